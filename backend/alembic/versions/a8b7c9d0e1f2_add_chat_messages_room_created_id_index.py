@@ -0,0 +1,31 @@
+"""add_chat_messages_room_created_id_index
+
+Revision ID: a8b7c9d0e1f2
+Revises: f7a6b8c9d0e1
+Create Date: 2026-10-17 17:00:00.000000
+
+聊天紀錄游標分頁：以 (room_id, created_at, id) 複合索引取代 (room_id, created_at)，
+WHERE room_id = ? ORDER BY created_at DESC, id DESC 與 before_id / after_id 條件都可直接沿索引掃描。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8b7c9d0e1f2'
+down_revision: Union[str, Sequence[str], None] = 'f7a6b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_room_created_id', 'chat_messages', ['room_id', 'created_at', 'id'], unique=False)
+    op.drop_index('idx_room_created', table_name='chat_messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('idx_room_created', 'chat_messages', ['room_id', 'created_at'], unique=False)
+    op.drop_index('idx_room_created_id', table_name='chat_messages')
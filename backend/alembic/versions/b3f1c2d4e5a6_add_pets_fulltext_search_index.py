@@ -0,0 +1,40 @@
+"""add_pets_fulltext_search_index
+
+Revision ID: b3f1c2d4e5a6
+Revises: 37f4fcc517ec
+Create Date: 2026-10-17 10:00:00.000000
+
+寵物全文搜尋：pets(name, breed, description) FULLTEXT 索引（ngram parser，支援中文）
+取代 ILIKE '%text%' 的全表掃描。僅 MySQL 適用，其他資料庫略過。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f1c2d4e5a6'
+down_revision: Union[str, Sequence[str], None] = '37f4fcc517ec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    op.execute("""
+        ALTER TABLE pets
+        ADD FULLTEXT INDEX ft_pets_search (name, breed, description)
+        WITH PARSER ngram
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    op.drop_index('ft_pets_search', table_name='pets')
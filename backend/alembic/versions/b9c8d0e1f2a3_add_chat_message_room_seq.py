@@ -0,0 +1,61 @@
+"""add_chat_message_room_seq
+
+Revision ID: b9c8d0e1f2a3
+Revises: a8b7c9d0e1f2
+Create Date: 2026-10-17 18:00:00.000000
+
+聊天室內的訊息序號：chat_messages.seq 在每個聊天室內從 1 單調遞增，
+chat_rooms.last_seq 為計數器，與新訊息在同一個交易中遞增。
+WebSocket 斷線重連時以 (room_id, seq) 索引補送缺少的訊息。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c8d0e1f2a3'
+down_revision: Union[str, Sequence[str], None] = 'a8b7c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_rooms', sa.Column('last_seq', sa.Integer(), nullable=False, server_default='0', comment='最後分配的訊息序號'))
+    op.add_column('chat_messages', sa.Column('seq', sa.Integer(), nullable=True, comment='聊天室內的訊息序號'))
+
+    # 回填：依 id 順序為每個聊天室的訊息編號
+    if op.get_bind().dialect.name == 'mysql':
+        # MySQL 不允許 UPDATE 的子查詢引用同一張表，改用衍生資料表 JOIN
+        op.execute("""
+            UPDATE chat_messages m
+            JOIN (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY room_id ORDER BY id) AS rn
+                FROM chat_messages
+            ) numbered ON numbered.id = m.id
+            SET m.seq = numbered.rn
+        """)
+    else:
+        op.execute("""
+            UPDATE chat_messages SET seq = (
+                SELECT COUNT(*) FROM chat_messages m
+                WHERE m.room_id = chat_messages.room_id AND m.id <= chat_messages.id
+            )
+        """)
+    op.execute("""
+        UPDATE chat_rooms SET last_seq = COALESCE((
+            SELECT MAX(m.seq) FROM chat_messages m WHERE m.room_id = chat_rooms.id
+        ), 0)
+    """)
+
+    op.alter_column('chat_messages', 'seq', existing_type=sa.Integer(), nullable=False, existing_comment='聊天室內的訊息序號')
+    op.create_index('idx_room_seq', 'chat_messages', ['room_id', 'seq'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_room_seq', table_name='chat_messages')
+    op.drop_column('chat_messages', 'seq')
+    op.drop_column('chat_rooms', 'last_seq')
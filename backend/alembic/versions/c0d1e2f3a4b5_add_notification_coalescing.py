@@ -0,0 +1,54 @@
+"""add_notification_coalescing
+
+Revision ID: c0d1e2f3a4b5
+Revises: b9c8d0e1f2a3
+Create Date: 2026-10-17 21:00:00.000000
+
+按讚、留言通知合併：notifications 新增合併鍵（type + link）、觸發人數與最後觸發者，
+時間窗內同一貼文的未讀通知更新同一列，不再每次新增一列。
+MySQL 的 notificationtype ENUM 補上 POST_LIKE / POST_COMMENT 等後來新增的類型。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0d1e2f3a4b5'
+down_revision: Union[str, Sequence[str], None] = 'b9c8d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_NOTIFICATION_TYPES = (
+    'APPLICATION_STATUS', 'MESSAGE', 'SYSTEM', 'REMINDER',
+    'REVIEW_STATUS', 'POST_REPORT', 'POST_LIKE', 'POST_COMMENT',
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'mysql':
+        op.alter_column('notifications', 'notification_type',
+                        existing_type=sa.Enum(*_NOTIFICATION_TYPES[:4], name='notificationtype'),
+                        type_=sa.Enum(*_NOTIFICATION_TYPES, name='notificationtype'),
+                        existing_nullable=True)
+
+    op.add_column('notifications', sa.Column('aggregation_key', sa.String(length=550), nullable=True, comment='合併鍵：type + link'))
+    op.add_column('notifications', sa.Column('actor_count', sa.Integer(), nullable=False, server_default='1', comment='合併的觸發人數'))
+    op.add_column('notifications', sa.Column('last_actor_id', sa.Integer(), nullable=True, comment='最後觸發者'))
+    op.add_column('notifications', sa.Column('last_actor_name', sa.String(length=255), nullable=True))
+    op.create_foreign_key('fk_notifications_last_actor_id_users', 'notifications', 'users',
+                          ['last_actor_id'], ['id'], ondelete='SET NULL')
+    op.create_index('idx_notification_user_aggregation', 'notifications',
+                    ['user_id', 'aggregation_key', 'is_read'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_notification_user_aggregation', table_name='notifications')
+    op.drop_constraint('fk_notifications_last_actor_id_users', 'notifications', type_='foreignkey')
+    op.drop_column('notifications', 'last_actor_name')
+    op.drop_column('notifications', 'last_actor_id')
+    op.drop_column('notifications', 'actor_count')
+    op.drop_column('notifications', 'aggregation_key')
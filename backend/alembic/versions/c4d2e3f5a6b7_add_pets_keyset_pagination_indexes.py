@@ -0,0 +1,35 @@
+"""add_pets_keyset_pagination_indexes
+
+Revision ID: c4d2e3f5a6b7
+Revises: b3f1c2d4e5a6
+Create Date: 2026-10-17 11:00:00.000000
+
+寵物游標分頁：每種排序一個複合索引 (status, sort_key, id)，
+讓 WHERE status = 'available' AND (sort_key, id) < (?, ?) ORDER BY sort_key, id
+可以直接沿索引掃描，不需要排序與 OFFSET。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e3f5a6b7'
+down_revision: Union[str, Sequence[str], None] = 'b3f1c2d4e5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_pets_status_created_at_id', 'pets', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('idx_pets_status_age_years_id', 'pets', ['status', 'age_years', 'id'], unique=False)
+    op.create_index('idx_pets_status_name_id', 'pets', ['status', 'name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_pets_status_name_id', table_name='pets')
+    op.drop_index('idx_pets_status_age_years_id', table_name='pets')
+    op.drop_index('idx_pets_status_created_at_id', table_name='pets')
@@ -0,0 +1,44 @@
+"""add_community_post_counters
+
+Revision ID: d1e2f3a4b5c6
+Revises: c0d1e2f3a4b5
+Create Date: 2026-10-17 23:00:00.000000
+
+community_posts 的反正規化計數：like_count、comment_count（不含已刪除的留言），
+由按讚 / 取消按讚、留言 / 刪除留言在同一交易中更新，貼文列表不再載入 post_likes 與 post_comments。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e2f3a4b5c6'
+down_revision: Union[str, Sequence[str], None] = 'c0d1e2f3a4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('community_posts', sa.Column('like_count', sa.Integer(), nullable=False, server_default='0', comment='按讚數'))
+    op.add_column('community_posts', sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0', comment='留言數（不含已刪除）'))
+
+    # 回填現有貼文的計數
+    op.execute("""
+        UPDATE community_posts SET
+            like_count = (
+                SELECT COUNT(*) FROM post_likes l WHERE l.post_id = community_posts.id
+            ),
+            comment_count = (
+                SELECT COUNT(*) FROM post_comments c
+                WHERE c.post_id = community_posts.id AND c.is_deleted = false
+            )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('community_posts', 'comment_count')
+    op.drop_column('community_posts', 'like_count')
@@ -0,0 +1,73 @@
+"""add_content_addressed_files_table
+
+Revision ID: d5e4f6a7b8c9
+Revises: c4d2e3f5a6b7
+Create Date: 2026-10-17 14:00:00.000000
+
+以內容 SHA-256 去重的檔案目錄（舊的 files 表已在 4853a5452c14 移除）：
+content_hash 唯一，ref_count 記錄引用次數，歸零時刪除物件與記錄。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e4f6a7b8c9'
+down_revision: Union[str, Sequence[str], None] = 'c4d2e3f5a6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('original_filename', sa.String(255), nullable=False),
+        sa.Column('stored_filename', sa.String(255), nullable=False),
+        sa.Column('file_path', sa.String(500), nullable=False),
+        sa.Column('file_url', sa.String(1000), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=False),
+        sa.Column('mime_type', sa.String(100), nullable=False),
+        sa.Column('file_type', sa.Enum('IMAGE', 'VIDEO', 'DOCUMENT', 'OTHER', name='filetype'), nullable=False),
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('uploaded_by', sa.Integer(), nullable=True),
+        sa.Column('status', sa.Enum('ACTIVE', 'DELETED', 'ARCHIVED', name='filestatus'), nullable=False),
+        sa.Column('pet_id', sa.Integer(), nullable=True),
+        sa.Column('application_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['pet_id'], ['pets.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['application_id'], ['adoption_applications.id'], ondelete='CASCADE'),
+        sa.UniqueConstraint('stored_filename'),
+    )
+    op.create_index('ix_files_id', 'files', ['id'], unique=False)
+    op.create_index('ix_files_content_hash', 'files', ['content_hash'], unique=True)
+    op.create_index('ix_files_file_type', 'files', ['file_type'], unique=False)
+    op.create_index('ix_files_status', 'files', ['status'], unique=False)
+    op.create_index('ix_files_uploaded_by', 'files', ['uploaded_by'], unique=False)
+    op.create_index('ix_files_pet_id', 'files', ['pet_id'], unique=False)
+    op.create_index('ix_files_application_id', 'files', ['application_id'], unique=False)
+    op.create_index('ix_files_created_at', 'files', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_files_created_at', table_name='files')
+    op.drop_index('ix_files_application_id', table_name='files')
+    op.drop_index('ix_files_pet_id', table_name='files')
+    op.drop_index('ix_files_uploaded_by', table_name='files')
+    op.drop_index('ix_files_status', table_name='files')
+    op.drop_index('ix_files_file_type', table_name='files')
+    op.drop_index('ix_files_content_hash', table_name='files')
+    op.drop_index('ix_files_id', table_name='files')
+    op.drop_table('files')
@@ -0,0 +1,51 @@
+"""scope_file_refs_to_rows
+
+Revision ID: e2f3a4b5c6d7
+Revises: d1e2f3a4b5c6
+Create Date: 2026-10-18 10:00:00.000000
+
+檔案目錄改為依分類去重：新增 category（物件 key 的第一層目錄），
+唯一鍵由 content_hash 改為 (category, content_hash)。
+ref_count 改為引用該物件的 pet_photos 列數（上傳本身不算引用），依現有資料重新計算。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f3a4b5c6d7'
+down_revision: Union[str, Sequence[str], None] = 'd1e2f3a4b5c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('files', sa.Column('category', sa.String(length=50), nullable=False, server_default=''))
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("UPDATE files SET category = SUBSTRING_INDEX(stored_filename, '/', 1)")
+    else:
+        op.execute("UPDATE files SET category = substr(stored_filename, 1, instr(stored_filename, '/') - 1)")
+
+    op.drop_index('ix_files_content_hash', table_name='files')
+    op.create_index('ix_files_content_hash', 'files', ['content_hash'], unique=False)
+    op.create_unique_constraint('uq_files_category_content_hash', 'files', ['category', 'content_hash'])
+
+    # 重新計算引用次數：每一筆 pet_photos 引用一次
+    op.alter_column('files', 'ref_count', existing_type=sa.Integer(), existing_nullable=False, server_default='0')
+    op.execute("""
+        UPDATE files SET ref_count = (
+            SELECT COUNT(*) FROM pet_photos p WHERE p.file_key = files.stored_filename
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('files', 'ref_count', existing_type=sa.Integer(), existing_nullable=False, server_default='1')
+    op.drop_constraint('uq_files_category_content_hash', 'files', type_='unique')
+    op.drop_index('ix_files_content_hash', table_name='files')
+    op.create_index('ix_files_content_hash', 'files', ['content_hash'], unique=True)
+    op.drop_column('files', 'category')
@@ -0,0 +1,67 @@
+"""add_chat_read_watermarks
+
+Revision ID: e6f5a7b8c9d0
+Revises: d5e4f6a7b8c9
+Create Date: 2026-10-17 15:00:00.000000
+
+聊天已讀水位：chat_rooms 記錄兩位參與者各自讀到的最後一則訊息 ID，
+未讀數改為 id > 水位，標記已讀只更新一列，不再逐列更新 chat_messages.is_read。
+
+回填規則（依既有 is_read）：水位 = 對方第一則未讀訊息 ID - 1；
+沒有未讀訊息時為聊天室最新訊息 ID（沒有訊息則為 0）。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f5a7b8c9d0'
+down_revision: Union[str, Sequence[str], None] = 'd5e4f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _backfill_statement(watermark_column: str, participant_column: str) -> str:
+    return f"""
+        UPDATE chat_rooms SET {watermark_column} = COALESCE(
+            (SELECT MIN(m.id) - 1 FROM chat_messages m
+             WHERE m.room_id = chat_rooms.id
+               AND m.sender_id != chat_rooms.{participant_column}
+               AND m.is_read = 0),
+            (SELECT MAX(m.id) FROM chat_messages m WHERE m.room_id = chat_rooms.id),
+            0
+        )
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_rooms', sa.Column(
+        'user_last_read_message_id', sa.Integer(), nullable=False, server_default='0',
+        comment='申請者已讀到的訊息ID'
+    ))
+    op.add_column('chat_rooms', sa.Column(
+        'shelter_last_read_message_id', sa.Integer(), nullable=False, server_default='0',
+        comment='收容所已讀到的訊息ID'
+    ))
+
+    op.execute(_backfill_statement('user_last_read_message_id', 'user_id'))
+    op.execute(_backfill_statement('shelter_last_read_message_id', 'shelter_id'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 把水位寫回 is_read，讓舊版程式的未讀數保持一致
+    op.execute("""
+        UPDATE chat_messages SET is_read = CASE
+            WHEN chat_messages.id <= (
+                SELECT CASE WHEN r.user_id = chat_messages.sender_id
+                            THEN r.shelter_last_read_message_id
+                            ELSE r.user_last_read_message_id END
+                FROM chat_rooms r WHERE r.id = chat_messages.room_id
+            ) THEN 1 ELSE 0 END
+    """)
+    op.drop_column('chat_rooms', 'shelter_last_read_message_id')
+    op.drop_column('chat_rooms', 'user_last_read_message_id')
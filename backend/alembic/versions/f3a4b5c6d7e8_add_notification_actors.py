@@ -0,0 +1,43 @@
+"""add_notification_actors
+
+Revision ID: f3a4b5c6d7e8
+Revises: e2f3a4b5c6d7
+Create Date: 2026-10-18 11:00:00.000000
+
+合併通知的觸發者：notification_actors 每人一列，actor_count 只計算不同的人
+（原本只比對最後觸發者，兩人交替按讚 / 留言會重複計數）。
+現有合併通知以最後觸發者回填。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a4b5c6d7e8'
+down_revision: Union[str, Sequence[str], None] = 'e2f3a4b5c6d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'notification_actors',
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('actor_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['actor_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('notification_id', 'actor_id'),
+    )
+    op.execute("""
+        INSERT INTO notification_actors (notification_id, actor_id)
+        SELECT id, last_actor_id FROM notifications
+        WHERE aggregation_key IS NOT NULL AND last_actor_id IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('notification_actors')
@@ -0,0 +1,58 @@
+"""add_chat_room_last_message_summary
+
+Revision ID: f7a6b8c9d0e1
+Revises: e6f5a7b8c9d0
+Create Date: 2026-10-17 16:00:00.000000
+
+聊天室最後訊息摘要：chat_rooms 冗餘存放最後一則訊息的 ID、預覽與類型，
+由發送訊息的同一個交易寫入，聊天室列表只需讀 chat_rooms。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a6b8c9d0e1'
+down_revision: Union[str, Sequence[str], None] = 'e6f5a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_rooms', sa.Column('last_message_id', sa.Integer(), nullable=True, comment='最後訊息ID'))
+    op.add_column('chat_rooms', sa.Column('last_message_preview', sa.String(length=200), nullable=True, comment='最後訊息預覽'))
+    op.add_column('chat_rooms', sa.Column('last_message_type', sa.String(length=20), nullable=True, comment='最後訊息類型'))
+
+    # 回填：每個聊天室 id 最大的訊息
+    op.execute("""
+        UPDATE chat_rooms SET last_message_id = (
+            SELECT MAX(m.id) FROM chat_messages m WHERE m.room_id = chat_rooms.id
+        )
+    """)
+    op.execute("""
+        UPDATE chat_rooms SET
+            last_message_type = LOWER((
+                SELECT m.message_type FROM chat_messages m WHERE m.id = chat_rooms.last_message_id
+            )),
+            last_message_preview = (
+                SELECT CASE LOWER(m.message_type)
+                    WHEN 'text' THEN SUBSTR(COALESCE(m.content, ''), 1, 200)
+                    WHEN 'image' THEN '[圖片]'
+                    WHEN 'file' THEN '[檔案]'
+                    WHEN 'pet_card' THEN '[寵物卡片]'
+                    ELSE '[訊息]'
+                END
+                FROM chat_messages m WHERE m.id = chat_rooms.last_message_id
+            )
+        WHERE last_message_id IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_rooms', 'last_message_type')
+    op.drop_column('chat_rooms', 'last_message_preview')
+    op.drop_column('chat_rooms', 'last_message_id')
@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.auth.dependencies import get_current_user
 from app.models.user import User, UserRole
-from app.services.factories import AdoptionServiceFactory
+from app.services.factories import AdoptionServiceFactory, NotificationServiceFactory
 from app.exceptions import (
     ApplicationNotFoundError,
     PetNotFoundError,
@@ -30,35 +30,27 @@ def _serialize_application(app) -> Dict[str, Any]:
     # 序列化 pet 信息
     pet_data = None
     if hasattr(app, 'pet') and app.pet:
-        from app.services.s3 import S3Service
+        from app.services.s3 import s3_service
         
-        s3_service = S3Service()
         pet = app.pet
         
         # 優化：批量收集所有需要生成 URL 的 file_keys
-        file_keys_map = {}
+        file_keys = []
         if hasattr(pet, 'photos') and pet.photos:
-            for photo in pet.photos:
-                if hasattr(photo, 'file_key') and photo.file_key:
-                    file_keys_map[photo.id] = photo.file_key
+            file_keys = [photo.file_key for photo in pet.photos if getattr(photo, 'file_key', None)]
         
-        # 批量生成所有 presigned URLs
-        presigned_urls = {}
-        for photo_id, file_key in file_keys_map.items():
-            try:
-                presigned_urls[photo_id] = s3_service.generate_presigned_url(
-                    file_key,
-                    expiration=604800  # 7天
-                )
-            except Exception as e:
-                print(f"⚠️ Failed to generate presigned URL for {file_key}: {e}")
+        # 批量生成所有 presigned URLs（共用快取）
+        presigned_urls = s3_service.generate_presigned_urls(
+            file_keys,
+            expiration=604800  # 7天
+        )
         
         # 序列化所有照片
         photos_data = []
         if hasattr(pet, 'photos') and pet.photos:
             for photo in pet.photos:
-                file_url = presigned_urls.get(photo.id)
                 file_key = photo.file_key if hasattr(photo, 'file_key') else None
+                file_url = presigned_urls.get(file_key)
                 
                 photos_data.append({
                     "id": photo.id,
@@ -83,28 +75,16 @@ def _serialize_application(app) -> Dict[str, Any]:
     # 序列化 documents 信息
     documents_data = []
     if hasattr(app, 'documents') and app.documents:
-        from app.services.s3 import S3Service
+        from app.services.s3 import s3_service
         
-        s3_service = S3Service()
-        
-        # 優化：批量生成文件 URLs
-        doc_keys_map = {}
-        for doc in app.documents:
-            if doc.file_key:
-                doc_keys_map[doc.id] = doc.file_key
-        
-        doc_presigned_urls = {}
-        for doc_id, file_key in doc_keys_map.items():
-            try:
-                doc_presigned_urls[doc_id] = s3_service.generate_presigned_url(
-                    file_key, 
-                    expiration=86400  # 24小時
-                )
-            except Exception as e:
-                print(f"⚠️ Failed to generate presigned URL for document {file_key}: {e}")
+        # 優化：批量生成文件 URLs（共用快取）
+        doc_presigned_urls = s3_service.generate_presigned_urls(
+            [doc.file_key for doc in app.documents if doc.file_key],
+            expiration=86400  # 24小時
+        )
         
         for doc in app.documents:
-            file_url = doc_presigned_urls.get(doc.id) or (doc.file_url if hasattr(doc, 'file_url') else None)
+            file_url = doc_presigned_urls.get(doc.file_key) or (doc.file_url if hasattr(doc, 'file_url') else None)
             
             documents_data.append({
                 "id": doc.id,
@@ -119,24 +99,23 @@ def _serialize_application(app) -> Dict[str, Any]:
     
     # 處理 living_environment 中的 environment_photos
     if isinstance(living_env, dict) and 'environment_photos' in living_env:
-        from app.services.s3 import S3Service
-        s3_service = S3Service()
+        from app.services.s3 import s3_service
         
         print(f"🏠 處理 {len(living_env.get('environment_photos', []))} 張居住環境照片")
         
+        # 批量生成預簽名 URL（24小時，共用快取）
+        env_presigned_urls = s3_service.generate_presigned_urls(
+            [photo.get('file_key') for photo in living_env.get('environment_photos', []) if isinstance(photo, dict)],
+            expiration=86400
+        )
+        
         updated_photos = []
         for photo in living_env.get('environment_photos', []):
             if isinstance(photo, dict):
-                file_key = photo.get('file_key')
-                if file_key and s3_service.use_s3 and s3_service.s3_client:
-                    try:
-                        # 生成新的預簽名 URL（24小時）
-                        new_url = s3_service.generate_presigned_url(file_key, expiration=86400)
-                        photo['file_url'] = new_url
-                        photo['url'] = new_url  # 兼容性
-                        print(f"   ✅ 環境照片 URL 已更新: {file_key[:50]}...")
-                    except Exception as e:
-                        print(f"   ❌ 生成環境照片 URL 失敗: {e}")
+                new_url = env_presigned_urls.get(photo.get('file_key'))
+                if new_url:
+                    photo['file_url'] = new_url
+                    photo['url'] = new_url  # 兼容性
                 updated_photos.append(photo)
         
         living_env['environment_photos'] = updated_photos
@@ -144,15 +123,11 @@ def _serialize_application(app) -> Dict[str, Any]:
     # 處理 home_visit_document
     home_visit_doc_url = None
     if hasattr(app, 'home_visit_document') and app.home_visit_document:
-        from app.services.s3 import S3Service
-        s3_service = S3Service()
+        from app.services.s3 import s3_service
         
-        if s3_service.use_s3 and s3_service.s3_client:
-            try:
-                home_visit_doc_url = s3_service.generate_presigned_url(app.home_visit_document, expiration=86400)
-                print(f"   ✅ 家訪文件 URL 已生成")
-            except Exception as e:
-                print(f"   ❌ 生成家訪文件 URL 失敗: {e}")
+        home_visit_doc_url = s3_service.generate_presigned_urls(
+            [app.home_visit_document], expiration=86400
+        ).get(app.home_visit_document)
     
     # 序列化申請人資訊
     user_data = None
@@ -208,6 +183,30 @@ def _handle_error(error: Exception):
         raise HTTPException(status_code=500, detail=str(error))
 
 
+async def _commit_with_applicant_notification(
+    db: AsyncSession,
+    application,
+    title: str,
+    message: str
+) -> None:
+    """
+    commit 申請的變更並通知申請人（同一次 commit），commit 後推送通知並重新載入申請
+    """
+    from app.models.notification import NotificationType
+    
+    notification_service = NotificationServiceFactory.create(db)
+    await notification_service.notify_users(
+        [application.applicant_id],
+        title=title,
+        message=message,
+        notification_type=NotificationType.APPLICATION_STATUS,
+        commit=False
+    )
+    await db.commit()
+    await db.refresh(application)
+    await notification_service.publish_pending()
+
+
 @router.post("/applications", status_code=status.HTTP_201_CREATED)
 async def create_draft_application(
     pet_id: Optional[int] = Query(None, description="Pet ID (can be provided as query or in JSON body)"),
@@ -470,7 +469,7 @@ async def get_application_documents(
     from sqlalchemy import select
     from app.models.adoption import ApplicationDocument, AdoptionApplication
     from app.models.pet import Pet
-    from app.services.s3 import S3Service
+    from app.services.s3 import s3_service
     
     # 驗證權限
     app_query = select(AdoptionApplication).where(AdoptionApplication.id == application_id)
@@ -496,9 +495,12 @@ async def get_application_documents(
     docs_result = await db.execute(docs_query)
     documents = docs_result.scalars().all()
     
-    # 生成預簽名 URL
-    s3_service = S3Service()
+    # 生成預簽名 URL（批量，共用快取）
     docs_data = []
+    presigned_urls = s3_service.generate_presigned_urls(
+        [doc.file_key for doc in documents if doc.file_key],
+        expiration=86400  # 24小時有效期
+    )
     
     print(f"🔍 處理 {len(documents)} 個文件")
     print(f"   S3 狀態: USE_S3={s3_service.use_s3}")
@@ -507,28 +509,12 @@ async def get_application_documents(
         print(f"  📄 文件: {doc.file_name}")
         print(f"     - file_key: {doc.file_key}")
         
-        # 總是嘗試生成新的預簽名 URL（如果使用 S3）
-        presigned_url = None
-        
-        if doc.file_key:
-            if s3_service.use_s3 and s3_service.s3_client:
-                try:
-                    # 生成新的預簽名 URL（24小時有效期）
-                    presigned_url = s3_service.generate_presigned_url(doc.file_key, expiration=86400)
-                    print(f"     - ✅ S3 預簽名 URL 已生成（24小時）")
-                except Exception as e:
-                    print(f"     - ❌ S3 預簽名失敗: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Fallback 使用原始 URL
-                    presigned_url = doc.file_url
-            else:
-                # S3 未啟用，使用原始 URL
-                print(f"     - ℹ️ S3 未啟用，使用原始 URL")
-                presigned_url = doc.file_url
+        # S3 未啟用、沒有 file_key 或簽名失敗時使用原始 URL
+        presigned_url = presigned_urls.get(doc.file_key) if doc.file_key else None
+        if presigned_url:
+            print(f"     - ✅ S3 預簽名 URL（24小時）")
         else:
-            # 沒有 file_key，使用原始 URL
-            print(f"     - ⚠️ 無 file_key，使用原始 URL")
+            print(f"     - ℹ️ 使用原始 URL")
             presigned_url = doc.file_url
         
         docs_data.append({
@@ -570,7 +556,6 @@ async def request_documents(
     from sqlalchemy import select
     from app.models.pet import Pet
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
     
     print(f"📄 通知補件:")
@@ -609,20 +594,14 @@ async def request_documents(
     
     application.updated_at = datetime.utcnow()
     
-    await db.commit()
-    await db.refresh(application)
-    
-    print(f"   ✅ 補件通知已發送")
-    
-    # Send notification to applicant
-    notification = Notification(
-        user_id=application.applicant_id,
+    await _commit_with_applicant_notification(
+        db,
+        application,
         title="請補充文件",
-        message=f"您的申請文件（申請編號 #{application.id}）尚未上傳完整。請至「我的申請」頁面上傳所需文件，以便我們進行審核。感謝您的配合！",
-        created_at=datetime.now(dt_timezone.utc)
+        message=f"您的申請文件（申請編號 #{application.id}）尚未上傳完整。請至「我的申請」頁面上傳所需文件，以便我們進行審核。感謝您的配合！"
     )
-    db.add(notification)
-    await db.commit()
+    
+    print(f"   ✅ 補件通知已發送")
     
     return {
         "message": "Document request notification sent",
@@ -643,7 +622,6 @@ async def schedule_home_visit(
     from sqlalchemy import select
     from app.models.pet import Pet
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
     
     # 讀取請求 body
@@ -718,19 +696,14 @@ async def schedule_home_visit(
     application.status = ApplicationStatus.HOME_VISIT_SCHEDULED
     application.updated_at = datetime.utcnow()
     
-    await db.commit()
-    await db.refresh(application)
-    
-    print(f"   ✅ 家訪已安排: {visit_date}")
-    
-    notification = Notification(
-        user_id=application.applicant_id,
+    await _commit_with_applicant_notification(
+        db,
+        application,
         title="家訪已安排",
-        message=f"申請編號：#{application.id}\n家訪時間：{visit_date.strftime('%Y年%m月%d日 %H:%M')}",
-        created_at=datetime.now(dt_timezone.utc)
+        message=f"申請編號：#{application.id}\n家訪時間：{visit_date.strftime('%Y年%m月%d日 %H:%M')}"
     )
-    db.add(notification)
-    await db.commit()
+    
+    print(f"   ✅ 家訪已安排: {visit_date}")
     
     return {
         "message": "Scheduled",
@@ -752,9 +725,10 @@ async def complete_home_visit(
     from sqlalchemy import select
     from app.models.pet import Pet, PetStatus
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
-    from app.services.s3 import s3_service
+    from app.services.storage import storage
+    from app.core.config import settings
+    from app.exceptions import FileTooLargeError
     
     # Parse multipart form data
     form = await request.form()
@@ -806,17 +780,17 @@ async def complete_home_visit(
     document_key = None
     if document and hasattr(document, 'filename'):
         try:
-            file_content = await document.read()
-            print(f"   📄 上傳文件: {document.filename} ({len(file_content)} bytes)")
-            
-            upload_result = s3_service.upload_file(
-                file_content=file_content,
-                filename=document.filename,
+            # 串流上傳（分塊讀取並檢查大小上限）
+            upload_result = await storage.upload_stream(
+                document,
                 category="home_visit_document",
-                content_type=getattr(document, 'content_type', 'application/octet-stream')
+                max_size=settings.MAX_FILE_SIZE
             )
+            print(f"   📄 上傳文件: {document.filename} ({upload_result['file_size']} bytes)")
             document_key = upload_result.get("file_key")
             print(f"   ✅ 文件已上傳: {document_key}")
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         except Exception as e:
             print(f"   ❌ 文件上傳失敗: {e}")
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -832,19 +806,14 @@ async def complete_home_visit(
     
     application.updated_at = datetime.utcnow()
     
-    await db.commit()
-    await db.refresh(application)
-    
-    print(f"   ✅ 家訪已完成")
-    
-    notification = Notification(
-        user_id=application.applicant_id,
+    await _commit_with_applicant_notification(
+        db,
+        application,
         title="家訪已完成",
-        message=f"申請編號：#{application.id}\n您的領養申請家訪已完成，我們正在進行評估。",
-        created_at=datetime.now(dt_timezone.utc)
+        message=f"申請編號：#{application.id}\n您的領養申請家訪已完成，我們正在進行評估。"
     )
-    db.add(notification)
-    await db.commit()
+    
+    print(f"   ✅ 家訪已完成")
     
     return {
         "message": "Home visit completed",
@@ -867,9 +836,11 @@ async def update_home_visit_record(
     from sqlalchemy import select
     from app.models.pet import Pet, PetStatus
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
+    from app.models.notification import NotificationType
     from datetime import timezone as dt_timezone
-    from app.services.s3 import s3_service
+    from app.services.storage import storage
+    from app.core.config import settings
+    from app.exceptions import FileTooLargeError
     
     # Parse multipart form data
     form = await request.form()
@@ -917,17 +888,17 @@ async def update_home_visit_record(
     document_key = None
     if document and hasattr(document, 'filename'):
         try:
-            file_content = await document.read()
-            print(f"   📄 上傳新文件: {document.filename} ({len(file_content)} bytes)")
-            
-            upload_result = s3_service.upload_file(
-                file_content=file_content,
-                filename=document.filename,
+            # 串流上傳（分塊讀取並檢查大小上限）
+            upload_result = await storage.upload_stream(
+                document,
                 category="home_visit_document",
-                content_type=getattr(document, 'content_type', 'application/octet-stream')
+                max_size=settings.MAX_FILE_SIZE
             )
+            print(f"   📄 上傳新文件: {document.filename} ({upload_result['file_size']} bytes)")
             document_key = upload_result.get("file_key")
             print(f"   ✅ 新文件已上傳: {document_key}")
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         except Exception as e:
             print(f"   ❌ 文件上傳失敗: {e}")
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -965,7 +936,6 @@ async def update_home_visit_date(
     from sqlalchemy import select
     from app.models.pet import Pet
     from app.models.adoption import AdoptionApplication
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
     
     # 讀取請求 body
@@ -1019,19 +989,14 @@ async def update_home_visit_date(
     application.home_visit_date = visit_date
     application.updated_at = datetime.utcnow()
     
-    await db.commit()
-    await db.refresh(application)
-    
-    print(f"   ✅ 家訪時間已更新: {visit_date}")
-    
-    notification = Notification(
-        user_id=application.applicant_id,
+    await _commit_with_applicant_notification(
+        db,
+        application,
         title="家訪時間已更改",
-        message=f"新時間：{visit_date.strftime('%Y年%m月%d日 %H:%M')}",
-        created_at=datetime.now(dt_timezone.utc)
+        message=f"新時間：{visit_date.strftime('%Y年%m月%d日 %H:%M')}"
     )
-    db.add(notification)
-    await db.commit()
+    
+    print(f"   ✅ 家訪時間已更新: {visit_date}")
     
     return {
         "message": "Updated",
@@ -1053,7 +1018,6 @@ async def complete_home_visit(
     from sqlalchemy import select
     from app.models.pet import Pet
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
     
     if current_user.role != UserRole.shelter:
@@ -1086,17 +1050,12 @@ async def complete_home_visit(
     
     application.updated_at = datetime.utcnow()
     
-    await db.commit()
-    await db.refresh(application)
-    
-    notification = Notification(
-        user_id=application.applicant_id,
+    await _commit_with_applicant_notification(
+        db,
+        application,
         title="家訪已完成",
-        message="家訪已完成，正在評估中",
-        created_at=datetime.now(dt_timezone.utc)
+        message="家訪已完成，正在評估中"
     )
-    db.add(notification)
-    await db.commit()
     
     return {
         "message": "Completed",
@@ -1119,7 +1078,6 @@ async def make_final_decision(
     from sqlalchemy import select
     from app.models.pet import Pet, PetStatus
     from app.models.adoption import AdoptionApplication, ApplicationStatus
-    from app.models.notification import Notification
     from datetime import timezone as dt_timezone
     
     # Parse multipart form data
@@ -1170,28 +1128,21 @@ async def make_final_decision(
     if decision == "approved":
         pet.status = PetStatus.ADOPTED
     
-    await db.commit()
-    await db.refresh(application)
-    
-    print(f"   ✅ 最終決定: {decision}")
-    
     if decision == "approved":
-        notification = Notification(
-            user_id=application.applicant_id,
-            title="領養申請已通過",
-            message=f"申請編號：#{application.id}\n恭喜！申請已通過，請聯繫收容所安排領養手續。",
-            created_at=datetime.now(dt_timezone.utc)
-        )
+        title = "領養申請已通過"
+        message = f"申請編號：#{application.id}\n恭喜！申請已通過，請聯繫收容所安排領養手續。"
     else:
-        notification = Notification(
-            user_id=application.applicant_id,
-            title="領養申請未通過",
-            message=f"申請編號：#{application.id}\n很抱歉，申請未能通過。{notes or '歡迎申請其他寵物。'}",
-            created_at=datetime.now(dt_timezone.utc)
-        )
+        title = "領養申請未通過"
+        message = f"申請編號：#{application.id}\n很抱歉，申請未能通過。{notes or '歡迎申請其他寵物。'}"
+    
+    await _commit_with_applicant_notification(
+        db,
+        application,
+        title=title,
+        message=message
+    )
     
-    db.add(notification)
-    await db.commit()
+    print(f"   ✅ 最終決定: {decision}")
     
     return {
         "message": f"Application {decision}",
@@ -3,81 +3,31 @@ Chat API V2 - 簡化版本 with WebSocket
 """
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Body, WebSocket, WebSocketDisconnect, UploadFile, File
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from pydantic import BaseModel
+import asyncio
 import json
 
-from app.database import get_db
+from app.database import get_db, get_session_factory
 from app.auth.dependencies import get_current_user, get_current_user_optional
 from app.models.user import User, UserRole
 from app.services.factories import ChatServiceFactory
+from app.core.config import settings
+from app.services.realtime import decode_binary_frame, encode_frame, frame_encodings, manager
+from app.services.message_batcher import MessageBatcher, get_message_batcher
 from app.exceptions import (
     ChatRoomNotFoundError,
     MessageNotFoundError,
     PetNotFoundError,
-    PermissionDeniedError
+    PermissionDeniedError,
+    FileTooLargeError,
+    ValidationError
 )
 
 router = APIRouter()
 
-
-# ===== WebSocket 連接管理器 =====
-class ConnectionManager:
-    """
-    WebSocket 連接管理器
-    支援全局單一連接，用戶可訂閱多個聊天室
-    """
-    def __init__(self):
-        # 儲存連接：{user_id: websocket}
-        self.active_connections: Dict[int, WebSocket] = {}
-        # 儲存用戶訂閱的聊天室：{user_id: set(room_ids)}
-        self.user_rooms: Dict[int, set] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: int):
-        """用戶連接"""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        self.user_rooms[user_id] = set()
-        print(f"✅ User {user_id} connected to WebSocket V2")
-
-    def disconnect(self, user_id: int):
-        """用戶斷線"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        if user_id in self.user_rooms:
-            del self.user_rooms[user_id]
-        print(f"❌ User {user_id} disconnected from WebSocket V2")
-
-    def subscribe_room(self, user_id: int, room_id: int):
-        """訂閱聊天室"""
-        if user_id in self.user_rooms:
-            self.user_rooms[user_id].add(room_id)
-            print(f"📢 User {user_id} subscribed to room {room_id}")
-
-    def unsubscribe_room(self, user_id: int, room_id: int):
-        """取消訂閱聊天室"""
-        if user_id in self.user_rooms and room_id in self.user_rooms[user_id]:
-            self.user_rooms[user_id].remove(room_id)
-            print(f"🔕 User {user_id} unsubscribed from room {room_id}")
-
-    async def send_personal_message(self, message: dict, user_id: int):
-        """發送訊息給特定用戶"""
-        if user_id in self.active_connections:
-            try:
-                websocket = self.active_connections[user_id]
-                await websocket.send_json(message)
-            except Exception as e:
-                print(f"❌ Error sending message to user {user_id}: {e}")
-                self.disconnect(user_id)
-
-    async def broadcast_to_room(self, message: dict, room_id: int, exclude_user: Optional[int] = None):
-        """廣播訊息給聊天室的所有訂閱者（可排除特定用戶）"""
-        for user_id, rooms in self.user_rooms.items():
-            if room_id in rooms and user_id != exclude_user:
-                await self.send_personal_message(message, user_id)
-
-# 全局連接管理器
-manager = ConnectionManager()
+# WebSocket 發送訊息後等待寫入、回覆 ack 與廣播的 task（保留參考，避免被回收）
+_send_tasks = set()
 
 
 # ===== WebSocket Endpoint =====
@@ -85,11 +35,30 @@ manager = ConnectionManager()
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str,
-    db: AsyncSession = Depends(get_db)
+    encoding: str = "json",
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    batcher: MessageBatcher = Depends(get_message_batcher)
 ):
     """
     WebSocket 連接端點
     前端連接：ws://localhost:8000/api/v2/chat/ws?token=<jwt_token>
+    
+    encoding=msgpack（msgpack 列在 requirements.txt；未安裝時以 1008 拒絕）時伺服器以 MessagePack binary frame 送出，
+    客戶端可送 JSON text frame 或 MessagePack binary frame；預設 encoding=json。
+    permessage-deflate 壓縮由 ASGI 伺服器在握手時協商（見 WEBSOCKET_PER_MESSAGE_DEFLATE）。
+    
+    連線期間不佔用資料庫 session：需要查詢的動作（訂閱時的權限檢查）才開啟短命 session。
+    伺服器送出 {"type": "ping"} 時請回覆任一訊息（例如 {"action": "pong"}），否則連線會被關閉。
+    
+    發送文字訊息（需先訂閱該聊天室）：
+        {"action": "send", "room_id": 1, "client_id": "c-1", "content": "..."}
+    訊息寫入後回覆 {"type": "ack", "client_id", "room_id", "message"} 並廣播給其他訂閱者；
+    失敗時回覆 {"type": "error", "client_id", "room_id", "error"}。
+    
+    斷線重連（同時訂閱這些聊天室）：{"action": "resume", "rooms": {"<room_id>": <最後收到的 seq>}}
+    每個聊天室補送缺少的 new_message 後回覆 {"type": "resumed", "room_id", "last_seq", "replayed"}；
+    缺少太多時回覆 {"type": "resync", "room_id", "last_seq"}，請改用 REST 重新載入。
+    補送與即時訊息可能重複或交錯，客戶端以 message.seq 去重、排序。
     """
     # 驗證 token
     try:
@@ -106,21 +75,38 @@ async def websocket_endpoint(
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    # 建立連接
-    await manager.connect(websocket, user_id)
+    if encoding not in frame_encodings():
+        print(f"❌ WebSocket encoding not supported: {encoding}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # 建立連接（連線數已達上限時已被關閉）
+    connection = await manager.connect(websocket, user_id, encoding)
+    if connection is None:
+        return
 
     try:
         while True:
             # 接收前端訊息
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await _receive_action(websocket)
+            connection.touch()
             
             action = message_data.get("action")
             
-            # 訂閱聊天室
+            # 訂閱聊天室（只有參與者可以訂閱）
             if action == "subscribe":
                 room_id = message_data.get("room_id")
                 if room_id:
+                    try:
+                        async with session_factory() as db:
+                            await ChatServiceFactory.create(db).verify_participant(room_id, user_id)
+                    except (ChatRoomNotFoundError, PermissionDeniedError) as e:
+                        await manager.send_personal_message({
+                            "type": "error",
+                            "room_id": room_id,
+                            "error": str(e)
+                        }, user_id)
+                        continue
                     manager.subscribe_room(user_id, room_id)
                     await manager.send_personal_message({
                         "type": "subscribed",
@@ -137,6 +123,34 @@ async def websocket_endpoint(
                         "room_id": room_id
                     }, user_id)
             
+            # 發送文字訊息：批次寫入，commit 後回覆 ack 並廣播（不阻塞接收下一則）
+            elif action == "send":
+                room_id = message_data.get("room_id")
+                client_id = message_data.get("client_id")
+                content = message_data.get("content")
+                error = None
+                if room_id not in connection.rooms:
+                    error = "請先訂閱聊天室"
+                elif not isinstance(content, str) or not content.strip():
+                    error = "訊息內容不能為空"
+                if error:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "client_id": client_id,
+                        "room_id": room_id,
+                        "error": error
+                    }, user_id)
+                    continue
+                task = asyncio.create_task(_deliver_sent_message(
+                    batcher.submit(room_id, user_id, content), room_id, user_id, client_id
+                ))
+                _send_tasks.add(task)
+                task.add_done_callback(_send_tasks.discard)
+            
+            # 斷線重連：訂閱並補送缺少的訊息
+            elif action == "resume":
+                await _resume_rooms(message_data.get("rooms") or {}, user_id, session_factory)
+            
             # 心跳檢測
             elif action == "ping":
                 await manager.send_personal_message({
@@ -144,10 +158,112 @@ async def websocket_endpoint(
                 }, user_id)
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, connection)
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, connection)
+
+
+async def _receive_action(websocket: WebSocket) -> Dict[str, Any]:
+    """接收客戶端的下一個動作（JSON text frame 或 MessagePack binary frame）"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("bytes") is not None:
+        return decode_binary_frame(message["bytes"])
+    return json.loads(message["text"])
+
+
+async def _deliver_sent_message(future, room_id: int, user_id: int, client_id: Optional[str]):
+    """等待訊息所屬批次 commit，回覆發送者 ack 並廣播給聊天室的其他訂閱者"""
+    try:
+        message = await future
+    except Exception as e:
+        if isinstance(e, ChatRoomNotFoundError):
+            # 聊天室已隨寵物刪除：取消訂閱，之後的訊息不再送進批次
+            manager.unsubscribe_room(user_id, room_id)
+        await manager.send_personal_message({
+            "type": "error",
+            "client_id": client_id,
+            "room_id": room_id,
+            "error": str(e) if isinstance(e, ChatRoomNotFoundError) else "訊息發送失敗"
+        }, user_id)
+        return
+    
+    message_data = _serialize_message(message)
+    await manager.send_personal_message({
+        "type": "ack",
+        "client_id": client_id,
+        "room_id": room_id,
+        "message": message_data
+    }, user_id)
+    await manager.broadcast_to_room(
+        {
+            "type": "new_message",
+            "room_id": room_id,
+            "message": message_data
+        },
+        room_id,
+        exclude_user=user_id,
+        seq=message.seq
+    )
+
+
+async def _resume_rooms(cursors: Dict[str, Any], user_id: int, session_factory: async_sessionmaker):
+    """
+    斷線重連補送：訂閱聊天室，補送序號大於客戶端最後收到的訊息
+    
+    先訂閱再補送，避免兩者之間的新訊息遺漏；優先使用記憶體緩衝，不足時查 (room_id, seq) 索引。
+    """
+    try:
+        cursors = {int(room_id): int(seq or 0) for room_id, seq in cursors.items()}
+    except (AttributeError, TypeError, ValueError):
+        await manager.send_personal_message({"type": "error", "error": "rooms 格式錯誤"}, user_id)
+        return
+    
+    async with session_factory() as db:
+        service = ChatServiceFactory.create(db)
+        rooms = await service.get_resume_rooms(list(cursors), user_id)
+        
+        for room_id, after_seq in cursors.items():
+            room = rooms.get(room_id)
+            if room is None:
+                await manager.send_personal_message({
+                    "type": "error",
+                    "room_id": room_id,
+                    "error": "您沒有權限查看此聊天室"
+                }, user_id)
+                continue
+            manager.subscribe_room(user_id, room_id)
+            
+            frames = manager.history.since(room_id, after_seq, room.last_seq)
+            if frames is None:
+                if room.last_seq - after_seq > settings.CHAT_RESUME_MAX_MESSAGES:
+                    await manager.send_personal_message({
+                        "type": "resync",
+                        "room_id": room_id,
+                        "last_seq": room.last_seq
+                    }, user_id)
+                    continue
+                messages = await service.get_messages_after_seq(
+                    room_id, after_seq, limit=room.last_seq - after_seq
+                )
+                frames = [
+                    encode_frame({
+                        "type": "new_message",
+                        "room_id": room_id,
+                        "message": _serialize_message(message, room)
+                    })
+                    for message in messages
+                ]
+            
+            manager.send_personal_frames(frames, user_id)
+            await manager.send_personal_message({
+                "type": "resumed",
+                "room_id": room_id,
+                "last_seq": room.last_seq,
+                "replayed": len(frames)
+            }, user_id)
 
 
 class CreateChatRoomRequest(BaseModel):
@@ -174,7 +290,7 @@ class SendFileRequest(BaseModel):
 
 def _serialize_room(room) -> Dict[str, Any]:
     """序列化聊天室"""
-    from app.services.s3 import S3Service
+    from app.services.s3 import s3_service
     
     # 基本聊天室資訊
     room_data = {
@@ -185,55 +301,45 @@ def _serialize_room(room) -> Dict[str, Any]:
         "last_message_at": room.last_message_at.isoformat() if room.last_message_at else None,
         "created_at": room.created_at.isoformat() if room.created_at else None,
         "unread_count": 0,  # 默認值，可以後續實現
-        "last_message": None,  # 默認值
-        "last_message_type": None,  # 默認值
+        # 最後訊息摘要（發送訊息時寫入聊天室）
+        "last_message": room.last_message_preview,
+        "last_message_type": room.last_message_type,
     }
     
-    # 如果有關聯的訊息，獲取最後一條
-    from sqlalchemy import inspect
-    insp = inspect(room)
-    
-    if 'messages' not in insp.unloaded and hasattr(room, 'messages') and room.messages:
-        # 訊息已經加載，取最後一條
-        last_msg = room.messages[-1] if room.messages else None
-        if last_msg:
-            room_data["last_message"] = last_msg.content or "[圖片]" if last_msg.message_type.value == "image" else last_msg.content
-            room_data["last_message_type"] = last_msg.message_type.value if hasattr(last_msg.message_type, 'value') else last_msg.message_type
-    
     # 如果有關聯的寵物資訊，序列化寵物資料
     if hasattr(room, 'pet') and room.pet:
         pet = room.pet
-        s3_service = S3Service()
         
         # 添加 pet_name 供 shelter 標題使用
         room_data["pet_name"] = pet.name
         
         # 序列化寵物照片
         photos_data = []
-        pet_photo_url = None  # 用於列表顯示的主要照片
+        pet_photo_url = None  # 用於列表顯示的主要照片（縮圖）
         
         if hasattr(pet, 'photos') and pet.photos:
+            # 批量生成（共用快取）：聊天室只需要卡片尺寸與縮圖
+            file_keys = [photo.file_key for photo in pet.photos]
+            card_urls = s3_service.generate_variant_urls(file_keys, "card", expiration=604800)
+            thumbnail_urls = s3_service.generate_variant_urls(file_keys, "thumbnail", expiration=604800)
             for photo in pet.photos:
-                file_url = None
-                if photo.file_key and s3_service.use_s3 and s3_service.s3_client:
-                    try:
-                        file_url = s3_service.generate_presigned_url(photo.file_key, expiration=604800)
-                        # 設置主要照片為列表顯示圖片
-                        if photo.is_primary and not pet_photo_url:
-                            pet_photo_url = file_url
-                    except Exception as e:
-                        print(f"⚠️ Failed to generate presigned URL: {e}")
+                file_url = card_urls.get(photo.file_key) if photo.file_key else None
+                thumbnail_url = (thumbnail_urls.get(photo.file_key) or file_url) if photo.file_key else None
+                # 設置主要照片為列表顯示圖片
+                if thumbnail_url and photo.is_primary and not pet_photo_url:
+                    pet_photo_url = thumbnail_url
                 
                 photos_data.append({
                     "id": photo.id,
                     "file_url": file_url,
+                    "thumbnail_url": thumbnail_url,
                     "file_key": photo.file_key,
                     "is_primary": photo.is_primary if hasattr(photo, 'is_primary') else False,
                 })
             
             # 如果沒有主要照片，使用第一張照片
-            if not pet_photo_url and photos_data and photos_data[0]["file_url"]:
-                pet_photo_url = photos_data[0]["file_url"]
+            if not pet_photo_url and photos_data and photos_data[0]["thumbnail_url"]:
+                pet_photo_url = photos_data[0]["thumbnail_url"]
         
         # 添加 pet_photo_url 供前端列表顯示
         room_data["pet_photo_url"] = pet_photo_url
@@ -275,8 +381,8 @@ def _serialize_room(room) -> Dict[str, Any]:
     return room_data
 
 
-def _serialize_message(msg) -> Dict[str, Any]:
-    """序列化訊息"""
+def _serialize_message(msg, room=None) -> Dict[str, Any]:
+    """序列化訊息（提供 room 時 is_read 由接收方的已讀水位判斷）"""
     return {
         "id": msg.id,
         "room_id": msg.room_id,
@@ -286,7 +392,8 @@ def _serialize_message(msg) -> Dict[str, Any]:
         "file_url": msg.file_url,
         "file_name": msg.file_name,
         "file_size": msg.file_size,
-        "is_read": msg.is_read,
+        "seq": msg.seq,
+        "is_read": room.is_read_by_recipient(msg) if room is not None else msg.is_read,
         "created_at": msg.created_at.isoformat() if msg.created_at else None,
     }
 
@@ -297,6 +404,10 @@ def _handle_error(error: Exception):
         raise HTTPException(status_code=404, detail=str(error))
     elif isinstance(error, PermissionDeniedError):
         raise HTTPException(status_code=403, detail=str(error))
+    elif isinstance(error, FileTooLargeError):
+        raise HTTPException(status_code=413, detail=str(error))
+    elif isinstance(error, ValidationError):
+        raise HTTPException(status_code=400, detail=str(error))
     else:
         raise HTTPException(status_code=500, detail=str(error))
 
@@ -316,7 +427,6 @@ async def create_or_get_room(
     """
     try:
         from sqlalchemy import select
-        from sqlalchemy.orm import selectinload
         from app.models.pet import Pet
         
         print(f"📞 Creating chat room for pet_id={request.pet_id}, user_id={current_user.id}")
@@ -342,14 +452,7 @@ async def create_or_get_room(
         print(f"✅ Chat room created/retrieved: room_id={room.id}")
         
         # 重新查詢聊天室以包含所有關聯資料
-        from app.models.chat_room import ChatRoom
-        room_query = select(ChatRoom).options(
-            selectinload(ChatRoom.pet).selectinload(Pet.photos),
-            selectinload(ChatRoom.user),
-            selectinload(ChatRoom.shelter)
-        ).where(ChatRoom.id == room.id)
-        room_result = await db.execute(room_query)
-        room_with_relations = room_result.scalar_one()
+        room_with_relations = await service.get_room(room.id, current_user.id)
         
         return _serialize_room(room_with_relations)
     except Exception as e:
@@ -365,27 +468,8 @@ async def get_room(
 ) -> Dict[str, Any]:
     """獲取聊天室詳情"""
     try:
-        from sqlalchemy import select
-        from sqlalchemy.orm import selectinload
-        from app.models.chat_room import ChatRoom
-        from app.models.pet import Pet
-        
-        # 查詢聊天室（包含關聯資料）
-        query = select(ChatRoom).options(
-            selectinload(ChatRoom.pet).selectinload(Pet.photos),
-            selectinload(ChatRoom.user),
-            selectinload(ChatRoom.shelter)
-        ).where(ChatRoom.id == room_id)
-        
-        result = await db.execute(query)
-        room = result.scalar_one_or_none()
-        
-        if not room:
-            raise ChatRoomNotFoundError(f"Chat room {room_id} not found")
-        
-        # 驗證權限
-        if room.user_id != current_user.id and room.shelter_id != current_user.id:
-            raise PermissionDeniedError("You don't have permission to access this chat room")
+        service = ChatServiceFactory.create(db)
+        room = await service.get_room(room_id, current_user.id)
         
         return _serialize_room(room)
     except Exception as e:
@@ -394,99 +478,48 @@ async def get_room(
 
 @router.get("/rooms")
 async def list_rooms(
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="每頁筆數；未指定 cursor 與 limit 時返回全部"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
-    """列出聊天室（只顯示有訊息的聊天室）"""
+    """
+    列出聊天室（只顯示有訊息的聊天室）
+    
+    依最後訊息時間排序；指定 limit 或 cursor 時為游標分頁（limit 預設 50），
+    都未指定時返回全部聊天室（與 V1 相同，不會截斷）。
+    最後訊息摘要直接存在聊天室上，未讀數以一次批次查詢取得，查詢數與聊天室數量無關。
+    """
     try:
-        from sqlalchemy import select, exists, desc, func, and_
-        from sqlalchemy.orm import selectinload
-        from app.models.chat_room import ChatRoom
-        from app.models.chat_message import ChatMessage
-        from app.models.pet import Pet
-        
         print(f"📋 Listing rooms for user_id={current_user.id}, role={current_user.role}")
         
-        # 根據角色查詢聊天室（包含關聯資料），並過濾出有訊息的聊天室
-        if current_user.role == UserRole.adopter:
-            # 子查詢：檢查聊天室是否有訊息
-            has_messages = select(ChatMessage.id).where(
-                ChatMessage.room_id == ChatRoom.id
-            ).limit(1).exists()
-            
-            query = select(ChatRoom).options(
-                selectinload(ChatRoom.pet).selectinload(Pet.photos),
-                selectinload(ChatRoom.shelter)
-            ).where(
-                ChatRoom.user_id == current_user.id
-            ).where(
-                has_messages  # 只顯示有訊息的聊天室
-            ).order_by(desc(ChatRoom.last_message_at))
-        elif current_user.role == UserRole.shelter:
-            # 子查詢：檢查聊天室是否有訊息
-            has_messages = select(ChatMessage.id).where(
-                ChatMessage.room_id == ChatRoom.id
-            ).limit(1).exists()
-            
-            query = select(ChatRoom).options(
-                selectinload(ChatRoom.pet).selectinload(Pet.photos),
-                selectinload(ChatRoom.user)
-            ).where(
-                ChatRoom.shelter_id == current_user.id
-            ).where(
-                has_messages  # 只顯示有訊息的聊天室
-            ).order_by(desc(ChatRoom.last_message_at))
-        else:
+        if current_user.role not in (UserRole.adopter, UserRole.shelter):
             raise HTTPException(status_code=403, detail="Invalid role")
         
-        result = await db.execute(query)
-        rooms = result.scalars().all()
+        service = ChatServiceFactory.create(db)
+        page = await service.list_rooms(
+            current_user.id,
+            as_shelter=current_user.role == UserRole.shelter,
+            cursor=cursor,
+            limit=limit if limit is not None or cursor is None else 50
+        )
         
-        print(f"✅ Found {len(rooms)} rooms with messages")
+        print(f"✅ Found {len(page['rooms'])} rooms with messages")
         
-        # 為每個聊天室獲取最後一條訊息和未讀數量
         rooms_data = []
-        for room in rooms:
-            # 獲取該聊天室的最後一條訊息
-            last_msg_query = select(ChatMessage).where(
-                ChatMessage.room_id == room.id
-            ).order_by(desc(ChatMessage.created_at)).limit(1)
-            last_msg_result = await db.execute(last_msg_query)
-            last_msg = last_msg_result.scalar_one_or_none()
-            
-            # 計算未讀訊息數量（不是當前用戶發送的且未讀的訊息）
-            unread_query = select(func.count(ChatMessage.id)).where(
-                and_(
-                    ChatMessage.room_id == room.id,
-                    ChatMessage.sender_id != current_user.id,
-                    ChatMessage.is_read == False
-                )
-            )
-            unread_result = await db.execute(unread_query)
-            unread_count = unread_result.scalar() or 0
-            
-            # 序列化聊天室
+        for room in page["rooms"]:
             room_data = _serialize_room(room)
-            
-            # 更新未讀數量
-            room_data["unread_count"] = unread_count
-            
-            # 添加最後一條訊息信息
-            if last_msg:
-                if last_msg.message_type.value == "text":
-                    room_data["last_message"] = last_msg.content
-                elif last_msg.message_type.value == "image":
-                    room_data["last_message"] = "[圖片]"
-                elif last_msg.message_type.value == "file":
-                    room_data["last_message"] = "[檔案]"
-                else:
-                    room_data["last_message"] = "[訊息]"
-                room_data["last_message_type"] = last_msg.message_type.value
-            
+            room_data["unread_count"] = page["unread_counts"].get(room.id, 0)
             rooms_data.append(room_data)
         
-        # 返回格式與 V1 兼容
-        return {"rooms": rooms_data}
+        # 返回格式與 V1 兼容（另附分頁資訊）
+        return {
+            "rooms": rooms_data,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error in list_rooms: {e}")
         import traceback
@@ -497,41 +530,33 @@ async def list_rooms(
 @router.get("/rooms/{room_id}/messages")
 async def get_messages(
     room_id: int,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, le=100),
+    before_id: Optional[int] = Query(None, description="載入比此訊息更舊的訊息"),
+    after_id: Optional[int] = Query(None, description="載入比此訊息更新的訊息"),
+    skip: int = Query(0, ge=0, description="舊版 OFFSET 分頁，請改用 before_id"),
+    limit: int = Query(50, ge=1, le=100),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
-    """獲取聊天室訊息"""
+    """
+    獲取聊天室訊息（最新的在前）
+    
+    游標分頁：往上捲動時以目前最舊一則的 id 作為 before_id，補新訊息時以最新一則的 id 作為 after_id。
+    """
     try:
-        from sqlalchemy import select
-        from app.models.chat_room import ChatRoom
-        from app.repositories.chat import MessageRepository
-        
         print(f"📨 Getting messages for room_id={room_id}, user_id={current_user.id}")
         
-        # 驗證權限：檢查用戶是否是聊天室參與者
-        room_query = select(ChatRoom).where(ChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
-        
-        if not room:
-            raise ChatRoomNotFoundError(f"Chat room {room_id} not found")
-        
-        if room.user_id != current_user.id and room.shelter_id != current_user.id:
-            raise PermissionDeniedError("You don't have permission to access this chat room")
-        
-        print(f"✅ Permission verified")
-        
-        # 獲取訊息
-        message_repo = MessageRepository(db)
-        messages = await message_repo.get_room_messages(room_id, skip=skip, limit=limit)
+        # 權限檢查（參與者快取）並取得聊天室的已讀水位
+        service = ChatServiceFactory.create(db)
+        room, messages, has_more = await service.get_message_page(
+            room_id, current_user.id, before_id=before_id, after_id=after_id, limit=limit, skip=skip
+        )
         
         print(f"✅ Found {len(messages)} messages")
         
         return {
-            "items": [_serialize_message(msg) for msg in messages],
-            "total": len(messages)
+            "items": [_serialize_message(msg, room) for msg in messages],
+            "total": len(messages),
+            "has_more": has_more,
         }
     except Exception as e:
         print(f"❌ Error in get_messages: {e}")
@@ -568,7 +593,8 @@ async def send_text_message(
                 "message": message_data
             },
             room_id,
-            exclude_user=current_user.id
+            exclude_user=current_user.id,
+            seq=message.seq
         )
         
         print(f"✅ Message sent and broadcasted in room {room_id}")
@@ -610,7 +636,8 @@ async def send_image_message(
                 "message": message_data
             },
             room_id,
-            exclude_user=current_user.id
+            exclude_user=current_user.id,
+            seq=message.seq
         )
         
         print(f"✅ Image message sent and broadcasted in room {room_id}")
@@ -649,7 +676,8 @@ async def send_file_message(
                 "message": message_data
             },
             room_id,
-            exclude_user=current_user.id
+            exclude_user=current_user.id,
+            seq=message.seq
         )
         
         print(f"✅ File message sent and broadcasted in room {room_id}")
@@ -668,42 +696,36 @@ async def upload_file(
 ) -> Dict[str, Any]:
     """上傳聊天文件（圖片或文件）"""
     try:
-        from app.services.s3 import s3_service
-        from sqlalchemy import select
-        from app.models.chat_room import ChatRoom
-        
-        # 驗證聊天室權限
-        room_query = select(ChatRoom).where(ChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
-        
-        if not room:
-            raise ChatRoomNotFoundError(f"Chat room {room_id} not found")
+        from app.services.image_pipeline import image_pipeline
         
-        if room.user_id != current_user.id and room.shelter_id != current_user.id:
-            raise PermissionDeniedError("You don't have permission to access this chat room")
+        # 驗證聊天室權限（參與者快取）
+        service = ChatServiceFactory.create(db)
+        await service.verify_participant(room_id, current_user.id)
         
-        # 確定文件類型
-        content_type = file.content_type or ""
-        is_image = content_type.startswith("image/")
+        from app.core.config import settings
         
-        # 上傳到 S3
-        file_content = await file.read()
+        # 確定文件類型（宣告為圖片時套用照片大小上限）
+        declared_image = (file.content_type or "").startswith("image/")
         
-        upload_result = s3_service.upload_file(
-            file_content,
-            file.filename or "file",
+        # 串流上傳到 S3（分塊讀取並檢查大小上限）；圖片另產生衍生版本
+        upload_result = await image_pipeline.upload(
+            file,
             "chat",  # category
-            content_type
+            max_size=settings.MAX_PHOTO_SIZE if declared_image else settings.MAX_FILE_SIZE
         )
         
         print(f"✅ Upload result: {upload_result}")
         
-        # 返回上傳結果
+        # 以檔頭判斷的實際類型決定訊息類型
+        is_image = upload_result["content_type"].startswith("image/")
+        
+        # 返回上傳結果（縮圖供訊息列表預覽，沒有衍生版本時為原圖）
+        thumbnail = upload_result["variants"].get("thumbnail")
         return {
             "file_url": upload_result["file_url"],
+            "thumbnail_url": thumbnail["file_url"] if thumbnail else upload_result["file_url"],
             "file_name": file.filename,
-            "file_size": len(file_content),
+            "file_size": upload_result["file_size"],
             "message_type": "image" if is_image else "file"
         }
     except Exception as e:
@@ -720,7 +742,7 @@ async def get_room_unread_count(
     """獲取聊天室未讀數"""
     try:
         service = ChatServiceFactory.create(db)
-        count = await service.get_unread_count(current_user.id, room_id)
+        count = await service.get_unread_count(room_id, current_user.id)
         return {"unread_count": count}
     except Exception as e:
         _handle_error(e)
@@ -746,34 +768,10 @@ async def mark_messages_as_read(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, str]:
-    """標記聊天室訊息為已讀"""
+    """標記聊天室訊息為已讀（推進已讀水位）"""
     try:
-        from sqlalchemy import select, update
-        from app.models.chat_room import ChatRoom
-        from app.models.chat_message import ChatMessage
-        
-        # 驗證權限
-        room_query = select(ChatRoom).where(ChatRoom.id == room_id)
-        room_result = await db.execute(room_query)
-        room = room_result.scalar_one_or_none()
-        
-        if not room:
-            raise ChatRoomNotFoundError(f"Chat room {room_id} not found")
-        
-        if room.user_id != current_user.id and room.shelter_id != current_user.id:
-            raise PermissionDeniedError("You don't have permission to access this chat room")
-        
-        # 標記所有非當前用戶發送的訊息為已讀
-        update_stmt = (
-            update(ChatMessage)
-            .where(ChatMessage.room_id == room_id)
-            .where(ChatMessage.sender_id != current_user.id)
-            .where(ChatMessage.is_read == False)
-            .values(is_read=True)
-        )
-        
-        await db.execute(update_stmt)
-        await db.commit()
+        service = ChatServiceFactory.create(db)
+        await service.mark_room_read(room_id, current_user.id)
         
         return {"status": "success"}
     except Exception as e:
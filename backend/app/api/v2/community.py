@@ -9,15 +9,18 @@ from pydantic import BaseModel
 
 from app.database import get_db
 from app.auth.dependencies import get_current_user, get_current_user_optional
+from app.core.config import settings
 from app.models.user import User
 from app.services.factories import CommunityServiceFactory, NotificationServiceFactory
-from app.services.s3 import S3Service
+from app.services.s3 import s3_service
+from app.services.image_pipeline import image_pipeline
 from app.models.notification import NotificationType
 from app.exceptions import (
     PostNotFoundError,
     CommentNotFoundError,
     PermissionDeniedError,
-    ValidationError
+    ValidationError,
+    FileTooLargeError
 )
 
 router = APIRouter()
@@ -56,20 +59,40 @@ def _serialize_user(user) -> Dict[str, Any]:
     }
 
 
-def _serialize_post(post, current_user_id: Optional[int] = None, s3_service=None) -> Dict[str, Any]:
-    """Serialize post with user, photos, and stats"""
+def _serialize_post(
+    post,
+    is_liked: bool = False,
+    s3_service=None,
+    photo_variant: str = "large"
+) -> Dict[str, Any]:
+    """
+    Serialize post with user, photos, and stats
+    
+    is_liked: 目前用戶是否已按讚（列表以 get_liked_post_ids 一次查詢整頁）
+    photo_variant: 照片尺寸（列表用 card，詳細頁用 large），另附 thumbnail_url
+    """
     # Serialize photos
     photos_data = []
     if hasattr(post, 'photos') and post.photos:
+        # 批量生成衍生版本 URL（共用快取；完整 URL 的 file_key 不需要簽名）
+        photo_urls = {}
+        thumbnail_urls = {}
+        if s3_service:
+            keys = [
+                photo.file_key for photo in post.photos
+                if photo.file_key and not photo.file_key.startswith(('http://', 'https://'))
+            ]
+            photo_urls = s3_service.generate_variant_urls(keys, photo_variant, 604800)
+            thumbnail_urls = s3_service.generate_variant_urls(keys, "thumbnail", 604800)
+        
         for photo in post.photos:
             # 如果 file_key 已經是完整 URL（包含 http），直接使用
             if photo.file_key and (photo.file_key.startswith('http://') or photo.file_key.startswith('https://')):
-                photo_url = photo.file_key
-            elif photo.file_key and s3_service:
-                # 否則生成預簽名 URL
-                photo_url = s3_service.generate_presigned_url(photo.file_key, 604800)
+                photo_url = thumbnail_url = photo.file_key
             else:
-                photo_url = ""
+                # 否則使用預簽名 URL
+                photo_url = photo_urls.get(photo.file_key, "")
+                thumbnail_url = thumbnail_urls.get(photo.file_key) or photo_url
             
             photos_data.append({
                 "id": photo.id,
@@ -77,16 +100,10 @@ def _serialize_post(post, current_user_id: Optional[int] = None, s3_service=None
                 "file_key": photo.file_key,
                 "display_order": photo.display_order,
                 "photo_url": photo_url,
+                "thumbnail_url": thumbnail_url,
                 "created_at": photo.created_at.isoformat() if photo.created_at else None
             })
     
-    # Calculate stats
-    like_count = len(post.likes) if hasattr(post, 'likes') and post.likes else 0
-    comment_count = len([c for c in post.comments if not c.is_deleted]) if hasattr(post, 'comments') and post.comments else 0
-    is_liked = False
-    if current_user_id and hasattr(post, 'likes') and post.likes:
-        is_liked = any(like.user_id == current_user_id for like in post.likes)
-    
     return {
         "id": post.id,
         "user_id": post.user_id,
@@ -94,8 +111,8 @@ def _serialize_post(post, current_user_id: Optional[int] = None, s3_service=None
         "content": post.content,
         "post_type": post.post_type.value if hasattr(post.post_type, 'value') else post.post_type,
         "photos": photos_data,
-        "like_count": like_count,
-        "comment_count": comment_count,
+        "like_count": post.like_count or 0,
+        "comment_count": post.comment_count or 0,
         "is_liked": is_liked,
         "is_deleted": post.is_deleted,
         "created_at": post.created_at.isoformat() if post.created_at else None,
@@ -127,6 +144,8 @@ def _handle_error(error: Exception):
         raise HTTPException(status_code=404, detail=str(error))
     elif isinstance(error, PermissionDeniedError):
         raise HTTPException(status_code=403, detail=str(error))
+    elif isinstance(error, FileTooLargeError):
+        raise HTTPException(status_code=413, detail=str(error))
     elif isinstance(error, ValidationError):
         raise HTTPException(status_code=400, detail=str(error))
     else:
@@ -146,20 +165,22 @@ async def create_post(
     """Create a new post with optional photo uploads"""
     try:
         service = CommunityServiceFactory.create(db)
-        s3_service = S3Service()
         
         # 上傳照片到 S3
         photo_urls = []
         for photo in photos:
             if photo.filename:
-                file_content = await photo.read()
-                upload_result = s3_service.upload_file(
-                    file_content,
-                    photo.filename,
+                # 串流上傳（分塊讀取並檢查大小上限），並產生衍生版本
+                upload_result = await image_pipeline.upload(
+                    photo,
                     "community",
-                    photo.content_type or "image/jpeg"
+                    max_size=settings.MAX_PHOTO_SIZE
                 )
-                photo_urls.append(upload_result["file_url"])
+                # 儲存 key（預簽名 URL 會過期）；本地儲存的舊格式檔案只能存 URL
+                if s3_service.use_s3 or upload_result["variants"]:
+                    photo_urls.append(upload_result["file_key"])
+                else:
+                    photo_urls.append(upload_result["file_url"])
         
         post = await service.create_post(
             current_user.id,
@@ -167,7 +188,7 @@ async def create_post(
             post_type,
             photo_urls
         )
-        return _serialize_post(post, current_user.id, s3_service)
+        return _serialize_post(post, False, s3_service)
     except Exception as e:
         _handle_error(e)
 
@@ -182,11 +203,11 @@ async def get_my_posts(
     """Get my posts"""
     try:
         service = CommunityServiceFactory.create(db)
-        s3_service = S3Service()
         
         posts = await service.get_user_posts(current_user.id, skip, limit)
         
-        serialized_posts = [_serialize_post(post, current_user.id, s3_service) for post in posts]
+        liked = await service.get_liked_post_ids(current_user.id, [post.id for post in posts])
+        serialized_posts = [_serialize_post(post, post.id in liked, s3_service, "card") for post in posts]
         has_more = len(posts) == limit
         
         return {
@@ -207,10 +228,9 @@ async def get_post(
     """Get post details"""
     try:
         service = CommunityServiceFactory.create(db)
-        s3_service = S3Service()
         post = await service.get_post(post_id)
-        user_id = current_user.id if current_user else None
-        return _serialize_post(post, user_id, s3_service)
+        is_liked = bool(current_user) and await service.is_post_liked_by_user(post_id, current_user.id)
+        return _serialize_post(post, is_liked, s3_service)
     except Exception as e:
         _handle_error(e)
 
@@ -227,7 +247,6 @@ async def list_posts(
     """List posts"""
     try:
         service = CommunityServiceFactory.create(db)
-        s3_service = S3Service()
         
         # Calculate page
         page = (skip // limit) + 1
@@ -239,7 +258,8 @@ async def list_posts(
         )
         
         user_id = current_user.id if current_user else None
-        posts = [_serialize_post(post, user_id, s3_service) for post in result['results']]
+        liked = await service.get_liked_post_ids(user_id, [post.id for post in result['results']])
+        posts = [_serialize_post(post, post.id in liked, s3_service, "card") for post in result['results']]
         
         has_more = len(posts) == limit
         
@@ -268,7 +288,6 @@ async def update_post(
         print(f"   post_type: {post_type}, delete_photo_ids: {delete_photo_ids}, photos: {photos}")
         
         service = CommunityServiceFactory.create(db)
-        s3_service = S3Service()
         
         # 基本更新
         post = await service.update_post(
@@ -291,7 +310,8 @@ async def update_post(
         #     for photo in photos:
         #         await service.add_post_photo(post_id, photo)
         
-        return _serialize_post(post, current_user.id, s3_service)
+        is_liked = await service.is_post_liked_by_user(post_id, current_user.id)
+        return _serialize_post(post, is_liked, s3_service)
     except Exception as e:
         print(f"❌ Update post failed: {type(e).__name__}: {e}")
         import traceback
@@ -338,12 +358,14 @@ async def create_comment(
         # Notify post author (if not commenting on own post)
         if post.user_id != current_user.id:
             notification_service = NotificationServiceFactory.create(db)
-            await notification_service.create_notification(
+            await notification_service.notify_coalesced(
                 user_id=post.user_id,
-                notification_type=NotificationType.SYSTEM,
+                notification_type=NotificationType.POST_COMMENT,
+                link=f"/community/{post_id}",
                 title="新的留言",
-                message=f"{current_user.name or current_user.email} 在您的貼文留言了",
-                link=f"/community/{post_id}"
+                action="在您的貼文留言了",
+                actor_id=current_user.id,
+                actor_name=current_user.name or current_user.email
             )
         
         print(f"✅ Comment created successfully")
@@ -399,21 +421,22 @@ async def like_post(
     try:
         print(f"🔍 Like post {post_id} - User: {current_user.id}")
         service = CommunityServiceFactory.create(db)
-        await service.like_post(post_id, current_user.id)
+        result = await service.like_post(post_id, current_user.id)
+        like_count = result["like_count"]
         
-        # Get latest stats
         post = await service.get_post(post_id)
-        like_count = len(post.likes) if hasattr(post, 'likes') else 0
         
         # Notify post author (if not liking own post)
         if post.user_id != current_user.id:
             notification_service = NotificationServiceFactory.create(db)
-            await notification_service.create_notification(
+            await notification_service.notify_coalesced(
                 user_id=post.user_id,
-                notification_type=NotificationType.SYSTEM,
+                notification_type=NotificationType.POST_LIKE,
+                link=f"/community/{post_id}",
                 title="新的按讚",
-                message=f"{current_user.name or current_user.email} 按讚了您的貼文",
-                link=f"/community/{post_id}"
+                action="按讚了您的貼文",
+                actor_id=current_user.id,
+                actor_name=current_user.name or current_user.email
             )
         
         print(f"✅ Post {post_id} liked successfully, total likes: {like_count}")
@@ -439,11 +462,8 @@ async def unlike_post(
     try:
         print(f"🔍 Unlike post {post_id} - User: {current_user.id}")
         service = CommunityServiceFactory.create(db)
-        await service.unlike_post(post_id, current_user.id)
-        
-        # Get latest stats
-        post = await service.get_post(post_id)
-        like_count = len(post.likes) if hasattr(post, 'likes') else 0
+        result = await service.unlike_post(post_id, current_user.id)
+        like_count = result["like_count"]
         
         print(f"✅ Post {post_id} unliked successfully, total likes: {like_count}")
         return {
@@ -483,8 +503,6 @@ async def report_post(
     try:
         from app.models.post_report import PostReport
         from app.models.user import UserRole
-        from app.models.notification import Notification, NotificationType
-        from app.services.factories import NotificationServiceFactory
         
         # Check if already reported
         result = await db.execute(
@@ -511,23 +529,22 @@ async def report_post(
             reason=request.reason
         )
         db.add(report)
-        await db.commit()
         
-        # Notify all admins
+        # Notify all admins：一個多列 INSERT，與檢舉紀錄同一次 commit
         admin_result = await db.execute(
-            select(User).where(User.role == UserRole.admin)
+            select(User.id).where(User.role == UserRole.admin)
         )
-        admins = admin_result.scalars().all()
-        
         notification_service = NotificationServiceFactory.create(db)
-        for admin in admins:
-            await notification_service.create_notification(
-                user_id=admin.id,
-                notification_type=NotificationType.SYSTEM,
-                title="新的貼文檢舉",
-                message=f"用戶 {current_user.name or current_user.email} 檢舉了一則貼文",
-                link=f"/community/{post_id}"
-            )
+        await notification_service.notify_users(
+            list(admin_result.scalars().all()),
+            notification_type=NotificationType.SYSTEM,
+            title="新的貼文檢舉",
+            message=f"用戶 {current_user.name or current_user.email} 檢舉了一則貼文",
+            link=f"/community/{post_id}",
+            commit=False
+        )
+        await db.commit()
+        await notification_service.publish_pending()
         
         return {"message": "Report submitted"}
     except HTTPException:
@@ -1,19 +1,22 @@
 """
 Files API V2 - 簡化版本
 """
-from typing import List
+import asyncio
+from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 
 from app.auth.dependencies import get_current_user
+from app.core.config import settings
+from app.database import get_db
+from app.exceptions import FileTooLargeError
 from app.models.user import User
-from app.services.s3 import S3Service
+from app.services.factories import FileServiceFactory
+from app.services.file_service import FileService
 
 router = APIRouter()
 
-# 初始化 S3 服務
-s3_service = S3Service()
-
 # 允許的文件分類
 CATEGORIES = ["pet_photo", "document", "profile"]
 
@@ -26,15 +29,99 @@ def get_file_extension(filename: str) -> str:
     return filename[filename.rfind('.'):].lower() if '.' in filename else ''
 
 
+def get_max_size(category: str) -> int:
+    """依分類取得檔案大小上限（文件 MAX_FILE_SIZE，照片 MAX_PHOTO_SIZE）"""
+    return settings.MAX_FILE_SIZE if category == "document" else settings.MAX_PHOTO_SIZE
+
+
+async def _upload_one(
+    file: UploadFile,
+    category: str,
+    semaphore: asyncio.Semaphore,
+    file_service: FileService,
+    user_id: int
+) -> Dict[str, Any]:
+    """
+    上傳單一文件（失敗不拋出，返回錯誤資訊）
+    
+    Returns:
+        成功：文件元數據；失敗：{"filename", "success": False, "status_code", "error"}
+    """
+    ext = get_file_extension(file.filename or "")
+    if ext not in ALLOWED_EXTENSIONS:
+        return {
+            "filename": file.filename,
+            "success": False,
+            "status_code": 400,
+            "error": f"File type {ext} not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}",
+        }
+    
+    async with semaphore:
+        try:
+            print(f"  📁 處理文件: {file.filename}")
+            
+            # 先以內容 hash 查詢檔案目錄，已存在時不再上傳；
+            # 否則串流上傳（執行緒池，不阻塞 event loop），圖片另在行程池產生衍生版本
+            upload_result = await file_service.store_upload(
+                file,
+                category=category,
+                uploaded_by=user_id,
+                max_size=get_max_size(category)
+            )
+        except FileTooLargeError as e:
+            return {"filename": file.filename, "success": False, "status_code": 413, "error": str(e)}
+        except HTTPException as e:
+            print(f"  ❌ 上傳失敗: {file.filename}: {e.detail}")
+            return {"filename": file.filename, "success": False, "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            print(f"  ❌ 上傳失敗: {file.filename}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return {
+                "filename": file.filename,
+                "success": False,
+                "status_code": 500,
+                "error": f"Failed to upload {file.filename}: {str(e)}",
+            }
+    
+    print(f"  ✅ 上傳成功: {file.filename} ({upload_result['file_size']} bytes) -> {upload_result['file_key']}")
+    
+    # 構建返回數據（沒有衍生版本時各尺寸都指向原圖）
+    variants = upload_result["variants"]
+    urls = {"original": upload_result["file_url"]}
+    for name in ("large", "card", "thumbnail"):
+        urls[name] = variants[name]["file_url"] if name in variants else upload_result["file_url"]
+    
+    return {
+        "id": str(uuid.uuid4()),
+        "filename": file.filename,
+        "success": True,
+        "file_url": upload_result["file_url"],
+        "file_key": upload_result["file_key"],
+        "file_size": upload_result["file_size"],
+        "content_type": upload_result["content_type"],
+        "content_hash": upload_result["content_hash"],
+        "deduplicated": upload_result["deduplicated"],
+        "category": category,
+        "urls": urls,
+        "variants": variants,
+    }
+
+
 @router.post("/upload")
 async def upload_files(
     files: List[UploadFile] = File(...),
     category: str = Form("pet_photo"),
     current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     上傳一個或多個文件
     
+    多個文件以 UPLOAD_CONCURRENCY 為上限並行上傳，每個文件各自回報結果；
+    內容相同的文件只存一份（deduplicated 表示沿用既有物件）；
+    部分失敗時仍返回成功的文件（列於 failed），全部失敗時才返回錯誤狀態碼。
+    
     Args:
         files: 要上傳的文件列表
         category: 文件分類 (pet_photo, document, profile)
@@ -52,66 +139,27 @@ async def upload_files(
             detail=f"Invalid category. Must be one of: {', '.join(CATEGORIES)}"
         )
     
-    # 驗證文件類型
-    for file in files:
-        ext = get_file_extension(file.filename)
-        if ext not in ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type {ext} not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
+    # 並行上傳文件（結果順序與請求相同）
+    semaphore = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+    file_service = FileServiceFactory.create(db)
+    results = await asyncio.gather(*(
+        _upload_one(file, category, semaphore, file_service, current_user.id) for file in files
+    ))
     
-    # 上傳文件
-    uploaded_files = []
-    for file in files:
-        try:
-            print(f"  📁 處理文件: {file.filename}")
-            
-            # 讀取文件內容
-            content = await file.read()
-            print(f"  📊 文件大小: {len(content)} bytes")
-            
-            # 使用 S3 服務上傳
-            upload_result = s3_service.upload_file(
-                file_content=content,
-                filename=file.filename,
-                category=category,
-                content_type=file.content_type or "application/octet-stream"
-            )
-            
-            print(f"  ✅ 上傳成功!")
-            print(f"  🔗 URL: {upload_result['file_url']}")
-            print(f"  🔑 Key: {upload_result['file_key']}")
-            
-            # 構建返回數據
-            file_metadata = {
-                "id": str(uuid.uuid4()),
-                "filename": file.filename,
-                "file_url": upload_result["file_url"],
-                "file_key": upload_result["file_key"],
-                "file_size": len(content),
-                "content_type": file.content_type,
-                "category": category,
-                "urls": {
-                    "original": upload_result["file_url"],
-                    "large": upload_result["file_url"],
-                    "thumbnail": upload_result["file_url"],
-                }
-            }
-            
-            uploaded_files.append(file_metadata)
-            
-        except Exception as e:
-            print(f"  ❌ 上傳失敗: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload {file.filename}: {str(e)}"
-            )
+    uploaded_files = [result for result in results if result["success"]]
+    failed_files = [result for result in results if not result["success"]]
+    
+    if failed_files and not uploaded_files:
+        first = failed_files[0]
+        detail = first["error"] if len(failed_files) == 1 else [
+            {"filename": failed["filename"], "error": failed["error"]} for failed in failed_files
+        ]
+        raise HTTPException(status_code=first["status_code"], detail=detail)
     
     return {
-        "success": True,
-        "message": f"Successfully uploaded {len(uploaded_files)} file(s)",
+        "success": not failed_files,
+        "message": f"Successfully uploaded {len(uploaded_files)} file(s)"
+                   + (f", {len(failed_files)} failed" if failed_files else ""),
         "files": uploaded_files,
+        "failed": failed_files,
     }
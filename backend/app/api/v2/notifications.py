@@ -6,9 +6,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.auth.dependencies import get_current_user, get_current_user_optional
+from app.auth.dependencies import get_current_user, get_current_user_optional, require_admin
 from app.models.user import User
 from app.services.factories import NotificationServiceFactory
+from app.services.notification_retention import NotificationRetentionWorker, get_notification_retention
 from app.exceptions import NotificationNotFoundError, PermissionDeniedError
 
 router = APIRouter()
@@ -24,6 +25,8 @@ def _serialize_notification(notif) -> Dict[str, Any]:
         "message": notif.message,
         "is_read": notif.is_read,
         "link": notif.link if hasattr(notif, 'link') else None,
+        "actor_count": notif.actor_count or 1,
+        "last_actor_name": notif.last_actor_name,
         "created_at": notif.created_at.isoformat() if notif.created_at else None,
     }
 
@@ -103,6 +106,15 @@ async def mark_as_read(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/retention")
+async def get_retention_stats(
+    current_user: User = Depends(require_admin()),
+    retention: NotificationRetentionWorker = Depends(get_notification_retention)
+) -> Dict[str, Any]:
+    """已讀通知清理排程的指標（管理員）"""
+    return retention.stats()
+
+
 @router.post("/mark-all-read")
 async def mark_all_as_read(
     current_user: User = Depends(get_current_user),
@@ -10,15 +10,12 @@ from pydantic import BaseModel
 from app.database import get_db
 from app.auth.dependencies import get_current_user_optional, get_current_user
 from app.models.user import User
-from app.services.factories import PetServiceFactory
-from app.services.s3 import S3Service
-from app.exceptions import PetNotFoundError
+from app.services.factories import FileServiceFactory, PetServiceFactory
+from app.services.s3 import s3_service
+from app.exceptions import PetNotFoundError, ValidationError
 
 router = APIRouter()
 
-# 初始化 S3 服務
-s3_service = S3Service()
-
 
 def _get_shelter_name(pet) -> Optional[str]:
     """安全獲取 shelter name，避免延遲加載"""
@@ -39,65 +36,55 @@ def _get_shelter_name(pet) -> Optional[str]:
 
 
 def _serialize_pet(pet, include_photos: bool = False) -> Dict[str, Any]:
-    """序列化寵物對象"""
+    """
+    序列化寵物對象
+    
+    列表視圖的主照片使用 card 尺寸；詳細視圖（include_photos）使用 large，每張照片另附縮圖。
+    """
     from app.core.config import settings
     
-    # 獲取主照片並動態生成簽名 URL
-    primary_photo_url = None
+    # 收集需要簽名的照片（主照片 + 詳細視圖的所有照片），一次批量生成
+    primary_photo = None
     if hasattr(pet, 'primary_photo') and pet.primary_photo:
-        if hasattr(pet.primary_photo, 'file_key') and pet.primary_photo.file_key:
-            if s3_service.use_s3 and s3_service.s3_client:
-                try:
-                    # 總是生成新的預簽名 URL（24小時有效期）
-                    primary_photo_url = s3_service.generate_presigned_url(
-                        pet.primary_photo.file_key, 
-                        expiration=86400  # 24 小時
-                    )
-                except Exception as e:
-                    print(f"⚠️ Failed to generate presigned URL for primary photo: {e}")
-                    # Fallback: 嘗試使用原始 URL 或構建本地路徑
-                    primary_photo_url = getattr(pet.primary_photo, 'file_url', None)
+        primary_photo = pet.primary_photo
     elif hasattr(pet, 'photos') and pet.photos and len(pet.photos) > 0:
-        if hasattr(pet.photos[0], 'file_key') and pet.photos[0].file_key:
-            if s3_service.use_s3 and s3_service.s3_client:
-                try:
-                    primary_photo_url = s3_service.generate_presigned_url(
-                        pet.photos[0].file_key,
-                        expiration=86400  # 24 小時
-                    )
-                except Exception as e:
-                    print(f"⚠️ Failed to generate presigned URL for first photo: {e}")
-                    primary_photo_url = getattr(pet.photos[0], 'file_url', None)
+        primary_photo = pet.photos[0]
+    
+    file_keys = []
+    if primary_photo is not None and getattr(primary_photo, 'file_key', None):
+        file_keys.append(primary_photo.file_key)
+    if include_photos and hasattr(pet, 'photos') and pet.photos:
+        file_keys.extend(photo.file_key for photo in pet.photos if getattr(photo, 'file_key', None))
+    
+    # 共用快取：同一張照片在 24 小時有效期內只簽一次
+    primary_variant = "large" if include_photos else "card"
+    presigned_urls = s3_service.generate_variant_urls(file_keys, primary_variant, expiration=86400) if file_keys else {}
+    thumbnail_urls = (
+        s3_service.generate_variant_urls(file_keys, "thumbnail", expiration=86400)
+        if include_photos and file_keys else {}
+    )
+    
+    # 獲取主照片 URL（S3 未啟用或簽名失敗時回退到原始 URL）
+    primary_photo_url = None
+    if primary_photo is not None and getattr(primary_photo, 'file_key', None):
+        if s3_service.use_s3 and s3_service.s3_client:
+            primary_photo_url = (
+                presigned_urls.get(primary_photo.file_key)
+                or getattr(primary_photo, 'file_url', None)
+            )
     
     # 序列化所有照片（如果需要）
     photos_list = []
     if include_photos and hasattr(pet, 'photos') and pet.photos:
-        # 優化：批量收集所有 file_keys，一次性生成 URLs
-        file_keys_map = {}
-        for photo in pet.photos:
-            if hasattr(photo, 'file_key') and photo.file_key:
-                file_keys_map[photo.id] = photo.file_key
-        
-        # 批量生成 presigned URLs
-        presigned_urls = {}
-        if s3_service.use_s3 and s3_service.s3_client:
-            for photo_id, file_key in file_keys_map.items():
-                try:
-                    presigned_urls[photo_id] = s3_service.generate_presigned_url(
-                        file_key,
-                        expiration=86400  # 24 小時
-                    )
-                except Exception as e:
-                    print(f"⚠️ Failed to generate presigned URL for {file_key}: {e}")
-        
-        # 組裝照片列表
         for photo in pet.photos:
-            file_url = presigned_urls.get(photo.id) or getattr(photo, 'file_url', None)
+            file_key = getattr(photo, 'file_key', None)
+            file_url = presigned_urls.get(file_key) or getattr(photo, 'file_url', None)
             
             photos_list.append({
                 "id": photo.id,
                 "file_url": file_url,
-                "file_key": photo.file_key if hasattr(photo, 'file_key') else None,
+                "thumbnail_url": thumbnail_urls.get(file_key) or file_url,
+                "file_key": file_key,
                 "is_primary": photo.is_primary if hasattr(photo, 'is_primary') else False,
             })
     
@@ -148,16 +135,36 @@ async def list_pets(
     species: Optional[str] = None,
     size: Optional[str] = None,
     gender: Optional[str] = None,
+    pagination: str = Query("page", pattern="^(page|cursor)$"),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     列出可領養的寵物
     
     使用新的 Service 層架構
+    
+    - pagination=page（預設）：頁碼分頁，返回 total / total_pages
+    - pagination=cursor 或帶 cursor：游標分頁，返回 next_cursor / has_more
     """
     try:
         service = PetServiceFactory.create(db)
         
+        if pagination == "cursor" or cursor:
+            pets, next_cursor, has_more = await service.list_available_pets_by_cursor(
+                limit=page_size,
+                cursor=cursor,
+                species=species,
+                size=size,
+                gender=gender
+            )
+            return {
+                "items": [_serialize_pet(pet) for pet in pets],
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "has_more": has_more
+            }
+        
         # PetService.list_available_pets 返回 (pets, total, total_pages)
         pets, total, total_pages = await service.list_available_pets(
             page=page,
@@ -174,6 +181,8 @@ async def list_pets(
             "page_size": page_size,
             "total_pages": total_pages
         }
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -500,9 +509,16 @@ async def delete_pet(
         if existing_pet.shelter_id != current_user.id:
             raise HTTPException(status_code=403, detail="只能刪除自己收容所的寵物")
         
+        # 每一筆照片釋放一次檔案目錄的引用，與刪除照片在同一交易中 commit（delete_pet 的第一次 commit）
+        file_service = FileServiceFactory.create(db)
+        orphaned = await file_service.release_files([photo.file_key for photo in existing_pet.photos])
+        
         # 刪除寵物
         await service.delete_pet(pet_id, current_user.id)
         
+        # 引用次數歸零的照片連同衍生版本一併刪除
+        await file_service.delete_objects(orphaned)
+        
         return {"message": "Pet deleted successfully"}
         
     except HTTPException:
@@ -591,17 +607,12 @@ async def get_user_favorites(
                     file_keys_to_generate.append(primary_photo.file_key)
                     pet_photo_map[favorite.pet_id] = primary_photo.file_key
         
-        # 批量生成所有 presigned URLs（一次性操作）
-        presigned_urls = {}
-        for file_key in file_keys_to_generate:
-            try:
-                presigned_urls[file_key] = s3_service.generate_presigned_url(
-                    file_key,
-                    expiration=604800  # 7天
-                )
-            except Exception as e:
-                print(f"Failed to generate presigned URL for {file_key}: {e}")
-                presigned_urls[file_key] = None
+        # 批量生成所有卡片尺寸 URL（一次性操作，共用快取）
+        presigned_urls = s3_service.generate_variant_urls(
+            file_keys_to_generate,
+            "card",
+            expiration=604800  # 7天
+        )
         
         # 序列化收藏項目
         items = []
@@ -773,15 +784,20 @@ class SearchPetsRequest(BaseModel):
     limit: Optional[int] = 20
     page: Optional[int] = 1
     page_size: Optional[int] = 20
+    pagination: Optional[str] = None  # 'page'（預設）或 'cursor'
+    cursor: Optional[str] = None
 
 
 @router.post("/search")
 async def search_pets(
     request: SearchPetsRequest,
+    facets: Optional[str] = Query(None, description="逗號分隔，例如 species,size,gender,energy_level"),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     搜尋寵物
+    
+    帶 facets 時一併返回各維度的計數（每個維度排除自己的篩選條件）
     """
     try:
         service = PetServiceFactory.create(db)
@@ -818,10 +834,29 @@ async def search_pets(
             filters['sort_by'] = request.sort_by
         if request.order:
             filters['order'] = request.order
+        if facets:
+            filters['facets'] = [name.strip() for name in facets.split(',') if name.strip()]
+        
+        # 游標分頁：不計算總數，返回 next_cursor / has_more
+        if request.pagination == 'cursor' or request.cursor:
+            filters['cursor'] = request.cursor
+            result = await service.search_pets_by_cursor(filters)
+            items = [_serialize_pet(pet) for pet in result['results']]
+            response = {
+                "items": items,
+                "page_size": result['page_size'],
+                "next_cursor": result['next_cursor'],
+                "has_more": result['has_more'],
+                "results": items
+            }
+            if 'facets' in result:
+                response['total'] = result['total']
+                response['facets'] = result['facets']
+            return response
             
         result = await service.search_pets(filters)
         
-        return {
+        response = {
             "items": [_serialize_pet(pet) for pet in result['results']],
             "total": result['total'],
             "page": result['page'],
@@ -829,6 +864,11 @@ async def search_pets(
             "total_pages": result['total_pages'],
             "results": [_serialize_pet(pet) for pet in result['results']]
         }
+        if 'facets' in result:
+            response['facets'] = result['facets']
+        return response
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -872,8 +912,7 @@ async def link_pet_photos(
         count_result = await db.execute(count_query)
         current_count = count_result.scalar() or 0
         
-        linked_photos = []
-        
+        rows = []
         for idx, photo_data in enumerate(photos):
             file_url = photo_data.get("url") or photo_data.get("file_url")
             if not file_url:
@@ -885,31 +924,36 @@ async def link_pet_photos(
             if isinstance(file_key, list):
                 file_key = "/".join(file_key)
             
-            # First photo is primary
-            is_primary = (current_count == 0 and idx == 0)
-            
-            photo_insert_data = {
+            rows.append({
                 "pet_id": pet_id,
                 "file_url": file_url,
                 "file_key": file_key,
-                "is_primary": is_primary,
+                # First photo is primary
+                "is_primary": current_count == 0 and idx == 0,
                 "upload_order": current_count + idx,
-            }
-            
-            print(f"💾 Inserting photo {idx}: {file_key[:50]}...")
-            
-            stmt = insert(PetPhoto).values(**photo_insert_data)
-            result = await db.execute(stmt)
-            await db.commit()
-            
-            photo_id = result.inserted_primary_key[0]
-            linked_photos.append({
-                "id": photo_id,
-                "file_url": file_url,
-                "is_primary": is_primary
             })
-            
-            print(f"✅ Photo {idx} linked successfully (ID: {photo_id})")
+        
+        # 每一筆照片引用一次檔案目錄中的物件（key 必須是上傳 API 登記過的），與照片一起 commit
+        try:
+            await FileServiceFactory.create(db).reference_files([row["file_key"] for row in rows])
+        except ValidationError as e:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        linked_photos = []
+        try:
+            for idx, row in enumerate(rows):
+                print(f"💾 Inserting photo {idx}: {row['file_key'][:50]}...")
+                result = await db.execute(insert(PetPhoto).values(**row))
+                linked_photos.append({
+                    "id": result.inserted_primary_key[0],
+                    "file_url": row["file_url"],
+                    "is_primary": row["is_primary"]
+                })
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
         
         print(f"✅ Successfully linked {len(linked_photos)} photos to pet {pet_id}")
         
@@ -918,6 +962,8 @@ async def link_pet_photos(
             "data": linked_photos
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Failed to link photos: {str(e)}")
         import traceback
@@ -925,6 +971,68 @@ async def link_pet_photos(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.delete("/{pet_id}/photos/{photo_id}")
+async def delete_pet_photo(
+    pet_id: int,
+    photo_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """Remove a photo from a pet and release its file reference"""
+    from sqlalchemy import select
+    from app.models.pet import PetPhoto
+    
+    try:
+        service = PetServiceFactory.create(db)
+        
+        try:
+            pet = await service.get_pet(pet_id)
+        except PetNotFoundError:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        
+        if pet.shelter_id != current_user.id and pet.created_by != current_user.id:
+            raise HTTPException(status_code=403, detail="You don't have permission to manage photos for this pet")
+        
+        result = await db.execute(
+            select(PetPhoto).where(PetPhoto.id == photo_id, PetPhoto.pet_id == pet_id)
+        )
+        photo = result.scalar_one_or_none()
+        if photo is None:
+            raise HTTPException(status_code=404, detail="Photo not found")
+        
+        was_primary = photo.is_primary
+        # 釋放檔案目錄的引用，與刪除照片在同一交易中 commit
+        file_service = FileServiceFactory.create(db)
+        orphaned = await file_service.release_files([photo.file_key])
+        await db.delete(photo)
+        await db.flush()
+        
+        # 刪除的是主要照片時，由排序最前的照片接替
+        if was_primary:
+            next_photo = (await db.execute(
+                select(PetPhoto)
+                .where(PetPhoto.pet_id == pet_id)
+                .order_by(PetPhoto.upload_order, PetPhoto.id)
+                .limit(1)
+            )).scalar_one_or_none()
+            if next_photo is not None:
+                next_photo.is_primary = True
+        await db.commit()
+        
+        # 最後一個引用時連同衍生版本一併刪除
+        await file_service.delete_objects(orphaned)
+        
+        return {"message": "Photo deleted successfully"}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Failed to delete photo: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/filters/options")
 async def get_filter_options(
     db: AsyncSession = Depends(get_db)
@@ -81,8 +81,24 @@ class Settings(BaseSettings):
     AWS_S3_BUCKET: str = config("AWS_S3_BUCKET", default="pet-adoption-files")
     AWS_REGION: str = config("AWS_REGION", default="ap-southeast-2")
     AWS_CLOUDFRONT_DOMAIN: Optional[str] = config("AWS_CLOUDFRONT_DOMAIN", default=None)
+    S3_PRESIGN_CACHE_SIZE: int = config("S3_PRESIGN_CACHE_SIZE", default=20000, cast=int)  # 預簽名 URL 快取上限（筆）
+    STORAGE_MAX_WORKERS: int = config("STORAGE_MAX_WORKERS", default=8, cast=int)  # S3 / 本地儲存執行緒池大小
+    STORAGE_TIMEOUT: float = config("STORAGE_TIMEOUT", default=30.0, cast=float)  # 單次儲存操作逾時（秒）
     MAX_FILE_SIZE: int = config("MAX_FILE_SIZE", default=10485760, cast=int)  # 10MB
     MAX_PHOTO_SIZE: int = config("MAX_PHOTO_SIZE", default=5242880, cast=int)  # 5MB
+    UPLOAD_CHUNK_SIZE: int = config("UPLOAD_CHUNK_SIZE", default=1048576, cast=int)  # 1MB，串流上傳每次讀取的大小
+    UPLOAD_CONCURRENCY: int = config("UPLOAD_CONCURRENCY", default=4, cast=int)  # 單次請求多檔上傳的並行數
+    IMAGE_PROCESS_WORKERS: int = config("IMAGE_PROCESS_WORKERS", default=2, cast=int)  # 圖片衍生版本行程池大小
+    IMAGE_PROCESS_TIMEOUT: float = config("IMAGE_PROCESS_TIMEOUT", default=30.0, cast=float)  # 單張圖片處理逾時（秒）
+    IMAGE_VARIANT_FORMAT: str = config("IMAGE_VARIANT_FORMAT", default="webp")  # 衍生版本格式：webp / jpeg
+    IMAGE_VARIANT_QUALITY: int = config("IMAGE_VARIANT_QUALITY", default=80, cast=int)
+    # 無引用檔案清理（背景排程）：上傳後超過 GRACE_HOURS 仍未被引用（ref_count=0）的檔案連同衍生版本刪除，
+    # 每 INTERVAL 秒一輪、每批 BATCH_SIZE 筆；預設不啟用，多個 worker 時設 FILE_ORPHAN_SWEEP_LOCK=true 以 Redis 租約只讓一個執行
+    FILE_ORPHAN_SWEEP_ENABLED: bool = config("FILE_ORPHAN_SWEEP_ENABLED", default=False, cast=bool)
+    FILE_ORPHAN_SWEEP_LOCK: bool = config("FILE_ORPHAN_SWEEP_LOCK", default=False, cast=bool)
+    FILE_ORPHAN_GRACE_HOURS: int = config("FILE_ORPHAN_GRACE_HOURS", default=24, cast=int)
+    FILE_ORPHAN_SWEEP_INTERVAL_SECONDS: int = config("FILE_ORPHAN_SWEEP_INTERVAL_SECONDS", default=3600, cast=int)
+    FILE_ORPHAN_SWEEP_BATCH_SIZE: int = config("FILE_ORPHAN_SWEEP_BATCH_SIZE", default=100, cast=int)
     
     # Email settings
     EMAIL_SMTP_HOST: str = config("EMAIL_SMTP_HOST", default="smtp.gmail.com")
@@ -106,6 +122,45 @@ class Settings(BaseSettings):
     WEBSOCKET_MAX_CONNECTIONS: int = config("WEBSOCKET_MAX_CONNECTIONS", default=1000, cast=int)
     WEBSOCKET_PING_INTERVAL: int = config("WEBSOCKET_PING_INTERVAL", default=25, cast=int)
     WEBSOCKET_PING_TIMEOUT: int = config("WEBSOCKET_PING_TIMEOUT", default=5, cast=int)
+    # 每條連線的送出佇列上限（frame 數）；滿了之後的處理：disconnect 或 drop_oldest
+    WEBSOCKET_SEND_QUEUE_SIZE: int = config("WEBSOCKET_SEND_QUEUE_SIZE", default=256, cast=int)
+    WEBSOCKET_SLOW_CONSUMER_POLICY: str = config("WEBSOCKET_SLOW_CONSUMER_POLICY", default="disconnect")
+    # permessage-deflate 壓縮（客戶端提出時由 uvicorn 協商；uvicorn CLI / gunicorn 請改用
+    # --ws-per-message-deflate 或環境變數 UVICORN_WS_PER_MESSAGE_DEFLATE）
+    WEBSOCKET_PER_MESSAGE_DEFLATE: bool = config("WEBSOCKET_PER_MESSAGE_DEFLATE", default=True, cast=bool)
+    # 跨 worker 的聊天室廣播：memory（單一行程）或 redis（使用 REDIS_URL 的 pub/sub）
+    CHAT_BACKPLANE: str = config("CHAT_BACKPLANE", default="memory")
+    CHAT_BACKPLANE_CHANNEL: str = config("CHAT_BACKPLANE_CHANNEL", default="chat:room-events")
+    # 斷線重連補送：每個聊天室在記憶體保留最近的訊息數、最多保留的聊天室數；
+    # 缺少超過 CHAT_RESUME_MAX_MESSAGES 則時請客戶端改用 REST 重新載入
+    CHAT_RESUME_BUFFER_SIZE: int = config("CHAT_RESUME_BUFFER_SIZE", default=200, cast=int)
+    CHAT_RESUME_BUFFER_ROOMS: int = config("CHAT_RESUME_BUFFER_ROOMS", default=2000, cast=int)
+    CHAT_RESUME_MAX_MESSAGES: int = config("CHAT_RESUME_MAX_MESSAGES", default=500, cast=int)
+    # 聊天室參與者快取（權限檢查）：行程內 LRU，CHAT_ROOM_CACHE_REDIS=true 時以 REDIS_URL 作為第二層
+    CHAT_ROOM_CACHE_SIZE: int = config("CHAT_ROOM_CACHE_SIZE", default=10000, cast=int)
+    CHAT_ROOM_CACHE_TTL: int = config("CHAT_ROOM_CACHE_TTL", default=3600, cast=int)
+    CHAT_ROOM_CACHE_REDIS: bool = config("CHAT_ROOM_CACHE_REDIS", default=False, cast=bool)
+    
+    # Notification settings
+    # 按讚、留言通知的合併時間窗（小時）：窗內同一貼文的未讀通知合併為一筆（「A 和其他 37 人按讚了您的貼文」）
+    NOTIFICATION_COALESCE_WINDOW_HOURS: int = config("NOTIFICATION_COALESCE_WINDOW_HOURS", default=24, cast=int)
+    # 已讀通知保留期限清理（背景排程）：每 INTERVAL 秒一輪，每批依 id 範圍掃描 BATCH_SIZE 筆、批次間暫停 BATCH_PAUSE_MS；
+    # 預設保留 NOTIFICATION_RETENTION_DAYS 天，個別類型以 POLICIES 覆寫，例如 "post_like:7,application_status:365"（0 表示永久保留）
+    # 每輪最多 MAX_BATCHES 批，下一輪由上一輪最後掃描的 id 接續，掃到最後一筆後再從頭開始
+    # 預設不啟用：多個 uvicorn worker 時只在一個 worker 啟用，或全部啟用並設 NOTIFICATION_RETENTION_LOCK=true，
+    # 以 Redis 租約（SET NX）確保同一時間只有一個 worker 執行清理
+    NOTIFICATION_RETENTION_ENABLED: bool = config("NOTIFICATION_RETENTION_ENABLED", default=False, cast=bool)
+    NOTIFICATION_RETENTION_LOCK: bool = config("NOTIFICATION_RETENTION_LOCK", default=False, cast=bool)
+    NOTIFICATION_RETENTION_MAX_BATCHES: int = config("NOTIFICATION_RETENTION_MAX_BATCHES", default=100, cast=int)
+    NOTIFICATION_RETENTION_DAYS: int = config("NOTIFICATION_RETENTION_DAYS", default=30, cast=int)
+    NOTIFICATION_RETENTION_POLICIES: str = config("NOTIFICATION_RETENTION_POLICIES", default="post_like:7,post_comment:14,application_status:180")
+    NOTIFICATION_RETENTION_INTERVAL_SECONDS: int = config("NOTIFICATION_RETENTION_INTERVAL_SECONDS", default=3600, cast=int)
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = config("NOTIFICATION_RETENTION_BATCH_SIZE", default=1000, cast=int)
+    NOTIFICATION_RETENTION_BATCH_PAUSE_MS: int = config("NOTIFICATION_RETENTION_BATCH_PAUSE_MS", default=50, cast=int)
+    # WebSocket 發送訊息的批次寫入：收集同一時間窗（毫秒）內的訊息一起 commit
+    CHAT_SEND_BATCH_WINDOW_MS: int = config("CHAT_SEND_BATCH_WINDOW_MS", default=5, cast=int)
+    CHAT_SEND_BATCH_MAX_SIZE: int = config("CHAT_SEND_BATCH_MAX_SIZE", default=200, cast=int)
+    CHAT_SEND_MAX_INFLIGHT_BATCHES: int = config("CHAT_SEND_MAX_INFLIGHT_BATCHES", default=4, cast=int)
 
     FRONTEND_URL: str = "http://localhost:3000"
     
@@ -67,6 +67,16 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
 get_db = get_async_db
 
 
+def get_session_factory() -> async_sessionmaker:
+    """
+    Dependency to get the session factory
+    
+    長連線（WebSocket）不應在整個連線期間佔用 session / 連線池，
+    只在需要存取資料庫時以 `async with factory() as db:` 開啟短命 session。
+    """
+    return AsyncSessionLocal
+
+
 async def init_db() -> None:
     """
     Initialize database - create all tables
@@ -97,6 +97,11 @@ class InvalidApplicationStatusError(ValidationError):
     pass
 
 
+class FileTooLargeError(ValidationError):
+    """檔案超過大小上限"""
+    pass
+
+
 # Business Logic Exceptions
 class HomeVisitNotCompletedError(BusinessException):
     """家訪未完成"""
@@ -8,6 +8,13 @@ from pathlib import Path
 # Import configurations and database
 from app.core.config import settings
 from app.database import init_db, close_db
+from app.services.file_sweeper import file_orphan_sweeper
+from app.services.image_pipeline import image_pipeline
+from app.services.message_batcher import message_batcher
+from app.services.notification_retention import notification_retention
+from app.services.realtime import manager as realtime_manager
+from app.services.room_participants import room_participants_cache
+from app.services.storage import storage
 
 # V2 API Router- 三層架構：Controller -> Service -> Repository
 from app.api.v2 import api_router as v2_router
@@ -16,8 +23,20 @@ from app.api.v2 import api_router as v2_router
 async def lifespan(app: FastAPI):
     print("🚀 Starting Pet Adoption API...")
     await init_db()
+    await realtime_manager.start()
+    if settings.NOTIFICATION_RETENTION_ENABLED:
+        notification_retention.start()
+    if settings.FILE_ORPHAN_SWEEP_ENABLED:
+        file_orphan_sweeper.start()
     yield
+    await file_orphan_sweeper.stop()
+    await notification_retention.stop()
+    await message_batcher.stop()
+    await realtime_manager.stop()
+    await room_participants_cache.close()
     await close_db()
+    storage.shutdown(wait=False)
+    image_pipeline.shutdown(wait=False)
     print("👋 API shutdown complete.")
 
 app = FastAPI(
@@ -52,7 +71,13 @@ async def root():
     return {"message": "Pet Adoption API is running", "docs": "/api/v1/docs"}
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=settings.WEBSOCKET_PER_MESSAGE_DEFLATE
+    )
 @app.get("/")
 async def root():
     return {
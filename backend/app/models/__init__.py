@@ -12,9 +12,10 @@ from app.models.chat_room import ChatRoom
 from app.models.chat_message import ChatMessage, MessageType
 # Old message models (if still needed elsewhere)
 # from app.models.message import RoomMember, Message, ChatRoomType, MemberRole
-from app.models.notification import Notification, UserFavorite, NotificationType
+from app.models.notification import Notification, NotificationActor, UserFavorite, NotificationType
 
-# File model removed - not used, files are stored in specific tables (pet_photos, post_photos, application_documents)
+# Content-addressed file catalog (deduplicated uploads)
+from app.models.file import File, FileType, FileStatus
 # DocumentRequest, ApplicationReviewer, ApplicationStatus models removed - not used in V2
 # Community models
 from app.models.community import CommunityPost, PostPhoto, PostComment, PostLike, PostTypeEnum
@@ -46,9 +47,15 @@ __all__ = [
     
     # Notification models
     "Notification",
+    "NotificationActor",
     "UserFavorite",
     "NotificationType",
     
+    # File models
+    "File",
+    "FileType",
+    "FileStatus",
+    
 
     
     # Community models
@@ -3,6 +3,7 @@ Chat Message Model
 聊天訊息資料模型：支援文字、圖片、檔案、寵物卡片
 """
 from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Index
+from sqlalchemy import column, select, table, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -17,6 +18,37 @@ class MessageType(str, enum.Enum):
     PET_CARD = "pet_card"
 
 
+# 非文字訊息在聊天室列表的預覽文字
+_PREVIEW_LABELS = {
+    MessageType.IMAGE.value: "[圖片]",
+    MessageType.FILE.value: "[檔案]",
+    MessageType.PET_CARD.value: "[寵物卡片]",
+}
+
+
+# 只用到 chat_rooms 的序號欄位（避免與 ChatRoom 互相 import）
+_rooms = table("chat_rooms", column("id"), column("last_seq"))
+
+
+def allocate_room_seq(connection, room_id: int, count: int = 1) -> int:
+    """
+    在目前的交易中為聊天室保留 count 個連續序號，返回最後一個
+    
+    遞增會鎖住聊天室那一列直到交易結束，同一聊天室的寫入依序取得序號。
+    支援 UPDATE ... RETURNING 的資料庫一個語句完成，MySQL 另以 SELECT 讀回。
+    """
+    bump = update(_rooms).where(_rooms.c.id == room_id).values(last_seq=_rooms.c.last_seq + count)
+    if connection.dialect.update_returning:
+        return connection.execute(bump.returning(_rooms.c.last_seq)).scalar_one()
+    connection.execute(bump)
+    return connection.execute(select(_rooms.c.last_seq).where(_rooms.c.id == room_id)).scalar_one()
+
+
+def _next_room_seq(context) -> int:
+    """未指定 seq 時（單筆寫入）分配聊天室的下一個序號"""
+    return allocate_room_seq(context.connection, context.get_current_parameters()["room_id"])
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
@@ -28,7 +60,9 @@ class ChatMessage(Base):
     file_url = Column(String(500), nullable=True, comment="S3檔案URL")
     file_name = Column(String(255), nullable=True, comment="檔案名稱")
     file_size = Column(Integer, nullable=True, comment="檔案大小(bytes)")
-    is_read = Column(Boolean, default=False, nullable=False, comment="是否已讀")
+    is_read = Column(Boolean, default=False, nullable=False, comment="是否已讀（已改用 chat_rooms 已讀水位，不再更新）")
+    # 聊天室內單調遞增的序號（1, 2, 3...），斷線重連時以此補送缺少的訊息
+    seq = Column(Integer, nullable=False, default=_next_room_seq, comment="聊天室內的訊息序號")
     created_at = Column(DateTime, server_default=func.now())
 
     # Relationships
@@ -41,9 +75,20 @@ class ChatMessage(Base):
         Index('idx_sender_id', 'sender_id'),
         Index('idx_created_at', 'created_at'),
         Index('idx_is_read', 'is_read'),
-        Index('idx_room_created', 'room_id', 'created_at'),
+        # 聊天紀錄游標分頁：WHERE room_id = ? ORDER BY created_at DESC, id DESC
+        Index('idx_room_created_id', 'room_id', 'created_at', 'id'),
+        # 斷線重連補送：WHERE room_id = ? AND seq > ? ORDER BY seq
+        Index('idx_room_seq', 'room_id', 'seq', unique=True),
         {'extend_existing': True}
     )
 
+    @property
+    def preview(self) -> str:
+        """聊天室列表顯示的訊息預覽（非文字訊息以類型標籤表示）"""
+        message_type = self.message_type.value if hasattr(self.message_type, 'value') else self.message_type
+        if message_type == MessageType.TEXT.value:
+            return self.content or ""
+        return _PREVIEW_LABELS.get(message_type, "[訊息]")
+
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, room_id={self.room_id}, type={self.message_type})>"
@@ -7,6 +7,9 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
+# 最後訊息預覽的最大長度
+LAST_MESSAGE_PREVIEW_LENGTH = 200
+
 
 class ChatRoom(Base):
     __tablename__ = "chat_rooms"
@@ -16,6 +19,15 @@ class ChatRoom(Base):
     shelter_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="收容所ID")
     pet_id = Column(Integer, ForeignKey("pets.id", ondelete="CASCADE"), nullable=False, comment="寵物ID")
     last_message_at = Column(DateTime, nullable=True, comment="最後訊息時間")
+    # 最後訊息摘要：與新訊息在同一個交易中寫入，聊天室列表不必再查 chat_messages
+    last_message_id = Column(Integer, nullable=True, comment="最後訊息ID")
+    last_message_preview = Column(String(LAST_MESSAGE_PREVIEW_LENGTH), nullable=True, comment="最後訊息預覽")
+    last_message_type = Column(String(20), nullable=True, comment="最後訊息類型")
+    # 已讀水位：各參與者讀到的最後一則訊息 ID（未讀 = 對方發送且 id 大於水位的訊息）
+    user_last_read_message_id = Column(Integer, nullable=False, default=0, server_default="0", comment="申請者已讀到的訊息ID")
+    shelter_last_read_message_id = Column(Integer, nullable=False, default=0, server_default="0", comment="收容所已讀到的訊息ID")
+    # 訊息序號計數器：每則新訊息在同一個交易中遞增（見 ChatMessage.seq）
+    last_seq = Column(Integer, nullable=False, default=0, server_default="0", comment="最後分配的訊息序號")
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -35,5 +47,16 @@ class ChatRoom(Base):
         {'extend_existing': True}
     )
 
+    def last_read_message_id(self, participant_id: int) -> int:
+        """參與者的已讀水位"""
+        if participant_id == self.shelter_id:
+            return self.shelter_last_read_message_id or 0
+        return self.user_last_read_message_id or 0
+
+    def is_read_by_recipient(self, message) -> bool:
+        """訊息是否已被接收方（發送者以外的參與者）讀取"""
+        recipient_id = self.shelter_id if message.sender_id == self.user_id else self.user_id
+        return message.id <= self.last_read_message_id(recipient_id)
+
     def __repr__(self):
         return f"<ChatRoom(id={self.id}, user_id={self.user_id}, shelter_id={self.shelter_id}, pet_id={self.pet_id})>"
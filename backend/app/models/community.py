@@ -24,6 +24,9 @@ class CommunityPost(Base):
     post_type = Column(SQLEnum(PostTypeEnum, native_enum=False, length=20), nullable=False, default=PostTypeEnum.share, comment="貼文類型")
     content = Column(Text, nullable=False, comment="貼文內容")
     is_deleted = Column(Boolean, default=False, nullable=False, comment="是否已刪除")
+    # 反正規化計數：由按讚 / 取消按讚、留言 / 刪除留言在同一交易中更新，列表不必載入按讚與留言
+    like_count = Column(Integer, nullable=False, default=0, server_default="0", comment="按讚數")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0", comment="留言數（不含已刪除）")
     created_at = Column(DateTime, server_default=func.now(), comment="建立時間")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新時間")
 
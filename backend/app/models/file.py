@@ -1,7 +1,7 @@
 """
 File model for managing uploaded files and documents
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -25,8 +25,17 @@ class FileStatus(str, enum.Enum):
 
 
 class File(Base):
-    """File storage records"""
+    """
+    File storage records
+
+    以內容 SHA-256 去重的檔案目錄：同一分類中同樣內容只存一份物件。
+    上傳只登記到目錄；ref_count 是引用這個物件的資料列數（例如 pet_photos），
+    最後一個引用釋放時刪除物件與記錄。
+    """
     __tablename__ = "files"
+    __table_args__ = (
+        UniqueConstraint("category", "content_hash", name="uq_files_category_content_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -38,6 +47,9 @@ class File(Base):
     file_size = Column(BigInteger, nullable=False)  # Size in bytes
     mime_type = Column(String(100), nullable=False)
     file_type = Column(Enum(FileType), nullable=False, index=True)
+    category = Column(String(50), nullable=False)  # pet_photo / document / profile（物件 key 的第一層目錄）
+    content_hash = Column(String(64), nullable=False, index=True)  # SHA-256 hex
+    ref_count = Column(Integer, default=0, nullable=False)
     
     # Metadata
     width = Column(Integer, nullable=True)  # For images/videos
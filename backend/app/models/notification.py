@@ -1,7 +1,7 @@
 """
 Notification and user favorite models
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -36,19 +36,43 @@ class Notification(Base):
     notification_type = Column(Enum(NotificationType), nullable=True, index=True)
     link = Column(String(500), nullable=True)  # Link to related resource (e.g., post URL)
     
+    # Coalescing: 高頻事件（按讚、留言）以 type + link 為合併鍵，時間窗內的未讀通知合併為一筆
+    aggregation_key = Column(String(550), nullable=True)
+    actor_count = Column(Integer, default=1, server_default="1", nullable=False)
+    last_actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    last_actor_name = Column(String(255), nullable=True)
+    
     # Notification status
     is_read = Column(Boolean, default=False, nullable=False, index=True)
     
-    # Timestamps
+    # Timestamps（合併的通知以最後一次事件時間更新 created_at，列表依此排序）
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
-    user = relationship("User", back_populates="notifications")
+    user = relationship("User", back_populates="notifications", foreign_keys=[user_id])
+    actors = relationship("NotificationActor", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index("idx_notification_user_aggregation", "user_id", "aggregation_key", "is_read"),
+    )
     
     def __repr__(self):
         return f"<Notification(id={self.id}, is_read={self.is_read})>"
 
 
+class NotificationActor(Base):
+    """合併通知的觸發者（每人一列，actor_count 只計算不同的人）"""
+    
+    __tablename__ = "notification_actors"
+    
+    # Composite primary key
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), primary_key=True)
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    
+    def __repr__(self):
+        return f"<NotificationActor(notification_id={self.notification_id}, actor_id={self.actor_id})>"
+
+
 class UserFavorite(Base):
     """User favorite pets model"""
     
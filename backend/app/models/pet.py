@@ -1,7 +1,7 @@
 """
 Pet model for managing pet information and adoption status
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text, DECIMAL, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Text, DECIMAL, Float, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, declared_attr
 import enum
@@ -118,6 +118,18 @@ class Pet(Base):
     # Note: community_posts removed - no foreign key relationship exists
     #statistics = relationship("PetStatistics", back_populates="pet", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # 全文搜尋索引（MySQL only，ngram parser 支援中文）；其他資料庫使用記憶體倒排索引
+        Index(
+            'ft_pets_search', 'name', 'breed', 'description',
+            mysql_prefix='FULLTEXT', mysql_with_parser='ngram'
+        ).ddl_if(dialect='mysql'),
+        # 游標分頁：WHERE status = ? ORDER BY <sort_key>, id
+        Index('idx_pets_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('idx_pets_status_age_years_id', 'status', 'age_years', 'id'),
+        Index('idx_pets_status_name_id', 'status', 'name', 'id'),
+    )
+    
     def __repr__(self):
         return f"<Pet(id={self.id}, name='{self.name}', species='{self.species}', status='{self.status}')>"
     
@@ -64,7 +64,7 @@ class User(Base):
     # Note: Old Message and RoomMember relationships removed - using new chat system
     # sent_messages = relationship("Message", back_populates="sender")
     # room_memberships = relationship("RoomMember", back_populates="user")
-    notifications = relationship("Notification", back_populates="user")
+    notifications = relationship("Notification", back_populates="user", foreign_keys="Notification.user_id")
     favorites = relationship("UserFavorite", back_populates="user")
     password_history = relationship("PasswordHistory", back_populates="user", order_by="PasswordHistory.created_at.desc()")
     community_posts = relationship("CommunityPost", back_populates="user")
@@ -6,6 +6,7 @@ from .base import BaseRepository
 from .adoption import AdoptionRepository
 from .pet import PetRepository
 from .notification import NotificationRepository
+from .file import FileRepository
 from .user import UserRepository
 from .password_history import PasswordHistoryRepository
 from .chat import ChatRepository, MessageRepository
@@ -21,6 +22,7 @@ __all__ = [
     "AdoptionRepository",
     "PetRepository",
     "NotificationRepository",
+    "FileRepository",
     "UserRepository",
     "PasswordHistoryRepository",
     "ChatRepository",
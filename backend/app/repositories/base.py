@@ -3,7 +3,7 @@ Base Repository
 基礎 Repository 提供通用 CRUD 操作
 """
 from typing import Generic, TypeVar, Type, Optional, List, Any
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import select, update, delete, func, and_, or_, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import Base
 
@@ -118,3 +118,29 @@ class BaseRepository(Generic[T]):
             .where(self.model.id == id)
         )
         return result.scalar() > 0
+    
+    def _comparable(self, expr):
+        """
+        排序 / 比較用運算式
+        
+        SQLite 以字串儲存時間，server_default 產生的值不含微秒，與綁定參數的格式不同，
+        直接比較會把同一秒的資料判為不相等；轉成 julianday 後再比較。
+        """
+        if isinstance(expr.type, DateTime) and self.db.get_bind().dialect.name == "sqlite":
+            return func.julianday(expr)
+        return expr
+    
+    def _keyset_condition(self, key, value, value_is_null: bool, last_id: int, order: str, nullable: bool):
+        """游標之後的資料條件（依 (key, id) 排序；NULL 在 ASC 時排最前、DESC 時排最後，與 MySQL / SQLite 一致）"""
+        model_id = self.model.id
+        if order == 'asc':
+            if value_is_null:
+                return or_(key.is_not(None), and_(key.is_(None), model_id > last_id))
+            return or_(key > value, and_(key == value, model_id > last_id))
+        
+        if value_is_null:
+            return and_(key.is_(None), model_id < last_id)
+        condition = or_(key < value, and_(key == value, model_id < last_id))
+        if nullable:
+            condition = or_(condition, key.is_(None))
+        return condition
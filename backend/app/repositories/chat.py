@@ -2,16 +2,18 @@
 Chat Repository
 聊天室與訊息資料存取層
 """
-from typing import Optional, List
+from typing import Optional, List, Dict, Iterable, Tuple
 from datetime import datetime
-from sqlalchemy import select, and_, or_, func, desc
+from sqlalchemy import select, update, and_, or_, case, func, desc, literal, inspect, DateTime
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.repositories.base import BaseRepository
-from app.models.chat_room import ChatRoom
-from app.models.chat_message import ChatMessage, MessageType
+from app.models.chat_room import ChatRoom, LAST_MESSAGE_PREVIEW_LENGTH
+from app.models.chat_message import ChatMessage, MessageType, allocate_room_seq
+from app.models.pet import Pet
 from app.models.user import User
+from app.utils.pagination import encode_cursor, decode_cursor
 
 
 class ChatRepository(BaseRepository[ChatRoom]):
@@ -57,12 +59,24 @@ class ChatRepository(BaseRepository[ChatRoom]):
             .options(
                 selectinload(ChatRoom.user),
                 selectinload(ChatRoom.shelter),
-                selectinload(ChatRoom.pet)
+                selectinload(ChatRoom.pet).selectinload(Pet.photos)
             )
             .where(ChatRoom.id == room_id)
         )
         return result.scalar_one_or_none()
     
+    async def get_by_ids(self, room_ids: Iterable[int]) -> List[ChatRoom]:
+        """批次查詢聊天室（不含關聯；重新讀取已在 session 中的聊天室，取得最新的計數器）"""
+        room_ids = list(room_ids)
+        if not room_ids:
+            return []
+        result = await self.db.execute(
+            select(ChatRoom)
+            .where(ChatRoom.id.in_(room_ids))
+            .execution_options(populate_existing=True)
+        )
+        return list(result.scalars().all())
+    
     async def get_user_rooms(
         self,
         user_id: int,
@@ -103,12 +117,112 @@ class ChatRepository(BaseRepository[ChatRoom]):
         )
         return result.scalars().all()
     
-    async def update_last_message_time(self, room_id: int) -> None:
-        """更新聊天室最後訊息時間"""
-        room = await self.get_by_id(room_id)
-        if room:
-            room.last_message_at = datetime.utcnow()
+    async def get_rooms_page(
+        self,
+        participant_id: int,
+        as_shelter: bool,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = 50
+    ) -> Tuple[List[ChatRoom], Optional[str], bool]:
+        """
+        有訊息的聊天室列表（游標分頁，last_message_at DESC, id DESC；limit 為 None 時返回全部）
+        
+        寵物照片與對方用戶以 selectinload 批次載入，查詢數與聊天室數量無關。
+        
+        Returns:
+            (rooms, next_cursor, has_more)
+        
+        Raises:
+            ValidationError: 游標無效
+        """
+        position = decode_cursor(cursor, 'last_message_at', 'desc')
+        
+        if as_shelter:
+            counterpart = selectinload(ChatRoom.user)
+            participant = ChatRoom.shelter_id == participant_id
+        else:
+            counterpart = selectinload(ChatRoom.shelter)
+            participant = ChatRoom.user_id == participant_id
+        
+        key = self._comparable(ChatRoom.last_message_at)
+        query = (
+            select(ChatRoom)
+            .options(selectinload(ChatRoom.pet).selectinload(Pet.photos), counterpart)
+            .where(participant, ChatRoom.last_message_id.isnot(None))
+        )
+        if position is not None:
+            last_message_at, last_id = position
+            value = self._comparable(literal(last_message_at, type_=DateTime))
+            query = query.where(
+                self._keyset_condition(key, value, last_message_at is None, last_id, 'desc', nullable=True)
+            )
+        
+        query = query.order_by(key.desc(), ChatRoom.id.desc())
+        if limit is None:
+            return list((await self.db.execute(query)).scalars().all()), None, False
+        
+        result = await self.db.execute(query.limit(limit + 1))
+        rooms = list(result.scalars().all())
+        
+        has_more = len(rooms) > limit
+        rooms = rooms[:limit]
+        next_cursor = None
+        if has_more:
+            last = rooms[-1]
+            next_cursor = encode_cursor('last_message_at', 'desc', last.last_message_at, last.id)
+        return rooms, next_cursor, has_more
+    
+    async def mark_room_read(self, room_id: int, as_shelter: bool) -> Tuple[int, bool]:
+        """
+        把參與者的已讀水位推進到聊天室最新訊息（單列 UPDATE，只會前進不會後退；沒有新訊息時不 commit）
+        
+        Args:
+            as_shelter: 讀取者是聊天室的收容所（否則為領養者）
+        
+        Returns:
+            (聊天室最新訊息 ID（沒有訊息時為 0）, 水位是否前進)
+        """
+        column = (
+            ChatRoom.shelter_last_read_message_id if as_shelter
+            else ChatRoom.user_last_read_message_id
+        )
+        result = await self.db.execute(
+            select(func.max(ChatMessage.id)).where(ChatMessage.room_id == room_id)
+        )
+        latest = result.scalar() or 0
+        if not latest:
+            return 0, False
+        
+        # WHERE 中比較，避免並行請求讓水位倒退
+        result = await self.db.execute(
+            update(ChatRoom)
+            .where(ChatRoom.id == room_id, or_(column.is_(None), column < latest))
+            .values({column: latest})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
             await self.db.commit()
+        return latest, bool(result.rowcount)
+    
+    async def refresh_last_message(self, room_id: int) -> None:
+        """依目前最新的訊息重建聊天室的最後訊息摘要（刪除訊息後呼叫）"""
+        result = await self.db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.room_id == room_id)
+            .order_by(ChatMessage.id.desc())
+            .limit(1)
+        )
+        last = result.scalar_one_or_none()
+        await self.db.execute(
+            update(ChatRoom)
+            .where(ChatRoom.id == room_id)
+            .values(
+                last_message_id=last.id if last else None,
+                last_message_preview=last.preview[:LAST_MESSAGE_PREVIEW_LENGTH] if last else None,
+                last_message_type=last.message_type.value if last else None,
+            )
+        )
+        await self.db.commit()
 
 
 class MessageRepository(BaseRepository[ChatMessage]):
@@ -120,21 +234,158 @@ class MessageRepository(BaseRepository[ChatMessage]):
     async def get_room_messages(
         self,
         room_id: int,
-        skip: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 100,
+        skip: int = 0
+    ) -> Tuple[List[ChatMessage], bool]:
+        """
+        獲取聊天室訊息（按時間降序，最新的在前；以 (created_at, id) 游標分頁）
+        
+        - before_id：比該訊息更舊的 limit 筆（往上捲動）
+        - after_id：緊接在該訊息之後的 limit 筆（補齊新訊息）
+        - 都沒有：最新的 limit 筆（skip 僅為舊版相容的 OFFSET 分頁）
+        
+        沿 (room_id, created_at, id) 索引定位，每頁成本與捲動深度無關；
+        錨點訊息不在此聊天室時返回空列表。
+        
+        Returns:
+            (messages, has_more)：has_more 表示游標方向上還有更多訊息
+        """
+        key = self._comparable(ChatMessage.created_at)
+        query = select(ChatMessage).where(ChatMessage.room_id == room_id)
+        
+        anchor_id = before_id if before_id is not None else after_id
+        if anchor_id is not None:
+            anchor = self._comparable(
+                select(ChatMessage.created_at)
+                .where(ChatMessage.id == anchor_id, ChatMessage.room_id == room_id)
+                .scalar_subquery()
+            )
+            order = 'desc' if before_id is not None else 'asc'
+            # 額外的單邊範圍條件讓索引直接從錨點開始掃描（只有 OR 條件時會從最新一則逐列過濾）
+            bound = key <= anchor if order == 'desc' else key >= anchor
+            query = query.where(
+                bound,
+                self._keyset_condition(key, anchor, False, anchor_id, order, nullable=False)
+            )
+        else:
+            order = 'desc'
+            query = query.offset(skip)
+        
+        if order == 'desc':
+            query = query.order_by(key.desc(), ChatMessage.id.desc())
+        else:
+            query = query.order_by(key.asc(), ChatMessage.id.asc())
+        
+        result = await self.db.execute(query.limit(limit + 1))
+        messages = list(result.scalars().all())
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if order == 'asc':
+            messages.reverse()
+        return messages, has_more
+    
+    async def get_messages_after_seq(
+        self,
+        room_id: int,
+        after_seq: int,
         limit: int = 100
     ) -> List[ChatMessage]:
-        """獲取聊天室訊息（按時間降序，最新的在前）"""
+        """序號大於 after_seq 的訊息（按序號升冪，沿 (room_id, seq) 索引）"""
         result = await self.db.execute(
             select(ChatMessage)
-            .options(
-                selectinload(ChatMessage.sender)
-            )
-            .where(ChatMessage.room_id == room_id)
-            .order_by(ChatMessage.created_at.desc())
-            .offset(skip)
+            .where(ChatMessage.room_id == room_id, ChatMessage.seq > after_seq)
+            .order_by(ChatMessage.seq.asc())
             .limit(limit)
         )
-        return result.scalars().all()
+        return list(result.scalars().all())
+    
+    async def _update_room_summary(self, room_id: int, message: ChatMessage) -> Optional[Dict]:
+        """
+        以條件式 UPDATE 寫入聊天室的最後訊息摘要（不 commit）
+        
+        並行發送時只有 id 較大的訊息會成為最後訊息；返回寫入的摘要，沒有寫入時返回 None。
+        """
+        summary = {
+            "last_message_at": datetime.utcnow(),
+            "last_message_id": message.id,
+            "last_message_preview": message.preview[:LAST_MESSAGE_PREVIEW_LENGTH],
+            "last_message_type": message.message_type.value,
+        }
+        result = await self.db.execute(
+            update(ChatRoom)
+            .where(
+                ChatRoom.id == room_id,
+                or_(ChatRoom.last_message_id.is_(None), ChatRoom.last_message_id < message.id)
+            )
+            .values(**summary)
+            .execution_options(synchronize_session=False)
+        )
+        return summary if result.rowcount else None
+    
+    async def _create_in_room(self, message: ChatMessage) -> ChatMessage:
+        """新增訊息並更新聊天室的最後訊息摘要（同一個交易、一次 commit）"""
+        self.db.add(message)
+        await self.db.flush()
+        
+        await self._update_room_summary(message.room_id, message)
+        await self.db.commit()
+        
+        await self.db.refresh(message)
+        return message
+    
+    async def create_text_messages(self, items: List[Tuple[int, int, str]]) -> List[ChatMessage]:
+        """
+        批次創建文字訊息（group commit）
+        
+        一次 flush 寫入所有訊息（資料庫支援時為多列 INSERT）、每個聊天室一次摘要 UPDATE、
+        整批只 commit 一次。呼叫端需已確認發送者是聊天室參與者。
+        
+        Args:
+            items: [(room_id, sender_id, content), ...]
+        
+        Returns:
+            與 items 同順序的訊息
+        """
+        messages = [
+            ChatMessage(room_id=room_id, sender_id=sender_id, message_type=MessageType.TEXT, content=content)
+            for room_id, sender_id, content in items
+        ]
+        
+        # 每個聊天室一次保留整批需要的序號；依 room_id 排序鎖定 chat_rooms，
+        # 同時 commit 的多個批次以相同順序取得鎖，不會互相死結
+        per_room: Dict[int, List[ChatMessage]] = {}
+        for message in messages:
+            per_room.setdefault(message.room_id, []).append(message)
+        connection = await self.db.connection()
+        for room_id in sorted(per_room):
+            room_messages = per_room[room_id]
+            last_seq = await connection.run_sync(allocate_room_seq, room_id, len(room_messages))
+            for offset, message in enumerate(room_messages, start=last_seq - len(room_messages) + 1):
+                message.seq = offset
+        
+        self.db.add_all(messages)
+        await self.db.flush()
+        
+        latest: Dict[int, ChatMessage] = {}
+        for message in messages:
+            if message.room_id not in latest or latest[message.room_id].id < message.id:
+                latest[message.room_id] = message
+        for room_id in sorted(latest):
+            await self._update_room_summary(room_id, latest[room_id])
+        
+        # 不支援 RETURNING 的資料庫（MySQL）flush 後沒有 created_at，commit 前在同一交易中一次查詢補齊，
+        # commit 是最後一步：這個方法拋出例外時整批都沒有寫入，呼叫端可以安全重試
+        missing = [message.id for message in messages if "created_at" in inspect(message).unloaded]
+        if missing:
+            await self.db.execute(
+                select(ChatMessage)
+                .where(ChatMessage.id.in_(missing))
+                .execution_options(populate_existing=True)
+            )
+        await self.db.commit()
+        return messages
     
     async def create_text_message(
         self,
@@ -149,7 +400,7 @@ class MessageRepository(BaseRepository[ChatMessage]):
             message_type=MessageType.TEXT,
             content=content
         )
-        return await self.create(message)
+        return await self._create_in_room(message)
     
     async def create_image_message(
         self,
@@ -168,7 +419,7 @@ class MessageRepository(BaseRepository[ChatMessage]):
             file_name=file_name,
             file_size=file_size
         )
-        return await self.create(message)
+        return await self._create_in_room(message)
     
     async def create_file_message(
         self,
@@ -187,42 +438,53 @@ class MessageRepository(BaseRepository[ChatMessage]):
             file_name=file_name,
             file_size=file_size
         )
-        return await self.create(message)
+        return await self._create_in_room(message)
     
-    async def mark_as_read(
-        self,
-        room_id: int,
-        user_id: int
-    ) -> int:
-        """標記聊天室訊息為已讀（排除發送者自己的訊息）"""
-        from sqlalchemy import update
+    @staticmethod
+    def _unread_condition(user_id: int):
+        """
+        未讀條件：對方發送且 id 大於自己的已讀水位（需 join chat_rooms）
         
-        stmt = (
-            update(ChatMessage)
+        room_id = ? AND id > ? 可直接沿 (room_id) 索引（InnoDB 次索引隱含主鍵）範圍掃描。
+        """
+        watermark = case(
+            (ChatRoom.shelter_id == user_id, ChatRoom.shelter_last_read_message_id),
+            else_=ChatRoom.user_last_read_message_id
+        )
+        return and_(
+            ChatMessage.sender_id != user_id,
+            ChatMessage.id > watermark
+        )
+    
+    async def get_unread_counts(self, room_ids: Iterable[int], user_id: int) -> Dict[int, int]:
+        """多個聊天室的未讀訊息數（一次 GROUP BY 查詢；沒有未讀的聊天室不在結果中）"""
+        room_ids = list(room_ids)
+        if not room_ids:
+            return {}
+        
+        result = await self.db.execute(
+            select(ChatMessage.room_id, func.count(ChatMessage.id))
+            .join(ChatRoom, ChatMessage.room_id == ChatRoom.id)
             .where(
                 and_(
-                    ChatMessage.room_id == room_id,
-                    ChatMessage.sender_id != user_id,
-                    ChatMessage.is_read == False
+                    ChatMessage.room_id.in_(room_ids),
+                    self._unread_condition(user_id)
                 )
             )
-            .values(is_read=True)
+            .group_by(ChatMessage.room_id)
         )
-        
-        result = await self.db.execute(stmt)
-        await self.db.commit()
-        return result.rowcount
+        return {room_id: count for room_id, count in result.all()}
     
     async def get_unread_count(self, room_id: int, user_id: int) -> int:
         """獲取用戶在聊天室的未讀訊息數"""
         result = await self.db.execute(
             select(func.count())
             .select_from(ChatMessage)
+            .join(ChatRoom, ChatMessage.room_id == ChatRoom.id)
             .where(
                 and_(
                     ChatMessage.room_id == room_id,
-                    ChatMessage.sender_id != user_id,
-                    ChatMessage.is_read == False
+                    self._unread_condition(user_id)
                 )
             )
         )
@@ -240,8 +502,7 @@ class MessageRepository(BaseRepository[ChatMessage]):
                         ChatRoom.user_id == user_id,
                         ChatRoom.shelter_id == user_id
                     ),
-                    ChatMessage.sender_id != user_id,
-                    ChatMessage.is_read == False
+                    self._unread_condition(user_id)
                 )
             )
         )
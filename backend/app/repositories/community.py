@@ -2,8 +2,8 @@
 Community Repository
 社群功能資料存取層（貼文、留言、按讚）
 """
-from typing import Optional, List
-from sqlalchemy import select, and_, func, desc
+from typing import Optional, List, Set, Tuple
+from sqlalchemy import select, update, case, and_, func, desc
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -13,6 +13,21 @@ from app.models.community import (
 )
 
 
+def _adjust_post_counter(post_id: int, counter: str, delta: int):
+    """
+    貼文計數的原子增減（UPDATE ... SET like_count = like_count + 1），與按讚 / 留言的變更同一次 commit
+    
+    減少時不低於 0；保留 updated_at：計數變化不算編輯貼文
+    """
+    column = getattr(CommunityPost, counter)
+    value = column + delta if delta > 0 else case((column + delta < 0, 0), else_=column + delta)
+    return (
+        update(CommunityPost)
+        .where(CommunityPost.id == post_id)
+        .values({counter: value, "updated_at": CommunityPost.updated_at})
+    )
+
+
 class CommunityRepository(BaseRepository[CommunityPost]):
     """社群貼文 Repository"""
     
@@ -20,14 +35,12 @@ class CommunityRepository(BaseRepository[CommunityPost]):
         super().__init__(db, CommunityPost)
     
     async def get_post_with_relations(self, post_id: int) -> Optional[CommunityPost]:
-        """獲取貼文（包含完整關聯）"""
+        """獲取貼文（包含作者與照片；按讚數、留言數使用計數欄位）"""
         result = await self.db.execute(
             select(CommunityPost)
             .options(
                 selectinload(CommunityPost.user),
-                selectinload(CommunityPost.photos),
-                selectinload(CommunityPost.comments).selectinload(PostComment.user),
-                selectinload(CommunityPost.likes)
+                selectinload(CommunityPost.photos)
             )
             .where(
                 and_(
@@ -44,14 +57,12 @@ class CommunityRepository(BaseRepository[CommunityPost]):
         skip: int = 0,
         limit: int = 100
     ) -> List[CommunityPost]:
-        """獲取貼文列表"""
+        """獲取貼文列表（不載入按讚與留言，計數使用 like_count / comment_count）"""
         query = (
             select(CommunityPost)
             .options(
                 selectinload(CommunityPost.user),
-                selectinload(CommunityPost.photos),
-                selectinload(CommunityPost.comments),
-                selectinload(CommunityPost.likes)
+                selectinload(CommunityPost.photos)
             )
             .where(CommunityPost.is_deleted == False)
         )
@@ -73,7 +84,10 @@ class CommunityRepository(BaseRepository[CommunityPost]):
         """獲取用戶的貼文"""
         result = await self.db.execute(
             select(CommunityPost)
-            .options(selectinload(CommunityPost.photos))
+            .options(
+                selectinload(CommunityPost.user),
+                selectinload(CommunityPost.photos)
+            )
             .where(
                 and_(
                     CommunityPost.user_id == user_id,
@@ -96,6 +110,15 @@ class CommunityRepository(BaseRepository[CommunityPost]):
         await self.db.commit()
         return True
     
+    async def get_counts(self, post_id: int) -> Optional[Tuple[int, int]]:
+        """貼文的 (like_count, comment_count)"""
+        result = await self.db.execute(
+            select(CommunityPost.like_count, CommunityPost.comment_count)
+            .where(CommunityPost.id == post_id)
+        )
+        row = result.one_or_none()
+        return tuple(row) if row else None
+    
     async def count_user_posts(self, user_id: int) -> int:
         """計算用戶的貼文數量"""
         result = await self.db.execute(
@@ -152,13 +175,23 @@ class CommentRepository(BaseRepository[PostComment]):
         )
         return result.scalars().all()
     
+    async def create_comment(self, comment: PostComment) -> PostComment:
+        """新增留言並遞增貼文的留言數（同一次 commit）"""
+        self.db.add(comment)
+        await self.db.execute(_adjust_post_counter(comment.post_id, "comment_count", 1))
+        await self.db.commit()
+        await self.db.refresh(comment)
+        return comment
+    
     async def soft_delete_comment(self, comment_id: int, user_id: int) -> bool:
-        """軟刪除留言"""
+        """軟刪除留言（並遞減貼文的留言數）"""
         comment = await self.get_by_id(comment_id)
         if not comment or comment.user_id != user_id:
             return False
         
-        comment.is_deleted = True
+        if not comment.is_deleted:
+            comment.is_deleted = True
+            await self.db.execute(_adjust_post_counter(comment.post_id, "comment_count", -1))
         await self.db.commit()
         return True
     
@@ -199,9 +232,13 @@ class PostLikeRepository(BaseRepository[PostLike]):
         if existing:
             return existing
         
-        # 創建新按讚
+        # 創建新按讚，並遞增貼文的按讚數（同一次 commit）
         like = PostLike(post_id=post_id, user_id=user_id)
-        return await self.create(like)
+        self.db.add(like)
+        await self.db.execute(_adjust_post_counter(post_id, "like_count", 1))
+        await self.db.commit()
+        await self.db.refresh(like)
+        return like
     
     async def unlike_post(self, post_id: int, user_id: int) -> bool:
         """取消按讚"""
@@ -218,7 +255,9 @@ class PostLikeRepository(BaseRepository[PostLike]):
         if not like:
             return False
         
-        await self.delete(like)
+        await self.db.delete(like)
+        await self.db.execute(_adjust_post_counter(post_id, "like_count", -1))
+        await self.db.commit()
         return True
     
     async def is_liked_by_user(self, post_id: int, user_id: int) -> bool:
@@ -235,6 +274,20 @@ class PostLikeRepository(BaseRepository[PostLike]):
         )
         return result.scalar() > 0
     
+    async def get_liked_post_ids(self, user_id: int, post_ids: List[int]) -> Set[int]:
+        """用戶按讚過的貼文（一次查詢：post_id IN (...)）"""
+        if not post_ids:
+            return set()
+        result = await self.db.execute(
+            select(PostLike.post_id).where(
+                and_(
+                    PostLike.user_id == user_id,
+                    PostLike.post_id.in_(post_ids)
+                )
+            )
+        )
+        return set(result.scalars().all())
+    
     async def count_post_likes(self, post_id: int) -> int:
         """計算貼文的按讚數"""
         result = await self.db.execute(
@@ -0,0 +1,128 @@
+"""
+File Repository
+檔案目錄資料存取層（以內容 SHA-256 去重、引用計數）
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.base import BaseRepository
+from app.models.file import File
+
+
+class FileRepository(BaseRepository[File]):
+    """檔案目錄 Repository"""
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, File)
+
+    async def get_by_hash(self, content_hash: str, category: str) -> Optional[File]:
+        """依分類與內容 hash 查詢"""
+        result = await self.db.execute(
+            select(File).where(File.category == category, File.content_hash == content_hash)
+        )
+        return result.scalar_one_or_none()
+
+    async def touch_unreferenced(self, file_id: int) -> bool:
+        """
+        更新未被引用的目錄記錄的 updated_at（去重命中時呼叫，重新計算清理的寬限期；不 commit）
+
+        Returns:
+            記錄是否仍存在（已被清理時返回 False）
+        """
+        result = await self.db.execute(
+            update(File)
+            .where(File.id == file_id)
+            .values(updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+    async def add_references(self, file_keys: Iterable[str]) -> List[str]:
+        """
+        取得引用（同一個 key 出現幾次就加幾次；在資料庫端累加，避免並行請求互相覆蓋）
+
+        不 commit，由呼叫端與建立引用的資料列一起 commit。
+
+        Returns:
+            目錄中不存在的 key（這些 key 沒有被加上引用）
+        """
+        counts = Counter(file_keys)
+        missing = []
+        for key, count in counts.items():
+            result = await self.db.execute(
+                update(File)
+                .where(File.stored_filename == key)
+                .values(ref_count=File.ref_count + count)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                missing.append(key)
+        return missing
+
+    async def release_references(self, file_keys: Iterable[str]) -> List[str]:
+        """
+        釋放引用（同一個 key 出現幾次就減幾次；以有唯一索引的 stored_filename 查詢）
+
+        目錄中沒有的 key（目錄建立前的舊照片）直接略過。
+        不 commit，由呼叫端與刪除引用的資料列一起 commit。
+
+        Returns:
+            引用次數歸零、已從目錄移除的檔案 key（呼叫端在 commit 後刪除物件）
+        """
+        counts = Counter(key for key in file_keys if key)
+        if not counts:
+            return []
+
+        for key, count in counts.items():
+            await self.db.execute(
+                update(File)
+                .where(File.stored_filename == key, File.ref_count > 0)
+                .values(ref_count=File.ref_count - count)
+                .execution_options(synchronize_session=False)
+            )
+        return await self._delete_unreferenced(File.stored_filename.in_(counts))
+
+    async def delete_unreferenced_before(self, cutoff: datetime, limit: int) -> List[str]:
+        """
+        刪除 cutoff 之前上傳（或最後一次去重命中）後一直沒有被引用的目錄記錄，最多 limit 筆（不 commit）
+
+        Returns:
+            已從目錄移除的檔案 key（呼叫端在 commit 後刪除物件）
+        """
+        return await self._delete_unreferenced(File.updated_at < cutoff, limit=limit)
+
+    async def _delete_unreferenced(self, *criteria, limit: Optional[int] = None) -> List[str]:
+        """
+        刪除引用次數為 0 的目錄記錄，只返回這次 DELETE 實際刪除的 key
+
+        支援 DELETE ... RETURNING 的資料庫一次完成；其他（MySQL）先 SELECT ... FOR UPDATE 鎖定再刪除，
+        並行的 add_references 必須等這個交易結束，不會在判斷與刪除之間重新取得引用
+        """
+        unreferenced = (File.ref_count <= 0, *criteria)
+        connection = await self.db.connection()
+        if connection.dialect.delete_returning:
+            if limit is not None:
+                unreferenced = (File.id.in_(select(File.id).where(*unreferenced).limit(limit)),)
+            result = await self.db.execute(
+                delete(File)
+                .where(*unreferenced)
+                .returning(File.stored_filename)
+                .execution_options(synchronize_session=False)
+            )
+            return list(result.scalars())
+
+        result = await self.db.execute(
+            select(File.id, File.stored_filename).where(*unreferenced).limit(limit).with_for_update()
+        )
+        orphaned = result.all()
+        if orphaned:
+            await self.db.execute(
+                delete(File)
+                .where(File.id.in_([row.id for row in orphaned]))
+                .execution_options(synchronize_session=False)
+            )
+        return [row.stored_filename for row in orphaned]
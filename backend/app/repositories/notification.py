@@ -2,13 +2,13 @@
 Notification Repository
 通知資料存取層
 """
-from typing import Optional, List
+from typing import Optional, List, Sequence, Tuple
 from datetime import datetime
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, or_, func, insert, delete, literal, false, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.repositories.base import BaseRepository
-from app.models.notification import Notification, NotificationType
+from app.models.notification import Notification, NotificationActor, NotificationType
 
 
 class NotificationRepository(BaseRepository[Notification]):
@@ -97,10 +97,97 @@ class NotificationRepository(BaseRepository[Notification]):
         )
         return await self.create(notification)
     
+    async def create_many(
+        self,
+        user_ids: List[int],
+        title: str,
+        message: str,
+        notification_type: NotificationType,
+        link: Optional[str] = None,
+        commit: bool = True
+    ) -> List[Notification]:
+        """
+        批次創建通知：一個多列 INSERT
+        
+        commit=False 時只寫入目前交易，由呼叫端與其他變更一起 commit。
+        資料庫支援 INSERT ... RETURNING 時返回新通知（MySQL 不支援，返回空列表）。
+        """
+        if not user_ids:
+            return []
+        
+        stmt = insert(Notification).values([
+            {
+                "user_id": user_id,
+                "title": title,
+                "message": message,
+                "notification_type": notification_type,
+                "link": link,
+                "is_read": False
+            }
+            for user_id in user_ids
+        ])
+        
+        connection = await self.db.connection()
+        if connection.dialect.insert_returning:
+            notifications = list((await self.db.scalars(stmt.returning(Notification))).all())
+        else:
+            await self.db.execute(stmt)
+            notifications = []
+        
+        if commit:
+            await self.db.commit()
+        return notifications
+    
+    async def get_coalescible(
+        self,
+        user_id: int,
+        aggregation_key: str,
+        since: datetime
+    ) -> Optional[Notification]:
+        """
+        查詢可合併的通知：同一合併鍵、未讀、最後事件在 since 之後
+        
+        以 FOR UPDATE 鎖定該列，同時到達的事件依序累加計數（SQLite 忽略）。
+        """
+        result = await self.db.execute(
+            select(Notification)
+            .where(
+                and_(
+                    Notification.user_id == user_id,
+                    Notification.aggregation_key == aggregation_key,
+                    Notification.is_read == False,
+                    self._comparable(Notification.created_at)
+                    >= self._comparable(literal(since, type_=DateTime))
+                )
+            )
+            .order_by(Notification.created_at.desc())
+            .limit(1)
+            .with_for_update()
+        )
+        return result.scalar_one_or_none()
+    
+    async def add_actor(self, notification_id: int, actor_id: int) -> bool:
+        """
+        記錄合併通知的觸發者（不 commit）
+        
+        呼叫端已以 get_coalescible 鎖定通知列，同一通知的觸發者依序寫入。
+        
+        Returns:
+            是否為新的觸發者（已記錄過時返回 False）
+        """
+        exists = await self.db.scalar(
+            select(NotificationActor.actor_id).where(
+                NotificationActor.notification_id == notification_id,
+                NotificationActor.actor_id == actor_id
+            )
+        )
+        if exists is not None:
+            return False
+        self.db.add(NotificationActor(notification_id=notification_id, actor_id=actor_id))
+        return True
     async def delete_old_read_notifications(self, user_id: int, days: int = 30) -> int:
         """刪除舊的已讀通知"""
         from datetime import timedelta
-        from sqlalchemy import delete
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
@@ -110,7 +197,8 @@ class NotificationRepository(BaseRepository[Notification]):
                 and_(
                     Notification.user_id == user_id,
                     Notification.is_read == True,
-                    Notification.read_at < cutoff_date
+                    self._comparable(Notification.created_at)
+                    < self._comparable(literal(cutoff_date, type_=DateTime))
                 )
             )
         )
@@ -119,6 +207,60 @@ class NotificationRepository(BaseRepository[Notification]):
         await self.db.commit()
         return result.rowcount
     
+    async def get_id_range_end(self, after_id: int, batch_size: int) -> Optional[int]:
+        """id 大於 after_id 的前 batch_size 筆中最大的 id（沒有更多資料時返回 None）"""
+        page = (
+            select(Notification.id)
+            .where(Notification.id > after_id)
+            .order_by(Notification.id)
+            .limit(batch_size)
+            .subquery()
+        )
+        return await self.db.scalar(select(func.max(page.c.id)))
+    
+    async def purge_read_in_id_range(
+        self,
+        after_id: int,
+        upto_id: int,
+        cutoffs: Sequence[Tuple[datetime, Sequence[Optional[NotificationType]]]]
+    ) -> int:
+        """
+        刪除 id 在 (after_id, upto_id] 之間、早於保留期限的已讀通知（所有用戶）
+        
+        以主鍵範圍限制每次刪除的列數，交易與鎖定都很短；範圍內的各保留期限在同一次 commit。
+        
+        Args:
+            cutoffs: [(期限, 適用的通知類型)]，類型 None 代表沒有類型的通知
+        
+        Returns:
+            刪除的通知數量
+        """
+        deleted = 0
+        for cutoff, notification_types in cutoffs:
+            types = [t for t in notification_types if t is not None]
+            type_condition = Notification.notification_type.in_(types) if types else false()
+            if None in notification_types:
+                type_condition = or_(type_condition, Notification.notification_type.is_(None))
+            
+            result = await self.db.execute(
+                delete(Notification)
+                .where(
+                    and_(
+                        Notification.id > after_id,
+                        Notification.id <= upto_id,
+                        Notification.is_read == True,
+                        self._comparable(Notification.created_at)
+                        < self._comparable(literal(cutoff, type_=DateTime)),
+                        type_condition
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            deleted += result.rowcount
+        
+        await self.db.commit()
+        return deleted
+    
     async def get_by_type(
         self,
         user_id: int,
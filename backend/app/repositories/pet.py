@@ -2,22 +2,85 @@
 Pet Repository
 寵物資料存取層
 """
-from typing import Optional, List, Dict, Any
-from sqlalchemy import select, and_, or_, func
+import asyncio
+import weakref
+from datetime import timedelta
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import select, and_, or_, func, false, literal
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.repositories.base import BaseRepository
+from app.models.chat_room import ChatRoom
 from app.models.pet import Pet, PetStatus, PetSpecies, PetSize, PetGender
 from app.models.user import User
+from app.utils.text_search import InvertedIndex, build_boolean_query, query_terms
+from app.utils.pagination import encode_cursor, decode_cursor
+
+
+class _SearchIndexState:
+    """記憶體倒排索引與其對應的資料版本"""
+
+    def __init__(self):
+        self.index = InvertedIndex()
+        # (count, max_id, max_updated_at)：資料表變動時重新同步
+        self.signature: Optional[tuple] = None
+        # 經由 Repository 寫入時標記（updated_at 精度不足以分辨同一秒內的修改）
+        self.stale = False
+        self.lock = asyncio.Lock()
+
+
+# 每個資料庫引擎各自一份索引（MySQL 使用 FULLTEXT，不會用到）
+_search_indexes: "weakref.WeakKeyDictionary[Any, _SearchIndexState]" = weakref.WeakKeyDictionary()
+
+# 排序欄位：sort_by -> (欄位, 是否可為 NULL)
+_SORT_COLUMNS = {
+    'created_at': (Pet.created_at, False),
+    'age': (Pet.age_years, True),
+    'name': (Pet.name, False),
+}
 
 
 class PetRepository(BaseRepository[Pet]):
     """寵物 Repository"""
     
+    # 搜尋側欄的 facet 維度（皆為 Enum 欄位）
+    FACET_COLUMNS = {
+        'species': Pet.species,
+        'size': Pet.size,
+        'gender': Pet.gender,
+        'energy_level': Pet.energy_level,
+    }
+    
     def __init__(self, db: AsyncSession):
         super().__init__(db, Pet)
     
+    async def create(self, obj: Pet) -> Pet:
+        """新增寵物"""
+        self._invalidate_search_index()
+        return await super().create(obj)
+    
+    async def update(self, obj: Pet) -> Pet:
+        """更新寵物"""
+        self._invalidate_search_index()
+        return await super().update(obj)
+    
+    async def update_by_id(self, id: int, **kwargs) -> Optional[Pet]:
+        """根據 ID 更新寵物"""
+        self._invalidate_search_index()
+        return await super().update_by_id(id, **kwargs)
+    
+    async def delete(self, obj: Pet) -> None:
+        """刪除寵物"""
+        self._invalidate_search_index()
+        await super().delete(obj)
+    
+    async def delete_by_id(self, id: int) -> bool:
+        """根據 ID 刪除寵物"""
+        self._invalidate_search_index()
+        return await super().delete_by_id(id)
+    
     async def get_by_id_with_shelter(self, pet_id: int) -> Optional[Pet]:
         """獲取寵物（包含收容所資訊）"""
         result = await self.db.execute(
@@ -27,6 +90,11 @@ class PetRepository(BaseRepository[Pet]):
         )
         return result.scalar_one_or_none()
     
+    async def get_chat_room_ids(self, pet_id: int) -> List[int]:
+        """寵物的聊天室 ID（刪除寵物時聊天室會連帶刪除）"""
+        result = await self.db.execute(select(ChatRoom.id).where(ChatRoom.pet_id == pet_id))
+        return list(result.scalars().all())
+    
     async def get_available_pets(
         self,
         skip: int = 0,
@@ -53,6 +121,31 @@ class PetRepository(BaseRepository[Pet]):
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    async def get_available_pets_by_cursor(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        species: Optional[PetSpecies] = None,
+        size: Optional[PetSize] = None,
+        gender: Optional[PetGender] = None
+    ) -> Tuple[List[Pet], Optional[str], bool]:
+        """
+        獲取可領養的寵物（游標分頁，依 created_at DESC, id DESC）
+        
+        Returns:
+            (pets, next_cursor, has_more)
+        """
+        query = select(Pet).where(Pet.status == PetStatus.AVAILABLE)
+        
+        if species:
+            query = query.where(Pet.species == species)
+        if size:
+            query = query.where(Pet.size == size)
+        if gender:
+            query = query.where(Pet.gender == gender)
+        
+        return await self._cursor_page(query, 'created_at', 'desc', cursor, limit)
+    
     async def get_shelter_pets(
         self,
         shelter_id: int,
@@ -85,8 +178,11 @@ class PetRepository(BaseRepository[Pet]):
         limit: int = 100
     ) -> List[Pet]:
         """搜尋寵物（支援多條件）"""
-        query = self._build_search_query(filters)
-        query = query.order_by(Pet.created_at.desc()).offset(skip).limit(limit)
+        query, _ = await self._build_text_search_query(filters)
+        query = query.options(
+            selectinload(Pet.photos),
+            selectinload(Pet.shelter)
+        ).order_by(Pet.created_at.desc()).offset(skip).limit(limit)
         
         result = await self.db.execute(query)
         return result.scalars().all()
@@ -98,82 +194,391 @@ class PetRepository(BaseRepository[Pet]):
         limit: int = 100
     ) -> tuple[List[Pet], int]:
         """搜尋寵物並返回總數"""
-        # 建立基礎查詢
-        base_query = self._build_search_query(filters)
+        # 建立基礎查詢（含全文搜尋條件）
+        base_query, relevance = await self._build_text_search_query(filters)
+        
+        # 記憶體索引的相關度排序：在 Python 端依分數排序後只載入當頁資料
+        if filters.get('sort_by') == 'relevance' and isinstance(relevance, dict):
+            return await self._page_by_scores(base_query, relevance, skip, limit)
         
         # 計算總數
         count_query = select(func.count()).select_from(
-            base_query.alias()
+            base_query.with_only_columns(Pet.id).subquery()
         )
         count_result = await self.db.execute(count_query)
         total = count_result.scalar()
         
-        # 處理排序
+        pets = await self._fetch_page(base_query, relevance, filters, skip, limit)
+        return pets, total
+    
+    async def search_pets_with_facets(
+        self,
+        filters: Dict[str, Any],
+        dimensions: List[str],
+        skip: int = 0,
+        limit: int = 100
+    ) -> Tuple[List[Pet], int, Dict[str, Dict[str, int]]]:
+        """
+        搜尋寵物並返回總數與 facet 計數
+        
+        總數由 facet 聚合查詢一併算出，不另外執行 COUNT。
+        
+        Returns:
+            (pets, total, facets)
+        """
+        base_query, relevance = await self._build_text_search_query(filters, facet_filters=False)
+        total, facets = await self._facet_counts(base_query, filters, dimensions)
+        
+        query = self._apply_facet_filters(base_query, filters)
+        if filters.get('sort_by') == 'relevance' and isinstance(relevance, dict):
+            pets, _ = await self._page_by_scores(query, relevance, skip, limit)
+        else:
+            pets = await self._fetch_page(query, relevance, filters, skip, limit)
+        
+        return pets, total, facets
+    
+    async def get_search_facets(
+        self,
+        filters: Dict[str, Any],
+        dimensions: List[str]
+    ) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """獲取搜尋條件下的總數與 facet 計數，返回 (total, facets)"""
+        base_query, _ = await self._build_text_search_query(filters, facet_filters=False)
+        return await self._facet_counts(base_query, filters, dimensions)
+    
+    async def _facet_counts(
+        self,
+        base_query,
+        filters: Dict[str, Any],
+        dimensions: List[str]
+    ) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """
+        單次 GROUP BY 計算所有 facet 與總數
+        
+        base_query 不含 facet 維度的篩選；以 (species, size, gender, energy_level)
+        分組後在 Python 端彙整。每個維度的計數排除自己的篩選條件
+        （選了「狗」之後，物種 facet 仍顯示貓的數量），總數則套用全部條件。
+        """
+        active = {
+            name: filters[name] for name in self.FACET_COLUMNS
+            if filters.get(name)
+        }
+        group_names = [name for name in self.FACET_COLUMNS if name in dimensions or name in active]
+        group_columns = [self.FACET_COLUMNS[name] for name in group_names]
+        
+        facets = {
+            name: {member.value: 0 for member in self.FACET_COLUMNS[name].type.enum_class}
+            for name in dimensions
+        }
+        
+        query = base_query.with_only_columns(*group_columns, func.count().label('pet_count'))
+        if group_columns:
+            query = query.group_by(*group_columns)
+        result = await self.db.execute(query)
+        
+        total = 0
+        for row in result:
+            values = dict(zip(group_names, row))
+            failed = [
+                name for name, wanted in active.items()
+                if not self._facet_matches(values[name], wanted)
+            ]
+            
+            if not failed:
+                total += row.pet_count
+            
+            for name in dimensions:
+                value = values[name]
+                # 只有自己這個維度不符合（或全部符合）時才計入
+                if value is None or any(other != name for other in failed):
+                    continue
+                facets[name][value.value] += row.pet_count
+        
+        return total, facets
+    
+    @staticmethod
+    def _facet_matches(value, wanted) -> bool:
+        """facet 值是否符合篩選條件（單一值或陣列）"""
+        if isinstance(wanted, list):
+            return value in wanted
+        return value == wanted
+    
+    async def _fetch_page(
+        self,
+        base_query,
+        relevance,
+        filters: Dict[str, Any],
+        skip: int,
+        limit: int
+    ) -> List[Pet]:
+        """依 sort_by / order 排序並載入當頁寵物"""
         sort_by = filters.get('sort_by', 'created_at')
         order = filters.get('order', 'desc')
         
-        # 根據排序欄位選擇對應的資料庫欄位
-        if sort_by == 'age':
-            sort_column = Pet.age_years
-        elif sort_by == 'name':
-            sort_column = Pet.name
-        elif sort_by == 'created_at':
-            sort_column = Pet.created_at
-        else:
-            sort_column = Pet.created_at
+        query = base_query.options(
+            selectinload(Pet.photos),
+            selectinload(Pet.shelter)
+        )
         
-        # 應用排序方向
-        if order == 'asc':
-            query = base_query.order_by(sort_column.asc())
+        # 根據排序欄位選擇對應的資料庫欄位
+        if sort_by == 'relevance' and relevance is not None:
+            query = query.order_by(relevance.desc(), Pet.id.desc())
         else:
-            query = base_query.order_by(sort_column.desc())
+            sort_column, _ = _SORT_COLUMNS.get(sort_by, _SORT_COLUMNS['created_at'])
+            
+            # 應用排序方向
+            if order == 'asc':
+                query = query.order_by(sort_column.asc())
+            else:
+                query = query.order_by(sort_column.desc())
         
         # 應用分頁
         query = query.offset(skip).limit(limit)
         result = await self.db.execute(query)
-        pets = result.scalars().all()
+        return result.scalars().all()
+    
+    async def search_pets_by_cursor(
+        self,
+        filters: Dict[str, Any],
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Pet], Optional[str], bool]:
+        """
+        搜尋寵物（游標分頁，不計算總數）
         
-        return pets, total
+        Returns:
+            (pets, next_cursor, has_more)
+        """
+        base_query, relevance = await self._build_text_search_query(filters)
+        
+        sort_by = filters.get('sort_by', 'created_at')
+        order = 'asc' if filters.get('order') == 'asc' else 'desc'
+        
+        if sort_by == 'relevance' and relevance is not None:
+            if isinstance(relevance, dict):
+                return await self._cursor_page_by_scores(base_query, relevance, cursor, limit)
+            return await self._cursor_page(
+                base_query, 'relevance', 'desc', cursor, limit, sort_expr=relevance
+            )
+        
+        if sort_by not in _SORT_COLUMNS:
+            sort_by = 'created_at'
+        return await self._cursor_page(base_query, sort_by, order, cursor, limit)
     
-    def _build_search_query(self, filters: Dict[str, Any]):
-        """建立搜尋查詢"""
-        query = select(Pet).options(
+    async def _cursor_page(
+        self,
+        query,
+        sort_by: str,
+        order: str,
+        cursor: Optional[str],
+        limit: int,
+        sort_expr=None
+    ) -> Tuple[List[Pet], Optional[str], bool]:
+        """
+        Keyset 分頁：WHERE (sort_key, id) 位於游標之後，ORDER BY sort_key, id
+        
+        多取一筆判斷是否還有下一頁，不需要 OFFSET 與 COUNT。
+        """
+        nullable = False
+        if sort_expr is None:
+            sort_expr, nullable = _SORT_COLUMNS[sort_by]
+        key = self._comparable(sort_expr)
+        
+        position = decode_cursor(cursor, sort_by, order)
+        if position is not None:
+            sort_key, last_id = position
+            # 相關度分數為浮點數，其餘沿用欄位型別（時間需經型別轉換才能比較）
+            value_type = None if sort_by == 'relevance' else sort_expr.type
+            value = self._comparable(literal(sort_key, type_=value_type))
+            query = query.where(self._keyset_condition(key, value, sort_key is None, last_id, order, nullable))
+        
+        if order == 'asc':
+            query = query.order_by(key.asc(), Pet.id.asc())
+        else:
+            query = query.order_by(key.desc(), Pet.id.desc())
+        
+        query = query.add_columns(sort_expr.label('sort_key')).options(
             selectinload(Pet.photos),
             selectinload(Pet.shelter)
-        ).where(Pet.status == PetStatus.AVAILABLE)
+        ).limit(limit + 1)
         
-        # 文字搜尋（搜尋名稱、品種、描述）
-        if "query" in filters and filters["query"]:
-            search_text = filters["query"]
-            query = query.where(
-                or_(
-                    Pet.name.ilike(f"%{search_text}%"),
-                    Pet.breed.ilike(f"%{search_text}%"),
-                    Pet.description.ilike(f"%{search_text}%")
-                )
+        result = await self.db.execute(query)
+        rows = result.all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort_by, order, last.sort_key, last[0].id)
+        
+        return [row[0] for row in rows], next_cursor, has_more
+    
+    async def _cursor_page_by_scores(
+        self,
+        base_query,
+        scores: Dict[int, float],
+        cursor: Optional[str],
+        limit: int
+    ) -> Tuple[List[Pet], Optional[str], bool]:
+        """依記憶體索引分數的游標分頁（score DESC, id DESC）"""
+        position = decode_cursor(cursor, 'relevance', 'desc')
+        
+        result = await self.db.execute(base_query.with_only_columns(Pet.id))
+        ranked = sorted(((scores[pet_id], pet_id) for pet_id in result.scalars()), reverse=True)
+        if position is not None:
+            ranked = [item for item in ranked if item < position]
+        
+        has_more = len(ranked) > limit
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor('relevance', 'desc', *ranked[-1]) if has_more else None
+        
+        pets = await self._load_in_order([pet_id for _, pet_id in ranked])
+        return pets, next_cursor, has_more
+    
+    async def _page_by_scores(
+        self,
+        base_query,
+        scores: Dict[int, float],
+        skip: int,
+        limit: int
+    ) -> tuple[List[Pet], int]:
+        """依記憶體索引分數排序並分頁"""
+        result = await self.db.execute(base_query.with_only_columns(Pet.id))
+        ids = sorted(result.scalars().all(), key=lambda pet_id: (-scores[pet_id], -pet_id))
+        
+        page_ids = ids[skip:skip + limit]
+        return await self._load_in_order(page_ids), len(ids)
+    
+    async def _load_in_order(self, pet_ids: List[int]) -> List[Pet]:
+        """依指定 ID 順序載入寵物"""
+        if not pet_ids:
+            return []
+        
+        result = await self.db.execute(
+            select(Pet)
+            .options(selectinload(Pet.photos), selectinload(Pet.shelter))
+            .where(Pet.id.in_(pet_ids))
+        )
+        pets = {pet.id: pet for pet in result.scalars().all()}
+        return [pets[pet_id] for pet_id in pet_ids if pet_id in pets]
+    
+    async def _build_text_search_query(self, filters: Dict[str, Any], facet_filters: bool = True):
+        """
+        建立搜尋查詢並套用全文搜尋
+        
+        Returns:
+            (query, relevance)：relevance 見 _text_search，無文字查詢時為 None
+        """
+        query = self._build_search_query(filters, facet_filters)
+        
+        search_text = filters.get("query")
+        if not search_text:
+            return query, None
+        
+        condition, relevance = await self._text_search(search_text)
+        if condition is not None:
+            query = query.where(condition)
+        return query, relevance
+    
+    async def _text_search(self, search_text: str) -> Tuple[Any, Any]:
+        """
+        全文搜尋（搜尋名稱、品種、描述）
+        
+        - MySQL：MATCH ... AGAINST（FULLTEXT + ngram parser）
+        - 其他資料庫（SQLite / 測試）：記憶體倒排索引
+        
+        Returns:
+            (WHERE 條件, 相關度)：相關度在 MySQL 為 SQL 運算式，記憶體索引為
+            {pet_id: 分數}；查詢沒有可用的詞時返回 (None, None)
+        """
+        if not query_terms(search_text):
+            return None, None
+        
+        if self.db.get_bind().dialect.name == "mysql":
+            relevance = match(
+                Pet.name, Pet.breed, Pet.description,
+                against=build_boolean_query(search_text)
+            ).in_boolean_mode()
+            return relevance, relevance
+        
+        index = await self._get_search_index()
+        scores = index.search(search_text)
+        if not scores:
+            return false(), None
+        
+        return Pet.id.in_(list(scores)), scores
+    
+    def _search_index_state(self, create: bool = True) -> Optional[_SearchIndexState]:
+        """取得目前資料庫引擎對應的索引狀態"""
+        bind = self.db.get_bind()
+        engine = getattr(bind, "engine", bind)
+        
+        state = _search_indexes.get(engine)
+        if state is None and create:
+            state = _search_indexes[engine] = _SearchIndexState()
+        return state
+    
+    def _invalidate_search_index(self) -> None:
+        """標記索引需要重新同步"""
+        state = self._search_index_state(create=False)
+        if state is not None:
+            state.stale = True
+    
+    async def _get_search_index(self) -> InvertedIndex:
+        """取得（並同步）目前資料庫的記憶體倒排索引"""
+        state = self._search_index_state()
+        
+        async with state.lock:
+            result = await self.db.execute(
+                select(func.count(Pet.id), func.max(Pet.id), func.max(Pet.updated_at))
             )
+            signature = tuple(result.one())
+            if state.stale or signature != state.signature:
+                state.stale = False
+                await self._refresh_search_index(state, signature)
         
-        # 基本篩選條件（支援單一值或陣列）
-        if "species" in filters and filters["species"]:
-            species_val = filters["species"]
-            if isinstance(species_val, list):
-                query = query.where(Pet.species.in_(species_val))
-            else:
-                query = query.where(Pet.species == species_val)
+        return state.index
+    
+    async def _refresh_search_index(self, state: _SearchIndexState, signature: tuple) -> None:
+        """增量同步索引：只重新載入新增或更新過的寵物，有刪除時整份重建"""
+        columns = (Pet.id, Pet.name, Pet.breed, Pet.description)
+        query = select(*columns)
+        
+        if state.signature is not None:
+            _, last_max_id, last_updated_at = state.signature
+            changed = []
+            if last_max_id is not None:
+                changed.append(Pet.id > last_max_id)
+            if last_updated_at is not None:
+                # 往前多取一秒：資料庫時間戳精度可能只到秒
+                changed.append(Pet.updated_at >= last_updated_at - timedelta(seconds=1))
+            if changed:
+                query = query.where(or_(*changed))
         
-        if "size" in filters and filters["size"]:
-            size_val = filters["size"]
-            if isinstance(size_val, list):
-                query = query.where(Pet.size.in_(size_val))
-            else:
-                query = query.where(Pet.size == size_val)
+        result = await self.db.execute(query)
+        for row in result:
+            state.index.add(row.id, {"name": row.name, "breed": row.breed, "description": row.description})
         
-        if "gender" in filters and filters["gender"]:
-            gender_val = filters["gender"]
-            if isinstance(gender_val, list):
-                query = query.where(Pet.gender.in_(gender_val))
-            else:
-                query = query.where(Pet.gender == gender_val)
+        if len(state.index) != signature[0]:
+            state.index.clear()
+            result = await self.db.execute(select(*columns))
+            for row in result:
+                state.index.add(row.id, {"name": row.name, "breed": row.breed, "description": row.description})
+        
+        state.signature = signature
+    
+    def _build_search_query(self, filters: Dict[str, Any], facet_filters: bool = True):
+        """
+        建立搜尋查詢（文字搜尋以外的篩選條件，不含載入選項）
+        
+        facet_filters=False 時不套用 facet 維度（species / size / gender / energy_level），
+        供 facet 計數使用。
+        """
+        query = select(Pet).where(Pet.status == PetStatus.AVAILABLE)
+        
+        if facet_filters:
+            query = self._apply_facet_filters(query, filters)
         
         if "breed" in filters and filters["breed"]:
             query = query.where(Pet.breed.ilike(f"%{filters['breed']}%"))
@@ -185,14 +590,6 @@ class PetRepository(BaseRepository[Pet]):
         if "max_age_years" in filters and filters["max_age_years"] is not None:
             query = query.where(Pet.age_years <= filters["max_age_years"])
         
-        # 活力等級
-        if "energy_level" in filters and filters["energy_level"]:
-            energy_val = filters["energy_level"]
-            if isinstance(energy_val, list):
-                query = query.where(Pet.energy_level.in_(energy_val))
-            else:
-                query = query.where(Pet.energy_level == energy_val)
-        
         # 領養費用上限
         if "max_adoption_fee" in filters and filters["max_adoption_fee"] is not None:
             query = query.where(Pet.adoption_fee <= filters["max_adoption_fee"])
@@ -209,6 +606,18 @@ class PetRepository(BaseRepository[Pet]):
         
         return query
     
+    def _apply_facet_filters(self, query, filters: Dict[str, Any]):
+        """套用 facet 維度的篩選條件（支援單一值或陣列）"""
+        for name, column in self.FACET_COLUMNS.items():
+            value = filters.get(name)
+            if not value:
+                continue
+            if isinstance(value, list):
+                query = query.where(column.in_(value))
+            else:
+                query = query.where(column == value)
+        return query
+    
     async def update_status(
         self,
         pet: Pet,
@@ -217,6 +626,7 @@ class PetRepository(BaseRepository[Pet]):
         """更新寵物狀態"""
         pet.status = new_status
         pet.updated_at = func.now()
+        self._invalidate_search_index()
         await self.db.commit()
         await self.db.refresh(pet)
         return pet
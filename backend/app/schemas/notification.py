@@ -15,6 +15,8 @@ class NotificationResponse(NotificationBase):
     is_read: bool
     notification_type: str | None = None
     link: str | None = None
+    actor_count: int = 1
+    last_actor_name: str | None = None
     created_at: datetime
 
     class Config:
@@ -0,0 +1,208 @@
+"""
+Chat Backplane
+跨行程的聊天室廣播：每個 worker 發布聊天室事件，收到事件後只投遞給本機的訂閱者
+
+- InMemoryBackplane：單一行程（開發、測試）；多個實例共用同一個 InMemoryBus 可模擬多個 worker
+- RedisBackplane：Redis pub/sub（REDIS_URL），所有 worker 訂閱同一個 channel
+
+事件格式（JSON）：
+- 聊天室事件：{"origin", "room_id", "exclude_user", "frame", "seq"}（seq 為新訊息的聊天室序號，其他事件為 null）
+- 用戶事件（通知、未讀數變化）：{"origin", "user_id", "frame"}
+發布的 worker 已直接投遞給本機連線，收到自己發出的事件時略過。
+"""
+import asyncio
+import json
+import uuid
+from typing import Callable, Optional, Set
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+# 收到事件時的投遞函式：deliver(room_id, frame, exclude_user, seq)
+Deliver = Callable[[int, str, Optional[int], Optional[int]], None]
+# 收到用戶事件時的投遞函式：deliver_user(user_id, frame)
+DeliverUser = Callable[[int, str], None]
+
+
+class Backplane:
+    """廣播後端基底類別"""
+
+    def __init__(self):
+        # 每個 worker 一個 ID，用來略過自己發出的事件
+        self.node_id = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        self._deliver_user: Optional[DeliverUser] = None
+
+    async def start(self, deliver: Deliver, deliver_user: Optional[DeliverUser] = None) -> None:
+        """開始接收其他 worker 的事件"""
+        self._deliver = deliver
+        self._deliver_user = deliver_user
+
+    async def publish(
+        self,
+        room_id: int,
+        frame: str,
+        exclude_user: Optional[int] = None,
+        seq: Optional[int] = None
+    ) -> None:
+        """發布聊天室事件給其他 worker"""
+        await self._send(self._encode(room_id, frame, exclude_user, seq))
+
+    async def publish_to_user(self, user_id: int, frame: str) -> None:
+        """發布用戶事件給其他 worker（用戶可能連在任何一個 worker）"""
+        await self._send(json.dumps({
+            "origin": self.node_id,
+            "user_id": user_id,
+            "frame": frame,
+        }, ensure_ascii=False, separators=(",", ":")))
+
+    async def _send(self, payload: str) -> None:
+        """送出已編碼的事件"""
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        """停止接收事件並釋放連線"""
+        self._deliver = None
+        self._deliver_user = None
+
+    def _encode(self, room_id: int, frame: str, exclude_user: Optional[int], seq: Optional[int] = None) -> str:
+        return json.dumps({
+            "origin": self.node_id,
+            "room_id": room_id,
+            "exclude_user": exclude_user,
+            "frame": frame,
+            "seq": seq,
+        }, ensure_ascii=False, separators=(",", ":"))
+
+    def _receive(self, payload: str) -> None:
+        """處理收到的事件（忽略格式錯誤與自己發出的事件）"""
+        try:
+            event = json.loads(payload)
+            if event["origin"] == self.node_id or self._deliver is None:
+                return
+            if event.get("user_id") is not None:
+                if self._deliver_user is not None:
+                    self._deliver_user(int(event["user_id"]), event["frame"])
+                return
+            self._deliver(int(event["room_id"]), event["frame"], event.get("exclude_user"), event.get("seq"))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ 無法處理的聊天室事件: {e}")
+
+
+class InMemoryBus:
+    """行程內的事件匯流排（模擬 Redis channel）"""
+
+    def __init__(self):
+        self.backplanes: Set["InMemoryBackplane"] = set()
+
+
+class InMemoryBackplane(Backplane):
+    """行程內的 backplane：沒有共用 bus 時等同單一 worker"""
+
+    def __init__(self, bus: Optional[InMemoryBus] = None):
+        super().__init__()
+        self.bus = bus or InMemoryBus()
+
+    async def start(self, deliver: Deliver, deliver_user: Optional[DeliverUser] = None) -> None:
+        await super().start(deliver, deliver_user)
+        self.bus.backplanes.add(self)
+
+    async def _send(self, payload: str) -> None:
+        for backplane in tuple(self.bus.backplanes):
+            if backplane is not self:
+                backplane._receive(payload)
+
+    async def stop(self) -> None:
+        self.bus.backplanes.discard(self)
+        await super().stop()
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backplane
+
+    Redis 暫時無法連線時，本機訂閱者仍會收到訊息；接收端會持續重連。
+    """
+
+    def __init__(
+        self,
+        url: str = settings.REDIS_URL,
+        channel: str = settings.CHAT_BACKPLANE_CHANNEL,
+        reconnect_delay: float = 1.0
+    ):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._client: Optional[redis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(self.url, decode_responses=True, socket_connect_timeout=2)
+        return self._client
+
+    async def start(self, deliver: Deliver, deliver_user: Optional[DeliverUser] = None) -> None:
+        await super().start(deliver, deliver_user)
+        # 先完成第一次訂閱再返回，避免啟動後立即發布的事件漏接
+        pubsub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _subscribe(self) -> Optional["redis.client.PubSub"]:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.channel)
+            print(f"📡 Chat backplane subscribed to Redis channel {self.channel}")
+            return pubsub
+        except Exception as e:
+            print(f"⚠️ Chat backplane 無法連線 Redis（{e}），只投遞給本機連線")
+            await pubsub.aclose()
+            return None
+
+    async def _listen(self, pubsub) -> None:
+        while True:
+            if pubsub is None:
+                await asyncio.sleep(self.reconnect_delay)
+                pubsub = await self._subscribe()
+                continue
+            try:
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._receive(message["data"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                print(f"⚠️ Chat backplane 連線中斷（{e}），重新訂閱")
+            await pubsub.aclose()
+            pubsub = None
+
+    async def _send(self, payload: str) -> None:
+        try:
+            await self.client.publish(self.channel, payload)
+        except Exception as e:
+            print(f"⚠️ Chat backplane 發布失敗（{e}），其他 worker 的連線不會收到此訊息")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await super().stop()
+
+
+def create_backplane() -> Backplane:
+    """依 CHAT_BACKPLANE 設定建立 backplane（memory / redis）"""
+    if settings.CHAT_BACKPLANE == "redis":
+        return RedisBackplane()
+    if settings.CHAT_BACKPLANE != "memory":
+        raise ValueError("CHAT_BACKPLANE must be 'memory' or 'redis'")
+    return InMemoryBackplane()
@@ -2,19 +2,28 @@
 Chat Service
 聊天室與訊息業務邏輯層
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 from datetime import datetime
 
+from sqlalchemy.exc import NoResultFound, StatementError
+
 from app.repositories.chat import ChatRepository, MessageRepository
 from app.repositories import UserRepository, PetRepository
 from app.models.chat_room import ChatRoom
 from app.models.chat_message import ChatMessage, MessageType
+from app.services.room_participants import (
+    RoomParticipants,
+    RoomParticipantsCache,
+    room_participants_cache
+)
+from app.services.realtime import ConnectionManager, manager as realtime_manager
 from app.exceptions import (
     ChatRoomNotFoundError,
     MessageNotFoundError,
     PetNotFoundError,
     UserNotFoundError,
-    PermissionDeniedError
+    PermissionDeniedError,
+    ValidationError
 )
 
 
@@ -26,12 +35,16 @@ class ChatService:
         chat_repo: ChatRepository,
         message_repo: MessageRepository,
         user_repo: UserRepository,
-        pet_repo: PetRepository
+        pet_repo: PetRepository,
+        participants_cache: RoomParticipantsCache = room_participants_cache,
+        realtime: ConnectionManager = realtime_manager
     ):
         self.chat_repo = chat_repo
         self.message_repo = message_repo
         self.user_repo = user_repo
         self.pet_repo = pet_repo
+        self.participants_cache = participants_cache
+        self.realtime = realtime
     
     async def get_or_create_room(
         self,
@@ -52,15 +65,66 @@ class ChatService:
         
         return await self.chat_repo.get_or_create_room(user_id, shelter_id, pet_id)
     
+    async def _participants(self, room_id: int) -> Tuple[RoomParticipants, Optional[ChatRoom]]:
+        """
+        聊天室參與者（參與者快取命中時不查資料庫）
+        
+        Returns:
+            (participants, room)：room 為快取未命中時查到的聊天室（不含關聯），命中時為 None
+        """
+        participants = await self.participants_cache.get(room_id)
+        room = None
+        if participants is None:
+            room = await self.chat_repo.get_by_id(room_id)
+            if not room:
+                raise ChatRoomNotFoundError(f"聊天室 ID {room_id} 不存在")
+            participants = RoomParticipants(room.user_id, room.shelter_id)
+            await self.participants_cache.set(room_id, participants)
+        return participants, room
+    
+    async def _ensure_rooms_exist(self, room_ids: Iterable[int]) -> None:
+        """
+        寫入訊息失敗後確認聊天室仍存在（寵物刪除時聊天室會連帶刪除，參與者快取可能還留著）
+        
+        聊天室不存在時分配序號找不到資料列（NoResultFound，在 flush 中會包成 StatementError），
+        或訊息的外鍵約束失敗（IntegrityError）
+
+        Raises:
+            ChatRoomNotFoundError: 有聊天室已被刪除（同時移除其參與者快取）
+        """
+        await self.chat_repo.db.rollback()
+        missing = [room_id for room_id in dict.fromkeys(room_ids) if not await self.chat_repo.get_by_id(room_id)]
+        for room_id in missing:
+            await self.participants_cache.delete(room_id)
+        if missing:
+            raise ChatRoomNotFoundError(f"聊天室 ID {', '.join(map(str, missing))} 不存在")
+    
+    async def _authorize(self, room_id: int, user_id: int) -> Tuple[RoomParticipants, Optional[ChatRoom]]:
+        """
+        權限檢查：只有參與者可以存取聊天室（參與者快取命中時不查資料庫）
+        
+        Returns:
+            (participants, room)：room 為快取未命中時查到的聊天室（不含關聯），命中時為 None
+        """
+        participants, room = await self._participants(room_id)
+        if not participants.includes(user_id):
+            raise PermissionDeniedError("您沒有權限查看此聊天室")
+        return participants, room
+    
     async def get_room(self, room_id: int, user_id: int) -> ChatRoom:
-        """獲取聊天室詳情（權限檢查）"""
+        """獲取聊天室詳情（權限檢查，包含用戶、收容所與寵物照片）"""
+        participants = await self.participants_cache.get(room_id)
+        if participants is not None and not participants.includes(user_id):
+            raise PermissionDeniedError("您沒有權限查看此聊天室")
+        
         room = await self.chat_repo.get_room_with_relations(room_id)
         if not room:
             raise ChatRoomNotFoundError(f"聊天室 ID {room_id} 不存在")
         
-        # 權限檢查：只有參與者可以查看
-        if room.user_id != user_id and room.shelter_id != user_id:
-            raise PermissionDeniedError("您沒有權限查看此聊天室")
+        if participants is None:
+            await self.participants_cache.set(room_id, RoomParticipants(room.user_id, room.shelter_id))
+            if room.user_id != user_id and room.shelter_id != user_id:
+                raise PermissionDeniedError("您沒有權限查看此聊天室")
         
         return room
     
@@ -82,21 +146,134 @@ class ChatService:
         """獲取收容所的聊天室列表"""
         return await self.chat_repo.get_shelter_rooms(shelter_id, skip, limit)
     
+    async def list_rooms(
+        self,
+        user_id: int,
+        as_shelter: bool,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = 50
+    ) -> Dict[str, Any]:
+        """
+        聊天室列表（含未讀數，游標分頁，limit 為 None 時不分頁；最後訊息摘要存在聊天室上）
+        
+        固定查詢數：聊天室一頁 + 批次載入的關聯 + 未讀數一次。
+        
+        Returns:
+            {"rooms", "unread_counts": {room_id: int}, "next_cursor", "has_more"}
+        """
+        rooms, next_cursor, has_more = await self.chat_repo.get_rooms_page(
+            user_id, as_shelter, cursor, limit
+        )
+        room_ids = [room.id for room in rooms]
+        return {
+            "rooms": rooms,
+            "unread_counts": await self.message_repo.get_unread_counts(room_ids, user_id),
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+    
     async def get_room_messages(
         self,
         room_id: int,
         user_id: int,
-        skip: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
         limit: int = 100
-    ) -> List[ChatMessage]:
-        """獲取聊天室訊息（權限檢查）"""
-        # 驗證權限
-        room = await self.get_room(room_id, user_id)
+    ) -> Tuple[List[ChatMessage], bool]:
+        """獲取聊天室訊息（權限檢查，游標分頁，推進已讀水位），返回 (messages, has_more)"""
+        if before_id is not None and after_id is not None:
+            raise ValidationError("before_id 與 after_id 不能同時指定")
+        
+        await self.mark_room_read(room_id, user_id)
+        return await self.message_repo.get_room_messages(room_id, before_id, after_id, limit)
+    
+    async def get_message_page(
+        self,
+        room_id: int,
+        user_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 100,
+        skip: int = 0
+    ) -> Tuple[ChatRoom, List[ChatMessage], bool]:
+        """
+        聊天紀錄一頁（權限檢查，不推進已讀水位）
+        
+        同時返回聊天室（不含關聯）：訊息的 is_read 依接收方的已讀水位判斷。
+        
+        Returns:
+            (room, messages, has_more)
+        """
+        if before_id is not None and after_id is not None:
+            raise ValidationError("before_id 與 after_id 不能同時指定")
+        
+        _, room = await self._authorize(room_id, user_id)
+        room = room or await self.chat_repo.get_by_id(room_id)
+        if not room:
+            raise ChatRoomNotFoundError(f"聊天室 ID {room_id} 不存在")
         
-        # 標記訊息為已讀
-        await self.message_repo.mark_as_read(room_id, user_id)
+        messages, has_more = await self.message_repo.get_room_messages(
+            room_id, before_id=before_id, after_id=after_id, limit=limit, skip=skip
+        )
+        return room, messages, has_more
+    
+    async def get_resume_rooms(self, room_ids: List[int], user_id: int) -> Dict[int, ChatRoom]:
+        """
+        斷線重連：一次查出要補送的聊天室（含序號計數器與已讀水位）
         
-        return await self.message_repo.get_room_messages(room_id, skip, limit)
+        Returns:
+            {room_id: ChatRoom}，只包含存在且用戶參與的聊天室
+        """
+        rooms = {}
+        for room in await self.chat_repo.get_by_ids(room_ids):
+            await self.participants_cache.set(room.id, RoomParticipants(room.user_id, room.shelter_id))
+            if room.user_id == user_id or room.shelter_id == user_id:
+                rooms[room.id] = room
+        return rooms
+    
+    async def get_messages_after_seq(self, room_id: int, after_seq: int, limit: int = 100) -> List[ChatMessage]:
+        """斷線重連：序號 after_seq 之後的訊息（呼叫端已確認權限）"""
+        return await self.message_repo.get_messages_after_seq(room_id, after_seq, limit)
+    
+    async def verify_participant(self, room_id: int, user_id: int) -> None:
+        """確認用戶是聊天室參與者（使用參與者快取）"""
+        await self._authorize(room_id, user_id)
+    
+    async def mark_room_read(self, room_id: int, user_id: int) -> int:
+        """標記聊天室訊息為已讀（權限檢查，水位前進時推送未讀數歸零），返回聊天室最新訊息 ID"""
+        participants, _ = await self._authorize(room_id, user_id)
+        latest, advanced = await self.chat_repo.mark_room_read(
+            room_id, as_shelter=user_id == participants.shelter_id
+        )
+        if advanced:
+            await self.realtime.send_to_user({
+                "type": "unread.cleared",
+                "counter": "chat",
+                "room_id": room_id
+            }, user_id)
+        return latest
+    
+    async def push_unread(self, messages: List[ChatMessage]) -> None:
+        """新訊息寫入後推送收件者的未讀數變化（同一聊天室合併成一則）"""
+        deltas: Dict[Tuple[int, int], int] = {}
+        for message in messages:
+            try:
+                participants, _ = await self._participants(message.room_id)
+            except ChatRoomNotFoundError:
+                continue
+            recipient = (
+                participants.shelter_id if message.sender_id == participants.user_id
+                else participants.user_id
+            )
+            key = (recipient, message.room_id)
+            deltas[key] = deltas.get(key, 0) + 1
+        for (recipient, room_id), delta in deltas.items():
+            await self.realtime.send_to_user({
+                "type": "unread.delta",
+                "counter": "chat",
+                "room_id": room_id,
+                "delta": delta
+            }, recipient)
     
     async def send_text_message(
         self,
@@ -106,15 +283,36 @@ class ChatService:
     ) -> ChatMessage:
         """發送文字訊息"""
         # 驗證權限
-        room = await self.get_room(room_id, sender_id)
+        await self._authorize(room_id, sender_id)
+        
+        # 創建訊息（同一交易更新聊天室最後訊息摘要）
+        try:
+            message = await self.message_repo.create_text_message(room_id, sender_id, content)
+        except (NoResultFound, StatementError):
+            await self._ensure_rooms_exist([room_id])
+            raise
+        await self.push_unread([message])
+        return message
+    
+    async def send_text_messages(self, items: List[Tuple[int, int, str]]) -> List[ChatMessage]:
+        """
+        批次發送文字訊息（WebSocket 發送的 group commit）
         
-        # 創建訊息
-        message = await self.message_repo.create_text_message(room_id, sender_id, content)
+        不做權限檢查：呼叫端只接受已通過參與者檢查（已訂閱）的聊天室。
+        返回時整批已 commit；不推送未讀數，由呼叫端在寫入成功後呼叫 push_unread，
+        推送失敗不會被當成寫入失敗而重試。
         
-        # 更新聊天室最後訊息時間
-        await self.chat_repo.update_last_message_time(room_id)
+        Args:
+            items: [(room_id, sender_id, content), ...]
         
-        return message
+        Raises:
+            ChatRoomNotFoundError: 聊天室已被刪除
+        """
+        try:
+            return await self.message_repo.create_text_messages(items)
+        except (NoResultFound, StatementError):
+            await self._ensure_rooms_exist(room_id for room_id, _, _ in items)
+            raise
     
     async def send_image_message(
         self,
@@ -125,14 +323,16 @@ class ChatService:
         file_size: int
     ) -> ChatMessage:
         """發送圖片訊息"""
-        room = await self.get_room(room_id, sender_id)
-        
-        message = await self.message_repo.create_image_message(
-            room_id, sender_id, file_url, file_name, file_size
-        )
-        
-        await self.chat_repo.update_last_message_time(room_id)
+        await self._authorize(room_id, sender_id)
         
+        try:
+            message = await self.message_repo.create_image_message(
+                room_id, sender_id, file_url, file_name, file_size
+            )
+        except (NoResultFound, StatementError):
+            await self._ensure_rooms_exist([room_id])
+            raise
+        await self.push_unread([message])
         return message
     
     async def send_file_message(
@@ -144,14 +344,16 @@ class ChatService:
         file_size: int
     ) -> ChatMessage:
         """發送檔案訊息"""
-        room = await self.get_room(room_id, sender_id)
-        
-        message = await self.message_repo.create_file_message(
-            room_id, sender_id, file_url, file_name, file_size
-        )
-        
-        await self.chat_repo.update_last_message_time(room_id)
+        await self._authorize(room_id, sender_id)
         
+        try:
+            message = await self.message_repo.create_file_message(
+                room_id, sender_id, file_url, file_name, file_size
+            )
+        except (NoResultFound, StatementError):
+            await self._ensure_rooms_exist([room_id])
+            raise
+        await self.push_unread([message])
         return message
     
     async def get_unread_count(self, room_id: int, user_id: int) -> int:
@@ -175,4 +377,9 @@ class ChatService:
         if message.sender_id != user_id:
             raise PermissionDeniedError("只能刪除自己的訊息")
         
-        return await self.message_repo.delete(message_id)
+        deleted = await self.message_repo.delete_by_id(message_id)
+        # 刪掉的是最後一則訊息時，重建聊天室摘要
+        room = await self.chat_repo.get_by_id(message.room_id)
+        if deleted and room and room.last_message_id == message_id:
+            await self.chat_repo.refresh_last_message(room.id)
+        return deleted
@@ -2,7 +2,7 @@
 Community Service
 社群功能業務邏輯層（貼文、留言、按讚）
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from math import ceil
 
 from app.repositories.community import (
@@ -158,7 +158,7 @@ class CommunityService:
             is_deleted=False
         )
         
-        created_comment = await self.comment_repo.create(comment)
+        created_comment = await self.comment_repo.create_comment(comment)
         # 重新查詢以獲取關聯數據
         return await self.comment_repo.get_comment_with_relations(created_comment.id)
     
@@ -193,7 +193,7 @@ class CommunityService:
             raise PostNotFoundError(f"貼文 ID {post_id} 不存在")
         
         await self.post_like_repo.like_post(post_id, user_id)
-        like_count = await self.post_like_repo.count_post_likes(post_id)
+        like_count, _ = await self.post_repo.get_counts(post_id)
         
         return {
             "post_id": post_id,
@@ -208,7 +208,8 @@ class CommunityService:
     ) -> Dict[str, Any]:
         """取消按讚貼文"""
         success = await self.post_like_repo.unlike_post(post_id, user_id)
-        like_count = await self.post_like_repo.count_post_likes(post_id)
+        counts = await self.post_repo.get_counts(post_id)
+        like_count = counts[0] if counts else 0
         
         return {
             "post_id": post_id,
@@ -220,8 +221,8 @@ class CommunityService:
     
     async def get_post_stats(self, post_id: int) -> Dict[str, int]:
         """獲取貼文統計資料"""
-        like_count = await self.post_like_repo.count_post_likes(post_id)
-        comment_count = await self.comment_repo.count_post_comments(post_id)
+        counts = await self.post_repo.get_counts(post_id)
+        like_count, comment_count = counts if counts else (0, 0)
         
         return {
             "likes": like_count,
@@ -232,6 +233,12 @@ class CommunityService:
         """檢查用戶是否已按讚貼文"""
         return await self.post_like_repo.is_liked_by_user(post_id, user_id)
     
+    async def get_liked_post_ids(self, user_id: Optional[int], post_ids: List[int]) -> Set[int]:
+        """一頁貼文中用戶按讚過的貼文 ID（未登入為空集合）"""
+        if not user_id:
+            return set()
+        return await self.post_like_repo.get_liked_post_ids(user_id, post_ids)
+    
     async def get_user_stats(self, user_id: int) -> Dict[str, int]:
         """獲取用戶在社群的統計"""
         post_count = await self.post_repo.count_user_posts(user_id)
@@ -15,6 +15,7 @@ from app.repositories import (
     CommentRepository,
     PostLikeRepository,
     PhotoRepository,
+    FileRepository,
 )
 
 # Import service classes
@@ -23,6 +24,7 @@ from app.services.pet_service import PetService
 from app.services.notification_service import NotificationService
 from app.services.chat_service import ChatService
 from app.services.community_service import CommunityService
+from app.services.file_service import FileService
 
 
 class AdoptionServiceFactory:
@@ -95,3 +97,13 @@ class CommunityServiceFactory:
             post_like_repo=post_like_repo,
             photo_repo=photo_repo
         )
+
+
+class FileServiceFactory:
+    """檔案目錄 Service 工廠"""
+    
+    @staticmethod
+    def create(db: AsyncSession) -> FileService:
+        file_repo = FileRepository(db)
+        
+        return FileService(file_repo=file_repo)
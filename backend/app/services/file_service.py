@@ -0,0 +1,194 @@
+"""
+File Service
+檔案目錄業務邏輯層：以內容 SHA-256 去重
+
+- 上傳前先計算 hash（讀本地暫存檔），同一分類的目錄已有相同內容時直接沿用，不再 PUT
+- 物件 key 由分類與 hash 決定（pet_photo/<sha256>/original-webp.jpg 或 document/<sha256>.pdf）
+- 上傳只登記到目錄，不算引用；建立引用物件的資料列（pet_photos）時取得引用，刪除時釋放
+- 最後一個引用釋放時刪除物件（含圖片衍生版本）與目錄記錄
+- 上傳後超過寬限期仍未被引用的檔案由 sweep_unreferenced 清理（見 FileOrphanSweeper）
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import UploadFile
+from sqlalchemy.exc import IntegrityError
+
+from app.exceptions import ValidationError
+from app.models.file import File, FileType
+from app.repositories import FileRepository
+from app.services.image_pipeline import ImagePipeline, image_pipeline
+from app.services.storage import AsyncStorageService, storage
+from app.utils.image_processor import IMAGE_VARIANTS, has_variants, variant_key
+
+
+def _file_type(mime_type: str) -> FileType:
+    """MIME type 對應的檔案類型"""
+    if mime_type.startswith("image/"):
+        return FileType.IMAGE
+    if mime_type.startswith("video/"):
+        return FileType.VIDEO
+    if mime_type.startswith("application/"):
+        return FileType.DOCUMENT
+    return FileType.OTHER
+
+
+class FileService:
+    """檔案目錄業務邏輯"""
+
+    def __init__(
+        self,
+        file_repo: FileRepository,
+        storage: AsyncStorageService = storage,
+        pipeline: ImagePipeline = image_pipeline
+    ):
+        self.file_repo = file_repo
+        self.storage = storage
+        self.pipeline = pipeline
+        # 同一請求中的多檔上傳會並行呼叫，共用的 AsyncSession 一次只能給一個協程使用
+        self._db_lock = asyncio.Lock()
+
+    async def store_upload(
+        self,
+        upload: UploadFile,
+        category: str,
+        uploaded_by: Optional[int],
+        max_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        上傳檔案（相同內容只存一份）
+
+        Returns:
+            與 ImagePipeline.upload 相同的結果，加上 "content_hash" 與 "deduplicated"
+            （上傳本身不取得引用，見 reference_files）
+
+        Raises:
+            FileTooLargeError: 超過 max_size
+        """
+        content_hash, file_size = await self.storage.hash_upload(upload, max_size)
+
+        async with self._db_lock:
+            entry = await self.file_repo.get_by_hash(content_hash, category)
+            if entry is not None and entry.ref_count <= 0:
+                # 尚未被引用的檔案重新計算寬限期，避免在連結前被清理；已被清理時重新上傳
+                if not await self.file_repo.touch_unreferenced(entry.id):
+                    entry = None
+                await self.file_repo.db.commit()
+        if entry is not None:
+            print(f"      ♻️ 內容已存在，略過上傳: {entry.stored_filename}")
+            return await self._describe(entry, content_hash)
+
+        result = await self.pipeline.upload(upload, category, max_size, object_id=content_hash)
+
+        async with self._db_lock:
+            entry = await self.file_repo.get_by_hash(content_hash, category)
+            if entry is None:
+                try:
+                    entry = await self.file_repo.create(File(
+                        original_filename=upload.filename or "file",
+                        stored_filename=result["file_key"],
+                        file_path=result["file_key"],
+                        file_url=None if self.storage.backend.use_s3 else result["file_url"],
+                        file_size=file_size,
+                        mime_type=result["content_type"],
+                        file_type=_file_type(result["content_type"]),
+                        category=category,
+                        content_hash=content_hash,
+                        ref_count=0,
+                        uploaded_by=uploaded_by,
+                    ))
+                    result.update(content_hash=content_hash, deduplicated=False)
+                    return result
+                except IntegrityError:
+                    # 其他行程同時上傳了相同內容
+                    await self.file_repo.db.rollback()
+                    entry = await self.file_repo.get_by_hash(content_hash, category)
+
+        # 並行上傳了相同內容：沿用目錄中的物件，不同 key 的這份是多餘的
+        if entry.stored_filename != result["file_key"]:
+            await self._delete_objects(result["file_key"])
+        return await self._describe(entry, content_hash)
+
+    async def reference_files(self, file_keys: List[str]) -> None:
+        """
+        為即將建立的資料列取得檔案引用（每一列一次；不 commit，與資料列一起 commit）
+
+        Raises:
+            ValidationError: 有 key 不在檔案目錄中（不是透過上傳 API 取得的 key）
+        """
+        async with self._db_lock:
+            missing = await self.file_repo.add_references(file_keys)
+        if missing:
+            raise ValidationError(f"Unknown file key: {', '.join(missing)}")
+
+    async def release_files(self, file_keys: Iterable[str]) -> List[str]:
+        """
+        釋放檔案引用（不 commit，與刪除引用的資料列一起 commit）
+
+        Returns:
+            引用次數歸零、已從目錄移除的檔案 key；呼叫端 commit 後以 delete_objects 刪除物件
+        """
+        async with self._db_lock:
+            return await self.file_repo.release_references(file_keys)
+
+    async def delete_objects(self, file_keys: List[str]) -> int:
+        """
+        刪除已從目錄移除的物件（含圖片衍生版本；失敗只記錄，目錄記錄已不存在）
+
+        Returns:
+            刪除的檔案數
+        """
+        deleted = 0
+        for file_key in file_keys:
+            try:
+                await self._delete_objects(file_key)
+                deleted += 1
+            except Exception as e:
+                print(f"⚠️ 刪除無引用的檔案失敗 {file_key}: {str(e)}")
+        if deleted:
+            print(f"🗑️ 已刪除 {deleted} 個無引用的檔案")
+        return deleted
+
+    async def sweep_unreferenced(self, older_than: datetime, batch_size: int) -> int:
+        """
+        清理一批 older_than 之前上傳後一直沒有被引用的檔案（目錄記錄先 commit 刪除，再刪除物件）
+
+        Returns:
+            這一批刪除的檔案數（小於 batch_size 表示已清理完）
+        """
+        async with self._db_lock:
+            orphaned = await self.file_repo.delete_unreferenced_before(older_than, batch_size)
+            await self.file_repo.db.commit()
+        await self.delete_objects(orphaned)
+        return len(orphaned)
+
+    async def _describe(self, entry: File, content_hash: str) -> Dict[str, Any]:
+        """目錄中既有檔案的上傳結果"""
+        file_key = entry.stored_filename
+        variants = {}
+        if has_variants(file_key):
+            for name in IMAGE_VARIANTS:
+                key = variant_key(file_key, name)
+                variants[name] = {
+                    "file_key": key,
+                    "file_url": await self.storage.object_url(key),
+                    "width": None,
+                    "height": None,
+                }
+        return {
+            "file_url": await self.storage.object_url(file_key),
+            "file_key": file_key,
+            "file_size": entry.file_size,
+            "content_type": entry.mime_type,
+            "variants": variants,
+            "content_hash": content_hash,
+            "deduplicated": True,
+        }
+
+    async def _delete_objects(self, file_key: str) -> None:
+        """刪除物件與其衍生版本"""
+        await self.storage.delete_file(file_key)
+        if has_variants(file_key):
+            for name in IMAGE_VARIANTS:
+                await self.storage.delete_file(variant_key(file_key, name))
@@ -0,0 +1,110 @@
+"""
+File Orphan Sweeper
+無引用檔案的清理（背景排程）
+
+- 上傳只登記到檔案目錄（ref_count=0），一直沒有被連結的檔案不會經過 release_files
+- 每 FILE_ORPHAN_SWEEP_INTERVAL_SECONDS 秒清理一輪：刪除 FILE_ORPHAN_GRACE_HOURS 小時前上傳
+  （或最後一次去重命中）後仍未被引用的目錄記錄，commit 後刪除物件與圖片衍生版本
+- 每批 FILE_ORPHAN_SWEEP_BATCH_SIZE 筆，刪到不足一批為止
+- FILE_ORPHAN_SWEEP_LOCK：每輪先取得 Redis 租約，多個 worker 同時啟用時只有持有者執行
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.database import get_session_factory
+from app.services.factories import FileServiceFactory
+from app.services.notification_retention import RetentionLease
+
+
+class FileOrphanSweeper:
+    """定期刪除超過寬限期仍未被引用的檔案"""
+
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        grace_hours: float = settings.FILE_ORPHAN_GRACE_HOURS,
+        interval: float = settings.FILE_ORPHAN_SWEEP_INTERVAL_SECONDS,
+        batch_size: int = settings.FILE_ORPHAN_SWEEP_BATCH_SIZE,
+        lease: Optional[RetentionLease] = None
+    ):
+        self.session_factory = session_factory or get_session_factory()
+        self.grace = timedelta(hours=grace_hours)
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.lease = lease
+        self._runner: Optional[asyncio.Task] = None
+        # 指標：輪數、因租約略過的輪數與累計刪除的檔案數
+        self.runs = 0
+        self.skipped_runs = 0
+        self.files_deleted_total = 0
+
+    async def run_once(self) -> int:
+        """清理一輪，返回刪除的檔案數"""
+        cutoff = datetime.utcnow() - self.grace
+        deleted = 0
+        async with self.session_factory() as db:
+            service = FileServiceFactory.create(db)
+            while True:
+                swept = await service.sweep_unreferenced(cutoff, self.batch_size)
+                deleted += swept
+                if swept < self.batch_size:
+                    break
+        self.runs += 1
+        self.files_deleted_total += deleted
+        print(f"🧹 File orphan sweep: deleted {deleted} unreferenced files")
+        return deleted
+
+    async def run_if_leader(self) -> Optional[int]:
+        """取得租約後清理一輪；租約由其他 worker 持有時略過並返回 None"""
+        if self.lease is not None and not await self.lease.acquire():
+            self.skipped_runs += 1
+            return None
+        return await self.run_once()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_if_leader()
+            except Exception as e:
+                print(f"❌ File orphan sweep failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """啟動背景排程（應用程式啟動時呼叫）"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止背景排程（應用程式關閉時呼叫）"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self.lease is not None:
+            await self.lease.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """清理指標"""
+        return {
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "files_deleted_total": self.files_deleted_total,
+            "grace_hours": self.grace.total_seconds() / 3600,
+        }
+
+
+# 全局清理排程
+file_orphan_sweeper = FileOrphanSweeper(
+    lease=RetentionLease(
+        settings.REDIS_URL,
+        ttl=settings.FILE_ORPHAN_SWEEP_INTERVAL_SECONDS * 2,
+        key="files:orphan-sweep:lease"
+    ) if settings.FILE_ORPHAN_SWEEP_LOCK else None
+)
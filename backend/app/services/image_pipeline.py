@@ -0,0 +1,192 @@
+"""
+Image pipeline
+上傳圖片時產生 thumbnail / card / large 衍生版本：
+Pillow 解碼與縮圖是 CPU 密集工作，放在行程池中執行（不佔用 event loop，也不受 GIL 限制），
+原圖（去除 EXIF 後）與衍生版本再透過 AsyncStorageService 的執行緒池並行寫入同一個目錄。
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+from PIL import Image
+
+from app.core.config import settings
+from app.exceptions import FileTooLargeError
+from app.services.storage import AsyncStorageService, storage
+from app.utils.file_validator import SNIFF_BYTES, sniff_content_type
+from app.utils.image_processor import (
+    IMAGE_VARIANTS,
+    ORIGINAL_NAME,
+    PROCESSABLE_TYPES,
+    original_key,
+    render_variants,
+    variant_key,
+)
+
+_ORIGINAL_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+
+class ImagePipeline:
+    """上傳圖片並產生衍生版本（非圖片或無法解碼時只上傳原檔）"""
+
+    def __init__(
+        self,
+        storage: AsyncStorageService,
+        max_workers: int = settings.IMAGE_PROCESS_WORKERS,
+        timeout: Optional[float] = settings.IMAGE_PROCESS_TIMEOUT
+    ):
+        self.storage = storage
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn：避免在有執行緒池與 event loop 的行程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def render(self, data: bytes) -> Optional[Dict[str, dict]]:
+        """
+        在行程池中產生衍生版本
+
+        Returns:
+            {variant: {"data", "content_type", "width", "height"}}；無法處理時返回 None
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.executor,
+            partial(
+                render_variants,
+                data,
+                IMAGE_VARIANTS,
+                settings.IMAGE_VARIANT_FORMAT,
+                settings.IMAGE_VARIANT_QUALITY
+            )
+        )
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ 圖片處理逾時 ({self.timeout}s)，只保留原圖")
+        except BrokenProcessPool:
+            print("⚠️ 圖片處理行程異常結束，重建行程池")
+            self.shutdown(wait=False)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"⚠️ 無法產生圖片衍生版本: {e}")
+        return None
+
+    async def upload(
+        self,
+        upload: UploadFile,
+        category: str,
+        max_size: Optional[int] = None,
+        object_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        上傳檔案；可處理的圖片會一併產生並上傳衍生版本
+        
+        object_id 用來產生物件 key（內容 hash），未指定時為隨機 uuid
+
+        Returns:
+            {"file_url", "file_key", "file_size", "content_type"}（同 storage.upload_stream），加上 "variants":
+            {variant: {"file_key", "file_url", "width", "height"}}（沒有衍生版本時為空 dict）
+
+        Raises:
+            FileTooLargeError: 超過 max_size
+        """
+        if max_size is not None and upload.size is not None and upload.size > max_size:
+            raise FileTooLargeError(f"檔案超過大小上限（{max_size} bytes）")
+
+        await upload.seek(0)
+        head = await upload.read(SNIFF_BYTES)
+        content_type = sniff_content_type(head)
+        if content_type not in PROCESSABLE_TYPES:
+            return await self._upload_original(upload, category, max_size, object_id)
+
+        # 圖片需要完整內容才能解碼（大小已受 max_size 限制）
+        data = head + await upload.read(-1 if max_size is None else max_size + 1 - len(head))
+        if max_size is not None and len(data) > max_size:
+            raise FileTooLargeError(f"檔案超過大小上限（{max_size} bytes）")
+
+        rendered = await self.render(data)
+        if not rendered:
+            return await self._upload_original(upload, category, max_size, object_id)
+
+        # 原圖（已去除 EXIF）與衍生版本並行寫入同一目錄；任何一個失敗就清掉已寫入的部分
+        # 原圖 key 記錄衍生版本格式，之後調整 IMAGE_VARIANT_FORMAT 不影響既有圖片
+        original = rendered.pop(ORIGINAL_NAME)
+        file_key = original_key(
+            category, _ORIGINAL_EXTENSIONS[content_type], settings.IMAGE_VARIANT_FORMAT, object_id
+        )
+        variant_keys = {name: variant_key(file_key, name) for name in rendered}
+        outcomes = await asyncio.gather(
+            self.storage.store_object(file_key, original["data"], original["content_type"]),
+            *(
+                self.storage.store_object(variant_keys[name], variant["data"], variant["content_type"])
+                for name, variant in rendered.items()
+            ),
+            return_exceptions=True
+        )
+
+        written = [file_key] + [variant_keys[name] for name in rendered]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            for key, outcome in zip(written, outcomes):
+                if not isinstance(outcome, BaseException):
+                    await self.storage.delete_file(key)
+            raise errors[0]
+
+        result = {
+            "file_url": outcomes[0],
+            "file_key": file_key,
+            "file_size": len(original["data"]),
+            "content_type": original["content_type"],
+        }
+        result["variants"] = {
+            name: {
+                "file_key": variant_keys[name],
+                "file_url": url,
+                "width": variant["width"],
+                "height": variant["height"],
+            }
+            for (name, variant), url in zip(rendered.items(), outcomes[1:])
+        }
+        print(f"      🖼️ 已產生衍生版本: {', '.join(result['variants'])}")
+        return result
+
+    async def _upload_original(
+        self,
+        upload: UploadFile,
+        category: str,
+        max_size: Optional[int],
+        object_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """只上傳原檔（沒有衍生版本）"""
+        file_key = None
+        if object_id:
+            file_key = self.storage.backend.generate_s3_key(category, upload.filename or "file", object_id)
+        result = await self.storage.upload_stream(upload, category, max_size=max_size, file_key=file_key)
+        result["variants"] = {}
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """關閉行程池（應用程式關閉時呼叫）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+# Global image pipeline instance
+image_pipeline = ImagePipeline(storage)
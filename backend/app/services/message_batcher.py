@@ -0,0 +1,138 @@
+"""
+Chat Message Batcher
+WebSocket 發送訊息的批次寫入（group commit）
+
+- 收集 CHAT_SEND_BATCH_WINDOW_MS 內各聊天室送出的訊息，一個交易寫入、一次 commit
+- 每批最多 CHAT_SEND_BATCH_MAX_SIZE 則；最多 CHAT_SEND_MAX_INFLIGHT_BATCHES 批同時寫入，
+  某一批 commit 較慢時，後面的批次照常寫入與回覆
+- 每則訊息的 future 在所屬批次 commit 後完成，呼叫端再回覆 ack 與廣播
+- 整批寫入失敗（未 commit）時逐則重試，避免單一訊息（例如聊天室已刪除）拖累同批的其他訊息
+- commit 之後才推送收件者的未讀數；推送失敗只記錄，不重試寫入（避免重複寫入訊息）
+- 沒有待寫入的訊息時背景 task 會結束，下一則訊息進來時再啟動
+"""
+import asyncio
+from typing import List, Optional, Set
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.database import get_session_factory
+from app.models.chat_message import ChatMessage
+from app.services.factories import ChatServiceFactory
+
+
+class PendingMessage:
+    """等待寫入的訊息"""
+
+    def __init__(self, room_id: int, sender_id: int, content: str):
+        self.room_id = room_id
+        self.sender_id = sender_id
+        self.content = content
+        self.future: "asyncio.Future[ChatMessage]" = asyncio.get_running_loop().create_future()
+
+
+class MessageBatcher:
+    """以時間窗批次寫入聊天訊息"""
+
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        window_ms: int = settings.CHAT_SEND_BATCH_WINDOW_MS,
+        max_batch_size: int = settings.CHAT_SEND_BATCH_MAX_SIZE,
+        max_inflight: int = settings.CHAT_SEND_MAX_INFLIGHT_BATCHES
+    ):
+        self.session_factory = session_factory or get_session_factory()
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_inflight = max(1, max_inflight)
+        self._pending: List[PendingMessage] = []
+        self._runner: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        # 已 commit 的批次數（觀察批次效果用）
+        self.flushed_batches = 0
+
+    def submit(self, room_id: int, sender_id: int, content: str) -> "asyncio.Future[ChatMessage]":
+        """
+        加入待寫入的文字訊息
+
+        Returns:
+            所屬批次 commit 後完成的 future（結果為已寫入的訊息）
+        """
+        pending = PendingMessage(room_id, sender_id, content)
+        self._pending.append(pending)
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        return pending.future
+
+    async def _run(self) -> None:
+        while self._pending:
+            # 時間窗內的訊息併入同一批
+            await asyncio.sleep(self.window)
+            while self._pending:
+                if len(self._inflight) >= self.max_inflight:
+                    await asyncio.wait(self._inflight, return_when=asyncio.FIRST_COMPLETED)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+                task = asyncio.create_task(self._flush(batch))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                if len(self._pending) < self.max_batch_size:
+                    break
+
+    async def _flush(self, batch: List[PendingMessage]) -> None:
+        try:
+            messages = await self._write(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"❌ Failed to save chat message in room {batch[0].room_id}: {e}")
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+                return
+            print(f"⚠️ Chat message batch of {len(batch)} failed ({e}), retrying one by one")
+            for pending in batch:
+                await self._flush([pending])
+            return
+
+        for pending, message in zip(batch, messages):
+            if not pending.future.done():
+                pending.future.set_result(message)
+        await self._push_unread(messages)
+
+    async def _write(self, batch: List[PendingMessage]) -> List[ChatMessage]:
+        """寫入一批訊息；拋出例外時整批都沒有 commit"""
+        async with self.session_factory() as db:
+            service = ChatServiceFactory.create(db)
+            try:
+                messages = await service.send_text_messages(
+                    [(pending.room_id, pending.sender_id, pending.content) for pending in batch]
+                )
+            except Exception:
+                await db.rollback()
+                raise
+        self.flushed_batches += 1
+        return messages
+
+    async def _push_unread(self, messages: List[ChatMessage]) -> None:
+        """推送已寫入訊息的未讀數變化（失敗只記錄，訊息已 commit）"""
+        try:
+            async with self.session_factory() as db:
+                await ChatServiceFactory.create(db).push_unread(messages)
+        except Exception as e:
+            print(f"⚠️ Failed to push unread counts for {len(messages)} chat messages: {e}")
+
+    async def stop(self) -> None:
+        """寫完所有待寫入的訊息（應用程式關閉時呼叫）"""
+        if self._runner is not None:
+            await self._runner
+            self._runner = None
+        if self._inflight:
+            await asyncio.wait(self._inflight)
+
+
+# 全局批次寫入器
+message_batcher = MessageBatcher()
+
+
+def get_message_batcher() -> MessageBatcher:
+    """Dependency to get the chat message batcher"""
+    return message_batcher
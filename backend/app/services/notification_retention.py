@@ -0,0 +1,262 @@
+"""
+Notification Retention Worker
+已讀通知的保留期限清理（背景排程）
+
+- 每 NOTIFICATION_RETENTION_INTERVAL_SECONDS 秒清理一輪，範圍是所有用戶
+- 依主鍵範圍分批：每批只掃描 NOTIFICATION_RETENTION_BATCH_SIZE 筆、各自 commit，
+  批次間暫停 NOTIFICATION_RETENTION_BATCH_PAUSE_MS，不會長時間持有鎖
+- 每輪最多 NOTIFICATION_RETENTION_MAX_BATCHES 批，下一輪（或失敗後）由最後掃描的 id 接續，
+  掃到最後一筆才從頭開始下一趟
+- NOTIFICATION_RETENTION_LOCK：每輪先取得 Redis 租約（SET NX EX），多個 worker 同時啟用時只有持有者執行
+- 保留天數可依 NotificationType 設定（NOTIFICATION_RETENTION_POLICIES），0 表示永久保留
+- 每輪記錄刪除數量、批次數與耗時（stats()），並輸出到日誌
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.database import get_session_factory
+from app.models.notification import NotificationType
+from app.services.factories import NotificationServiceFactory
+
+
+def parse_retention_policies(spec: str) -> Dict[NotificationType, int]:
+    """
+    解析保留天數設定，例如 "post_like:7,application_status:365"
+
+    Raises:
+        ValueError: 未知的通知類型或天數格式錯誤
+    """
+    policies: Dict[NotificationType, int] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, days = item.partition(":")
+        try:
+            notification_type = NotificationType(name.strip().lower())
+        except ValueError:
+            raise ValueError(f"Unknown notification type in retention policy: {name!r}")
+        if not days.strip().isdigit():
+            raise ValueError(f"Retention days must be a non-negative integer: {item!r}")
+        policies[notification_type] = int(days)
+    return policies
+
+
+class RetentionRun(NamedTuple):
+    """一輪清理的結果"""
+    rows_purged: int
+    batches: int
+    duration_ms: float
+    finished_at: datetime
+    # 本輪由哪個 id 之後開始掃描
+    resumed_after_id: int
+
+
+class RetentionLease:
+    """單一執行者租約：以 Redis SET NX EX 確保同一時間只有一個 worker 執行清理"""
+
+    def __init__(self, redis_url: str, ttl: float, key: str = "notification:retention:lease"):
+        self.redis_url = redis_url
+        self.ttl = max(1, int(ttl))
+        self.key = key
+        self.token = uuid.uuid4().hex
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(self.redis_url, decode_responses=True, socket_connect_timeout=2)
+        return self._client
+
+    async def acquire(self) -> bool:
+        """取得或續約租約；被其他 worker 持有或 Redis 無法連線時返回 False"""
+        try:
+            if await self.client.set(self.key, self.token, nx=True, ex=self.ttl):
+                return True
+            if await self.client.get(self.key) == self.token:
+                return bool(await self.client.expire(self.key, self.ttl))
+            return False
+        except Exception as e:
+            print(f"⚠️ Notification retention: Redis unavailable ({e}), skipping this round")
+            return False
+
+    async def release(self) -> None:
+        """釋放自己持有的租約，讓其他 worker 可以立即接手"""
+        if self._client is None:
+            return
+        try:
+            if await self._client.get(self.key) == self.token:
+                await self._client.delete(self.key)
+        except Exception:
+            pass
+        await self._client.aclose()
+        self._client = None
+
+
+class NotificationRetentionWorker:
+    """定期刪除過期的已讀通知"""
+
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        default_days: int = settings.NOTIFICATION_RETENTION_DAYS,
+        policies: Optional[Dict[NotificationType, int]] = None,
+        interval: float = settings.NOTIFICATION_RETENTION_INTERVAL_SECONDS,
+        batch_size: int = settings.NOTIFICATION_RETENTION_BATCH_SIZE,
+        batch_pause_ms: int = settings.NOTIFICATION_RETENTION_BATCH_PAUSE_MS,
+        max_batches: int = settings.NOTIFICATION_RETENTION_MAX_BATCHES,
+        lease: Optional[RetentionLease] = None
+    ):
+        self.session_factory = session_factory or get_session_factory()
+        self.default_days = default_days
+        self.policies = (
+            policies if policies is not None
+            else parse_retention_policies(settings.NOTIFICATION_RETENTION_POLICIES)
+        )
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause_ms / 1000
+        self.max_batches = max(1, max_batches)
+        self.lease = lease
+        self._runner: Optional[asyncio.Task] = None
+        # 下一輪由這個 id 之後接續掃描（0 表示從頭開始）
+        self.resume_after_id = 0
+        # 指標：累計刪除數量、輪數、因租約略過的輪數與最近一輪的結果
+        self.runs = 0
+        self.skipped_runs = 0
+        self.rows_purged_total = 0
+        self.last_run: Optional[RetentionRun] = None
+
+    def retention_days(self, notification_type: Optional[NotificationType]) -> int:
+        """通知類型的保留天數（0 表示永久保留）"""
+        if notification_type is None:
+            return self.default_days
+        return self.policies.get(notification_type, self.default_days)
+
+    def cutoffs(self, now: datetime) -> List[Tuple[datetime, List[Optional[NotificationType]]]]:
+        """依保留天數分組的刪除期限：[(期限, 通知類型)]，永久保留的類型不列入"""
+        groups: Dict[int, List[Optional[NotificationType]]] = {}
+        for notification_type in [*NotificationType, None]:
+            days = self.retention_days(notification_type)
+            if days > 0:
+                groups.setdefault(days, []).append(notification_type)
+        return [(now - timedelta(days=days), types) for days, types in sorted(groups.items())]
+
+    async def run_once(self) -> RetentionRun:
+        """
+        清理一輪：由上一輪最後掃描的 id 接續，最多 max_batches 批
+
+        每批 commit 後即記錄進度，中途失敗的下一輪由最後完成的批次接續；
+        掃到最後一筆時進度歸零，下一輪從頭開始新的一趟
+        """
+        started = time.perf_counter()
+        cutoffs = self.cutoffs(datetime.utcnow())
+        resumed_after_id = self.resume_after_id
+        rows_purged = 0
+        batches = 0
+
+        if cutoffs:
+            async with self.session_factory() as db:
+                service = NotificationServiceFactory.create(db)
+                while batches < self.max_batches:
+                    try:
+                        upto_id, deleted = await service.purge_read_batch(
+                            self.resume_after_id, self.batch_size, cutoffs
+                        )
+                    except Exception:
+                        await db.rollback()
+                        raise
+                    if upto_id is None:
+                        self.resume_after_id = 0
+                        break
+                    self.resume_after_id = upto_id
+                    rows_purged += deleted
+                    batches += 1
+                    if self.batch_pause:
+                        await asyncio.sleep(self.batch_pause)
+
+        run = RetentionRun(
+            rows_purged=rows_purged,
+            batches=batches,
+            duration_ms=(time.perf_counter() - started) * 1000,
+            finished_at=datetime.utcnow(),
+            resumed_after_id=resumed_after_id
+        )
+        self.runs += 1
+        self.rows_purged_total += rows_purged
+        self.last_run = run
+        print(f"🧹 Notification retention: purged {run.rows_purged} read notifications "
+              f"in {run.batches} batches after id {run.resumed_after_id} ({run.duration_ms:.0f} ms)")
+        return run
+
+    async def run_if_leader(self) -> Optional[RetentionRun]:
+        """取得租約後清理一輪；租約由其他 worker 持有時略過並返回 None"""
+        if self.lease is not None and not await self.lease.acquire():
+            self.skipped_runs += 1
+            return None
+        return await self.run_once()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_if_leader()
+            except Exception as e:
+                print(f"❌ Notification retention failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """啟動背景排程（應用程式啟動時呼叫）"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止背景排程（應用程式關閉時呼叫）"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self.lease is not None:
+            await self.lease.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """清理指標"""
+        last = self.last_run
+        return {
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "rows_purged_total": self.rows_purged_total,
+            "resume_after_id": self.resume_after_id,
+            "last_run": None if last is None else {
+                "rows_purged": last.rows_purged,
+                "batches": last.batches,
+                "resumed_after_id": last.resumed_after_id,
+                "duration_ms": round(last.duration_ms, 1),
+                "finished_at": last.finished_at.isoformat()
+            },
+            "policies": {
+                "default_days": self.default_days,
+                **{t.value: days for t, days in self.policies.items()}
+            }
+        }
+
+
+# 全局清理排程
+notification_retention = NotificationRetentionWorker(
+    lease=RetentionLease(
+        settings.REDIS_URL,
+        # 租約涵蓋兩個間隔：持有者每輪續約，失效後其他 worker 最遲兩個間隔內接手
+        ttl=settings.NOTIFICATION_RETENTION_INTERVAL_SECONDS * 2
+    ) if settings.NOTIFICATION_RETENTION_LOCK else None
+)
+
+
+def get_notification_retention() -> NotificationRetentionWorker:
+    """Dependency to get the notification retention worker"""
+    return notification_retention
@@ -1,20 +1,46 @@
 """
 Notification Service
 通知業務邏輯層
+
+通知與未讀數的變化會即時推送到用戶的 WebSocket（/api/v2/chat/ws），客戶端不必輪詢：
+- {"type": "notification.created", "notification": {...}}：新通知（未讀數 +1）；
+  批次通知在不支援 INSERT ... RETURNING 的資料庫（MySQL）上 notification 為 null，客戶端重新載入列表
+- {"type": "notification.updated", "notification": {...}}：事件合併到既有的未讀通知（未讀數不變）
+- {"type": "unread.delta", "counter": "notifications", "delta": -1}：單則已讀或刪除未讀通知
+- {"type": "unread.cleared", "counter": "notifications"}：全部已讀
 """
-from typing import Optional, List
-from datetime import datetime
+from typing import Any, Dict, Optional, List, Tuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
 
 from app.repositories import NotificationRepository
-from app.models.notification import Notification, NotificationType
+from app.models.notification import Notification, NotificationActor, NotificationType
+from app.schemas.notification import NotificationResponse
+from app.services.realtime import ConnectionManager, manager as realtime_manager
+from app.core.config import settings
 from app.exceptions import NotificationNotFoundError, PermissionDeniedError
 
 
 class NotificationService:
     """通知業務邏輯"""
     
-    def __init__(self, notification_repo: NotificationRepository):
+    def __init__(
+        self,
+        notification_repo: NotificationRepository,
+        realtime: ConnectionManager = realtime_manager
+    ):
         self.notification_repo = notification_repo
+        self.realtime = realtime
+        # notify_users(commit=False) 寫入後待推送的事件，呼叫端 commit 後以 publish_pending() 送出
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+    
+    async def _push_unread_delta(self, user_id: int, delta: int) -> None:
+        await self.realtime.send_to_user({
+            "type": "unread.delta",
+            "counter": "notifications",
+            "delta": delta
+        }, user_id)
     
     async def get_user_notifications(
         self,
@@ -45,11 +71,21 @@ class NotificationService:
         if notification.user_id != user_id:
             raise PermissionDeniedError("只能標記自己的通知")
         
-        return await self.notification_repo.mark_as_read(notification_id, user_id)
+        was_unread = not notification.is_read
+        marked = await self.notification_repo.mark_as_read(notification_id, user_id)
+        if marked and was_unread:
+            await self._push_unread_delta(user_id, -1)
+        return marked
     
     async def mark_all_as_read(self, user_id: int) -> int:
         """標記所有通知為已讀"""
-        return await self.notification_repo.mark_all_as_read(user_id)
+        count = await self.notification_repo.mark_all_as_read(user_id)
+        if count:
+            await self.realtime.send_to_user({
+                "type": "unread.cleared",
+                "counter": "notifications"
+            }, user_id)
+        return count
     
     async def create_notification(
         self,
@@ -59,14 +95,123 @@ class NotificationService:
         notification_type: NotificationType,
         link: Optional[str] = None
     ) -> Notification:
-        """創建新通知"""
-        return await self.notification_repo.create_notification(
+        """創建新通知（commit 後推送給用戶）"""
+        notification = await self.notification_repo.create_notification(
             user_id=user_id,
             title=title,
             message=message,
             notification_type=notification_type,
             link=link
         )
+        await self.realtime.send_to_user({
+            "type": "notification.created",
+            "notification": NotificationResponse.model_validate(notification).model_dump(mode="json")
+        }, user_id)
+        return notification
+    
+    async def notify_coalesced(
+        self,
+        user_id: int,
+        notification_type: NotificationType,
+        link: str,
+        title: str,
+        action: str,
+        actor_id: int,
+        actor_name: str
+    ) -> Notification:
+        """
+        高頻事件的合併通知：合併鍵為 type + link
+        
+        時間窗（NOTIFICATION_COALESCE_WINDOW_HOURS）內已有同鍵的未讀通知時，
+        更新該筆的計數與最後觸發者（「A 和其他 37 人按讚了您的貼文」），不新增一列；
+        已讀或超過時間窗則建立新通知。
+        
+        Args:
+            action: 動作描述，例如「按讚了您的貼文」
+        """
+        aggregation_key = f"{notification_type.value}:{link}"
+        since = datetime.utcnow() - timedelta(hours=settings.NOTIFICATION_COALESCE_WINDOW_HOURS)
+        notification = await self.notification_repo.get_coalescible(user_id, aggregation_key, since)
+        
+        if notification is None:
+            notification = await self.notification_repo.create(Notification(
+                user_id=user_id,
+                title=title,
+                message=f"{actor_name} {action}",
+                notification_type=notification_type,
+                link=link,
+                aggregation_key=aggregation_key,
+                actor_count=1,
+                last_actor_id=actor_id,
+                last_actor_name=actor_name,
+                is_read=False,
+                actors=[NotificationActor(actor_id=actor_id)]
+            ))
+            event_type = "notification.created"
+        else:
+            # 計數只算不同的人：同一人重複觸發（例如取消後再按讚、多次留言）只更新時間
+            if await self.notification_repo.add_actor(notification.id, actor_id):
+                notification.actor_count += 1
+            notification.last_actor_id = actor_id
+            notification.last_actor_name = actor_name
+            notification.message = (
+                f"{actor_name} 和其他 {notification.actor_count - 1} 人{action}"
+                if notification.actor_count > 1 else f"{actor_name} {action}"
+            )
+            notification.created_at = func.now()
+            notification = await self.notification_repo.update(notification)
+            event_type = "notification.updated"
+        
+        await self.realtime.send_to_user({
+            "type": event_type,
+            "notification": NotificationResponse.model_validate(notification).model_dump(mode="json")
+        }, user_id)
+        return notification
+    
+    async def notify_users(
+        self,
+        user_ids: List[int],
+        title: str,
+        message: str,
+        notification_type: NotificationType,
+        link: Optional[str] = None,
+        commit: bool = True
+    ) -> int:
+        """
+        通知多位用戶：一個多列 INSERT，而不是每人一次 INSERT + commit
+        
+        commit=False 時通知寫入呼叫端的交易，與領域變更同一次 commit；
+        推送延後到呼叫端 commit 之後呼叫 publish_pending()，避免推送尚未寫入的通知。
+        
+        Returns:
+            通知數量
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        notifications = await self.notification_repo.create_many(
+            user_ids=user_ids,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            link=link,
+            commit=commit
+        )
+        payloads = {
+            n.user_id: NotificationResponse.model_validate(n).model_dump(mode="json")
+            for n in notifications
+        }
+        self._pending.extend(
+            (user_id, {"type": "notification.created", "notification": payloads.get(user_id)})
+            for user_id in user_ids
+        )
+        if commit:
+            await self.publish_pending()
+        return len(user_ids)
+    
+    async def publish_pending(self) -> None:
+        """推送 notify_users 寫入的通知（呼叫端 commit 之後）"""
+        pending, self._pending = self._pending, []
+        for user_id, frame in pending:
+            await self.realtime.send_to_user(frame, user_id)
     
     async def delete_notification(
         self,
@@ -81,7 +226,11 @@ class NotificationService:
         if notification.user_id != user_id:
             raise PermissionDeniedError("只能刪除自己的通知")
         
-        return await self.notification_repo.delete(notification_id)
+        was_unread = not notification.is_read
+        await self.notification_repo.delete(notification)
+        if was_unread:
+            await self._push_unread_delta(user_id, -1)
+        return True
     
     async def cleanup_old_notifications(
         self,
@@ -91,6 +240,24 @@ class NotificationService:
         """清理舊的已讀通知"""
         return await self.notification_repo.delete_old_read_notifications(user_id, days)
     
+    async def purge_read_batch(
+        self,
+        after_id: int,
+        batch_size: int,
+        cutoffs: List[Tuple[datetime, List[Optional[NotificationType]]]]
+    ) -> Tuple[Optional[int], int]:
+        """
+        保留期限清理的一批：掃描 id 大於 after_id 的 batch_size 筆，刪除其中過期的已讀通知
+        
+        Returns:
+            (本批掃描到的最大 id，沒有更多資料時為 None, 刪除數量)
+        """
+        upto_id = await self.notification_repo.get_id_range_end(after_id, batch_size)
+        if upto_id is None:
+            return None, 0
+        deleted = await self.notification_repo.purge_read_in_id_range(after_id, upto_id, cutoffs)
+        return upto_id, deleted
+    
     async def get_by_type(
         self,
         user_id: int,
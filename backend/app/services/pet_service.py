@@ -7,14 +7,20 @@ from math import ceil
 
 from app.repositories import PetRepository
 from app.models.pet import Pet, PetStatus, PetSpecies, PetGender, PetSize, EnergyLevel
-from app.exceptions import PetNotFoundError, PermissionDeniedError, InvalidStatusTransitionError
+from app.exceptions import PetNotFoundError, PermissionDeniedError, InvalidStatusTransitionError, ValidationError
+from app.services.room_participants import RoomParticipantsCache, room_participants_cache
 
 
 class PetService:
     """寵物業務邏輯"""
     
-    def __init__(self, pet_repo: PetRepository):
+    def __init__(
+        self,
+        pet_repo: PetRepository,
+        participants_cache: RoomParticipantsCache = room_participants_cache
+    ):
         self.pet_repo = pet_repo
+        self.participants_cache = participants_cache
     
     async def get_pet(self, pet_id: int) -> Pet:
         """獲取寵物詳情"""
@@ -40,13 +46,86 @@ class PetService:
         
         return pets, total, total_pages
     
+    async def list_available_pets_by_cursor(
+        self,
+        limit: int = 24,
+        cursor: Optional[str] = None,
+        species: Optional[PetSpecies] = None,
+        size: Optional[PetSize] = None,
+        gender: Optional[PetGender] = None
+    ) -> Tuple[List[Pet], Optional[str], bool]:
+        """列出可領養的寵物（游標分頁），返回 (pets, next_cursor, has_more)"""
+        return await self.pet_repo.get_available_pets_by_cursor(limit, cursor, species, size, gender)
+    
     async def search_pets(self, filters: Dict[str, Any]) -> Dict[str, Any]:
         """搜尋寵物（支援多條件）"""
         page = int(filters.get("page", 1))
         limit = int(filters.get("limit", 24))
         skip = (page - 1) * limit
         
-        # 從 filters 提取搜尋條件
+        search_filters = self._build_search_filters(filters)
+        facet_fields = self._validate_facets(filters.get("facets"))
+        
+        # 搜尋寵物並計算總數（要求 facet 時，總數由 facet 聚合一併算出）
+        facets = None
+        if facet_fields:
+            pets, total, facets = await self.pet_repo.search_pets_with_facets(
+                search_filters, facet_fields, skip, limit
+            )
+        else:
+            pets, total = await self.pet_repo.search_pets_with_count(search_filters, skip, limit)
+        total_pages = ceil(total / limit) if limit > 0 else 1
+        
+        result = {
+            "results": pets,
+            "total": total,
+            "page": page,
+            "page_size": limit,
+            "total_pages": total_pages,
+            "applied_filters": filters
+        }
+        if facets is not None:
+            result["facets"] = facets
+        return result
+    
+    async def search_pets_by_cursor(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """搜尋寵物（游標分頁，不計算總數）"""
+        limit = int(filters.get("limit", 24))
+        
+        search_filters = self._build_search_filters(filters)
+        facet_fields = self._validate_facets(filters.get("facets"))
+        
+        pets, next_cursor, has_more = await self.pet_repo.search_pets_by_cursor(
+            search_filters, limit, filters.get("cursor")
+        )
+        
+        result = {
+            "results": pets,
+            "page_size": limit,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "applied_filters": filters
+        }
+        if facet_fields:
+            result["total"], result["facets"] = await self.pet_repo.get_search_facets(
+                search_filters, facet_fields
+            )
+        return result
+    
+    @staticmethod
+    def _validate_facets(facets: Optional[List[str]]) -> List[str]:
+        """檢查 facet 維度是否支援"""
+        if not facets:
+            return []
+        
+        unknown = [name for name in facets if name not in PetRepository.FACET_COLUMNS]
+        if unknown:
+            raise ValidationError(f"不支援的 facet：{', '.join(unknown)}")
+        return list(dict.fromkeys(facets))
+    
+    @staticmethod
+    def _build_search_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+        """從 filters 提取搜尋條件"""
         search_filters = {}
         
         if "query" in filters and filters["query"]:
@@ -82,18 +161,7 @@ class PetService:
         if "order" in filters:
             search_filters["order"] = filters["order"]
         
-        # 搜尋寵物並計算總數
-        pets, total = await self.pet_repo.search_pets_with_count(search_filters, skip, limit)
-        total_pages = ceil(total / limit) if limit > 0 else 1
-        
-        return {
-            "results": pets,
-            "total": total,
-            "page": page,
-            "page_size": limit,
-            "total_pages": total_pages,
-            "applied_filters": filters
-        }
+        return search_filters
     
     async def get_shelter_pets(
         self,
@@ -181,13 +249,19 @@ class PetService:
         if pet.shelter_id != shelter_id:
             raise PermissionDeniedError("只能刪除自己收容所的寵物")
         
+        # 聊天室會隨寵物連帶刪除，先記下以便移除參與者快取
+        room_ids = await self.pet_repo.get_chat_room_ids(pet_id)
+        
         # 先刪除關聯的照片
         delete_photos_stmt = sql_delete(PetPhoto).where(PetPhoto.pet_id == pet_id)
         await self.pet_repo.db.execute(delete_photos_stmt)
         await self.pet_repo.db.commit()
         
         # 再刪除寵物
-        return await self.pet_repo.delete_by_id(pet_id)
+        deleted = await self.pet_repo.delete_by_id(pet_id)
+        for room_id in room_ids:
+            await self.participants_cache.delete(room_id)
+        return deleted
     
     async def add_to_favorites(
         self,
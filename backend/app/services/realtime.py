@@ -0,0 +1,459 @@
+"""
+Realtime Connection Manager
+WebSocket 連線管理：每位用戶一條全域連線，可訂閱多個聊天室
+
+- room_id -> 訂閱者的反向索引，廣播只走訪該聊天室的訂閱者
+- 每則訊息只序列化一次，同一個 frame 放進所有收件者的佇列
+- 每條連線有自己的有界送出佇列與 writer task，慢的客戶端不會拖慢其他人
+- 佇列滿時依 WEBSOCKET_SLOW_CONSUMER_POLICY 處理：
+    disconnect：關閉連線（code 1013），客戶端重連後重新同步
+    drop_oldest：丟棄最舊的待送 frame
+- 聊天室廣播同時發布到 backplane（見 app.services.backplane），其他 worker 投遞給各自的本機訂閱者
+- 每個 worker 最多 WEBSOCKET_MAX_CONNECTIONS 條連線；超過時以 1013 關閉新連線
+- 心跳：閒置 WEBSOCKET_PING_INTERVAL 秒送出 {"type": "ping"}，
+  再過 WEBSOCKET_PING_TIMEOUT 秒仍沒收到任何訊息就關閉連線（code 4408）
+- 新訊息（帶聊天室序號 seq）的 frame 另存入每個聊天室的環狀緩衝（RoomHistory），
+  斷線重連時補送缺少的部分，緩衝不足時由呼叫端改查資料庫
+- 用戶事件（通知、未讀數變化）以 send_to_user 投遞給用戶的連線，其他 worker 經 backplane
+- 連線可選擇 frame 編碼：json（text frame，預設）或 msgpack（binary frame，msgpack 列在 requirements.txt）；
+  廣播仍只序列化一次 JSON，msgpack 連線共用同一份轉換結果
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # 列在 requirements.txt；未安裝時只提供 json 編碼
+    msgpack = None
+
+from app.core.config import settings
+from app.services.backplane import Backplane, InMemoryBackplane, create_backplane
+
+# 與 Starlette send_json 相同的 JSON 格式
+_JSON_OPTIONS = {"ensure_ascii": False, "separators": (",", ":")}
+
+# 慢速客戶端、連線數已滿時的 close code（1013 Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+CONNECTION_LIMIT_CLOSE_CODE = 1013
+# 心跳逾時的 close code
+IDLE_TIMEOUT_CLOSE_CODE = 4408
+
+
+def encode_frame(message: Dict[str, Any]) -> str:
+    """把訊息序列化成 WebSocket text frame"""
+    return json.dumps(message, **_JSON_OPTIONS)
+
+
+def frame_encodings() -> Tuple[str, ...]:
+    """目前可用的 frame 編碼"""
+    return ("json", "msgpack") if msgpack is not None else ("json",)
+
+
+def to_binary_frame(frame: str) -> bytes:
+    """把 JSON text frame 轉成 MessagePack binary frame"""
+    return msgpack.packb(json.loads(frame), use_bin_type=True)
+
+
+def decode_binary_frame(data: bytes) -> Any:
+    """解析客戶端送來的 binary frame（MessagePack；未安裝時視為 UTF-8 JSON）"""
+    if msgpack is None:
+        return json.loads(data)
+    # resume 的 rooms 可能以整數作為 key
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class RoomHistory:
+    """
+    每個聊天室最近的新訊息 frame（環狀緩衝），供斷線重連補送
+
+    - 每個聊天室保留最近 size 則；最多保留 max_rooms 個聊天室（LRU 淘汰）
+    - 緩衝內的序號一定連續：收到不連續的序號（中間的事件沒收到）時從該則重新開始
+    """
+
+    def __init__(self, size: int, max_rooms: int):
+        self.size = size
+        self.max_rooms = max_rooms
+        self._rooms: "OrderedDict[int, Deque[Tuple[int, str]]]" = OrderedDict()
+
+    def record(self, room_id: int, seq: int, frame: str) -> None:
+        """記錄聊天室的新訊息 frame"""
+        if self.size <= 0 or self.max_rooms <= 0:
+            return
+        buffer = self._rooms.get(room_id)
+        if buffer is None:
+            buffer = self._rooms[room_id] = deque(maxlen=self.size)
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        else:
+            self._rooms.move_to_end(room_id)
+            if buffer:
+                last_seq = buffer[-1][0]
+                if seq <= last_seq:
+                    return
+                if seq != last_seq + 1:
+                    buffer.clear()
+        buffer.append((seq, frame))
+
+    def since(self, room_id: int, after_seq: int, until_seq: int) -> Optional[List[str]]:
+        """
+        序號在 (after_seq, until_seq] 之間的 frame
+
+        Returns:
+            依序號排列的 frame；緩衝無法完整涵蓋這個區間時返回 None
+        """
+        if until_seq <= after_seq:
+            return []
+        buffer = self._rooms.get(room_id)
+        if not buffer or buffer[0][0] > after_seq + 1 or buffer[-1][0] < until_seq:
+            return None
+        return [frame for seq, frame in buffer if after_seq < seq <= until_seq]
+
+    def clear(self) -> None:
+        """清空所有聊天室的緩衝"""
+        self._rooms.clear()
+
+
+class Connection:
+    """單一 WebSocket 連線：有界送出佇列 + 專屬 writer task"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.rooms: Set[int] = set()
+        self.queue: "asyncio.Queue[Union[str, bytes]]" = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.closed = False
+        # 最後一次收到客戶端訊息的時間（monotonic）；送出心跳後尚未回應時為 True
+        self.last_seen = time.monotonic()
+        self.ping_pending = False
+
+    def touch(self) -> None:
+        """收到客戶端訊息"""
+        self.last_seen = time.monotonic()
+        self.ping_pending = False
+
+    def start(self, on_error) -> None:
+        """啟動 writer task（送出失敗時呼叫 on_error(connection)）"""
+        self.writer = asyncio.create_task(self._write_loop(on_error))
+
+    async def _write_loop(self, on_error) -> None:
+        try:
+            while True:
+                frame = await self.queue.get()
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Error sending message to user {self.user_id}: {e}")
+            on_error(self)
+
+    def stop(self) -> None:
+        """停止 writer task（不等待）"""
+        self.closed = True
+        if self.writer is not None and not self.writer.done():
+            self.writer.cancel()
+
+
+class ConnectionManager:
+    """
+    WebSocket 連接管理器
+    支援全局單一連接，用戶可訂閱多個聊天室
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.WEBSOCKET_SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = settings.WEBSOCKET_SLOW_CONSUMER_POLICY,
+        backplane: Optional[Backplane] = None,
+        max_connections: int = settings.WEBSOCKET_MAX_CONNECTIONS,
+        ping_interval: float = settings.WEBSOCKET_PING_INTERVAL,
+        ping_timeout: float = settings.WEBSOCKET_PING_TIMEOUT
+    ):
+        if slow_consumer_policy not in ("disconnect", "drop_oldest"):
+            raise ValueError("slow_consumer_policy must be 'disconnect' or 'drop_oldest'")
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.max_connections = max_connections
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        # 儲存連接：{user_id: Connection}
+        self.active_connections: Dict[int, Connection] = {}
+        # 聊天室訂閱者反向索引：{room_id: set(user_ids)}
+        self.room_subscribers: Dict[int, Set[int]] = {}
+        # 背景關閉連線的 task（保留參考，避免被回收）
+        self._closing: Set[asyncio.Task] = set()
+        self.backplane = backplane or InMemoryBackplane()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self._reaper: Optional[asyncio.Task] = None
+        self.history = RoomHistory(settings.CHAT_RESUME_BUFFER_SIZE, settings.CHAT_RESUME_BUFFER_ROOMS)
+        # 最近一次轉換的 (text frame, binary frame)：同一次廣播的 msgpack 連線共用
+        self._binary_frame: Tuple[Optional[str], bytes] = (None, b"")
+
+    async def start(self) -> None:
+        """開始接收其他 worker 的聊天室事件（可重複呼叫；第一次連線或廣播時也會自動啟動）"""
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.backplane.start(self._deliver_remote, self._deliver_user)
+                if self.ping_interval > 0:
+                    self._reaper = asyncio.create_task(self._reap_idle_connections())
+                self._started = True
+
+    async def stop(self) -> None:
+        """停止 backplane 並關閉所有本機連線（應用程式關閉時呼叫）"""
+        for connection in list(self.active_connections.values()):
+            self._remove(connection)
+            self._close_later(connection, code=1001)
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._started:
+            await self.backplane.stop()
+            self._started = False
+
+    async def _reap_idle_connections(self) -> None:
+        """心跳：對閒置連線送出 ping，逾時未回應就關閉"""
+        period = min(self.ping_interval, self.ping_timeout) if self.ping_timeout > 0 else self.ping_interval
+        while True:
+            await asyncio.sleep(period)
+            self.check_idle_connections()
+
+    def check_idle_connections(self) -> int:
+        """
+        檢查一次所有本機連線的心跳
+
+        Returns:
+            因逾時被關閉的連線數
+        """
+        now = time.monotonic()
+        reaped = 0
+        for connection in list(self.active_connections.values()):
+            idle = now - connection.last_seen
+            if idle >= self.ping_interval + self.ping_timeout:
+                print(f"💤 User {connection.user_id} heartbeat timed out, closing connection")
+                self.disconnect(connection.user_id, connection)
+                self._close_later(connection, code=IDLE_TIMEOUT_CLOSE_CODE)
+                reaped += 1
+            elif idle >= self.ping_interval and not connection.ping_pending:
+                connection.ping_pending = True
+                self._enqueue(connection, encode_frame({"type": "ping"}))
+        return reaped
+
+    def _deliver_remote(
+        self,
+        room_id: int,
+        frame: str,
+        exclude_user: Optional[int],
+        seq: Optional[int] = None
+    ) -> None:
+        """其他 worker 發布的聊天室事件：記錄到補送緩衝，並投遞給本機訂閱者"""
+        if seq is not None:
+            self.history.record(room_id, seq, frame)
+        self.publish_frame(frame, room_id, exclude_user)
+
+    def _deliver_user(self, user_id: int, frame: str) -> None:
+        """用戶事件：用戶連在本機時放入送出佇列"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            self._enqueue(connection, frame)
+
+    @property
+    def user_rooms(self) -> Dict[int, Set[int]]:
+        """用戶訂閱的聊天室：{user_id: set(room_ids)}"""
+        return {user_id: conn.rooms for user_id, conn in self.active_connections.items()}
+
+    async def connect(self, websocket: WebSocket, user_id: int, encoding: str = "json") -> Optional[Connection]:
+        """
+        用戶連接（同一用戶的舊連線會被取代）
+
+        Args:
+            encoding: 送出 frame 的編碼（見 frame_encodings()）
+
+        Returns:
+            新連線；連線數已達上限時關閉 WebSocket 並返回 None
+        """
+        if encoding not in frame_encodings():
+            raise ValueError(f"Unsupported frame encoding: {encoding}")
+        await self.start()
+        await websocket.accept()
+        previous = self.active_connections.get(user_id)
+        if previous is None and len(self.active_connections) >= self.max_connections:
+            print(f"🚫 WebSocket connection limit reached ({self.max_connections}), rejecting user {user_id}")
+            await websocket.close(code=CONNECTION_LIMIT_CLOSE_CODE)
+            return None
+        if previous is not None:
+            self._remove(previous)
+            self._close_later(previous, code=1000)
+
+        connection = Connection(websocket, user_id, self.queue_size, encoding)
+        connection.start(self._on_send_error)
+        self.active_connections[user_id] = connection
+        print(f"✅ User {user_id} connected to WebSocket V2")
+        return connection
+
+    def disconnect(self, user_id: int, connection: Optional[Connection] = None):
+        """用戶斷線（指定 connection 時，只在它仍是目前連線時移除）"""
+        current = self.active_connections.get(user_id)
+        if current is None or (connection is not None and current is not connection):
+            if connection is not None:
+                connection.stop()
+            return
+        self._remove(current)
+        print(f"❌ User {user_id} disconnected from WebSocket V2")
+
+    def subscribe_room(self, user_id: int, room_id: int):
+        """訂閱聊天室"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.rooms.add(room_id)
+            self.room_subscribers.setdefault(room_id, set()).add(user_id)
+            print(f"📢 User {user_id} subscribed to room {room_id}")
+
+    def unsubscribe_room(self, user_id: int, room_id: int):
+        """取消訂閱聊天室"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None and room_id in connection.rooms:
+            connection.rooms.discard(room_id)
+            self._discard_subscriber(room_id, user_id)
+            print(f"🔕 User {user_id} unsubscribed from room {room_id}")
+
+    async def send_personal_message(self, message: dict, user_id: int):
+        """發送訊息給特定用戶"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            self._enqueue(connection, encode_frame(message))
+
+    def send_personal_frames(self, frames: List[str], user_id: int) -> None:
+        """發送已序列化的 frame 給特定用戶（斷線重連補送）"""
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            for frame in frames:
+                if not self._enqueue(connection, frame):
+                    break
+
+    async def send_to_user(self, message: dict, user_id: int) -> None:
+        """
+        發送用戶事件（通知、未讀數變化）
+
+        與 send_personal_message 不同，用戶連在其他 worker 時也會經 backplane 收到。
+        """
+        frame = encode_frame(message)
+        self._deliver_user(user_id, frame)
+        await self.start()
+        await self.backplane.publish_to_user(user_id, frame)
+
+    async def broadcast_to_room(
+        self,
+        message: dict,
+        room_id: int,
+        exclude_user: Optional[int] = None,
+        seq: Optional[int] = None
+    ):
+        """
+        廣播訊息給聊天室的所有訂閱者（本機直接投遞，其他 worker 經 backplane；可排除特定用戶）
+
+        新訊息請帶上聊天室序號 seq，供斷線重連補送。
+        """
+        frame = encode_frame(message)
+        if seq is not None:
+            self.history.record(room_id, seq, frame)
+        self.publish_frame(frame, room_id, exclude_user)
+        await self.start()
+        await self.backplane.publish(room_id, frame, exclude_user, seq)
+
+    def publish_frame(self, frame: str, room_id: int, exclude_user: Optional[int] = None) -> int:
+        """
+        把已序列化的 frame 放進聊天室訂閱者的佇列（不等待送出）
+
+        Returns:
+            放入佇列的連線數
+        """
+        subscribers = self.room_subscribers.get(room_id)
+        if not subscribers:
+            return 0
+        delivered = 0
+        # 複製一份：慢速客戶端被斷線時會修改訂閱集合
+        for user_id in tuple(subscribers):
+            if user_id == exclude_user:
+                continue
+            connection = self.active_connections.get(user_id)
+            if connection is not None and self._enqueue(connection, frame):
+                delivered += 1
+        return delivered
+
+    def _enqueue(self, connection: Connection, frame: str) -> bool:
+        """放入連線的送出佇列；佇列滿時依慢速客戶端策略處理"""
+        if connection.closed:
+            return False
+        if connection.encoding == "msgpack":
+            frame = self._to_binary(frame)
+        try:
+            connection.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_consumer_policy == "drop_oldest":
+            connection.queue.get_nowait()
+            connection.queue.put_nowait(frame)
+            connection.dropped += 1
+            return True
+
+        print(f"🐢 User {connection.user_id} send queue full, closing connection")
+        self.disconnect(connection.user_id, connection)
+        self._close_later(connection, code=SLOW_CONSUMER_CLOSE_CODE)
+        return False
+
+    def _to_binary(self, frame: str) -> bytes:
+        """轉成 binary frame（同一個 frame 連續投遞時只轉換一次）"""
+        source, binary = self._binary_frame
+        if source is not frame:
+            binary = to_binary_frame(frame)
+            self._binary_frame = (frame, binary)
+        return binary
+
+    def _on_send_error(self, connection: Connection) -> None:
+        self.disconnect(connection.user_id, connection)
+
+    def _remove(self, connection: Connection) -> None:
+        """從索引中移除連線並停止 writer"""
+        connection.stop()
+        if self.active_connections.get(connection.user_id) is connection:
+            del self.active_connections[connection.user_id]
+        for room_id in connection.rooms:
+            self._discard_subscriber(room_id, connection.user_id)
+        connection.rooms.clear()
+
+    def _discard_subscriber(self, room_id: int, user_id: int) -> None:
+        subscribers = self.room_subscribers.get(room_id)
+        if subscribers is not None:
+            subscribers.discard(user_id)
+            if not subscribers:
+                del self.room_subscribers[room_id]
+
+    def _close_later(self, connection: Connection, code: int) -> None:
+        """在背景關閉 WebSocket（不阻塞廣播）"""
+        async def close():
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+        task = asyncio.get_running_loop().create_task(close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+
+# 全局連接管理器
+manager = ConnectionManager(backplane=create_backplane())
@@ -0,0 +1,122 @@
+"""
+Chat Room Participants Cache
+聊天室參與者快取：聊天室建立後參與者（user_id, shelter_id）不會改變，權限檢查不必每次查資料庫
+
+- L1：行程內 LRU（TTLCache），容量 CHAT_ROOM_CACHE_SIZE、存活 CHAT_ROOM_CACHE_TTL 秒
+- L2（選用）：CHAT_ROOM_CACHE_REDIS=true 時使用 REDIS_URL，多個 worker 共用
+- Redis 無法連線時只使用 L1，一段時間後再重試；快取未命中時由呼叫端查資料庫後寫回
+"""
+import time
+from typing import NamedTuple, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+# Redis 失敗後暫停使用 L2 的秒數
+_REDIS_RETRY_SECONDS = 30.0
+
+
+class RoomParticipants(NamedTuple):
+    """聊天室的兩位參與者"""
+    user_id: int
+    shelter_id: int
+
+    def includes(self, user_id: int) -> bool:
+        return user_id == self.user_id or user_id == self.shelter_id
+
+
+class RoomParticipantsCache:
+    """聊天室參與者快取（L1 行程內 LRU + 選用的 Redis L2）"""
+
+    def __init__(
+        self,
+        max_size: int = settings.CHAT_ROOM_CACHE_SIZE,
+        ttl: float = settings.CHAT_ROOM_CACHE_TTL,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "chat:room-participants:"
+    ):
+        self.local = TTLCache(max_size=max_size, default_ttl=ttl)
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self._client: Optional[redis.Redis] = None
+        self._redis_retry_at = 0.0
+
+    @property
+    def client(self) -> Optional[redis.Redis]:
+        """可用的 Redis 連線（未設定或暫停中返回 None）"""
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._client is None:
+            self._client = redis.from_url(self.redis_url, decode_responses=True, socket_connect_timeout=2)
+        return self._client
+
+    def _redis_failed(self, error: Exception) -> None:
+        print(f"⚠️ Room participants cache: Redis unavailable ({error}), using local cache only")
+        self._redis_retry_at = time.monotonic() + _REDIS_RETRY_SECONDS
+
+    async def get(self, room_id: int) -> Optional[RoomParticipants]:
+        """讀取快取（L1 → L2），未命中返回 None"""
+        participants = self.local.get(room_id)
+        if participants is not None:
+            return participants
+
+        client = self.client
+        if client is None:
+            return None
+        try:
+            raw = await client.get(f"{self.key_prefix}{room_id}")
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        if not raw:
+            return None
+
+        user_id, shelter_id = raw.split(":")
+        participants = RoomParticipants(int(user_id), int(shelter_id))
+        self.local.set(room_id, participants)
+        return participants
+
+    async def set(self, room_id: int, participants: RoomParticipants) -> None:
+        """寫入快取（L1 與 L2；ttl <= 0 時不快取）"""
+        if self.ttl <= 0:
+            return
+        self.local.set(room_id, participants)
+
+        client = self.client
+        if client is None:
+            return
+        try:
+            await client.set(
+                f"{self.key_prefix}{room_id}",
+                f"{participants.user_id}:{participants.shelter_id}",
+                ex=int(self.ttl)
+            )
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def delete(self, room_id: int) -> None:
+        """移除快取（刪除聊天室時呼叫）"""
+        self.local.delete(room_id)
+
+        client = self.client
+        if client is None:
+            return
+        try:
+            await client.delete(f"{self.key_prefix}{room_id}")
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def close(self) -> None:
+        """關閉 Redis 連線"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 全局參與者快取
+room_participants_cache = RoomParticipantsCache(
+    redis_url=settings.REDIS_URL if settings.CHAT_ROOM_CACHE_REDIS else None
+)
@@ -3,14 +3,29 @@ S3 file upload service with URL caching
 """
 import boto3
 import os
+import time
 from typing import Optional, Dict
 from pathlib import Path
 import uuid
-from datetime import datetime, timedelta
+from typing import BinaryIO, Iterable
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.file_validator import SNIFF_BYTES, read_chunks, sniff_content_type
+from app.utils.image_processor import variant_key
+
+# 預簽名 URL 在到期前這段時間內不再重用：快取的 URL 剩餘效期至少要有「要求的效期 - PRESIGN_REFRESH_MARGIN」才會返回
+PRESIGN_REFRESH_MARGIN = 3600
+
+# S3 multipart 每個 part 最小 5MB（最後一個 part 除外）
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+# 全行程共用的預簽名 URL 快取（所有 S3Service 實例共用）
+presign_cache = TTLCache(max_size=settings.S3_PRESIGN_CACHE_SIZE)
+
 
 class S3Service:
     """Service for uploading files to AWS S3 with URL caching"""
@@ -21,8 +36,8 @@ class S3Service:
         self.region = settings.AWS_REGION
         self.use_s3 = settings.USE_S3
         self.cloudfront_domain = settings.AWS_CLOUDFRONT_DOMAIN
-        # OPTIMIZED: Cache presigned URLs to reduce AWS API calls
-        self._url_cache: Dict[str, tuple] = {}  # {s3_key: (url, expiration_time)}
+        # OPTIMIZED: Cache presigned URLs to reduce AWS API calls（全行程共用）
+        self._url_cache = presign_cache
         
         print(f"🔧 S3Service 初始化:")
         print(f"   USE_S3: {self.use_s3}")
@@ -39,7 +54,13 @@ class S3Service:
                     's3',
                     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=self.region
+                    region_name=self.region,
+                    # 連線池與執行緒池大小一致；逾時交由 AsyncStorageService 控制整體時間
+                    config=Config(
+                        max_pool_connections=settings.STORAGE_MAX_WORKERS,
+                        connect_timeout=5,
+                        read_timeout=settings.STORAGE_TIMEOUT,
+                    )
                 )
                 print(f"   ✅ S3 client 初始化成功!")
             except Exception as e:
@@ -50,10 +71,10 @@ class S3Service:
         else:
             print(f"   ℹ️  S3 未啟用，將使用本地儲存")
     
-    def generate_s3_key(self, category: str, filename: str) -> str:
-        """Generate S3 object key"""
+    def generate_s3_key(self, category: str, filename: str, object_id: Optional[str] = None) -> str:
+        """Generate S3 object key（object_id 為內容 hash 時同樣內容得到同一個 key）"""
         ext = Path(filename).suffix.lower()
-        unique_filename = f"{uuid.uuid4()}{ext}"
+        unique_filename = f"{object_id or uuid.uuid4()}{ext}"
         return f"{category}/{unique_filename}"
     
     def upload_file(self, file_content: bytes, filename: str, category: str, content_type: str) -> dict:
@@ -72,6 +93,197 @@ class S3Service:
             print(f"    💾 使用本地儲存")
             return self._upload_to_local(file_content, filename, category)
     
+    def upload_stream(
+        self,
+        fileobj: BinaryIO,
+        filename: str,
+        category: str,
+        content_type: str,
+        max_size: Optional[int] = None,
+        chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+        file_key: Optional[str] = None
+    ) -> dict:
+        """
+        串流上傳（分塊讀取，不把整個檔案載入記憶體）
+        
+        - Content type 以第一個 chunk 的檔頭判斷，無法辨識時沿用 content_type
+        - 累計大小超過 max_size 時立即中止（FileTooLargeError），已寫入的部分會清除
+        - S3：小檔單次 put_object，大檔使用 multipart upload；本地：分塊寫入
+        - file_key 未指定時以 generate_s3_key 產生
+        
+        Returns:
+            dict with file_url, file_key, file_size and content_type
+        """
+        chunks = read_chunks(fileobj, chunk_size, max_size)
+        
+        # 檔頭判斷至少需要 SNIFF_BYTES（chunk 很小時多讀幾塊）
+        head = bytearray()
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= SNIFF_BYTES:
+                break
+        first = bytes(head)
+        content_type = sniff_content_type(first) or content_type
+        
+        file_key = file_key or self.generate_s3_key(category, filename)
+        if self.use_s3 and self.s3_client:
+            result = self._stream_to_s3(first, chunks, file_key, content_type, chunk_size)
+        else:
+            result = self._stream_to_local(first, chunks, file_key)
+        
+        result["content_type"] = content_type
+        return result
+    
+    def _stream_to_s3(
+        self,
+        first: bytes,
+        chunks: Iterable[bytes],
+        s3_key: str,
+        content_type: str,
+        chunk_size: int
+    ) -> dict:
+        """串流上傳到 S3（記憶體中最多保留一個 part）"""
+        part_size = max(chunk_size, S3_MIN_PART_SIZE)
+        buffer = bytearray(first)
+        total = len(first)
+        upload_id = None
+        parts = []
+        
+        def flush_part():
+            nonlocal buffer
+            part_number = len(parts) + 1
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=bytes(buffer)
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+            buffer = bytearray()
+        
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                total += len(chunk)
+                if len(buffer) >= part_size:
+                    if upload_id is None:
+                        upload_id = self.s3_client.create_multipart_upload(
+                            Bucket=self.bucket_name,
+                            Key=s3_key,
+                            ContentType=content_type,
+                            CacheControl='max-age=31536000',
+                        )["UploadId"]
+                        print(f"      📤 S3 multipart 上傳 - Key: {s3_key}")
+                    flush_part()
+            
+            if upload_id is None:
+                print(f"      📤 上傳到 S3 - Key: {s3_key}")
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=bytes(buffer),
+                    ContentType=content_type,
+                    CacheControl='max-age=31536000',  # Cache for 1 year
+                )
+            else:
+                if buffer:
+                    flush_part()
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except Exception as e:
+            if upload_id is not None:
+                try:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id
+                    )
+                except ClientError as abort_error:
+                    print(f"      ⚠️ 無法中止 multipart 上傳: {abort_error}")
+            if isinstance(e, ClientError):
+                print(f"      ❌ S3 upload failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
+            raise
+        
+        print(f"      ✅ S3 上傳成功! ({total} bytes, {len(parts) or 1} part)")
+        return {
+            "file_url": self.generate_presigned_url(s3_key, expiration=604800),
+            "file_key": s3_key,
+            "file_size": total,
+        }
+    
+    def _stream_to_local(self, first: bytes, chunks: Iterable[bytes], file_key: str) -> dict:
+        """分塊寫入本地儲存（先寫暫存檔，完成後再改名）"""
+        file_path = Path("uploads") / file_key
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = file_path.with_name(f"{file_path.name}.part")
+        
+        total = 0
+        try:
+            with open(partial_path, "wb") as f:
+                f.write(first)
+                total += len(first)
+                for chunk in chunks:
+                    f.write(chunk)
+                    total += len(chunk)
+            os.replace(partial_path, file_path)
+        except Exception:
+            partial_path.unlink(missing_ok=True)
+            raise
+        
+        print(f"      💾 檔案已儲存: {file_path.absolute()} ({total} bytes)")
+        return {
+            "file_url": self.local_url(file_key),
+            "file_key": file_key,
+            "file_size": total,
+        }
+    
+    def store_object(self, file_key: str, data: bytes, content_type: str) -> str:
+        """
+        以指定的 key 寫入一個小物件（圖片衍生版本等）
+        
+        Returns:
+            物件 URL
+        """
+        if self.use_s3 and self.s3_client:
+            try:
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Body=data,
+                    ContentType=content_type,
+                    CacheControl='max-age=31536000',  # Cache for 1 year
+                )
+            except ClientError as e:
+                print(f"      ❌ S3 upload failed: {e}")
+                raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
+            return self.generate_presigned_url(file_key, expiration=604800)
+        
+        file_path = Path("uploads") / file_key
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = file_path.with_name(f"{file_path.name}.part")
+        try:
+            partial_path.write_bytes(data)
+            os.replace(partial_path, file_path)
+        except Exception:
+            partial_path.unlink(missing_ok=True)
+            raise
+        return self.local_url(file_key)
+    
+    def object_url(self, file_key: str, expiration: int = 604800) -> str:
+        """已存在物件的 URL（S3：CloudFront / Presigned URL；本地：靜態檔案 URL）"""
+        if self.use_s3 and self.s3_client:
+            return self.generate_presigned_url(file_key, expiration=expiration)
+        return self.local_url(file_key)
+    
+    @staticmethod
+    def local_url(file_key: str) -> str:
+        """本地儲存檔案的 URL"""
+        return f"{settings.BACKEND_URL}/uploads/{file_key}"
+    
     def _upload_to_s3(self, file_content: bytes, filename: str, category: str, content_type: str) -> dict:
         """Upload file to S3"""
         try:
@@ -119,28 +331,122 @@ class S3Service:
             return cloudfront_url
         
         # 回退到 Presigned URL（帶快取）
-        if s3_key in self._url_cache:
-            cached_url, cache_expiry = self._url_cache[s3_key]
-            if datetime.now() < cache_expiry - timedelta(hours=1):
-                return cached_url
+        cached_url = self._cached_presigned_url(s3_key, expiration)
+        if cached_url:
+            return cached_url
         
         try:
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': self.bucket_name,
-                    'Key': s3_key
-                },
-                ExpiresIn=expiration
-            )
-            
-            self._url_cache[s3_key] = (url, datetime.now() + timedelta(seconds=expiration))
+            url = self._sign(s3_key, expiration)
             print(f"      🔗 生成 Presigned URL (有效期 {expiration//86400} 天)")
             return url
         except ClientError as e:
             print(f"❌ Failed to generate presigned URL: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to generate presigned URL: {str(e)}")
     
+    def cached_url(self, s3_key: str, expiration: int = 604800) -> Optional[str]:
+        """不需呼叫 AWS 就能取得的 URL（CloudFront 或快取中效期足夠的 Presigned URL）"""
+        if self.cloudfront_domain:
+            return f"{self.cloudfront_domain.rstrip('/')}/{s3_key}"
+        return self._cached_presigned_url(s3_key, expiration)
+    
+    def _cached_presigned_url(self, s3_key: str, expiration: int) -> Optional[str]:
+        """
+        快取中的 Presigned URL，剩餘效期不足 expiration - PRESIGN_REFRESH_MARGIN 時返回 None
+        
+        同一個 key 可能以不同效期簽出（寵物 1 天、聊天室 7 天）：較長效期的 URL 可以給較短的要求使用，
+        反之則重新簽出並取代快取
+        """
+        entry = self._url_cache.get((self.bucket_name, s3_key))
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at - time.monotonic() < expiration - PRESIGN_REFRESH_MARGIN:
+            return None
+        return url
+    
+    def generate_presigned_urls(self, s3_keys: Iterable[str], expiration: int = 604800) -> Dict[str, str]:
+        """
+        批量生成 URL（CloudFront 優先，其次為快取的 Presigned URL）
+        
+        重複的 key 只簽一次；簽章失敗的 key 不會出現在結果中，由呼叫端回退到原始 file_url。
+        
+        Args:
+            s3_keys: S3 object keys
+            expiration: URL expiration time in seconds (default: 7 days)
+        
+        Returns:
+            {s3_key: url}；S3 未啟用時返回空 dict
+        """
+        if not (self.use_s3 and self.s3_client):
+            return {}
+        
+        keys = [key for key in dict.fromkeys(s3_keys) if key]
+        if self.cloudfront_domain:
+            domain = self.cloudfront_domain.rstrip('/')
+            return {key: f"{domain}/{key}" for key in keys}
+        
+        urls: Dict[str, str] = {}
+        missing = []
+        for key in keys:
+            cached_url = self._cached_presigned_url(key, expiration)
+            if cached_url:
+                urls[key] = cached_url
+            else:
+                missing.append(key)
+        
+        for key in missing:
+            try:
+                urls[key] = self._sign(key, expiration)
+            except ClientError as e:
+                print(f"⚠️ Failed to generate presigned URL for {key}: {e}")
+        
+        if missing:
+            print(f"      🔗 批量生成 Presigned URL：快取命中 {len(keys) - len(missing)}，新簽 {len(missing)}")
+        return urls
+    
+    def generate_variant_urls(
+        self,
+        file_keys: Iterable[str],
+        variant: str,
+        expiration: int = 604800
+    ) -> Dict[str, str]:
+        """
+        批量取得圖片衍生版本的 URL（列表用 card / thumbnail，詳細頁用 large）
+        
+        沒有衍生版本的舊檔案返回原圖 URL；S3 未啟用時只處理有衍生版本的 key。
+        
+        Returns:
+            {原圖 file_key: url}；無法取得的 key 不會出現在結果中
+        """
+        targets = {
+            key: variant_key(key, variant)
+            for key in dict.fromkeys(file_keys) if key
+        }
+        if not (self.use_s3 and self.s3_client):
+            return {key: self.local_url(target) for key, target in targets.items() if target != key}
+        
+        urls = self.generate_presigned_urls(targets.values(), expiration)
+        return {key: urls[target] for key, target in targets.items() if target in urls}
+    
+    def _sign(self, s3_key: str, expiration: int) -> str:
+        """簽出 Presigned URL 並連同到期時間寫入共用快取（到期前 PRESIGN_REFRESH_MARGIN 秒失效）"""
+        expires_at = time.monotonic() + expiration
+        url = self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket_name,
+                'Key': s3_key
+            },
+            ExpiresIn=expiration
+        )
+        self._url_cache.set((self.bucket_name, s3_key), (url, expires_at), ttl=expiration - PRESIGN_REFRESH_MARGIN)
+        return url
+    
+    @staticmethod
+    def cache_stats() -> dict:
+        """預簽名 URL 快取統計"""
+        return presign_cache.stats()
+    
     def _upload_to_local(self, file_content: bytes, filename: str, category: str) -> dict:
         """Upload file to local storage (fallback)"""
         try:
@@ -0,0 +1,168 @@
+"""
+Async storage facade
+S3Service 的非同步包裝：boto3 / 本地檔案 I/O 都是同步阻塞呼叫，
+改在有上限的執行緒池中執行，避免一次慢上傳卡住整個 event loop（包含 WebSocket）。
+"""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.exceptions import FileTooLargeError
+from app.services.s3 import S3Service, s3_service
+from app.utils.file_validator import hash_stream
+
+
+def _result_key(result: dict) -> str:
+    """上傳結果中寫入的 key"""
+    return result["file_key"]
+
+
+class AsyncStorageService:
+    """以執行緒池執行 S3Service 的阻塞操作"""
+
+    def __init__(
+        self,
+        backend: S3Service,
+        max_workers: int = settings.STORAGE_MAX_WORKERS,
+        timeout: Optional[float] = settings.STORAGE_TIMEOUT
+    ):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="storage"
+            )
+        return self._executor
+
+    async def _run(
+        self,
+        func: Callable[..., Any],
+        *args,
+        written_key: Optional[Callable[[Any], str]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        在執行緒池中執行（逾時包含排隊等待的時間）
+        
+        逾時只會取消還在排隊的操作，已開始的執行緒無法中斷：它會繼續佔用執行緒池，通常也會完成寫入。
+        寫入隨機 key 的操作傳入 written_key（由結果取得寫入的 key）：呼叫端已收到 504 後才完成的寫入，
+        在執行緒中直接刪除該物件，不留下沒有資料列指向的檔案。
+        """
+        task = self.executor.submit(partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(task), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ 儲存操作逾時 ({self.timeout}s): {getattr(func, '__name__', func)}")
+            if written_key is not None:
+                task.add_done_callback(partial(self._discard_late_write, written_key))
+            raise HTTPException(status_code=504, detail="Storage operation timed out")
+
+    def _discard_late_write(self, written_key: Callable[[Any], str], task: Future) -> None:
+        """逾時後才完成的寫入：刪除寫入的物件（在執行緒池中執行）"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        file_key = written_key(task.result())
+        try:
+            self.backend.delete_file(file_key)
+            print(f"🗑️ 已刪除逾時後才完成的上傳: {file_key}")
+        except Exception as e:
+            print(f"⚠️ 刪除逾時後才完成的上傳失敗 {file_key}: {str(e)}")
+
+    async def upload_file(self, file_content: bytes, filename: str, category: str, content_type: str) -> dict:
+        """上傳檔案（S3 或本地儲存）"""
+        return await self._run(
+            self.backend.upload_file, file_content, filename, category, content_type,
+            written_key=_result_key
+        )
+
+    async def upload_stream(
+        self,
+        upload: UploadFile,
+        category: str,
+        max_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        file_key: Optional[str] = None
+    ) -> dict:
+        """
+        串流上傳 UploadFile（分塊讀取，記憶體用量以 chunk / S3 part 為上限）
+        
+        Raises:
+            FileTooLargeError: 超過 max_size（已知大小時在讀取前就拒絕）
+        """
+        if max_size is not None and upload.size is not None and upload.size > max_size:
+            raise FileTooLargeError(f"檔案超過大小上限（{max_size} bytes）")
+        
+        await upload.seek(0)
+        return await self._run(
+            self.backend.upload_stream,
+            upload.file,
+            upload.filename or "file",
+            category,
+            upload.content_type or "application/octet-stream",
+            max_size,
+            chunk_size or settings.UPLOAD_CHUNK_SIZE,
+            file_key,
+            # 指定的 key 以內容 hash 決定，可能已被同內容的其他上傳登記到目錄，不能刪除
+            written_key=None if file_key else _result_key
+        )
+    
+    async def store_object(self, file_key: str, data: bytes, content_type: str) -> str:
+        """以指定的 key 寫入小物件，返回 URL"""
+        return await self._run(self.backend.store_object, file_key, data, content_type)
+    
+    async def hash_upload(self, upload: UploadFile, max_size: Optional[int] = None) -> Tuple[str, int]:
+        """
+        計算 UploadFile 內容的 SHA-256（讀取本地暫存檔，完成後回到開頭）
+        
+        Raises:
+            FileTooLargeError: 超過 max_size
+        """
+        if max_size is not None and upload.size is not None and upload.size > max_size:
+            raise FileTooLargeError(f"檔案超過大小上限（{max_size} bytes）")
+        
+        await upload.seek(0)
+        try:
+            return await self._run(hash_stream, upload.file, settings.UPLOAD_CHUNK_SIZE, max_size)
+        finally:
+            await upload.seek(0)
+    
+    async def delete_file(self, file_key: str) -> bool:
+        """刪除檔案"""
+        return await self._run(self.backend.delete_file, file_key)
+
+    async def generate_presigned_url(self, s3_key: str, expiration: int = 604800) -> str:
+        """生成 URL（快取命中時不進執行緒池）"""
+        cached_url = self.backend.cached_url(s3_key, expiration)
+        if cached_url:
+            return cached_url
+        return await self._run(self.backend.generate_presigned_url, s3_key, expiration)
+
+    async def object_url(self, file_key: str, expiration: int = 604800) -> str:
+        """已存在物件的 URL（快取命中或本地儲存時不進執行緒池）"""
+        if not (self.backend.use_s3 and self.backend.s3_client):
+            return self.backend.local_url(file_key)
+        return await self.generate_presigned_url(file_key, expiration)
+    
+    async def generate_presigned_urls(self, s3_keys: Iterable[str], expiration: int = 604800) -> Dict[str, str]:
+        """批量生成 URL"""
+        return await self._run(self.backend.generate_presigned_urls, list(s3_keys), expiration)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """關閉執行緒池（應用程式關閉時呼叫）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+# Global async storage instance
+storage = AsyncStorageService(s3_service)
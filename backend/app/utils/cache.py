@@ -0,0 +1,98 @@
+"""
+Cache Utilities
+行程內快取：有容量上限的 LRU + 每筆 TTL
+
+- 超過容量時淘汰最久未使用的項目
+- 過期項目在讀取時移除，寫入時順便清掉 LRU 尾端已過期的項目
+- 以 Lock 保護，可在執行緒池中使用
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """有容量上限的 LRU 快取，每筆資料各自設定存活時間（秒）"""
+
+    def __init__(self, max_size: int = 10000, default_ttl: float = 3600.0):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # {key: (value, expires_at)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """讀取快取，未命中或已過期返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """寫入快取（ttl <= 0 時不快取）"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl)
+            self._data.move_to_end(key)
+
+            # 先清掉最舊一端已過期的項目，再依容量淘汰
+            while self._data:
+                oldest_key, (_, expires_at) = next(iter(self._data.items()))
+                if expires_at > now:
+                    break
+                del self._data[oldest_key]
+                self.expirations += 1
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """移除快取項目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空快取與統計"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """快取統計（供監控使用）"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
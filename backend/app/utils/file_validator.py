@@ -0,0 +1,83 @@
+"""
+File Validator
+上傳檔案驗證：以檔頭（magic bytes）判斷實際類型、串流時檢查大小上限
+"""
+import hashlib
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.exceptions import FileTooLargeError
+
+# 判斷類型所需的檔頭長度（docx 需在 zip 開頭找到 word/ 目錄）
+SNIFF_BYTES = 2048
+
+# (檔頭, 偏移, MIME type)
+_SIGNATURES = (
+    (b"\xff\xd8\xff", 0, "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png"),
+    (b"GIF87a", 0, "image/gif"),
+    (b"GIF89a", 0, "image/gif"),
+    (b"WEBP", 8, "image/webp"),
+    (b"%PDF-", 0, "application/pdf"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", 0, "application/msword"),
+)
+
+# docx 等 Office Open XML 實際上是 zip
+_ZIP_SIGNATURE = b"PK\x03\x04"
+_DOCX_MARKER = b"word/"
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """
+    由檔案開頭判斷 MIME type
+
+    Returns:
+        無法辨識時返回 None（由呼叫端沿用客戶端宣告的類型）
+    """
+    for signature, offset, content_type in _SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if content_type == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return content_type
+
+    if head.startswith(_ZIP_SIGNATURE):
+        if _DOCX_MARKER in head:
+            return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        return "application/zip"
+
+    return None
+
+
+def read_chunks(fileobj: BinaryIO, chunk_size: int, max_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    分塊讀取檔案，超過 max_size 時立即中止
+
+    Raises:
+        FileTooLargeError: 累計大小超過上限
+    """
+    total = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise FileTooLargeError(f"檔案超過大小上限（{max_size} bytes）")
+        yield chunk
+
+
+def hash_stream(fileobj: BinaryIO, chunk_size: int, max_size: Optional[int] = None) -> Tuple[str, int]:
+    """
+    分塊計算檔案內容的 SHA-256
+
+    Returns:
+        (hex digest, 檔案大小)
+
+    Raises:
+        FileTooLargeError: 累計大小超過上限
+    """
+    digest = hashlib.sha256()
+    total = 0
+    for chunk in read_chunks(fileobj, chunk_size, max_size):
+        digest.update(chunk)
+        total += len(chunk)
+    return digest.hexdigest(), total
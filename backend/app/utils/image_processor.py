@@ -0,0 +1,172 @@
+"""
+Image Processor
+圖片衍生版本（thumbnail / card / large）產生工具（Pillow）
+
+- 依 EXIF Orientation 轉正後縮圖（只縮小不放大），輸出不含 EXIF 的 WebP / JPEG
+- 原圖同樣轉正後以原格式重新編碼，移除 EXIF（含 GPS 等資訊）
+- 純函式、輸入輸出皆為 bytes，可直接丟進 ProcessPoolExecutor 執行
+- 衍生版本與原圖放在同一個目錄，原圖檔名記錄衍生版本的格式：
+    pet_photo/<id>/original-webp.jpg
+    pet_photo/<id>/thumbnail.webp
+    pet_photo/<id>/card.webp
+    pet_photo/<id>/large.webp
+  因此調整 IMAGE_VARIANT_FORMAT 只影響新上傳的圖片；
+  早期的 pet_photo/<id>/original.jpg 沒有記錄格式，衍生版本為 WebP；
+  舊的扁平 key（pet_photo/<uuid>.jpg）沒有衍生版本，一律回退到原圖
+"""
+import io
+import uuid
+from pathlib import PurePosixPath
+from typing import Dict, Mapping, Optional
+
+from PIL import Image, ImageOps
+
+# 衍生版本名稱 -> 最長邊像素
+IMAGE_VARIANTS: Dict[str, int] = {
+    "thumbnail": 200,
+    "card": 600,
+    "large": 1600,
+}
+
+# 可產生衍生版本的類型（GIF 保留動畫，不處理）
+PROCESSABLE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+# 原圖在衍生目錄中的檔名（不含副檔名）
+ORIGINAL_NAME = "original"
+
+_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+}
+
+# 未記錄格式的原圖（original.jpg）當時的衍生版本格式
+_LEGACY_VARIANT_FORMAT = "webp"
+
+
+def variant_content_type(fmt: str) -> str:
+    """衍生版本的 MIME type"""
+    return _FORMATS[fmt][1]
+
+
+def original_key(category: str, ext: str, fmt: str, object_id: Optional[str] = None) -> str:
+    """產生會附帶 fmt 格式衍生版本的原圖 key（object_id 預設為隨機 uuid）"""
+    return f"{category}/{object_id or uuid.uuid4().hex}/{ORIGINAL_NAME}-{fmt}{ext}"
+
+
+def variant_format(file_key: str) -> Optional[str]:
+    """由原圖 key 取得衍生版本的格式；沒有衍生版本時返回 None"""
+    if not file_key or file_key.startswith(("http://", "https://")):
+        return None
+    path = PurePosixPath(file_key)
+    if len(path.parts) < 3:
+        return None
+    if path.stem == ORIGINAL_NAME:
+        return _LEGACY_VARIANT_FORMAT
+    name, _, fmt = path.stem.partition("-")
+    return fmt if name == ORIGINAL_NAME and fmt in _FORMATS else None
+
+
+def has_variants(file_key: str) -> bool:
+    """key 是否為附帶衍生版本的原圖"""
+    return variant_format(file_key) is not None
+
+
+def variant_key(file_key: str, variant: str) -> str:
+    """
+    由原圖 key 推出衍生版本的 key（格式取自原圖 key，不受目前設定影響）
+
+    沒有衍生版本的舊檔案（或 variant 為 original）返回原本的 key
+    """
+    fmt = variant_format(file_key)
+    if variant == ORIGINAL_NAME or variant not in IMAGE_VARIANTS or fmt is None:
+        return file_key
+    return str(PurePosixPath(file_key).with_name(f"{variant}{_FORMATS[fmt][2]}"))
+
+
+def render_variants(
+    data: bytes,
+    variants: Mapping[str, int] = IMAGE_VARIANTS,
+    fmt: str = "webp",
+    quality: int = 80
+) -> Dict[str, dict]:
+    """
+    產生所有衍生版本與去除中繼資料的原圖（在行程池中執行）
+
+    Returns:
+        {variant: {"data", "content_type", "width", "height"}}，
+        另含 ORIGINAL_NAME：轉正後以原格式重新編碼、不帶 EXIF 的原圖
+
+    Raises:
+        OSError / ValueError: 無法解碼的圖片
+        Image.DecompressionBombError: 像素數超過 Pillow 上限
+    """
+    pil_format, content_type, _ = _FORMATS[fmt]
+
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        source_format = source.format
+        icc_profile = source.info.get("icc_profile")
+        # 轉正方向；之後重新編碼時不帶 EXIF（含 GPS 等資訊）
+        image = ImageOps.exif_transpose(source)
+
+    results: Dict[str, dict] = {ORIGINAL_NAME: _sanitize_original(image, source_format, icc_profile)}
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if pil_format == "JPEG" or not has_alpha:
+        image = image.convert("RGB")
+    else:
+        image = image.convert("RGBA")
+
+    # 由大到小縮，每次以上一個結果為來源，減少重複縮放的成本
+    current = image
+    for name, max_side in sorted(variants.items(), key=lambda item: item[1], reverse=True):
+        resized = current.copy()
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        save_options = {"quality": quality}
+        if pil_format == "JPEG":
+            save_options.update(optimize=True, progressive=True)
+        else:
+            save_options["method"] = 4
+        resized.save(buffer, format=pil_format, **save_options)
+
+        results[name] = {
+            "data": buffer.getvalue(),
+            "content_type": content_type,
+            "width": resized.width,
+            "height": resized.height,
+        }
+        current = resized
+
+    return results
+
+
+def _sanitize_original(image: Image.Image, source_format: str, icc_profile: Optional[bytes]) -> dict:
+    """原圖以原格式重新編碼：只保留像素與色彩描述檔，不寫入 EXIF / XMP / 文字區塊"""
+    # image 是 exif_transpose 產生的副本；info 中的 exif / xmp / comment 等會被部分編碼器沿用，只留透明色
+    image.info = {key: value for key, value in image.info.items() if key == "transparency"}
+    save_options: Dict[str, object] = {}
+    if icc_profile:
+        save_options["icc_profile"] = icc_profile
+    if source_format == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        save_options.update(quality=95, optimize=True)
+    elif source_format == "WEBP":
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        save_options.update(quality=95, method=4)
+    elif source_format == "PNG":
+        save_options["optimize"] = True
+    else:
+        raise ValueError(f"Unsupported original format: {source_format}")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=source_format, **save_options)
+    return {
+        "data": buffer.getvalue(),
+        "content_type": Image.MIME[source_format],
+        "width": image.width,
+        "height": image.height,
+    }
@@ -0,0 +1,61 @@
+"""
+Pagination Utilities
+游標分頁（keyset pagination）工具
+
+游標內容為 (sort_by, order, sort_key, id)，以 JSON + URL-safe Base64 編碼，
+對客戶端而言是不透明字串；排序方式與游標不一致時視為無效游標。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from app.exceptions import ValidationError
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_by: str, order: str, sort_key: Any, last_id: int) -> str:
+    """編碼游標"""
+    payload = {"s": sort_by, "o": order, "k": _encode_value(sort_key), "i": last_id}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort_by: str, order: str) -> Optional[Tuple[Any, int]]:
+    """
+    解碼游標
+
+    Returns:
+        (sort_key, last_id)；cursor 為空時返回 None（第一頁）
+
+    Raises:
+        ValidationError: 游標格式錯誤或與目前排序方式不一致
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["s"] != sort_by or payload["o"] != order:
+            raise ValidationError("分頁游標與排序方式不一致")
+        last_id = payload["i"]
+        if not isinstance(last_id, int):
+            raise ValueError("invalid id")
+        return _decode_value(payload["k"]), last_id
+    except ValidationError:
+        raise
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise ValidationError("無效的分頁游標")
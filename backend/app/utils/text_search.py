@@ -0,0 +1,225 @@
+"""
+Text Search Utilities
+全文搜尋工具：中英文斷詞、MySQL FULLTEXT 查詢字串、記憶體倒排索引
+
+- 英文 / 數字：轉小寫後以單字為單位，查詢時採前綴比對（gold -> golden）
+- 中文：以單字 + 二元組（bigram）建索引，與 MySQL ngram parser（ngram_token_size=2）一致
+- 排序：BM25，欄位加權（name > breed > description）
+"""
+import bisect
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# 中日韓統一表意文字（含擴充 A、相容表意文字）
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"([0-9a-z]+)|([{_CJK}]+)")
+
+# 欄位權重：名稱命中比描述命中更相關
+FIELD_WEIGHTS: Dict[str, float] = {
+    "name": 3.0,
+    "breed": 2.0,
+    "description": 1.0,
+}
+
+# 前綴展開命中（非完整單字）的分數折扣
+PREFIX_MATCH_PENALTY = 0.5
+
+
+def _cjk_grams(run: str) -> List[str]:
+    """中文片段 -> 單字 + 二元組"""
+    grams = list(run)
+    grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """文件斷詞（建索引用）"""
+    if not text:
+        return []
+
+    tokens: List[str] = []
+    for word, cjk_run in _TOKEN_RE.findall(text.casefold()):
+        if word:
+            tokens.append(word)
+        else:
+            tokens.extend(_cjk_grams(cjk_run))
+    return tokens
+
+
+def query_terms(text: Optional[str]) -> List[Tuple[str, bool]]:
+    """
+    查詢斷詞
+
+    Returns:
+        [(term, is_prefix)]：英文詞為前綴比對；中文單字片段比對單字，
+        多字片段拆成二元組（全部命中才算符合，近似片語比對）
+    """
+    if not text:
+        return []
+
+    terms: List[Tuple[str, bool]] = []
+    seen = set()
+    for word, cjk_run in _TOKEN_RE.findall(text.casefold()):
+        if word:
+            candidates = [(word, True)]
+        elif len(cjk_run) == 1:
+            candidates = [(cjk_run, False)]
+        else:
+            candidates = [(cjk_run[i:i + 2], False) for i in range(len(cjk_run) - 1)]
+
+        for term in candidates:
+            if term not in seen:
+                seen.add(term)
+                terms.append(term)
+    return terms
+
+
+def build_boolean_query(text: Optional[str]) -> str:
+    """
+    轉換為 MySQL FULLTEXT BOOLEAN MODE 查詢字串
+
+    每個詞都加上 `+`（必須命中），英文詞加上 `*` 做前綴比對，
+    中文片段以片語方式交給 ngram parser 處理。
+    """
+    if not text:
+        return ""
+
+    parts: List[str] = []
+    for word, cjk_run in _TOKEN_RE.findall(text.casefold()):
+        if word:
+            parts.append(f"+{word}*")
+        elif len(cjk_run) == 1:
+            parts.append(f"+{cjk_run}*")
+        else:
+            parts.append(f'+"{cjk_run}"')
+    return " ".join(parts)
+
+
+class InvertedIndex:
+    """
+    記憶體倒排索引（SQLite / 測試環境的 FULLTEXT 替代方案）
+
+    postings: term -> {doc_id: 加權詞頻}
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_len: Dict[int, float] = {}
+        self._total_len = 0.0
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: int, fields: Mapping[str, Optional[str]]) -> None:
+        """新增或更新文件"""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        weighted: Dict[str, float] = defaultdict(float)
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text):
+                weighted[token] += weight
+
+        doc_len = sum(weighted.values())
+        self._doc_terms[doc_id] = dict(weighted)
+        self._doc_len[doc_id] = doc_len
+        self._total_len += doc_len
+
+        for term, tf in weighted.items():
+            postings = self._postings[term]
+            if not postings:
+                self._vocab_dirty = True
+            postings[doc_id] = tf
+
+    def remove(self, doc_id: int) -> None:
+        """移除文件"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocab_dirty = True
+
+    def clear(self) -> None:
+        """清空索引"""
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_len.clear()
+        self._total_len = 0.0
+        self._vocab = []
+        self._vocab_dirty = False
+
+    def _expand(self, term: str, is_prefix: bool) -> List[str]:
+        """前綴展開（以排序後的詞彙表 + 二分搜尋）"""
+        if not is_prefix:
+            return [term] if term in self._postings else []
+
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+
+        start = bisect.bisect_left(self._vocab, term)
+        expanded = []
+        for candidate in self._vocab[start:]:
+            if not candidate.startswith(term):
+                break
+            expanded.append(candidate)
+        return expanded
+
+    def search(self, text: Optional[str]) -> Dict[int, float]:
+        """
+        搜尋（所有查詢詞都必須命中）
+
+        Returns:
+            {doc_id: BM25 分數}，未命中返回空 dict
+        """
+        terms = query_terms(text)
+        if not terms or not self._doc_terms:
+            return {}
+
+        n_docs = len(self._doc_terms)
+        avg_len = self._total_len / n_docs if n_docs else 1.0
+        scores: Optional[Dict[int, float]] = None
+
+        for term, is_prefix in terms:
+            term_scores: Dict[int, float] = {}
+            for candidate in self._expand(term, is_prefix):
+                postings = self._postings[candidate]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                factor = 1.0 if candidate == term else PREFIX_MATCH_PENALTY
+
+                for doc_id, tf in postings.items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    score = factor * idf * tf * (self.k1 + 1) / (tf + norm)
+                    if score > term_scores.get(doc_id, 0.0):
+                        term_scores[doc_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc_id: scores[doc_id] + s for doc_id, s in term_scores.items()}
+
+            if not scores:
+                return {}
+
+        return scores or {}
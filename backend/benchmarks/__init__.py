@@ -0,0 +1,7 @@
+"""
+Benchmarks
+效能基準測試腳本（不屬於 pytest 測試套件）
+
+執行方式（於 backend/ 目錄）：
+    python -m benchmarks.bench_pet_search
+"""
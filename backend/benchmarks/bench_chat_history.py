@@ -0,0 +1,124 @@
+"""
+Chat history benchmark
+比較舊的 OFFSET 分頁（含用不到的 sender selectinload）與 before_id 游標分頁，
+在單一聊天室有大量訊息時，不同捲動深度的單頁耗時
+
+    python -m benchmarks.bench_chat_history --messages 100000 --runs 20
+
+SQLite 依 julianday(created_at) 排序（見 BaseRepository._comparable），基準測試另建等價的運算式索引；
+MySQL 直接使用 idx_room_created_id (room_id, created_at, id)，請以 EXPLAIN 確認沒有 filesort。
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import selectinload
+
+from app.models.chat_message import ChatMessage, MessageType
+from app.models.chat_room import ChatRoom
+from app.models.user import User, UserRole
+from app.repositories.chat import MessageRepository
+from benchmarks.common import create_bench_engine, session_maker, timer, print_row
+
+ROOM_ID = 1
+PAGE_SIZE = 50
+
+
+async def seed(session, sender_ids, count: int) -> None:
+    """
+    建立單一聊天室的訊息（每三則共用同一秒，測試同一時間的排序）
+
+    訊息直接帶入序號 1..count，並同步聊天室的 last_seq，不逐筆經過 _next_room_seq 分配
+    """
+    session.add(ChatRoom(
+        id=ROOM_ID, user_id=sender_ids[0], shelter_id=sender_ids[1], pet_id=1, last_seq=count
+    ))
+    await session.flush()
+    base = datetime(2025, 1, 1)
+    batch = []
+    for i in range(count):
+        batch.append({
+            "room_id": ROOM_ID,
+            "seq": i + 1,
+            "sender_id": sender_ids[i % 2],
+            "message_type": MessageType.TEXT,
+            "content": f"message {i}",
+            "is_read": False,
+            "created_at": base + timedelta(seconds=i // 3),
+        })
+        if len(batch) == 10000:
+            await session.execute(insert(ChatMessage), batch)
+            batch = []
+    if batch:
+        await session.execute(insert(ChatMessage), batch)
+    await session.commit()
+
+
+async def offset_page(session, skip: int):
+    """舊版：ORDER BY created_at DESC OFFSET skip，並預載 sender"""
+    result = await session.execute(
+        select(ChatMessage)
+        .options(selectinload(ChatMessage.sender))
+        .where(ChatMessage.room_id == ROOM_ID)
+        .order_by(ChatMessage.created_at.desc())
+        .offset(skip)
+        .limit(PAGE_SIZE)
+    )
+    return result.scalars().all()
+
+
+async def main(message_count: int, runs: int) -> None:
+    engine = await create_bench_engine("users", "chat_rooms", "chat_messages")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE INDEX bench_room_created_id ON chat_messages (room_id, julianday(created_at), id)"
+        ))
+    make_session = session_maker(engine)
+
+    async with make_session() as session:
+        users = [
+            User(email="adopter@bench.com", password_hash="x", name="Adopter", role=UserRole.adopter),
+            User(email="shelter@bench.com", password_hash="x", name="Shelter", role=UserRole.shelter),
+        ]
+        session.add_all(users)
+        await session.commit()
+        await seed(session, [user.id for user in users], message_count)
+
+    print("=" * 72)
+    print(f"💬 聊天紀錄分頁基準測試：{message_count} 則訊息，每頁 {PAGE_SIZE} 則，每個深度 {runs} 次")
+    print("=" * 72)
+
+    depths = [d for d in (0, 1000, 10000, message_count // 2, message_count - PAGE_SIZE) if d < message_count]
+    async with make_session() as session:
+        repo = MessageRepository(session)
+
+        # 各深度的游標：先走一次 OFFSET 取得該位置前一則的 id
+        anchors = {}
+        for depth in depths:
+            if depth:
+                previous = await offset_page(session, depth - 1)
+                anchors[depth] = previous[0].id
+
+        for depth in depths:
+            print(f"\n📍 深度 {depth}")
+            old, new = [], []
+            for _ in range(runs):
+                session.expunge_all()
+                with timer(old):
+                    await offset_page(session, depth)
+                session.expunge_all()
+                with timer(new):
+                    await repo.get_room_messages(ROOM_ID, before_id=anchors.get(depth), limit=PAGE_SIZE)
+            print_row("OFFSET + selectinload(sender)", old)
+            print_row("before_id 游標", new)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat history pagination benchmark")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.runs))
@@ -0,0 +1,103 @@
+"""
+File upload benchmark
+比較多檔上傳逐一執行（UPLOAD_CONCURRENCY=1）與並行上傳的請求延遲
+
+    python -m benchmarks.bench_file_upload --files 10 --latency 0.1 --runs 5
+
+儲存後端為本地 uploads/（寫入暫存目錄），每次上傳額外阻塞 --latency 秒模擬 S3 往返；
+檔案目錄（files 資料表）使用記憶體 SQLite。
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from httpx import ASGITransport, AsyncClient
+
+from app.auth.dependencies import get_current_user
+from app.core.config import settings
+from app.database import get_db
+from app.main import app
+from app.services.image_pipeline import image_pipeline
+from app.services.s3 import S3Service
+from app.services.storage import storage
+from benchmarks.common import create_bench_engine, session_maker, timer, print_row
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+class SimulatedLatencyStorage(S3Service):
+    """本地儲存 + 固定延遲（在執行緒池中阻塞，與 boto3 呼叫相同）"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.use_s3 = False
+        self.latency = latency
+
+    def upload_stream(self, *args, **kwargs) -> dict:
+        time.sleep(self.latency)
+        return super().upload_stream(*args, **kwargs)
+
+
+async def run_batch(client: AsyncClient, file_count: int, size: int) -> None:
+    files = [
+        ("files", (f"photo_{i}.png", PNG_HEADER + os.urandom(size), "image/png"))
+        for i in range(file_count)
+    ]
+    response = await client.post("/api/v2/files/upload", files=files, data={"category": "pet_photo"})
+    response.raise_for_status()
+    assert len(response.json()["files"]) == file_count
+
+
+async def main(file_count: int, latency: float, size: int, runs: int) -> None:
+    engine = await create_bench_engine("users", "files")
+    make_session = session_maker(engine)
+
+    async def bench_db():
+        async with make_session() as session:
+            yield session
+
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    app.dependency_overrides[get_db] = bench_db
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.backend = SimulatedLatencyStorage(latency)
+    default_concurrency = settings.UPLOAD_CONCURRENCY
+
+    print(f"\n{file_count} 個檔案 × {size // 1024} KB，每次上傳延遲 {latency * 1000:.0f} ms，執行緒池 {storage.max_workers}")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 暖機：啟動圖片處理行程池，避免計入第一輪
+        with contextlib.redirect_stdout(io.StringIO()):
+            await run_batch(client, file_count, size)
+        for label, concurrency in (("逐一上傳（concurrency=1）", 1), (f"並行上傳（concurrency={default_concurrency}）", default_concurrency)):
+            settings.UPLOAD_CONCURRENCY = concurrency
+            samples = []
+            for _ in range(runs):
+                # 略過上傳流程的逐檔 log
+                with contextlib.redirect_stdout(io.StringIO()), timer(samples):
+                    await run_batch(client, file_count, size)
+            print_row(label, samples)
+
+    settings.UPLOAD_CONCURRENCY = default_concurrency
+    app.dependency_overrides.clear()
+    await engine.dispose()
+    # 在暫存目錄刪除前等待行程池結束
+    image_pipeline.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="每次上傳的模擬延遲（秒）")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="每個檔案大小（bytes）")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(main(args.files, args.latency, args.size, args.runs))
@@ -0,0 +1,109 @@
+"""
+Notification coalescing benchmark
+模擬貼文被大量按讚（like storm），比較每次按讚新增一筆通知與合併通知（notify_coalesced）
+對 notifications 資料表成長、每次事件耗時，以及作者未讀數 / 通知列表查詢的影響
+
+    python -m benchmarks.bench_notification_coalescing --likes 5000 --posts 3 --read-every 1000
+
+- 按讚平均分散到作者的 --posts 則貼文，每次由不同用戶觸發
+- --read-every N：作者每 N 次按讚後全部已讀一次，之後的按讚開始新的合併通知
+- 合併時間窗使用 NOTIFICATION_COALESCE_WINDOW_HOURS，基準測試期間所有事件都在窗內
+"""
+import argparse
+import asyncio
+from typing import List
+
+from sqlalchemy import func, select
+
+from app.models.notification import Notification, NotificationType
+from app.models.user import User, UserRole
+from app.repositories import NotificationRepository
+from app.services.notification_service import NotificationService
+from app.services.realtime import ConnectionManager
+from benchmarks.common import create_bench_engine, session_maker, timer, print_row
+
+AUTHOR_ID = 1
+QUERY_RUNS = 50
+
+
+async def like_storm(make_session, likes: int, posts: int, read_every: int, coalesce: bool) -> List[float]:
+    """依序送出按讚事件，返回每次事件耗時"""
+    samples: List[float] = []
+    async with make_session() as session:
+        service = NotificationService(NotificationRepository(session), realtime=ConnectionManager())
+        for i in range(likes):
+            actor_id = 2 + i
+            post_id = i % posts + 1
+            with timer(samples):
+                if coalesce:
+                    await service.notify_coalesced(
+                        user_id=AUTHOR_ID,
+                        notification_type=NotificationType.POST_LIKE,
+                        link=f"/community/{post_id}",
+                        title="新的按讚",
+                        action="按讚了您的貼文",
+                        actor_id=actor_id,
+                        actor_name=f"用戶 {actor_id}"
+                    )
+                else:
+                    await service.create_notification(
+                        user_id=AUTHOR_ID,
+                        title="新的按讚",
+                        message=f"用戶 {actor_id} 按讚了您的貼文",
+                        notification_type=NotificationType.POST_LIKE,
+                        link=f"/community/{post_id}"
+                    )
+            if read_every and (i + 1) % read_every == 0:
+                await service.mark_all_as_read(AUTHOR_ID)
+    return samples
+
+
+async def run(label: str, likes: int, posts: int, read_every: int, coalesce: bool) -> None:
+    engine = await create_bench_engine("users", "notifications", "notification_actors")
+    make_session = session_maker(engine)
+
+    async with make_session() as session:
+        session.add(User(id=AUTHOR_ID, email="author@bench.com", password_hash="x", name="Author", role=UserRole.adopter))
+        session.add_all(
+            User(id=2 + i, email=f"fan{i}@bench.com", password_hash="x", name=f"用戶 {2 + i}", role=UserRole.adopter)
+            for i in range(likes)
+        )
+        await session.commit()
+
+    event_samples = await like_storm(make_session, likes, posts, read_every, coalesce)
+
+    unread_samples: List[float] = []
+    list_samples: List[float] = []
+    async with make_session() as session:
+        repo = NotificationRepository(session)
+        rows = await session.scalar(select(func.count()).select_from(Notification))
+        for _ in range(QUERY_RUNS):
+            with timer(unread_samples):
+                unread = await repo.get_unread_count(AUTHOR_ID)
+            with timer(list_samples):
+                latest = await repo.get_user_notifications(AUTHOR_ID, 0, 20)
+
+    print(f"\n{label}")
+    print(f"  資料列 {rows:>8}   未讀 {unread:>8}   最新一則：{latest[0].message if latest else '-'}")
+    print_row("每次按讚", event_samples)
+    print_row("未讀數查詢", unread_samples)
+    print_row("通知列表（20 筆）", list_samples)
+    await engine.dispose()
+
+
+async def main(likes: int, posts: int, read_every: int) -> None:
+    print("=" * 72)
+    print(f"🔔 通知合併基準測試：{likes} 次按讚，{posts} 則貼文，"
+          f"{'每 ' + str(read_every) + ' 次全部已讀' if read_every else '不讀取'}")
+    print("=" * 72)
+    await run("📄 每次按讚一筆通知", likes, posts, read_every, coalesce=False)
+    await run("🧩 合併通知（type + link）", likes, posts, read_every, coalesce=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notification coalescing benchmark")
+    parser.add_argument("--likes", type=int, default=5000)
+    parser.add_argument("--posts", type=int, default=3)
+    parser.add_argument("--read-every", type=int, default=1000, help="作者每 N 次按讚後全部已讀（0 表示不讀取）")
+    args = parser.parse_args()
+    asyncio.run(main(args.likes, args.posts, args.read_every))
@@ -0,0 +1,107 @@
+"""
+Pet search benchmark
+比較舊的 ILIKE '%text%' 掃描與全文搜尋（記憶體倒排索引）
+
+    python -m benchmarks.bench_pet_search --pets 20000 --runs 30
+
+MySQL 環境請以相同查詢比較 EXPLAIN：FULLTEXT 索引可避免全表掃描。
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import select, func, or_, insert
+
+from app.models.pet import Pet, PetStatus
+from app.models.user import User, UserRole
+from app.repositories.pet import PetRepository
+from benchmarks.common import create_bench_engine, session_maker, timer, print_row
+
+NAMES = ["Lucky", "Buddy", "Max", "Mimi", "Coco", "小黃", "小黑", "豆豆", "球球", "Luna"]
+BREEDS = ["Golden Retriever", "Labrador", "Shiba Inu", "Persian", "米克斯", "柴犬", "黃金獵犬", "波斯貓"]
+WORDS = [
+    "friendly", "energetic", "calm", "loves", "children", "walks", "quiet", "playful",
+    "很親人", "活潑", "安靜", "喜歡散步", "已結紮", "適合新手", "怕生", "愛撒嬌",
+]
+QUERIES = ["golden", "親人", "shiba", "quiet walks", "黃金獵犬", "lab"]
+
+
+async def seed(session, shelter_id: int, count: int) -> None:
+    """建立測試寵物"""
+    rng = random.Random(42)
+    rows = [
+        {
+            "name": rng.choice(NAMES),
+            "species": "dog",
+            "breed": rng.choice(BREEDS),
+            "gender": "male",
+            "description": " ".join(rng.choices(WORDS, k=30)),
+            "status": PetStatus.AVAILABLE,
+            "shelter_id": shelter_id,
+            "created_by": shelter_id,
+        }
+        for _ in range(count)
+    ]
+    await session.execute(insert(Pet), rows)
+    await session.commit()
+
+
+async def ilike_search(session, text: str, limit: int = 20):
+    """舊版：三個欄位 ILIKE '%text%'"""
+    condition = or_(
+        Pet.name.ilike(f"%{text}%"),
+        Pet.breed.ilike(f"%{text}%"),
+        Pet.description.ilike(f"%{text}%"),
+    )
+    base = select(Pet.id).where(Pet.status == PetStatus.AVAILABLE).where(condition)
+    total = (await session.execute(select(func.count()).select_from(base.subquery()))).scalar()
+    rows = (await session.execute(base.order_by(Pet.created_at.desc()).limit(limit))).all()
+    return rows, total
+
+
+async def main(pet_count: int, runs: int) -> None:
+    engine = await create_bench_engine("users", "pets", "pet_photos")
+    make_session = session_maker(engine)
+
+    async with make_session() as session:
+        shelter = User(email="bench@test.com", password_hash="x", name="Bench", role=UserRole.shelter)
+        session.add(shelter)
+        await session.commit()
+        await seed(session, shelter.id, pet_count)
+
+    print("=" * 72)
+    print(f"🔍 寵物搜尋基準測試：{pet_count} 筆寵物，每個查詢 {runs} 次")
+    print("=" * 72)
+
+    async with make_session() as session:
+        repo = PetRepository(session)
+
+        build = []
+        with timer(build):
+            await repo._get_search_index()
+        print_row("倒排索引建立（首次）", build)
+
+        for text in QUERIES:
+            ilike_samples, index_samples, relevance_samples = [], [], []
+            for _ in range(runs):
+                with timer(ilike_samples):
+                    _, ilike_total = await ilike_search(session, text)
+                with timer(index_samples):
+                    _, index_total = await repo.search_pets_with_count({"query": text}, 0, 20)
+                with timer(relevance_samples):
+                    await repo.search_pets_with_count({"query": text, "sort_by": "relevance"}, 0, 20)
+
+            print(f"\n查詢 {text!r}：ILIKE 命中 {ilike_total} 筆，全文搜尋命中 {index_total} 筆")
+            print_row("ILIKE '%text%'", ilike_samples)
+            print_row("全文索引（created_at 排序）", index_samples)
+            print_row("全文索引（relevance 排序）", relevance_samples)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pets", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.pets, args.runs))
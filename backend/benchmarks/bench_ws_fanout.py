@@ -0,0 +1,151 @@
+"""
+WebSocket fan-out benchmark
+比較舊的廣播（走訪所有連線的訂閱集合、逐一 await send_json）與
+聊天室反向索引 + 每條連線送出佇列的 ConnectionManager
+
+    python -m benchmarks.bench_ws_fanout --connections 5000 --rooms 500 --slow 0.01 --runs 200
+
+以模擬 socket 量測：
+- 廣播呼叫本身的耗時（發送 API 的請求會等待它）
+- 房內所有正常客戶端都收到訊息的耗時（slow 比例的客戶端每次送出需 --slow-delay 毫秒）
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from app.services.realtime import ConnectionManager
+from benchmarks.common import timer, print_row
+
+
+class SimulatedSocket:
+    """模擬 WebSocket：慢速客戶端每次送出都要等待 delay 秒"""
+
+    def __init__(self, delay: float, tracker: "DeliveryTracker"):
+        self.delay = delay
+        self.tracker = tracker
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.tracker.received(self)
+
+    async def send_json(self, message: dict):
+        await self.send_text(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class DeliveryTracker:
+    """等待一組正常客戶端都收到訊息"""
+
+    def __init__(self):
+        self.pending = set()
+        self.done = asyncio.Event()
+
+    def expect(self, sockets) -> None:
+        self.pending = set(sockets)
+        self.done.clear()
+        if not self.pending:
+            self.done.set()
+
+    def received(self, socket) -> None:
+        self.pending.discard(socket)
+        if not self.pending:
+            self.done.set()
+
+
+class LegacyConnectionManager:
+    """舊版：{user_id: websocket} + {user_id: set(room_ids)}"""
+
+    def __init__(self):
+        self.active_connections: Dict[int, SimulatedSocket] = {}
+        self.user_rooms: Dict[int, set] = {}
+
+    async def connect(self, websocket, user_id: int):
+        await websocket.accept()
+        self.active_connections[user_id] = websocket
+        self.user_rooms[user_id] = set()
+
+    def subscribe_room(self, user_id: int, room_id: int):
+        self.user_rooms[user_id].add(room_id)
+
+    async def send_personal_message(self, message: dict, user_id: int):
+        if user_id in self.active_connections:
+            await self.active_connections[user_id].send_json(message)
+
+    async def broadcast_to_room(self, message: dict, room_id: int, exclude_user: Optional[int] = None):
+        for user_id, rooms in self.user_rooms.items():
+            if room_id in rooms and user_id != exclude_user:
+                await self.send_personal_message(message, user_id)
+
+
+async def run(label: str, manager, connections: int, rooms: int, slow_ratio: float,
+              slow_delay: float, runs: int) -> None:
+    rng = random.Random(7)
+    tracker = DeliveryTracker()
+    members: Dict[int, List[SimulatedSocket]] = {room_id: [] for room_id in range(rooms)}
+
+    # 連線 / 訂閱時每條連線各印一行 log，建立階段先略過輸出
+    with contextlib.redirect_stdout(io.StringIO()):
+        for user_id in range(connections):
+            delay = slow_delay if rng.random() < slow_ratio else 0.0
+            socket = SimulatedSocket(delay, tracker)
+            await manager.connect(socket, user_id)
+            room_id = user_id % rooms
+            manager.subscribe_room(user_id, room_id)
+            members[room_id].append(socket)
+
+    message = {"type": "new_message", "room_id": 0, "message": {"content": "哈囉，請問還可以認養嗎？" * 4}}
+    call, delivered = [], []
+    for i in range(runs):
+        room_id = rng.randrange(rooms)
+        message["room_id"] = room_id
+        tracker.expect(socket for socket in members[room_id] if not socket.delay)
+        start = time.perf_counter()
+        with timer(call):
+            await manager.broadcast_to_room(message, room_id)
+        await tracker.done.wait()
+        delivered.append((time.perf_counter() - start) * 1000)
+
+    print(f"\n📡 {label}")
+    print_row("broadcast 呼叫", call)
+    print_row("正常客戶端全部收到", delivered)
+
+
+async def main(connections: int, rooms: int, slow_ratio: float, slow_delay_ms: float, runs: int) -> None:
+    print("=" * 72)
+    print(f"📡 WebSocket 廣播基準測試：{connections} 條連線、{rooms} 個聊天室、"
+          f"{slow_ratio:.0%} 慢速客戶端（{slow_delay_ms:.0f} ms/frame），{runs} 次廣播")
+    print("=" * 72)
+
+    slow_delay = slow_delay_ms / 1000
+    await run("舊版：掃描所有連線 + 逐一 await", LegacyConnectionManager(),
+              connections, rooms, slow_ratio, slow_delay, runs)
+
+    # 佇列夠大，避免慢速客戶端在基準測試中被斷線
+    manager = ConnectionManager(queue_size=runs + 1)
+    await run("新版：聊天室反向索引 + 送出佇列", manager,
+              connections, rooms, slow_ratio, slow_delay, runs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for user_id in list(manager.active_connections):
+            manager.disconnect(user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket fan-out benchmark")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--slow", type=float, default=0.01, help="慢速客戶端比例")
+    parser.add_argument("--slow-delay", type=float, default=20.0, help="慢速客戶端每個 frame 的延遲（毫秒）")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.connections, args.rooms, args.slow, args.slow_delay, args.runs))
@@ -0,0 +1,222 @@
+"""
+WebSocket framing benchmark
+比較聊天 WebSocket 各種 frame 編碼的傳輸量與 CPU：
+json / msgpack（?encoding=msgpack，msgpack 列在 requirements.txt），各自搭配或不搭配 permessage-deflate
+
+    python -m benchmarks.bench_ws_framing --messages 2000 --photos 5
+
+- 伺服器端編碼走 app.services.realtime 的實際路徑（encode_frame、to_binary_frame）
+- permessage-deflate 以 zlib raw deflate 模擬（RFC 7692：每則 Z_SYNC_FLUSH 後去掉結尾 4 bytes），
+  預設保留壓縮字典（context takeover），--no-context-takeover 模擬每則重新開始
+- 傳輸量包含伺服器送出 frame 的 header（不遮罩：2 / 4 / 10 bytes）
+- CPU 以 process_time 計算：伺服器編碼 + 壓縮、客戶端解壓 + 解析，換算成每則微秒
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.api.v2.chat import _serialize_message, _serialize_room
+from app.models.chat_message import ChatMessage, MessageType
+from app.models.chat_room import ChatRoom
+from app.models.pet import Pet, PetPhoto, PetStatus
+from app.models.user import User
+from app.services.realtime import encode_frame, frame_encodings, to_binary_frame, decode_binary_frame
+
+_SAMPLE_TEXTS = [
+    "你好，請問這隻狗狗還可以認養嗎？",
+    "可以的！歡迎週末來收容所看看牠 🐶",
+    "牠平常會怕生嗎？家裡還有一隻貓。",
+    "剛來的時候比較害羞，熟了之後很親人，之前也和貓一起住過。",
+    "Great, could we schedule a visit on Saturday afternoon?",
+    "好的，我們星期六下午兩點見，請記得帶身分證件。",
+    "收到，謝謝！",
+]
+
+
+def _signed_url(file_key: str, variant: str) -> str:
+    """模擬 CloudFront 簽章網址的長度與隨機性"""
+    signature = hashlib.sha512(f"{file_key}:{variant}".encode()).hexdigest() * 3
+    return (
+        f"https://d1example.cloudfront.net/{variant}/{file_key}"
+        f"?Expires=1767225600&Signature={signature[:344]}&Key-Pair-Id=K2JCJMDEHXQW5F"
+    )
+
+
+def message_frames(count: int) -> List[Dict[str, Any]]:
+    """new_message 廣播 frame（與 API 相同的 _serialize_message 格式）"""
+    rng = random.Random(7)
+    started = datetime(2025, 1, 1, 9, 0, 0)
+    frames = []
+    for i in range(count):
+        message = ChatMessage(
+            id=100000 + i,
+            room_id=42,
+            sender_id=rng.choice((3, 8)),
+            message_type=MessageType.TEXT,
+            content=rng.choice(_SAMPLE_TEXTS),
+            is_read=False,
+            seq=i + 1,
+            created_at=started + timedelta(seconds=i * 7),
+        )
+        frames.append({"type": "new_message", "room_id": 42, "message": _serialize_message(message)})
+    return frames
+
+
+def room_frames(count: int, photos: int) -> List[Dict[str, Any]]:
+    """聊天室資料 frame（_serialize_room：寵物資料與照片陣列）"""
+    frames = []
+    for i in range(count):
+        pet = Pet(
+            id=500 + i,
+            name=f"小白 {i}",
+            species="dog",
+            breed="Mixed",
+            gender="male",
+            age_years=2,
+            age_months=3,
+            size="medium",
+            color="白色",
+            description="個性溫和親人，已完成結紮與疫苗注射，適合有院子的家庭。" * 3,
+            status=PetStatus.AVAILABLE,
+        )
+        pet.photos = [
+            PetPhoto(id=9000 + i * photos + n, file_key=f"pets/{500 + i}/{n}.jpg", is_primary=n == 0)
+            for n in range(photos)
+        ]
+        room = ChatRoom(
+            id=1000 + i,
+            user_id=3,
+            shelter_id=8,
+            pet_id=pet.id,
+            created_at=datetime(2025, 1, 1),
+            last_message_at=datetime(2025, 1, 2, 12, 30),
+            last_message_preview=_SAMPLE_TEXTS[i % len(_SAMPLE_TEXTS)],
+            last_message_type="text",
+        )
+        room.pet = pet
+        room.user = User(name="王小明", email="adopter@example.com")
+        room.shelter = User(name="台北動物之家", email="shelter@example.com")
+
+        data = _serialize_room(room)
+        # 本機儲存沒有縮圖網址；以簽章網址填入，接近正式環境的大小
+        for photo in data["pet"]["photos"]:
+            photo["file_url"] = _signed_url(photo["file_key"], "card")
+            photo["thumbnail_url"] = _signed_url(photo["file_key"], "thumbnail")
+        data["pet_photo_url"] = data["pet"]["photos"][0]["thumbnail_url"] if photos else None
+        frames.append({"type": "room_updated", "room": data})
+    return frames
+
+
+def _frame_header(length: int) -> int:
+    """伺服器送出 frame 的 header 大小（不遮罩）"""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+class Deflater:
+    """permessage-deflate 的壓縮 / 解壓（每則訊息）"""
+
+    def __init__(self, context_takeover: bool):
+        self.context_takeover = context_takeover
+        self._compressor = self._new_compressor()
+        self._decompressor = zlib.decompressobj(-15)
+
+    @staticmethod
+    def _new_compressor():
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+
+    def compress(self, payload: bytes) -> bytes:
+        if not self.context_takeover:
+            self._compressor = self._new_compressor()
+        data = self._compressor.compress(payload) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4]
+
+    def decompress(self, payload: bytes) -> bytes:
+        if not self.context_takeover:
+            self._decompressor = zlib.decompressobj(-15)
+        return self._decompressor.decompress(payload + b"\x00\x00\xff\xff")
+
+
+def _codec(encoding: str) -> Tuple[Callable[[Dict[str, Any]], bytes], Callable[[bytes], Any]]:
+    """返回 (伺服器編碼, 客戶端解析)"""
+    if encoding == "msgpack":
+        return (lambda message: to_binary_frame(encode_frame(message))), decode_binary_frame
+    return (lambda message: encode_frame(message).encode()), json.loads
+
+
+def measure(
+    frames: List[Dict[str, Any]],
+    encoding: str,
+    deflate: bool,
+    context_takeover: bool
+) -> Tuple[float, float, float]:
+    """
+    送出整串 frame
+
+    Returns:
+        (每則平均傳輸 bytes, 伺服器每則 CPU 微秒, 客戶端每則 CPU 微秒)
+    """
+    encode, decode = _codec(encoding)
+    deflater: Optional[Deflater] = Deflater(context_takeover) if deflate else None
+
+    wire = []
+    start = time.process_time()
+    for message in frames:
+        payload = encode(message)
+        if deflater is not None:
+            payload = deflater.compress(payload)
+        wire.append(payload)
+    server_cpu = time.process_time() - start
+
+    start = time.process_time()
+    for payload in wire:
+        if deflater is not None:
+            payload = deflater.decompress(payload)
+        decode(payload)
+    client_cpu = time.process_time() - start
+
+    total = sum(len(payload) + _frame_header(len(payload)) for payload in wire)
+    count = len(frames)
+    return total / count, server_cpu / count * 1e6, client_cpu / count * 1e6
+
+
+def report(label: str, frames: List[Dict[str, Any]], context_takeover: bool) -> None:
+    print(f"\n📦 {label}（{len(frames)} 則）")
+    print(f"  {'模式':<24}{'bytes/則':>10}{'相對 json':>12}{'伺服器 µs/則':>16}{'客戶端 µs/則':>16}")
+    baseline = None
+    for encoding in ("json", "msgpack"):
+        if encoding not in frame_encodings():
+            print(f"  {encoding:<24}（未安裝 msgpack，請先 pip install -r requirements.txt，略過）")
+            continue
+        for deflate in (False, True):
+            size, server_us, client_us = measure(frames, encoding, deflate, context_takeover)
+            baseline = baseline or size
+            mode = f"{encoding} + deflate" if deflate else encoding
+            print(f"  {mode:<24}{size:>10.1f}{size / baseline:>11.0%}{server_us:>16.1f}{client_us:>16.1f}")
+
+
+def main(messages: int, rooms: int, photos: int, context_takeover: bool) -> None:
+    print("=" * 80)
+    print(f"🗜️  WebSocket frame 編碼基準測試（permessage-deflate "
+          f"{'保留' if context_takeover else '不保留'}壓縮字典）")
+    print("=" * 80)
+    report("new_message 廣播", message_frames(messages), context_takeover)
+    report(f"聊天室資料（{photos} 張照片）", room_frames(rooms, photos), context_takeover)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket framing benchmark")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--photos", type=int, default=5, help="每個聊天室的寵物照片數")
+    parser.add_argument("--no-context-takeover", action="store_true", help="每則訊息重新開始壓縮字典")
+    args = parser.parse_args()
+    main(args.messages, args.rooms, args.photos, not args.no_context_takeover)
@@ -0,0 +1,55 @@
+"""
+Benchmark helpers
+基準測試共用工具：建立 SQLite 測試資料庫、計時
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401 - 註冊所有 model
+from app.database import Base
+
+BENCH_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+
+async def create_bench_engine(*table_names: str) -> AsyncEngine:
+    """建立記憶體資料庫並只建立指定的資料表"""
+    engine = create_async_engine(
+        BENCH_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    tables = [Base.metadata.tables[name] for name in table_names]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+    return engine
+
+
+def session_maker(engine: AsyncEngine) -> async_sessionmaker:
+    """建立 session factory"""
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@contextmanager
+def timer(results: List[float]) -> Iterator[None]:
+    """計時並將耗時（毫秒）加入 results"""
+    start = time.perf_counter()
+    yield
+    results.append((time.perf_counter() - start) * 1000)
+
+
+def summarize(samples: List[float]) -> Tuple[float, float, float]:
+    """返回 (平均, p50, p95)，單位毫秒"""
+    ordered = sorted(samples)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return sum(ordered) / len(ordered), p50, p95
+
+
+def print_row(label: str, samples: List[float]) -> None:
+    """輸出一行統計結果"""
+    avg, p50, p95 = summarize(samples)
+    print(f"  {label:<32} avg {avg:8.2f} ms   p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
@@ -3,14 +3,18 @@ E2E 測試基礎設施
 測試完整 HTTP 請求流程（API → Service → Repository → Database）
 """
 import pytest
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Dict
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_session_factory
 from app.models.user import User, UserRole
+from app.services.message_batcher import MessageBatcher, get_message_batcher
+from app.services.realtime import manager as realtime_manager
+from app.services.room_participants import room_participants_cache
 from app.auth.password_handler import password_handler
 
 
@@ -32,6 +36,10 @@ async def test_engine():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
+    # 每個測試都是新的資料庫，聊天室 ID 會重複使用
+    room_participants_cache.local.clear()
+    realtime_manager.history.clear()
+    
     yield engine
     
     # 清理
@@ -66,6 +74,15 @@ async def async_client(test_db: AsyncSession) -> AsyncGenerator[AsyncClient, Non
     
     app.dependency_overrides[get_db] = override_get_db
     
+    # 覆蓋 WebSocket 使用的 session factory（同樣使用測試 session）
+    @asynccontextmanager
+    async def test_session_factory():
+        yield test_db
+    
+    app.dependency_overrides[get_session_factory] = lambda: test_session_factory
+    # WebSocket 發送的批次寫入也使用測試 session（共用一個 session，一次只寫一批）
+    app.dependency_overrides[get_message_batcher] = lambda: MessageBatcher(test_session_factory, max_inflight=1)
+    
     # 創建 async HTTP client
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as client:
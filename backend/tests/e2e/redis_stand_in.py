@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Redis stand-in for multi-process tests
+以 asyncio 實作的最小 RESP2 伺服器：PUBLISH / SUBSCRIBE / UNSUBSCRIBE 與少量 key 指令，
+讓多個 app 行程在沒有 Redis 的環境下也能經由 pub/sub 互通。
+"""
+import asyncio
+from typing import Dict, List, Optional, Set
+
+
+def _bulk(value: Optional[str]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    data = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def _array(*items: bytes) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+def _integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+class RedisStandIn:
+    """最小的 Redis pub/sub 伺服器"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.values: Dict[str, str] = {}
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.port: Optional[int] = None
+
+    async def start(self, host: str = "127.0.0.1") -> int:
+        self.server = await asyncio.start_server(self._handle, host, 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for writers in self.channels.values():
+                for writer in writers:
+                    writer.close()
+            await self.server.wait_closed()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[str]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode().split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2].decode())
+        return args
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriptions: Set[str] = set()
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                writer.write(self._execute(args, writer, subscriptions))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self.channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    def _execute(self, args: List[str], writer: asyncio.StreamWriter, subscriptions: Set[str]) -> bytes:
+        command = args[0].upper()
+        if command == "PING":
+            if subscriptions:
+                return _array(_bulk("pong"), _bulk(""))
+            return b"+PONG\r\n"
+        if command == "SUBSCRIBE":
+            reply = b""
+            for channel in args[1:]:
+                subscriptions.add(channel)
+                self.channels.setdefault(channel, set()).add(writer)
+                reply += _array(_bulk("subscribe"), _bulk(channel), _integer(len(subscriptions)))
+            return reply
+        if command == "UNSUBSCRIBE":
+            reply = b""
+            for channel in args[1:] or list(subscriptions):
+                subscriptions.discard(channel)
+                self.channels.get(channel, set()).discard(writer)
+                reply += _array(_bulk("unsubscribe"), _bulk(channel), _integer(len(subscriptions)))
+            return reply
+        if command == "PUBLISH":
+            channel, message = args[1], args[2]
+            receivers = list(self.channels.get(channel, ()))
+            frame = _array(_bulk("message"), _bulk(channel), _bulk(message))
+            for receiver in receivers:
+                receiver.write(frame)
+            return _integer(len(receivers))
+        if command == "GET":
+            return _bulk(self.values.get(args[1]))
+        if command == "SET":
+            self.values[args[1]] = args[2]
+            return b"+OK\r\n"
+        if command == "SETEX":
+            self.values[args[1]] = args[3]
+            return b"+OK\r\n"
+        if command == "DEL":
+            return _integer(sum(self.values.pop(key, None) is not None for key in args[1:]))
+        # CLIENT SETINFO / SELECT 等連線設定指令
+        return b"+OK\r\n"
@@ -3,8 +3,11 @@
 Chat API E2E Tests
 Test complete chat flow: HTTP Request -> Controller -> Service -> Repository -> Database
 """
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import event
 from app.models.user import User
 from app.models.pet import Pet, PetStatus
 from app.models.chat_room import ChatRoom
@@ -312,6 +315,152 @@ class TestListChatRoomsAPI:
         data = response.json()
         assert isinstance(data, list) or "rooms" in data or "items" in data
 
+    
+    async def _create_rooms_with_messages(self, test_db, shelter: User, adopter: User, count: int):
+        """建立 count 個各有兩則訊息的聊天室（last_message_at 依序遞增）"""
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        rooms = []
+        for i in range(count):
+            pet = Pet(
+                name=f"Room Pet {i}",
+                species="dog",
+                breed="Mixed",
+                gender="male",
+                age_years=2,
+                size="medium",
+                status=PetStatus.AVAILABLE,
+                shelter_id=shelter.id,
+                created_by=shelter.id
+            )
+            test_db.add(pet)
+            await test_db.flush()
+            room = ChatRoom(
+                user_id=adopter.id,
+                shelter_id=shelter.id,
+                pet_id=pet.id,
+                last_message_at=base + timedelta(minutes=i)
+            )
+            test_db.add(room)
+            await test_db.flush()
+            last = ChatMessage(room_id=room.id, sender_id=shelter.id, message_type=MessageType.TEXT, content=f"reply {i}")
+            test_db.add(ChatMessage(room_id=room.id, sender_id=adopter.id, message_type=MessageType.TEXT, content=f"hi {i}"))
+            await test_db.flush()
+            test_db.add(last)
+            await test_db.flush()
+            room.last_message_id = last.id
+            room.last_message_preview = last.content
+            room.last_message_type = MessageType.TEXT.value
+            rooms.append(room)
+        await test_db.commit()
+        return rooms
+    
+    async def test_list_rooms_constant_query_count(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_engine,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict
+    ):
+        """Test the number of SQL statements does not grow with the number of rooms"""
+        statements = []
+        
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            query_counts = []
+            for batch in (2, 10):
+                await self._create_rooms_with_messages(test_db, test_shelter_user, test_adopter_user, batch)
+                statements.clear()
+                response = await async_client.get("/api/v2/chat/rooms?limit=100", headers=adopter_auth_headers)
+                assert response.status_code == 200
+                query_counts.append(len(statements))
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        
+        assert len(response.json()["rooms"]) == 12
+        assert query_counts[0] == query_counts[1]
+        
+        room = response.json()["rooms"][0]
+        assert room["last_message"] == "reply 9"
+        assert room["unread_count"] == 1
+        
+        # 列表只讀 chat_rooms（與預載的關聯），chat_messages 只用於一次未讀數查詢
+        assert sum("chat_messages" in statement for statement in statements) == 1
+    
+    async def test_send_message_updates_room_summary(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test sending a message stores the last-message summary on the room"""
+        rooms = await self._create_rooms_with_messages(test_db, test_shelter_user, test_adopter_user, 2)
+        older = rooms[0]
+        
+        response = await async_client.post(
+            f"/api/v2/chat/rooms/{older.id}/messages/text",
+            json={"content": "x" * 300},
+            headers=adopter_auth_headers
+        )
+        assert response.status_code in (200, 201)
+        message_id = response.json()["id"]
+        
+        await test_db.refresh(older)
+        assert older.last_message_id == message_id
+        assert older.last_message_preview == "x" * 200
+        assert older.last_message_type == "text"
+        
+        response = await async_client.get("/api/v2/chat/rooms", headers=shelter_auth_headers)
+        data = response.json()["rooms"]
+        assert data[0]["id"] == older.id
+        assert data[0]["last_message"] == "x" * 200
+        assert data[0]["last_message_type"] == "text"
+        
+        response = await async_client.get(f"/api/v2/chat/rooms/{older.id}", headers=shelter_auth_headers)
+        assert response.json()["last_message"] == "x" * 200
+    
+    async def test_list_rooms_cursor_pagination(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        shelter_auth_headers: dict
+    ):
+        """Test rooms are paged by last_message_at with an opaque cursor"""
+        rooms = await self._create_rooms_with_messages(test_db, test_shelter_user, test_adopter_user, 5)
+        
+        seen = []
+        cursor = None
+        while True:
+            url = "/api/v2/chat/rooms?limit=2" + (f"&cursor={cursor}" if cursor else "")
+            response = await async_client.get(url, headers=shelter_auth_headers)
+            assert response.status_code == 200
+            data = response.json()
+            seen.append([room["id"] for room in data["rooms"]])
+            cursor = data["next_cursor"]
+            if not data["has_more"]:
+                break
+        
+        expected = [room.id for room in reversed(rooms)]
+        assert seen == [expected[0:2], expected[2:4], expected[4:5]]
+        
+        # 未指定 cursor 與 limit：返回全部，不分頁
+        response = await async_client.get("/api/v2/chat/rooms", headers=shelter_auth_headers)
+        data = response.json()
+        assert [room["id"] for room in data["rooms"]] == expected
+        assert data["next_cursor"] is None and data["has_more"] is False
+        
+        response = await async_client.get("/api/v2/chat/rooms?cursor=bogus", headers=shelter_auth_headers)
+        assert response.status_code == 400
+
 
 # ==================== Send Message Tests ====================
 
@@ -409,6 +558,71 @@ class TestSendMessageAPI:
         # TODO: Consider adding validation to reject empty messages (should return 400)
         assert response.status_code == 200
     
+    async def test_access_checks_use_participants_cache(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_engine,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test warm access checks do not read chat_rooms and relations load only for room details"""
+        pet = Pet(
+            name="Cached Pet",
+            species="dog",
+            breed="Mixed",
+            gender="male",
+            age_years=2,
+            size="medium",
+            status=PetStatus.AVAILABLE,
+            shelter_id=test_shelter_user.id,
+            created_by=test_shelter_user.id
+        )
+        test_db.add(pet)
+        await test_db.flush()
+        room = ChatRoom(user_id=test_adopter_user.id, shelter_id=test_shelter_user.id, pet_id=pet.id)
+        test_db.add(room)
+        await test_db.commit()
+        
+        statements = []
+        
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        def room_reads():
+            return [s for s in statements if s.lstrip().upper().startswith("SELECT") and "FROM chat_rooms" in s]
+        
+        # 第一次存取查一次 chat_rooms 並寫入快取
+        response = await async_client.put(f"/api/v2/chat/rooms/{room.id}/read", headers=shelter_auth_headers)
+        assert response.status_code == 200
+        
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            response = await async_client.post(
+                f"/api/v2/chat/rooms/{room.id}/messages/text",
+                json={"content": "cached"},
+                headers=adopter_auth_headers
+            )
+            assert response.status_code == 200
+            message_id = response.json()["id"]
+            response = await async_client.put(f"/api/v2/chat/rooms/{room.id}/read", headers=shelter_auth_headers)
+            assert response.status_code == 200
+            assert room_reads() == []
+            assert not any("FROM users" in s and "chat_rooms" in s for s in statements)
+            
+            # 聊天室詳情需要關聯資料時才載入
+            response = await async_client.get(f"/api/v2/chat/rooms/{room.id}", headers=adopter_auth_headers)
+            assert response.status_code == 200
+            assert response.json()["pet_name"] == "Cached Pet"
+            assert len(room_reads()) == 1
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        
+        await test_db.refresh(room)
+        assert room.shelter_last_read_message_id == message_id
+    
     async def test_send_message_room_not_found(
         self,
         async_client: AsyncClient,
@@ -544,6 +758,80 @@ class TestGetMessagesAPI:
         )
         
         assert response.status_code == 200
+    
+    async def test_get_messages_cursor_pagination(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict
+    ):
+        """Test before_id / after_id paging (messages created in the same second are ordered by id)"""
+        pet = Pet(
+            name="Cursor Pet",
+            species="dog",
+            breed="Corgi",
+            gender="male",
+            age_years=2,
+            size="small",
+            status=PetStatus.AVAILABLE,
+            shelter_id=test_shelter_user.id,
+            created_by=test_shelter_user.id
+        )
+        test_db.add(pet)
+        await test_db.commit()
+        await test_db.refresh(pet)
+        
+        room = ChatRoom(
+            user_id=test_adopter_user.id,
+            shelter_id=test_shelter_user.id,
+            pet_id=pet.id
+        )
+        test_db.add(room)
+        await test_db.commit()
+        await test_db.refresh(room)
+        
+        messages = [
+            ChatMessage(
+                room_id=room.id,
+                sender_id=test_adopter_user.id,
+                message_type=MessageType.TEXT,
+                content=f"Message {i+1}"
+            )
+            for i in range(15)
+        ]
+        test_db.add_all(messages)
+        await test_db.commit()
+        expected = [msg.id for msg in reversed(messages)]
+        
+        url = f"/api/v2/chat/rooms/{room.id}/messages"
+        pages = []
+        query = "?limit=6"
+        while True:
+            response = await async_client.get(url + query, headers=adopter_auth_headers)
+            assert response.status_code == 200
+            data = response.json()
+            pages.append([item["id"] for item in data["items"]])
+            if not data["has_more"]:
+                break
+            query = f"?limit=6&before_id={pages[-1][-1]}"
+        assert pages == [expected[0:6], expected[6:12], expected[12:15]]
+        
+        # after_id 返回緊接在錨點之後的訊息（仍是最新的在前）
+        response = await async_client.get(
+            f"{url}?limit=3&after_id={expected[10]}",
+            headers=adopter_auth_headers
+        )
+        data = response.json()
+        assert [item["id"] for item in data["items"]] == expected[7:10]
+        assert data["has_more"] is True
+        
+        response = await async_client.get(
+            f"{url}?before_id={expected[0]}&after_id={expected[5]}",
+            headers=adopter_auth_headers
+        )
+        assert response.status_code == 400
 
 
 # ==================== Mark as Read Tests ====================
@@ -601,9 +889,88 @@ class TestMarkAsReadAPI:
             f"/api/v2/chat/rooms/{room.id}/read",
             headers=adopter_auth_headers
         )
-        
+
+        assert response.status_code == 200
+
+    async def test_mark_as_read_moves_watermark(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict
+    ):
+        """Test read state is a per-room watermark instead of per-message updates"""
+        pet = Pet(
+            name="Watermark Pet",
+            species="dog",
+            breed="Beagle",
+            gender="female",
+            age_years=2,
+            size="medium",
+            status=PetStatus.AVAILABLE,
+            shelter_id=test_shelter_user.id,
+            created_by=test_shelter_user.id
+        )
+        test_db.add(pet)
+        await test_db.commit()
+        await test_db.refresh(pet)
+
+        room = ChatRoom(
+            user_id=test_adopter_user.id,
+            shelter_id=test_shelter_user.id,
+            pet_id=pet.id
+        )
+        test_db.add(room)
+        await test_db.commit()
+        await test_db.refresh(room)
+
+        messages = [
+            ChatMessage(
+                room_id=room.id,
+                sender_id=test_shelter_user.id,
+                message_type=MessageType.TEXT,
+                content=f"Message {i}"
+            )
+            for i in range(3)
+        ]
+        test_db.add_all(messages)
+        await test_db.commit()
+
+        unread_url = f"/api/v2/chat/rooms/{room.id}/unread-count"
+        response = await async_client.get(unread_url, headers=adopter_auth_headers)
+        assert response.json()["unread_count"] == 3
+
+        response = await async_client.put(
+            f"/api/v2/chat/rooms/{room.id}/read",
+            headers=adopter_auth_headers
+        )
         assert response.status_code == 200
 
+        response = await async_client.get(unread_url, headers=adopter_auth_headers)
+        assert response.json()["unread_count"] == 0
+        response = await async_client.get("/api/v2/chat/unread-count", headers=adopter_auth_headers)
+        assert response.json()["unread_count"] == 0
+
+        await test_db.refresh(room)
+        assert room.user_last_read_message_id == messages[-1].id
+        assert room.shelter_last_read_message_id == 0
+        for msg in messages:
+            await test_db.refresh(msg)
+            assert msg.is_read is False
+
+        # 之後的新訊息重新計入未讀
+        test_db.add(ChatMessage(
+            room_id=room.id,
+            sender_id=test_shelter_user.id,
+            message_type=MessageType.TEXT,
+            content="New message"
+        ))
+        await test_db.commit()
+
+        response = await async_client.get(unread_url, headers=adopter_auth_headers)
+        assert response.json()["unread_count"] == 1
+
 
 # ==================== Unread Count Tests ====================
 
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Chat Backplane E2E Tests
+Test cross-worker delivery: worker A publishes room events -> backplane -> worker B's local subscribers
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from websockets.asyncio.client import connect as ws_connect
+
+from app.auth.jwt_handler import jwt_handler
+from app.database import Base
+from app.models.chat_room import ChatRoom
+from app.models.pet import Pet, PetStatus
+from app.models.user import User, UserRole
+from app.services.backplane import InMemoryBackplane, InMemoryBus
+from app.services.realtime import ConnectionManager
+from redis_stand_in import RedisStandIn
+from test_chat_websocket import FakeWebSocket
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _prepare_database(path: Path):
+    """建立兩個 app 行程共用的 SQLite 資料庫（只建聊天需要的資料表）"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    tables = [Base.metadata.tables[name] for name in ("users", "pets", "pet_photos", "chat_rooms", "chat_messages")]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        adopter = User(email="ws-adopter@test.com", password_hash="x", name="Adopter",
+                       role=UserRole.adopter, is_active=True, is_verified=True)
+        shelter = User(email="ws-shelter@test.com", password_hash="x", name="Shelter",
+                       role=UserRole.shelter, is_active=True, is_verified=True)
+        session.add_all([adopter, shelter])
+        await session.flush()
+        pet = Pet(name="Backplane Pet", species="dog", breed="Mixed", gender="male", size="medium",
+                  status=PetStatus.AVAILABLE, shelter_id=shelter.id, created_by=shelter.id)
+        session.add(pet)
+        await session.flush()
+        room = ChatRoom(user_id=adopter.id, shelter_id=shelter.id, pet_id=pet.id)
+        session.add(room)
+        await session.commit()
+    await engine.dispose()
+    return adopter, shelter, room
+
+
+async def _wait_until_ready(port: int, process: subprocess.Popen) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            if process.poll() is not None:
+                raise RuntimeError(f"app instance on port {port} exited with {process.returncode}")
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"app instance on port {port} did not start")
+
+
+@pytest.mark.asyncio
+class TestChatBackplane:
+    """Test room events reach subscribers connected to other workers"""
+
+    async def test_in_memory_backplane_between_managers(self):
+        """Test two managers sharing a bus behave like two workers"""
+        bus = InMemoryBus()
+        worker_a = ConnectionManager(backplane=InMemoryBackplane(bus))
+        worker_b = ConnectionManager(backplane=InMemoryBackplane(bus))
+        on_a, on_b, sender = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(on_a, 1)
+        await worker_b.connect(on_b, 2)
+        await worker_b.connect(sender, 3)
+        worker_a.subscribe_room(1, 10)
+        worker_b.subscribe_room(2, 10)
+        worker_b.subscribe_room(3, 10)
+
+        await worker_b.broadcast_to_room({"type": "new_message", "room_id": 10}, 10, exclude_user=3)
+        await asyncio.sleep(0.01)
+
+        # 本機直接投遞、其他 worker 經 backplane，各收到一次
+        assert on_a.sent == ['{"type":"new_message","room_id":10}']
+        assert on_b.sent == on_a.sent
+        assert sender.sent == []
+
+        # 用戶事件：用戶連在其他 worker 時也會收到
+        await worker_a.send_to_user({"type": "unread.cleared", "counter": "notifications"}, 2)
+        await asyncio.sleep(0.01)
+        assert on_b.sent[-1] == '{"type":"unread.cleared","counter":"notifications"}'
+        assert len(on_a.sent) == 1
+
+        await worker_a.stop()
+        await worker_b.stop()
+
+    async def test_two_app_instances_over_redis(self, tmp_path):
+        """Test a message posted to one app process is pushed to a WebSocket on another"""
+        redis_server = RedisStandIn()
+        redis_port = await redis_server.start()
+        adopter, shelter, room = await _prepare_database(tmp_path / "chat.db")
+
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}",
+            REDIS_URL=f"redis://127.0.0.1:{redis_port}/0",
+            CHAT_BACKPLANE="redis",
+            DEBUG="false",
+        )
+        ports = [_free_port(), _free_port()]
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--lifespan", "off"],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            for port in ports
+        ]
+        try:
+            for port, process in zip(ports, processes):
+                await _wait_until_ready(port, process)
+
+            shelter_token = jwt_handler.create_access_token(shelter)
+            adopter_token = jwt_handler.create_access_token(adopter)
+
+            async with ws_connect(f"ws://127.0.0.1:{ports[0]}/api/v2/chat/ws?token={shelter_token}") as ws:
+                await ws.send(json.dumps({"action": "subscribe", "room_id": room.id}))
+                assert json.loads(await asyncio.wait_for(ws.recv(), 5)) == {"type": "subscribed", "room_id": room.id}
+
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(
+                        f"http://127.0.0.1:{ports[1]}/api/v2/chat/rooms/{room.id}/messages/text",
+                        json={"content": "hello from another worker"},
+                        headers={"Authorization": f"Bearer {adopter_token}"},
+                    )
+                assert response.status_code == 200
+
+                # 收件者的未讀數變化（用戶事件）也經 backplane 送到另一個 worker
+                event = json.loads(await asyncio.wait_for(ws.recv(), 5))
+                assert event == {"type": "unread.delta", "counter": "chat", "room_id": room.id, "delta": 1}
+
+                event = json.loads(await asyncio.wait_for(ws.recv(), 5))
+                assert event["type"] == "new_message"
+                assert event["room_id"] == room.id
+                assert event["message"]["content"] == "hello from another worker"
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+            await redis_server.stop()
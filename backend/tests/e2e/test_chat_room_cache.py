@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Chat Room Participants Cache Tests
+Test the participants cache layers: in-process LRU -> Redis L2 shared by workers
+"""
+import pytest
+
+from app.services.room_participants import RoomParticipants, RoomParticipantsCache
+from redis_stand_in import RedisStandIn
+
+
+@pytest.mark.asyncio
+class TestRoomParticipantsCache:
+    """Test participants cached by one worker are visible to another through Redis"""
+
+    async def test_redis_second_level(self):
+        """Test a second worker's cache misses locally and fills from Redis"""
+        redis_server = RedisStandIn()
+        port = await redis_server.start()
+        url = f"redis://127.0.0.1:{port}/0"
+        worker_a = RoomParticipantsCache(redis_url=url)
+        worker_b = RoomParticipantsCache(redis_url=url)
+        try:
+            await worker_a.set(7, RoomParticipants(user_id=1, shelter_id=2))
+
+            participants = await worker_b.get(7)
+            assert participants == RoomParticipants(1, 2)
+            assert participants.includes(2) and not participants.includes(3)
+            # 之後由 L1 命中
+            assert worker_b.local.get(7) == participants
+            assert await worker_b.get(8) is None
+        finally:
+            await worker_a.close()
+            await worker_b.close()
+            await redis_server.stop()
+
+    async def test_redis_unavailable_falls_back_to_local(self):
+        """Test an unreachable Redis only disables L2"""
+        redis_server = RedisStandIn()
+        port = await redis_server.start()
+        await redis_server.stop()
+
+        cache = RoomParticipantsCache(redis_url=f"redis://127.0.0.1:{port}/0")
+        await cache.set(7, RoomParticipants(1, 2))
+        assert await cache.get(7) == RoomParticipants(1, 2)
+        assert await cache.get(8) is None
+        # 失敗後暫停使用 Redis
+        assert cache.client is None
+        await cache.close()
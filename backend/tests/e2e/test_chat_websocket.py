@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""
+Chat WebSocket E2E Tests
+Test realtime fan-out: WebSocket -> ConnectionManager -> per-connection send queue
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.exceptions import ChatRoomNotFoundError
+from app.main import app
+from app.models.chat_message import ChatMessage
+from app.models.chat_room import ChatRoom
+from app.models.pet import Pet, PetStatus
+from app.models.user import User
+from app.repositories import chat as chat_repository
+from app.repositories.chat import MessageRepository
+from app.services.chat_service import ChatService
+from app.services.message_batcher import MessageBatcher
+from app.services.room_participants import RoomParticipants, room_participants_cache
+from app.services.realtime import (
+    manager as realtime_manager,
+    ConnectionManager,
+    CONNECTION_LIMIT_CLOSE_CODE,
+    IDLE_TIMEOUT_CLOSE_CODE,
+    SLOW_CONSUMER_CLOSE_CODE,
+)
+
+
+class FakeWebSocket:
+    """記錄送出 frame 的假 WebSocket（blocked 時 send_text 會卡住，模擬慢速客戶端）"""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.unblock = asyncio.Event()
+        if not blocked:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        await self.unblock.wait()
+        self.sent.append(frame)
+
+    async def send_bytes(self, frame: bytes):
+        await self.unblock.wait()
+        self.sent.append(frame)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def _token(headers: dict) -> str:
+    return headers["Authorization"].split(" ", 1)[1]
+
+
+async def _create_room(db, shelter: User, adopter: User, name: str = "Socket Pet") -> ChatRoom:
+    pet = Pet(
+        name=name,
+        species="dog",
+        breed="Mixed",
+        gender="male",
+        age_years=1,
+        size="small",
+        status=PetStatus.AVAILABLE,
+        shelter_id=shelter.id,
+        created_by=shelter.id
+    )
+    db.add(pet)
+    await db.flush()
+    room = ChatRoom(user_id=adopter.id, shelter_id=shelter.id, pet_id=pet.id)
+    db.add(room)
+    await db.commit()
+    return room
+
+
+@pytest.mark.asyncio
+class TestChatWebSocket:
+    """Test WebSocket subscription and room fan-out"""
+
+    async def test_subscribe_and_ping(
+        self,
+        async_client,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict
+    ):
+        """Test participants can subscribe; replies go through the connection's send queue"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+
+        client = TestClient(app)
+        with client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}") as ws:
+            ws.send_json({"action": "subscribe", "room_id": room.id})
+            assert ws.receive_json() == {"type": "subscribed", "room_id": room.id}
+            ws.send_json({"action": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+            ws.send_json({"action": "unsubscribe", "room_id": room.id})
+            assert ws.receive_json() == {"type": "unsubscribed", "room_id": room.id}
+
+            # 不存在（或非參與者）的聊天室不能訂閱
+            ws.send_json({"action": "subscribe", "room_id": 99999})
+            reply = ws.receive_json()
+            assert reply["type"] == "error" and reply["room_id"] == 99999
+
+    async def test_broadcast_uses_room_index(self):
+        """Test only the room's subscribers receive the frame, excluding the sender"""
+        manager = ConnectionManager(queue_size=8)
+        sockets = {user_id: FakeWebSocket() for user_id in range(1, 5)}
+        for user_id, ws in sockets.items():
+            await manager.connect(ws, user_id)
+        for user_id in (1, 2, 3):
+            manager.subscribe_room(user_id, 10)
+        manager.subscribe_room(4, 11)
+
+        await manager.broadcast_to_room({"type": "new_message", "room_id": 10}, 10, exclude_user=1)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert sockets[1].sent == []
+        assert sockets[2].sent == ['{"type":"new_message","room_id":10}']
+        assert sockets[3].sent == sockets[2].sent
+        assert sockets[4].sent == []
+
+        manager.disconnect(2)
+        assert manager.room_subscribers[10] == {1, 3}
+        for user_id in (1, 3, 4):
+            manager.disconnect(user_id)
+        assert manager.room_subscribers == {}
+
+    async def test_slow_consumer_policies(self):
+        """Test a full send queue disconnects (or drops for) the slow client without blocking others"""
+        manager = ConnectionManager(queue_size=2)
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        await manager.connect(slow, 1)
+        await manager.connect(fast, 2)
+        manager.subscribe_room(1, 10)
+        manager.subscribe_room(2, 10)
+
+        for i in range(5):
+            await manager.broadcast_to_room({"n": i}, 10)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert len(fast.sent) == 5
+        assert 1 not in manager.active_connections
+        assert manager.room_subscribers[10] == {2}
+        assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+        manager.disconnect(2)
+
+        manager = ConnectionManager(queue_size=2, slow_consumer_policy="drop_oldest")
+        slow = FakeWebSocket(blocked=True)
+        connection = await manager.connect(slow, 1)
+        manager.subscribe_room(1, 10)
+        for i in range(5):
+            await manager.broadcast_to_room({"n": i}, 10)
+        # writer 已取出第一個 frame 卡在送出中；佇列只保留最新的兩個
+        assert connection.dropped > 0
+        slow.unblock.set()
+        await asyncio.sleep(0.01)
+        assert slow.sent[-2:] == ['{"n":3}', '{"n":4}']
+        manager.disconnect(1)
+
+    async def test_connection_limit_and_heartbeat(self):
+        """Test connections beyond the limit are refused and idle connections are pinged then closed"""
+        manager = ConnectionManager(max_connections=1, ping_interval=10, ping_timeout=5)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        connection = await manager.connect(first, 1)
+        assert await manager.connect(second, 2) is None
+        assert second.closed_with == CONNECTION_LIMIT_CLOSE_CODE
+        # 同一用戶重連會取代舊連線，不受上限影響
+        connection = await manager.connect(FakeWebSocket(), 1)
+        assert connection is not None
+
+        connection.last_seen -= 11
+        assert manager.check_idle_connections() == 0
+        await asyncio.sleep(0)
+        assert connection.websocket.sent == ['{"type":"ping"}']
+
+        # 回覆後重新計時
+        connection.touch()
+        assert manager.check_idle_connections() == 0
+
+        connection.last_seen -= 16
+        assert manager.check_idle_connections() == 1
+        await asyncio.sleep(0)
+        assert 1 not in manager.active_connections
+        assert connection.websocket.closed_with == IDLE_TIMEOUT_CLOSE_CODE
+        await manager.stop()
+
+    async def test_send_over_websocket(
+        self,
+        async_client,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test the send action acks the sender with its client_id and broadcasts to the room"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+
+        client = TestClient(app)
+        with client.websocket_connect(f"/api/v2/chat/ws?token={_token(shelter_auth_headers)}") as shelter_ws, \
+                client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}") as ws:
+            for socket in (shelter_ws, ws):
+                socket.send_json({"action": "subscribe", "room_id": room.id})
+                assert socket.receive_json()["type"] == "subscribed"
+
+            # 未訂閱的聊天室不能發送
+            ws.send_json({"action": "send", "room_id": room.id + 1, "client_id": "x", "content": "hi"})
+            assert ws.receive_json()["type"] == "error"
+
+            ws.send_json({"action": "send", "room_id": room.id, "client_id": "c-1", "content": "first"})
+            ws.send_json({"action": "send", "room_id": room.id, "client_id": "c-2", "content": "second"})
+            acks = [ws.receive_json(), ws.receive_json()]
+            assert [(ack["type"], ack["client_id"]) for ack in acks] == [("ack", "c-1"), ("ack", "c-2")]
+            assert acks[0]["message"]["content"] == "first"
+            assert acks[0]["message"]["id"] < acks[1]["message"]["id"]
+
+            # 收件者另外收到未讀數變化（同一批寫入的訊息合併），在新訊息之前送達
+            pushed, deltas = [], 0
+            while len(pushed) < 2:
+                event = shelter_ws.receive_json()
+                if event["type"] == "unread.delta":
+                    deltas += event["delta"]
+                else:
+                    pushed.append(event)
+            assert [event["message"]["content"] for event in pushed] == ["first", "second"]
+            assert all(event["type"] == "new_message" for event in pushed)
+            assert deltas == 2
+
+        await test_db.refresh(room)
+        assert room.last_message_id == acks[1]["message"]["id"]
+        assert room.last_message_preview == "second"
+
+    async def test_batcher_group_commits(
+        self,
+        test_engine,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User
+    ):
+        """Test messages sent to several rooms within one window share a single commit"""
+        rooms = [
+            await _create_room(test_db, test_shelter_user, test_adopter_user, name=f"Batch Pet {i}")
+            for i in range(2)
+        ]
+        batcher = MessageBatcher(
+            async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+            window_ms=20
+        )
+        futures = [
+            batcher.submit(rooms[i % 2].id, test_adopter_user.id, f"message {i}")
+            for i in range(5)
+        ]
+        messages = await asyncio.gather(*futures)
+        await batcher.stop()
+
+        assert batcher.flushed_batches == 1
+        assert [m.content for m in messages] == [f"message {i}" for i in range(5)]
+        # 每個聊天室各自連續編號
+        assert [m.seq for m in messages] == [1, 1, 2, 2, 3]
+        assert all(m.created_at is not None for m in messages)
+
+        result = await test_db.execute(
+            select(ChatRoom.last_message_preview).where(ChatRoom.id.in_([r.id for r in rooms])).order_by(ChatRoom.id)
+        )
+        assert list(result.scalars()) == ["message 4", "message 3"]
+        count = await test_db.execute(select(ChatMessage.id).where(ChatMessage.room_id == rooms[0].id))
+        assert len(count.all()) == 3
+
+    async def test_batch_locks_rooms_in_id_order(
+        self,
+        test_engine,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        monkeypatch
+    ):
+        """Test a batch reserves seqs and updates summaries in room id order, whatever the submission order"""
+        rooms = [
+            await _create_room(test_db, test_shelter_user, test_adopter_user, name=f"Lock Pet {i}")
+            for i in range(3)
+        ]
+        locked = []
+        allocate_room_seq = chat_repository.allocate_room_seq
+        update_room_summary = MessageRepository._update_room_summary
+
+        def recording_allocate(connection, room_id, count=1):
+            locked.append(("seq", room_id))
+            return allocate_room_seq(connection, room_id, count)
+
+        async def recording_summary(self, room_id, message):
+            locked.append(("summary", room_id))
+            return await update_room_summary(self, room_id, message)
+
+        monkeypatch.setattr(chat_repository, "allocate_room_seq", recording_allocate)
+        monkeypatch.setattr(MessageRepository, "_update_room_summary", recording_summary)
+        batcher = MessageBatcher(
+            async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+            window_ms=20
+        )
+        order = [rooms[2], rooms[0], rooms[1], rooms[2]]
+        await asyncio.gather(*(
+            batcher.submit(room.id, test_adopter_user.id, f"message {i}") for i, room in enumerate(order)
+        ))
+        await batcher.stop()
+
+        room_ids = sorted(room.id for room in rooms)
+        assert locked == [("seq", room_id) for room_id in room_ids] + [("summary", room_id) for room_id in room_ids]
+
+    async def test_batcher_push_failure_does_not_rewrite(
+        self,
+        test_engine,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        monkeypatch
+    ):
+        """Test a failure after commit (unread push) is logged without retrying the insert"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+
+        async def failing_push(self, messages):
+            raise RuntimeError("push failed")
+
+        monkeypatch.setattr(ChatService, "push_unread", failing_push)
+        batcher = MessageBatcher(
+            async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+            window_ms=20
+        )
+        futures = [batcher.submit(room.id, test_adopter_user.id, f"message {i}") for i in range(3)]
+        messages = await asyncio.gather(*futures)
+        await batcher.stop()
+
+        assert batcher.flushed_batches == 1
+        assert [m.seq for m in messages] == [1, 2, 3]
+        result = await test_db.execute(select(ChatMessage.content).where(ChatMessage.room_id == room.id))
+        assert sorted(result.scalars()) == [f"message {i}" for i in range(3)]
+
+    async def test_send_to_deleted_room_is_not_found(
+        self,
+        async_client,
+        test_engine,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test deleting a pet evicts its rooms and writes to a vanished room map to 404, not 500"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+        room_id, pet_id = room.id, room.pet_id
+        participants = RoomParticipants(test_adopter_user.id, test_shelter_user.id)
+        url = f"/api/v2/chat/rooms/{room_id}/messages/text"
+        response = await async_client.post(url, json={"content": "hello"}, headers=adopter_auth_headers)
+        assert response.status_code in (200, 201)
+        assert room_participants_cache.local.get(room_id) is not None
+
+        response = await async_client.delete(f"/api/v2/pets/{pet_id}", headers=shelter_auth_headers)
+        assert response.status_code == 200
+        assert room_participants_cache.local.get(room_id) is None
+
+        # 其他 worker 的快取仍可能留著：聊天室（外鍵 CASCADE）已刪除時寫入返回 404
+        await test_db.execute(delete(ChatRoom).where(ChatRoom.id == room_id))
+        await test_db.commit()
+        await room_participants_cache.set(room_id, participants)
+
+        response = await async_client.post(url, json={"content": "anyone?"}, headers=adopter_auth_headers)
+        assert response.status_code == 404
+        assert room_participants_cache.local.get(room_id) is None
+
+        batcher = MessageBatcher(
+            async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+            window_ms=0
+        )
+        with pytest.raises(ChatRoomNotFoundError):
+            await batcher.submit(room_id, participants.user_id, "still there?")
+        await batcher.stop()
+
+    async def test_resume_replays_missed_messages(
+        self,
+        async_client,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test resume replays messages after last_seq from the ring buffer, then from the database"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+        for i in range(3):
+            response = await async_client.post(
+                f"/api/v2/chat/rooms/{room.id}/messages/text",
+                json={"content": f"missed {i}"},
+                headers=shelter_auth_headers
+            )
+            assert response.json()["seq"] == i + 1
+
+        client = TestClient(app)
+        token = _token(adopter_auth_headers)
+        with client.websocket_connect(f"/api/v2/chat/ws?token={token}") as ws:
+            ws.send_json({"action": "resume", "rooms": {"99999": 0, str(room.id): 1}})
+            assert ws.receive_json()["type"] == "error"
+            replayed = [ws.receive_json(), ws.receive_json()]
+            assert [(f["type"], f["message"]["seq"]) for f in replayed] == [("new_message", 2), ("new_message", 3)]
+            assert ws.receive_json() == {"type": "resumed", "room_id": room.id, "last_seq": 3, "replayed": 2}
+            assert room.id in realtime_manager.active_connections[test_adopter_user.id].rooms
+
+        # 緩衝沒有（例如重新部署後）時改查資料庫
+        realtime_manager.history.clear()
+        with client.websocket_connect(f"/api/v2/chat/ws?token={token}") as ws:
+            ws.send_json({"action": "resume", "rooms": {str(room.id): 0}})
+            replayed = [ws.receive_json() for _ in range(3)]
+            assert [f["message"]["content"] for f in replayed] == ["missed 0", "missed 1", "missed 2"]
+            assert ws.receive_json()["replayed"] == 3
+
+            # 已是最新時不補送
+            ws.send_json({"action": "resume", "rooms": {str(room.id): 3}})
+            assert ws.receive_json() == {"type": "resumed", "room_id": room.id, "last_seq": 3, "replayed": 0}
+
+    async def test_frame_encodings(self, async_client, adopter_auth_headers: dict):
+        """Test unsupported encodings are refused and msgpack connections share one binary frame per broadcast"""
+        client = TestClient(app)
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}&encoding=cbor"):
+                pass
+
+        msgpack = pytest.importorskip("msgpack")
+        with client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}&encoding=msgpack") as ws:
+            ws.send_bytes(msgpack.packb({"action": "ping"}))
+            assert msgpack.unpackb(ws.receive_bytes()) == {"type": "pong"}
+            ws.send_json({"action": "ping"})
+            assert msgpack.unpackb(ws.receive_bytes()) == {"type": "pong"}
+
+        manager = ConnectionManager(queue_size=8)
+        text, binary, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(text, 1)
+        await manager.connect(binary, 2, encoding="msgpack")
+        await manager.connect(other, 3, encoding="msgpack")
+        for user_id in (1, 2, 3):
+            manager.subscribe_room(user_id, 10)
+
+        await manager.broadcast_to_room({"type": "new_message", "room_id": 10, "content": "哈囉"}, 10)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert text.sent == ['{"type":"new_message","room_id":10,"content":"哈囉"}']
+        assert msgpack.unpackb(binary.sent[0]) == {"type": "new_message", "room_id": 10, "content": "哈囉"}
+        assert other.sent[0] is binary.sent[0]
+        for user_id in (1, 2, 3):
+            manager.disconnect(user_id)
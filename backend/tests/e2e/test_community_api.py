@@ -5,6 +5,7 @@ Test complete community flow: HTTP Request -> Controller -> Service -> Repositor
 """
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import event
 from app.models.user import User
 from app.models.community import CommunityPost, PostComment, PostLike, PostTypeEnum
 
@@ -240,6 +241,57 @@ class TestListPostsAPI:
         
         assert response.status_code == 200
     
+    async def test_list_posts_uses_counters(
+        self,
+        async_client: AsyncClient,
+        test_engine,
+        test_adopter_user: User,
+        test_shelter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test the feed reads like/comment counters and checks is_liked with one query"""
+        post_ids = []
+        for i in range(3):
+            response = await async_client.post(
+                "/api/v2/community/posts",
+                data={"content": f"Counter post {i}", "post_type": "share"},
+                headers=adopter_auth_headers
+            )
+            post_ids.append(response.json()["id"])
+        
+        liked_id = post_ids[0]
+        await async_client.post(f"/api/v2/community/posts/{liked_id}/like", headers=shelter_auth_headers)
+        await async_client.post(f"/api/v2/community/posts/{liked_id}/like", headers=adopter_auth_headers)
+        await async_client.delete(f"/api/v2/community/posts/{liked_id}/like", headers=adopter_auth_headers)
+        for content in ("first", "second"):
+            response = await async_client.post(
+                f"/api/v2/community/posts/{liked_id}/comments",
+                json={"content": content},
+                headers=shelter_auth_headers
+            )
+        await async_client.delete(f"/api/v2/community/comments/{response.json()['id']}", headers=shelter_auth_headers)
+        
+        statements = []
+        
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            response = await async_client.get("/api/v2/community/posts", headers=shelter_auth_headers)
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statement)
+        
+        assert response.status_code == 200
+        posts = {post["id"]: post for post in response.json()["posts"]}
+        assert (posts[liked_id]["like_count"], posts[liked_id]["comment_count"], posts[liked_id]["is_liked"]) == (1, 1, True)
+        assert all(not posts[post_id]["is_liked"] and posts[post_id]["like_count"] == 0 for post_id in post_ids[1:])
+        
+        # 不載入留言；按讚只查一次 post_id IN (...)
+        assert not any("post_comments" in statement for statement in statements)
+        assert sum("post_likes" in statement for statement in statements) == 1
+    
     async def test_list_my_posts(
         self,
         async_client: AsyncClient,
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+Files API E2E Tests
+Test upload flow: HTTP Request -> Controller -> Async storage facade -> S3 stand-in
+"""
+import asyncio
+import io
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from PIL import Image
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models.file import File
+from app.models.pet import PetPhoto
+from app.repositories import FileRepository
+from app.services import s3 as s3_module
+from app.services.file_sweeper import FileOrphanSweeper
+from app.services.s3 import s3_service
+from app.services.storage import AsyncStorageService
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def make_jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    """產生帶 EXIF Orientation 與 GPS 位置的 JPEG"""
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x8825] = {1: "N", 2: (25.0, 2.0, 0.0), 3: "E", 4: (121.0, 33.0, 0.0)}
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "orange").save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+class LocalS3StandIn:
+    """
+    本地 S3 替身（與 boto3 client 相同介面）
+
+    清除 release 後，put_object 會阻塞到測試放行為止（模擬慢速上傳）。
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.content_types = {}
+        self.multipart = {}
+        self.upload_started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def put_object(self, Bucket, Key, Body, ContentType, CacheControl=None):
+        self.upload_started.set()
+        if not self.release.wait(timeout=5):
+            raise TimeoutError("upload was never released")
+        self.objects[(Bucket, Key)] = Body
+        self.content_types[(Bucket, Key)] = ContentType
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, CacheControl=None):
+        upload_id = f"upload-{len(self.multipart) + 1}"
+        self.multipart[upload_id] = []
+        self.content_types[(Bucket, Key)] = ContentType
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.multipart[UploadId].append(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == list(
+            range(1, len(self.multipart[UploadId]) + 1)
+        )
+        self.objects[(Bucket, Key)] = b"".join(self.multipart.pop(UploadId))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.multipart.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+@pytest.fixture
+def local_s3(monkeypatch) -> LocalS3StandIn:
+    stand_in = LocalS3StandIn()
+    monkeypatch.setattr(s3_service, "use_s3", True)
+    monkeypatch.setattr(s3_service, "s3_client", stand_in)
+    monkeypatch.setattr(s3_service, "cloudfront_domain", None)
+    yield stand_in
+    stand_in.release.set()
+
+
+# ==================== Upload Files Tests ====================
+
+@pytest.mark.asyncio
+class TestUploadFilesAPI:
+    """Test file upload API"""
+
+    async def test_slow_upload_does_not_block_other_requests(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn
+    ):
+        """Test other requests are served while a slow S3 upload is in flight"""
+        slow_s3 = local_s3
+        slow_s3.release.clear()
+        upload = asyncio.create_task(async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", b"\xff\xd8\xff" + b"0" * 1024, "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        ))
+
+        # 等上傳真正卡在 put_object（若在 event loop 上執行，這裡就會卡住）
+        started = await asyncio.to_thread(slow_s3.upload_started.wait, 5)
+        assert started
+
+        response = await asyncio.wait_for(async_client.get("/"), timeout=2)
+        assert response.status_code == 200
+        assert not upload.done()
+
+        slow_s3.release.set()
+        upload_response = await asyncio.wait_for(upload, timeout=5)
+
+        assert upload_response.status_code == 200
+        uploaded = upload_response.json()["files"][0]
+        assert uploaded["file_url"].startswith("https://s3.local/")
+        assert len(slow_s3.objects) == 1
+
+    async def test_upload_finished_after_timeout_is_deleted(self, local_s3: LocalS3StandIn):
+        """Test an upload whose thread completes after the 504 removes the object it wrote"""
+        storage = AsyncStorageService(s3_service, max_workers=1, timeout=0.1)
+        local_s3.release.clear()
+        with pytest.raises(HTTPException) as exc_info:
+            await storage.upload_file(b"late", "note.txt", "chat", "text/plain")
+        assert exc_info.value.status_code == 504
+
+        # 執行緒仍在 put_object：放行後寫入完成，再由 done-callback 刪除
+        local_s3.release.set()
+        await asyncio.to_thread(storage.executor.shutdown, wait=True)
+        assert local_s3.upload_started.is_set()
+        assert not local_s3.objects
+
+    async def test_large_upload_streams_in_parts(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn,
+        monkeypatch
+    ):
+        """Test large files go through S3 multipart upload with a sniffed content type"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 1024)
+        monkeypatch.setattr(s3_module, "S3_MIN_PART_SIZE", 4096)
+        content = PNG_HEADER + bytes(range(256)) * 40
+
+        response = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("photo.png", content, "application/octet-stream")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+
+        assert response.status_code == 200
+        uploaded = response.json()["files"][0]
+        assert uploaded["file_size"] == len(content)
+        assert uploaded["content_type"] == "image/png"
+        key = (s3_service.bucket_name, uploaded["file_key"])
+        assert local_s3.objects[key] == content
+        assert local_s3.content_types[key] == "image/png"
+        assert not local_s3.multipart
+
+    async def test_oversized_upload_rejected(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        monkeypatch,
+        tmp_path: Path
+    ):
+        """Test uploads over the size limit are rejected without leaving partial files"""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(settings, "MAX_PHOTO_SIZE", 2048)
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 512)
+
+        response = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("big.jpg", b"\xff\xd8\xff" + b"0" * 4096, "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+
+        assert response.status_code == 413
+        assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+    async def test_batch_reports_failures_per_file(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        monkeypatch,
+        tmp_path: Path
+    ):
+        """Test one bad file does not abort the rest of the batch"""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(settings, "MAX_PHOTO_SIZE", 2048)
+
+        response = await async_client.post(
+            "/api/v2/files/upload",
+            files=[
+                ("files", ("a.png", PNG_HEADER + b"a" * 100, "image/png")),
+                ("files", ("big.png", PNG_HEADER + b"b" * 4096, "image/png")),
+                ("files", ("script.exe", b"MZ", "application/octet-stream")),
+                ("files", ("c.png", PNG_HEADER + b"c" * 100, "image/png")),
+            ],
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is False
+        assert [f["filename"] for f in data["files"]] == ["a.png", "c.png"]
+        assert {f["filename"]: f["status_code"] for f in data["failed"]} == {"big.png": 413, "script.exe": 400}
+        assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 2
+
+    async def test_image_upload_creates_variants(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn,
+        monkeypatch
+    ):
+        """Test images get oriented, EXIF-free thumbnail/card/large variants next to an EXIF-free original"""
+        content = make_jpeg(1200, 800, orientation=6)  # 需轉 90 度，轉正後為 800x1200
+
+        response = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", content, "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+
+        assert response.status_code == 200
+        uploaded = response.json()["files"][0]
+        original_key = uploaded["file_key"]
+        assert original_key.startswith("pet_photo/") and original_key.endswith("/original-webp.jpg")
+        stored = local_s3.objects[(s3_service.bucket_name, original_key)]
+        assert stored != content
+        assert uploaded["file_size"] == len(stored)
+        with Image.open(io.BytesIO(stored)) as image:
+            assert image.format == "JPEG"
+            assert image.size == (800, 1200)
+            assert not image.getexif()
+
+        directory = original_key.rsplit("/", 1)[0]
+        expected_sizes = {"thumbnail": (133, 200), "card": (400, 600), "large": (800, 1200)}
+        for name, size in expected_sizes.items():
+            variant = uploaded["variants"][name]
+            assert variant["file_key"] == f"{directory}/{name}.webp"
+            assert (variant["width"], variant["height"]) == size
+            assert uploaded["urls"][name] == variant["file_url"] != uploaded["urls"]["original"]
+
+            key = (s3_service.bucket_name, variant["file_key"])
+            assert local_s3.content_types[key] == "image/webp"
+            with Image.open(io.BytesIO(local_s3.objects[key])) as image:
+                assert image.size == size
+                assert not image.getexif()
+
+        # 衍生版本格式取自原圖 key，調整設定不影響既有圖片
+        monkeypatch.setattr(settings, "IMAGE_VARIANT_FORMAT", "jpeg")
+        urls = s3_service.generate_variant_urls([original_key], "card")
+        assert urls[original_key].split("?")[0].endswith(f"{directory}/card.webp")
+
+    async def test_pet_views_use_variants(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        sample_pet_data: dict,
+        local_s3: LocalS3StandIn
+    ):
+        """Test pet lists return the card variant and detail views the large variant"""
+        upload = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", make_jpeg(900, 900), "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+        uploaded = upload.json()["files"][0]
+
+        pet = (await async_client.post("/api/v2/pets/", json=sample_pet_data, headers=shelter_auth_headers)).json()
+        link = await async_client.post(
+            f"/api/v2/pets/{pet['id']}/photos/link",
+            json={"photos": [{"file_url": uploaded["file_url"], "file_key": uploaded["file_key"]}]},
+            headers=shelter_auth_headers
+        )
+        assert link.status_code == 200
+
+        listed = (await async_client.get("/api/v2/pets/")).json()["items"]
+        assert listed[0]["primary_photo_url"].split("?")[0].endswith("/card.webp")
+
+        detail = (await async_client.get(f"/api/v2/pets/{pet['id']}")).json()["data"]
+        assert detail["primary_photo_url"].split("?")[0].endswith("/large.webp")
+        assert detail["photos"][0]["file_url"].split("?")[0].endswith("/large.webp")
+        assert detail["photos"][0]["thumbnail_url"].split("?")[0].endswith("/thumbnail.webp")
+
+    async def test_duplicate_upload_is_deduplicated(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn,
+        test_db: AsyncSession
+    ):
+        """Test re-uploading identical content skips the PUT without taking a reference"""
+        content = make_jpeg(640, 480)
+        responses = [
+            await async_client.post(
+                "/api/v2/files/upload",
+                files={"files": (name, content, "image/jpeg")},
+                data={"category": "pet_photo"},
+                headers=shelter_auth_headers
+            )
+            for name in ("first.jpg", "second.jpg")
+        ]
+
+        first, second = (response.json()["files"][0] for response in responses)
+        assert first["deduplicated"] is False
+        assert second["deduplicated"] is True
+        assert first["content_hash"] == second["content_hash"]
+        assert first["file_key"] == second["file_key"]
+        assert first["file_key"] == f"pet_photo/{first['content_hash']}/original-webp.jpg"
+        assert second["urls"]["card"].split("?")[0].endswith("/card.webp")
+        assert len(local_s3.objects) == 4  # 原圖 + 三個衍生版本，只寫一次
+
+        entry = (await test_db.execute(select(File))).scalar_one()
+        await test_db.refresh(entry)
+        assert entry.ref_count == 0
+        assert entry.stored_filename == first["file_key"]
+
+    async def test_deduplication_is_scoped_per_category(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn,
+        test_db: AsyncSession
+    ):
+        """Test identical content uploaded under another category gets its own object"""
+        content = make_jpeg(64, 64)
+        keys = {}
+        for category in ("pet_photo", "document"):
+            response = await async_client.post(
+                "/api/v2/files/upload",
+                files={"files": ("scan.jpg", content, "image/jpeg")},
+                data={"category": category},
+                headers=shelter_auth_headers
+            )
+            uploaded = response.json()["files"][0]
+            assert uploaded["deduplicated"] is False
+            keys[category] = uploaded["file_key"]
+
+        assert keys["pet_photo"].startswith("pet_photo/")
+        assert keys["document"].startswith("document/")
+        entries = (await test_db.execute(select(File.category, File.stored_filename))).all()
+        assert sorted(entries) == sorted((category, key) for category, key in keys.items())
+
+    async def test_last_reference_release_deletes_objects(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        sample_pet_data: dict,
+        local_s3: LocalS3StandIn,
+        test_db: AsyncSession
+    ):
+        """Test deleting the only pet using a photo removes the object, its variants and the catalog entry"""
+        upload = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", make_jpeg(300, 300), "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+        uploaded = upload.json()["files"][0]
+        pet = (await async_client.post("/api/v2/pets/", json=sample_pet_data, headers=shelter_auth_headers)).json()
+        await async_client.post(
+            f"/api/v2/pets/{pet['id']}/photos/link",
+            json={"photos": [{"file_url": uploaded["file_url"], "file_key": uploaded["file_key"]}]},
+            headers=shelter_auth_headers
+        )
+        assert len(local_s3.objects) == 4
+
+        response = await async_client.delete(f"/api/v2/pets/{pet['id']}", headers=shelter_auth_headers)
+
+        assert response.status_code == 200
+        assert not local_s3.objects
+        assert (await test_db.execute(select(File))).scalars().all() == []
+
+    async def test_photo_rows_hold_references(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        sample_pet_data: dict,
+        local_s3: LocalS3StandIn,
+        test_db: AsyncSession
+    ):
+        """Test each pet_photos row holds one reference, so linking twice cannot free a shared object"""
+        upload = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", make_jpeg(300, 300), "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+        uploaded = upload.json()["files"][0]
+        photo = {"file_url": uploaded["file_url"], "file_key": uploaded["file_key"]}
+        first, second = [
+            (await async_client.post("/api/v2/pets/", json=sample_pet_data, headers=shelter_auth_headers)).json()
+            for _ in range(2)
+        ]
+
+        linked = await async_client.post(
+            f"/api/v2/pets/{first['id']}/photos/link", json={"photos": [photo]}, headers=shelter_auth_headers
+        )
+        for _ in range(2):
+            await async_client.post(
+                f"/api/v2/pets/{second['id']}/photos/link", json={"photos": [photo]}, headers=shelter_auth_headers
+            )
+        entry = (await test_db.execute(select(File))).scalar_one()
+        await test_db.refresh(entry)
+        assert entry.ref_count == 3
+
+        # 刪除連結兩次的寵物只釋放自己的兩個引用
+        response = await async_client.delete(f"/api/v2/pets/{second['id']}", headers=shelter_auth_headers)
+        assert response.status_code == 200
+        assert len(local_s3.objects) == 4
+        await test_db.refresh(entry)
+        assert entry.ref_count == 1
+
+        # 移除最後一張引用的照片後物件才刪除
+        photo_id = linked.json()["data"][0]["id"]
+        response = await async_client.delete(
+            f"/api/v2/pets/{first['id']}/photos/{photo_id}", headers=shelter_auth_headers
+        )
+        assert response.status_code == 200
+        assert not local_s3.objects
+        assert (await test_db.execute(select(File))).scalars().all() == []
+
+    async def test_failed_release_keeps_pet_and_references(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        sample_pet_data: dict,
+        local_s3: LocalS3StandIn,
+        test_db: AsyncSession,
+        monkeypatch
+    ):
+        """Test the reference release commits with the photo delete, so a failed release deletes nothing"""
+        upload = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("dog.jpg", make_jpeg(300, 300), "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+        uploaded = upload.json()["files"][0]
+        pet = (await async_client.post("/api/v2/pets/", json=sample_pet_data, headers=shelter_auth_headers)).json()
+        linked = await async_client.post(
+            f"/api/v2/pets/{pet['id']}/photos/link",
+            json={"photos": [{"file_url": uploaded["file_url"], "file_key": uploaded["file_key"]}]},
+            headers=shelter_auth_headers
+        )
+        photo_id = linked.json()["data"][0]["id"]
+
+        async def failing_release(self, file_keys):
+            raise RuntimeError("catalog unavailable")
+
+        monkeypatch.setattr(FileRepository, "release_references", failing_release)
+        response = await async_client.delete(
+            f"/api/v2/pets/{pet['id']}/photos/{photo_id}", headers=shelter_auth_headers
+        )
+        assert response.status_code == 500
+        response = await async_client.delete(f"/api/v2/pets/{pet['id']}", headers=shelter_auth_headers)
+        assert response.status_code == 500
+
+        assert (await test_db.execute(select(PetPhoto.id))).scalars().all() == [photo_id]
+        entry = (await test_db.execute(select(File))).scalar_one()
+        await test_db.refresh(entry)
+        assert entry.ref_count == 1
+        assert len(local_s3.objects) == 4
+
+    async def test_unreferenced_uploads_are_swept(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        local_s3: LocalS3StandIn,
+        test_engine,
+        test_db: AsyncSession
+    ):
+        """Test uploads never linked within the grace period are removed with their variants"""
+        keys = []
+        for size in (100, 200, 300):
+            upload = await async_client.post(
+                "/api/v2/files/upload",
+                files={"files": ("dog.jpg", make_jpeg(size, size), "image/jpeg")},
+                data={"category": "pet_photo"},
+                headers=shelter_auth_headers
+            )
+            keys.append(upload.json()["files"][0]["file_key"])
+        assert len(local_s3.objects) == 12
+
+        # 前兩個檔案已超過寬限期；第二個重新上傳（去重命中）後重新計算寬限期
+        await test_db.execute(
+            update(File).where(File.stored_filename.in_(keys[:2])).values(updated_at=datetime.utcnow() - timedelta(days=2))
+        )
+        await test_db.commit()
+        response = await async_client.post(
+            "/api/v2/files/upload",
+            files={"files": ("again.jpg", make_jpeg(200, 200), "image/jpeg")},
+            data={"category": "pet_photo"},
+            headers=shelter_auth_headers
+        )
+        assert response.json()["files"][0]["deduplicated"] is True
+
+        sweeper = FileOrphanSweeper(
+            session_factory=async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+            grace_hours=24,
+            batch_size=1
+        )
+        assert await sweeper.run_if_leader() == 1
+        assert sweeper.stats()["files_deleted_total"] == 1
+
+        remaining = (await test_db.execute(select(File.stored_filename))).scalars().all()
+        assert sorted(remaining) == sorted(keys[1:])
+        assert len(local_s3.objects) == 8
+        assert not any(key.startswith(keys[0].rsplit("/", 1)[0]) for _, key in local_s3.objects)
+
+    async def test_link_rejects_unknown_file_keys(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        sample_pet_data: dict
+    ):
+        """Test linking a key that was never uploaded is rejected without creating photo rows"""
+        pet = (await async_client.post("/api/v2/pets/", json=sample_pet_data, headers=shelter_auth_headers)).json()
+
+        response = await async_client.post(
+            f"/api/v2/pets/{pet['id']}/photos/link",
+            json={"photos": [{"file_url": "https://cdn.example.com/x.jpg", "file_key": "pet_photo/other/original.jpg"}]},
+            headers=shelter_auth_headers
+        )
+
+        assert response.status_code == 400
+        detail = (await async_client.get(f"/api/v2/pets/{pet['id']}")).json()["data"]
+        assert detail["photos"] == []
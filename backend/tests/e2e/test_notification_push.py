@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Notification Push E2E Tests
+Test notification and unread-count events pushed over the user's WebSocket instead of polling
+"""
+import pytest
+from sqlalchemy import event, select
+from starlette.testclient import TestClient
+
+from app.main import app
+from app.models.notification import Notification, NotificationActor
+from app.models.user import User, UserRole
+from test_chat_websocket import _create_room, _token
+
+
+@pytest.mark.asyncio
+class TestNotificationPush:
+    """Test NotificationService and chat sends push events to the recipient's connection"""
+
+    async def test_notification_events_pushed(
+        self,
+        async_client,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test a new notification is pushed with its payload and reading it pushes an unread delta"""
+        response = await async_client.post(
+            "/api/v2/community/posts",
+            data={"content": "我家的狗狗今天回家了", "post_type": "share"},
+            headers=adopter_auth_headers
+        )
+        post_id = response.json()["id"]
+
+        client = TestClient(app)
+        with client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}") as ws:
+            client.post(f"/api/v2/community/posts/{post_id}/like", headers=shelter_auth_headers)
+            event = ws.receive_json()
+            assert event["type"] == "notification.created"
+            assert event["notification"]["title"] == "新的按讚"
+            assert event["notification"]["is_read"] is False
+
+            notification_id = event["notification"]["id"]
+            client.put(f"/api/v2/notifications/{notification_id}/read", headers=adopter_auth_headers)
+            assert ws.receive_json() == {"type": "unread.delta", "counter": "notifications", "delta": -1}
+
+            # 已讀的通知再標記、沒有未讀時全部已讀，都不推送
+            client.put(f"/api/v2/notifications/{notification_id}/read", headers=adopter_auth_headers)
+            client.post("/api/v2/notifications/mark-all-read", headers=adopter_auth_headers)
+            ws.send_json({"action": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+    async def test_chat_unread_pushed(
+        self,
+        async_client,
+        test_db,
+        test_shelter_user: User,
+        test_adopter_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test a chat message pushes the recipient's unread delta and reading the room clears it"""
+        room = await _create_room(test_db, test_shelter_user, test_adopter_user)
+
+        client = TestClient(app)
+        with client.websocket_connect(f"/api/v2/chat/ws?token={_token(adopter_auth_headers)}") as ws:
+            for content in ("在嗎？", "歡迎來看牠"):
+                client.post(
+                    f"/api/v2/chat/rooms/{room.id}/messages/text",
+                    json={"content": content},
+                    headers=shelter_auth_headers
+                )
+                assert ws.receive_json() == {"type": "unread.delta", "counter": "chat", "room_id": room.id, "delta": 1}
+
+            client.put(f"/api/v2/chat/rooms/{room.id}/read", headers=adopter_auth_headers)
+            assert ws.receive_json() == {"type": "unread.cleared", "counter": "chat", "room_id": room.id}
+
+            # 沒有新訊息時水位不變，不推送
+            client.put(f"/api/v2/chat/rooms/{room.id}/read", headers=adopter_auth_headers)
+            ws.send_json({"action": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+    async def test_report_notifies_admins_in_one_insert(
+        self,
+        async_client,
+        test_db,
+        test_engine,
+        test_admin_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict
+    ):
+        """Test reporting a post notifies every admin with one multi-row INSERT and one commit"""
+        for i in range(3):
+            test_db.add(User(
+                email=f"admin{i}@test.com",
+                password_hash="x",
+                name=f"Admin {i}",
+                role=UserRole.admin,
+                is_active=True,
+                is_verified=True
+            ))
+        await test_db.commit()
+
+        response = await async_client.post(
+            "/api/v2/community/posts",
+            data={"content": "可疑的貼文", "post_type": "share"},
+            headers=adopter_auth_headers
+        )
+        post_id = response.json()["id"]
+
+        inserts = []
+        commits = []
+
+        def count_insert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO notifications"):
+                inserts.append(statement)
+
+        def count_commit(conn):
+            commits.append(conn)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_insert)
+        event.listen(test_engine.sync_engine, "commit", count_commit)
+        try:
+            response = await async_client.post(
+                f"/api/v2/community/posts/{post_id}/report",
+                json={"reason": "spam"},
+                headers=shelter_auth_headers
+            )
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_insert)
+            event.remove(test_engine.sync_engine, "commit", count_commit)
+
+        assert response.status_code == 201
+        assert len(inserts) == 1
+        assert len(commits) == 1
+
+        result = await test_db.execute(select(Notification).where(Notification.title == "新的貼文檢舉"))
+        notifications = result.scalars().all()
+        assert len(notifications) == 4
+        assert all(n.link == f"/community/{post_id}" and not n.is_read for n in notifications)
+
+    async def test_likes_coalesce_into_one_notification(
+        self,
+        async_client,
+        test_db,
+        test_admin_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict,
+        admin_auth_headers: dict
+    ):
+        """Test repeated likes on a post update one unread notification until it is read"""
+        response = await async_client.post(
+            "/api/v2/community/posts",
+            data={"content": "領養一週年", "post_type": "share"},
+            headers=adopter_auth_headers
+        )
+        post_id = response.json()["id"]
+
+        await async_client.post(f"/api/v2/community/posts/{post_id}/like", headers=shelter_auth_headers)
+        await async_client.post(f"/api/v2/community/posts/{post_id}/like", headers=admin_auth_headers)
+
+        response = await async_client.get("/api/v2/notifications/", headers=adopter_auth_headers)
+        data = response.json()
+        assert data["unread_count"] == 1
+        notification = data["notifications"][0]
+        assert notification["actor_count"] == 2
+        assert notification["last_actor_name"] == "Test Admin"
+        assert notification["message"] == "Test Admin 和其他 1 人按讚了您的貼文"
+
+        # 已讀後的按讚開始新的通知
+        await async_client.post("/api/v2/notifications/mark-all-read", headers=adopter_auth_headers)
+        await async_client.delete(f"/api/v2/community/posts/{post_id}/like", headers=shelter_auth_headers)
+        await async_client.post(f"/api/v2/community/posts/{post_id}/like", headers=shelter_auth_headers)
+
+        result = await test_db.execute(
+            select(Notification).where(Notification.link == f"/community/{post_id}").order_by(Notification.id)
+        )
+        notifications = result.scalars().all()
+        assert [(n.actor_count, n.is_read) for n in notifications] == [(2, True), (1, False)]
+
+    async def test_coalesced_count_is_distinct_actors(
+        self,
+        async_client,
+        test_db,
+        test_admin_user: User,
+        adopter_auth_headers: dict,
+        shelter_auth_headers: dict,
+        admin_auth_headers: dict
+    ):
+        """Test alternating commenters are counted once each, not once per switch"""
+        response = await async_client.post(
+            "/api/v2/community/posts",
+            data={"content": "認養日記", "post_type": "share"},
+            headers=adopter_auth_headers
+        )
+        post_id = response.json()["id"]
+
+        for headers in (shelter_auth_headers, admin_auth_headers) * 3:
+            response = await async_client.post(
+                f"/api/v2/community/posts/{post_id}/comments",
+                json={"content": "好可愛"},
+                headers=headers
+            )
+            assert response.status_code == 201
+
+        response = await async_client.get("/api/v2/notifications/", headers=adopter_auth_headers)
+        notification = response.json()["notifications"][0]
+        assert notification["actor_count"] == 2
+        assert notification["message"] == "Test Admin 和其他 1 人在您的貼文留言了"
+
+        result = await test_db.execute(
+            select(NotificationActor.actor_id).where(NotificationActor.notification_id == notification["id"])
+        )
+        assert len(result.all()) == 2
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Notification Retention E2E Tests
+Test the background job that purges old read notifications across all users
+"""
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.main import app
+from app.models.notification import Notification, NotificationType
+from app.models.user import User
+from app.services.notification_retention import (
+    NotificationRetentionWorker,
+    get_notification_retention,
+    parse_retention_policies
+)
+from app.services.notification_service import NotificationService
+
+
+@pytest.mark.asyncio
+class TestNotificationRetention:
+    """Test NotificationRetentionWorker policies, batching and metrics"""
+
+    async def test_run_once_applies_type_policies(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_adopter_user: User,
+        test_shelter_user: User,
+        adopter_auth_headers: dict,
+        admin_auth_headers: dict
+    ):
+        """Test old read notifications are purged per type in id-ranged batches and reported"""
+        now = datetime.utcnow()
+        rows = [
+            # (user, type, is_read, age in days, kept)
+            (test_adopter_user, NotificationType.POST_LIKE, True, 10, False),
+            (test_adopter_user, NotificationType.POST_LIKE, False, 10, True),
+            (test_shelter_user, NotificationType.POST_LIKE, True, 3, True),
+            (test_shelter_user, NotificationType.SYSTEM, True, 40, False),
+            (test_adopter_user, NotificationType.SYSTEM, True, 10, True),
+            (test_adopter_user, NotificationType.APPLICATION_STATUS, True, 400, True),
+            (test_shelter_user, None, True, 40, False),
+        ]
+        for user, notification_type, is_read, age, kept in rows:
+            test_db.add(Notification(
+                user_id=user.id,
+                title="kept" if kept else "expired",
+                message="retention",
+                notification_type=notification_type,
+                is_read=is_read,
+                created_at=now - timedelta(days=age)
+            ))
+        await test_db.commit()
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        worker = NotificationRetentionWorker(
+            session_factory=session_factory,
+            default_days=30,
+            policies=parse_retention_policies("post_like:7,application_status:0"),
+            batch_size=2,
+            batch_pause_ms=0
+        )
+        run = await worker.run_once()
+
+        assert run.rows_purged == 3
+        assert run.batches == 4
+        result = await test_db.execute(select(Notification.title))
+        assert result.scalars().all() == ["kept"] * 4
+
+        app.dependency_overrides[get_notification_retention] = lambda: worker
+        response = await async_client.get("/api/v2/notifications/retention", headers=adopter_auth_headers)
+        assert response.status_code == 403
+
+        response = await async_client.get("/api/v2/notifications/retention", headers=admin_auth_headers)
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["runs"] == 1
+        assert stats["skipped_runs"] == 0
+        assert stats["rows_purged_total"] == 3
+        assert stats["resume_after_id"] == 0
+        assert stats["last_run"]["batches"] == 4
+        assert stats["last_run"]["resumed_after_id"] == 0
+        assert stats["policies"] == {"default_days": 30, "post_like": 7, "application_status": 0}
+
+    async def test_run_resumes_from_last_scanned_id(
+        self,
+        test_db,
+        test_adopter_user: User,
+        monkeypatch
+    ):
+        """Test each round continues after the last scanned id, including after a failed batch"""
+        expired_at = datetime.utcnow() - timedelta(days=40)
+        notifications = [
+            Notification(
+                user_id=test_adopter_user.id,
+                title="expired",
+                message="retention",
+                notification_type=NotificationType.SYSTEM,
+                is_read=True,
+                created_at=expired_at
+            )
+            for _ in range(5)
+        ]
+        test_db.add_all(notifications)
+        await test_db.commit()
+        ids = [n.id for n in notifications]
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        worker = NotificationRetentionWorker(
+            session_factory=session_factory,
+            default_days=30,
+            policies={},
+            batch_size=1,
+            batch_pause_ms=0,
+            max_batches=2
+        )
+        scanned = []
+        purge_read_batch = NotificationService.purge_read_batch
+
+        async def recording_purge(service, after_id, batch_size, cutoffs):
+            scanned.append(after_id)
+            if after_id == ids[2] and scanned.count(after_id) == 1:
+                raise RuntimeError("database went away")
+            return await purge_read_batch(service, after_id, batch_size, cutoffs)
+
+        monkeypatch.setattr(NotificationService, "purge_read_batch", recording_purge)
+
+        first = await worker.run_once()
+        assert (first.resumed_after_id, first.batches, first.rows_purged) == (0, 2, 2)
+        assert worker.resume_after_id == ids[1]
+
+        # 第 2 輪的第 2 批失敗：已完成的批次保留進度，下一輪由此接續而不是從頭掃描
+        with pytest.raises(RuntimeError):
+            await worker.run_once()
+        assert worker.resume_after_id == ids[2]
+
+        last = await worker.run_once()
+        assert last.resumed_after_id == ids[2]
+        assert last.rows_purged == 2
+        assert scanned == [0, ids[0], ids[1], ids[2], ids[2], ids[3]]
+
+        # 掃到最後一筆後進度歸零，下一輪從頭開始新的一趟
+        await worker.run_once()
+        assert worker.resume_after_id == 0
+        result = await test_db.execute(select(Notification.id))
+        assert result.scalars().all() == []
+
+    async def test_round_is_skipped_without_lease(self, test_db):
+        """Test a worker that does not hold the single-runner lease skips the round"""
+        class HeldElsewhere:
+            async def acquire(self):
+                return False
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        worker = NotificationRetentionWorker(session_factory=session_factory, lease=HeldElsewhere())
+        assert await worker.run_if_leader() is None
+        assert worker.runs == 0
+        assert worker.stats()["skipped_runs"] == 1
+
+    async def test_parse_retention_policies(self):
+        """Test policy parsing accepts type names case-insensitively and rejects unknown types"""
+        assert parse_retention_policies(" POST_LIKE:7, ,system:90") == {
+            NotificationType.POST_LIKE: 7,
+            NotificationType.SYSTEM: 90
+        }
+        with pytest.raises(ValueError):
+            parse_retention_policies("likes:7")
+        with pytest.raises(ValueError):
+            parse_retention_policies("post_like:-1")
@@ -188,6 +188,222 @@ class TestListPetsAPI:
         assert data["page"] == 1
         assert data["page_size"] == 2
         assert len(data["items"]) <= 2
+    
+    async def test_list_pets_cursor_pagination(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test cursor pagination walks every pet exactly once"""
+        pets = [
+            Pet(
+                name=f"Cursor Pet {i}",
+                species="cat",
+                gender="female",
+                size="small",
+                status=PetStatus.AVAILABLE,
+                shelter_id=test_shelter_user.id,
+                created_by=test_shelter_user.id
+            )
+            for i in range(5)
+        ]
+        test_db.add_all(pets)
+        await test_db.commit()
+        
+        seen = []
+        cursor = None
+        for _ in range(5):
+            params = {"pagination": "cursor", "page_size": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = await async_client.get("/api/v2/pets/", params=params)
+            
+            assert response.status_code == 200
+            data = response.json()
+            assert "total" not in data
+            seen.extend(pet["id"] for pet in data["items"])
+            cursor = data["next_cursor"]
+            if not data["has_more"]:
+                break
+        
+        assert cursor is None
+        assert seen == sorted((pet.id for pet in pets), reverse=True)
+    
+    async def test_list_pets_invalid_cursor(self, async_client: AsyncClient):
+        """Test malformed cursors are rejected"""
+        response = await async_client.get("/api/v2/pets/", params={"cursor": "not-a-cursor"})
+        
+        assert response.status_code == 400
+
+
+# ==================== Search Pets Tests ====================
+
+@pytest.mark.asyncio
+class TestSearchPetsAPI:
+    """Test full-text pet search API"""
+
+    def _pet(self, shelter: User, name: str, breed: str, description: str = None) -> Pet:
+        return Pet(
+            name=name,
+            species="dog",
+            breed=breed,
+            description=description,
+            gender="male",
+            age_years=2,
+            size="medium",
+            status=PetStatus.AVAILABLE,
+            shelter_id=shelter.id,
+            created_by=shelter.id
+        )
+
+    async def test_search_relevance_ranking(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test name matches rank above breed and description matches"""
+        test_db.add_all([
+            self._pet(test_shelter_user, "Max", "Mixed", "Loves golden sunsets"),
+            self._pet(test_shelter_user, "Golden", "Mixed"),
+            self._pet(test_shelter_user, "Buddy", "Golden Retriever"),
+            self._pet(test_shelter_user, "Rex", "Labrador", "Calm and quiet"),
+        ])
+        await test_db.commit()
+
+        response = await async_client.post(
+            "/api/v2/pets/search",
+            json={"query": "golden", "sort_by": "relevance"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3
+        assert [pet["name"] for pet in data["items"]] == ["Golden", "Buddy", "Max"]
+
+    async def test_search_prefix_and_chinese(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test English prefix matching and Chinese bigram matching"""
+        test_db.add_all([
+            self._pet(test_shelter_user, "小黃", "米克斯", "很親人的黃金獵犬"),
+            self._pet(test_shelter_user, "Lucky", "Labrador Retriever"),
+        ])
+        await test_db.commit()
+
+        response = await async_client.post("/api/v2/pets/search", json={"query": "黃金獵犬"})
+        assert [pet["name"] for pet in response.json()["items"]] == ["小黃"]
+
+        response = await async_client.post("/api/v2/pets/search", json={"query": "labra"})
+        assert [pet["name"] for pet in response.json()["items"]] == ["Lucky"]
+
+        response = await async_client.post("/api/v2/pets/search", json={"query": "貴賓"})
+        assert response.json()["total"] == 0
+
+    async def test_search_reflects_updates(
+        self,
+        async_client: AsyncClient,
+        shelter_auth_headers: dict,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test the search index picks up edits made through the API"""
+        pet = self._pet(test_shelter_user, "Shadow", "Husky")
+        test_db.add(pet)
+        await test_db.commit()
+        await test_db.refresh(pet)
+
+        response = await async_client.post("/api/v2/pets/search", json={"query": "husky"})
+        assert response.json()["total"] == 1
+
+        await async_client.put(
+            f"/api/v2/pets/{pet.id}",
+            json={"breed": "Malamute"},
+            headers=shelter_auth_headers
+        )
+
+        response = await async_client.post("/api/v2/pets/search", json={"query": "husky"})
+        assert response.json()["total"] == 0
+        response = await async_client.post("/api/v2/pets/search", json={"query": "malamute"})
+        assert response.json()["total"] == 1
+
+    async def test_search_cursor_pagination(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test cursor pagination with a nullable sort key and relevance sorting"""
+        pets = [self._pet(test_shelter_user, f"Terrier {i}", "Terrier") for i in range(5)]
+        pets[1].age_years = None
+        pets[3].age_years = 5
+        test_db.add_all(pets)
+        await test_db.commit()
+
+        async def walk(body: dict) -> list:
+            names, cursor = [], None
+            while True:
+                response = await async_client.post(
+                    "/api/v2/pets/search",
+                    json={**body, "pagination": "cursor", "page_size": 2, "cursor": cursor}
+                )
+                assert response.status_code == 200
+                data = response.json()
+                names.extend(pet["name"] for pet in data["items"])
+                cursor = data["next_cursor"]
+                if not data["has_more"]:
+                    return names
+
+        assert await walk({"sort_by": "age", "order": "asc"}) == [
+            "Terrier 1", "Terrier 0", "Terrier 2", "Terrier 4", "Terrier 3"
+        ]
+        assert await walk({"sort_by": "age", "order": "desc"}) == [
+            "Terrier 3", "Terrier 4", "Terrier 2", "Terrier 0", "Terrier 1"
+        ]
+        assert sorted(await walk({"query": "terrier", "sort_by": "relevance"})) == [
+            f"Terrier {i}" for i in range(5)
+        ]
+
+    async def test_search_facets(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_shelter_user: User
+    ):
+        """Test facet counts exclude their own dimension and share the total"""
+        cat = self._pet(test_shelter_user, "Mimi", "Persian")
+        cat.species, cat.gender, cat.size = "cat", "female", "small"
+        female_dog = self._pet(test_shelter_user, "Lady", "Beagle")
+        female_dog.gender, female_dog.size = "female", "large"
+        test_db.add_all([
+            self._pet(test_shelter_user, "Rocky", "Boxer"),
+            self._pet(test_shelter_user, "Duke", "Boxer"),
+            cat,
+            female_dog,
+        ])
+        await test_db.commit()
+
+        response = await async_client.post(
+            "/api/v2/pets/search?facets=species,gender,size",
+            json={"species": ["dog"], "gender": "male"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert len(data["items"]) == 2
+        assert data["facets"]["species"]["dog"] == 2
+        assert data["facets"]["species"]["cat"] == 0
+        assert data["facets"]["gender"] == {"male": 2, "female": 1, "unknown": 0}
+        assert data["facets"]["size"]["medium"] == 2
+        assert data["facets"]["size"]["large"] == 0
+
+        response = await async_client.post("/api/v2/pets/search?facets=color", json={})
+        assert response.status_code == 400
 
 
 # ==================== Get Pet Details Tests ====================
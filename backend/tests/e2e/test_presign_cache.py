@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Presigned URL Cache Tests
+Test S3Service reuses presigned URLs only while they outlive the requested expiration
+"""
+import time
+
+import pytest
+
+from app.services import s3 as s3_module
+from app.services.s3 import PRESIGN_REFRESH_MARGIN, S3Service
+from app.utils.cache import TTLCache
+
+DAY = 86400
+WEEK = 7 * DAY
+
+
+class SigningClient:
+    """記錄簽章次數的 boto3 client 替身"""
+
+    def __init__(self):
+        self.signed = []
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.signed.append((Params["Key"], ExpiresIn))
+        return f"https://s3.local/{Params['Key']}?expires={ExpiresIn}&n={len(self.signed)}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手動推進的 time.monotonic（快取 TTL 與 URL 剩餘效期共用）"""
+    now = [time.monotonic()]
+    monkeypatch.setattr(s3_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def service() -> S3Service:
+    s3 = S3Service()
+    s3.use_s3 = True
+    s3.cloudfront_domain = None
+    s3.s3_client = SigningClient()
+    s3._url_cache = TTLCache(max_size=2)
+    return s3
+
+
+class TestPresignCache:
+    """Test presigned URL cache hits, misses, expiration awareness and eviction"""
+
+    def test_same_expiration_hits(self, service: S3Service, clock):
+        """Test a second request for the same key and expiration is served from the cache"""
+        first = service.generate_presigned_url("a.jpg", expiration=DAY)
+        assert service.generate_presigned_url("a.jpg", expiration=DAY) == first
+        assert service.cached_url("a.jpg", DAY) == first
+        assert service.s3_client.signed == [("a.jpg", DAY)]
+        assert service._url_cache.hits == 2
+
+    def test_shorter_url_is_not_served_for_longer_expiration(self, service: S3Service, clock):
+        """Test a 1-day URL is re-signed for a 7-day request, and the 7-day URL then serves both"""
+        pet_url = service.generate_presigned_url("a.jpg", expiration=DAY)
+        assert service.cached_url("a.jpg", WEEK) is None
+
+        chat_url = service.generate_presigned_url("a.jpg", expiration=WEEK)
+        assert chat_url != pet_url
+        assert "expires=604800" in chat_url
+        assert service.generate_presigned_url("a.jpg", expiration=DAY) == chat_url
+        assert service.generate_presigned_urls(["a.jpg"], expiration=DAY) == {"a.jpg": chat_url}
+        assert service.s3_client.signed == [("a.jpg", DAY), ("a.jpg", WEEK)]
+
+    def test_remaining_lifetime_covers_request(self, service: S3Service, clock):
+        """Test a cached URL stops being served once its remaining lifetime drops below expiration - margin"""
+        week_url = service.generate_presigned_url("a.jpg", expiration=WEEK)
+
+        clock[0] += WEEK - DAY
+        # 剩 1 天：1 天的要求仍在 PRESIGN_REFRESH_MARGIN 之內，7 天的要求要重新簽
+        assert service.cached_url("a.jpg", DAY) == week_url
+        assert service.cached_url("a.jpg", WEEK) is None
+
+        clock[0] += PRESIGN_REFRESH_MARGIN + 1
+        assert service.generate_presigned_url("a.jpg", expiration=DAY) != week_url
+        assert service.s3_client.signed == [("a.jpg", WEEK), ("a.jpg", DAY)]
+
+    def test_least_recently_used_key_is_evicted(self, service: S3Service, clock):
+        """Test exceeding the cache size evicts the least recently used key, which is then re-signed"""
+        urls = service.generate_presigned_urls(["a.jpg", "b.jpg"], expiration=DAY)
+        assert service.generate_presigned_url("a.jpg", expiration=DAY) == urls["a.jpg"]
+        service.generate_presigned_url("c.jpg", expiration=DAY)
+
+        assert service._url_cache.evictions == 1
+        assert service.cached_url("b.jpg", DAY) is None
+        assert service.cached_url("a.jpg", DAY) == urls["a.jpg"]
+        service.generate_presigned_urls(["a.jpg", "b.jpg"], expiration=DAY)
+        assert [key for key, _ in service.s3_client.signed] == ["a.jpg", "b.jpg", "c.jpg", "b.jpg"]
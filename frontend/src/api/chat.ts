@@ -120,6 +120,11 @@ export async function getChatRooms(): Promise<ChatRoom[]> {
   return response.data.rooms
 }
 
+export async function getTotalUnreadCount(): Promise<number> {
+  const response = await apiClient.get<{ unread_count: number }>('/chat/unread-count')
+  return response.data.unread_count
+}
+
 export async function getChatMessages(
   roomId: number,
   skip: number = 0,
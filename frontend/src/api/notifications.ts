@@ -12,6 +12,9 @@ export interface Notification {
   is_read: boolean
   notification_type?: string | null
   link?: string | null
+  // 合併通知（按讚、留言）的觸發人數與最後觸發者
+  actor_count?: number
+  last_actor_name?: string | null
   created_at: string
 }
 
@@ -7,8 +7,28 @@ import { ref } from 'vue';
 import { useAuthStore } from '@/stores/auth';
 
 export interface WebSocketMessage {
-  type: 'subscribed' | 'unsubscribed' | 'new_message' | 'pong' | 'error';
+  type:
+    | 'subscribed'
+    | 'unsubscribed'
+    | 'new_message'
+    | 'ack'
+    | 'resumed'
+    | 'resync'
+    | 'notification.created'
+    | 'notification.updated'
+    | 'unread.delta'
+    | 'unread.cleared'
+    | 'ping'
+    | 'pong'
+    | 'error';
   room_id?: number;
+  client_id?: string;
+  last_seq?: number;
+  replayed?: number;
+  // 未讀數事件：counter 為 notifications 或 chat（chat 帶 room_id）
+  counter?: 'notifications' | 'chat';
+  delta?: number;
+  notification?: any;
   message?: any;
   error?: string;
 }
@@ -25,7 +45,11 @@ class ChatWebSocketService {
   private reconnectDelay = 3000;
   private listeners: Set<MessageListener> = new Set();
   private subscribedRooms: Set<number> = new Set();
+  // 每個聊天室最後收到的訊息序號，重連時只補送之後的訊息
+  private lastSeq: Map<number, number> = new Map();
   private heartbeatInterval: number | null = null;
+  private pendingSends: Map<string, { resolve: (message: any) => void; reject: (error: Error) => void }> = new Map();
+  private sendSequence = 0;
   
   public connected = ref(false);
   public connecting = ref(false);
@@ -68,10 +92,19 @@ class ChatWebSocketService {
         this.connecting.value = false;
         this.reconnectAttempts = 0;
 
-        // 重新訂閱之前的聊天室
+        // 重新訂閱之前的聊天室：已收過訊息的聊天室以 resume 補送斷線期間的訊息
+        const resumeRooms: Record<number, number> = {};
         this.subscribedRooms.forEach(roomId => {
-          this.subscribeRoom(roomId);
+          const seq = this.lastSeq.get(roomId);
+          if (seq !== undefined) {
+            resumeRooms[roomId] = seq;
+          } else {
+            this.subscribeRoom(roomId);
+          }
         });
+        if (Object.keys(resumeRooms).length > 0) {
+          this.ws?.send(JSON.stringify({ action: 'resume', rooms: resumeRooms }));
+        }
 
         // 啟動心跳檢測
         this.startHeartbeat();
@@ -82,6 +115,28 @@ class ChatWebSocketService {
           const message: WebSocketMessage = JSON.parse(event.data);
           console.log('📨 WebSocket message received:', message);
 
+          // 伺服器心跳：回覆後連線才不會被視為閒置而關閉
+          if (message.type === 'ping') {
+            this.ws?.send(JSON.stringify({ action: 'pong' }));
+            return;
+          }
+
+          if ((message.type === 'new_message' || message.type === 'ack') && message.room_id && message.message?.seq) {
+            this.setLastSeq(message.room_id, message.message.seq);
+          }
+
+          // 透過 WebSocket 發送的訊息：ack / error 以 client_id 對應
+          const pending = message.client_id ? this.pendingSends.get(message.client_id) : undefined;
+          if (pending && (message.type === 'ack' || message.type === 'error')) {
+            this.pendingSends.delete(message.client_id!);
+            if (message.type === 'ack') {
+              pending.resolve(message.message);
+            } else {
+              pending.reject(new Error(message.error || 'Failed to send message'));
+            }
+            return;
+          }
+
           // 通知所有監聽器
           this.listeners.forEach(listener => {
             listener(message);
@@ -101,6 +156,7 @@ class ChatWebSocketService {
         this.connected.value = false;
         this.connecting.value = false;
         this.stopHeartbeat();
+        this.rejectPendingSends();
 
         // 自動重連
         if (this.reconnectAttempts < this.maxReconnectAttempts) {
@@ -146,6 +202,7 @@ class ChatWebSocketService {
     this.connected.value = false;
     this.connecting.value = false;
     this.subscribedRooms.clear();
+    this.lastSeq.clear();
   }
 
   /**
@@ -178,6 +235,7 @@ class ChatWebSocketService {
 
     console.log('🔕 Unsubscribing from room:', roomId);
     this.subscribedRooms.delete(roomId);
+    this.lastSeq.delete(roomId);
 
     this.ws.send(JSON.stringify({
       action: 'unsubscribe',
@@ -185,6 +243,46 @@ class ChatWebSocketService {
     }));
   }
 
+  /**
+   * 記錄聊天室最後收到的訊息序號（也可用 REST 載入的最新訊息 seq 設定）
+   */
+  setLastSeq(roomId: number, seq: number): void {
+    if (seq > (this.lastSeq.get(roomId) ?? 0)) {
+      this.lastSeq.set(roomId, seq);
+    }
+  }
+
+  /**
+   * 透過 WebSocket 發送文字訊息（需先訂閱聊天室）
+   * 伺服器寫入後以 ack 回覆，resolve 為已儲存的訊息
+   */
+  sendMessage(roomId: number, content: string): Promise<any> {
+    if (!this.ws || this.ws.readyState !== WebSocket.OPEN) {
+      return Promise.reject(new Error('WebSocket not connected'));
+    }
+
+    const clientId = `${Date.now()}-${++this.sendSequence}`;
+    return new Promise((resolve, reject) => {
+      this.pendingSends.set(clientId, { resolve, reject });
+      this.ws!.send(JSON.stringify({
+        action: 'send',
+        room_id: roomId,
+        client_id: clientId,
+        content
+      }));
+    });
+  }
+
+  /**
+   * 連線中斷時，尚未收到 ack 的訊息視為發送失敗
+   */
+  private rejectPendingSends(): void {
+    this.pendingSends.forEach(pending => {
+      pending.reject(new Error('WebSocket closed before the message was acknowledged'));
+    });
+    this.pendingSends.clear();
+  }
+
   /**
    * 添加訊息監聽器
    */